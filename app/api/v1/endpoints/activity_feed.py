@@ -6,9 +6,11 @@ agregadas sin exponer identidades de usuarios.
 """
 
 from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect, HTTPException, status
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Optional
 from redis.asyncio import Redis
 from sqlalchemy.orm import Session
+import asyncio
 import json
 import logging
 
@@ -17,6 +19,7 @@ from app.db.session import get_db
 from app.core.tenant import get_tenant_id
 from app.services.activity_feed_service import ActivityFeedService
 from app.services.activity_aggregator import ActivityAggregator
+from app.services.activity_feed_broadcaster import activity_feed_broadcaster
 from app.core.dependencies import module_enabled
 
 logger = logging.getLogger(__name__)
@@ -305,6 +308,69 @@ async def get_daily_stats_summary(
         )
 
 
+SSE_HEARTBEAT_SECONDS = 15
+
+
+def _format_sse(event: str, data: Dict, event_id: Optional[str] = None) -> str:
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("/stream", summary="Feed en tiempo real (Server-Sent Events)")
+async def stream_activity_feed(
+    gym_id: int = Depends(get_tenant_id),
+    redis: Redis = Depends(get_redis_client)
+):
+    """
+    Stream SSE con las nuevas actividades del gimnasio.
+
+    Sustituye al polling de `GET /`: el cliente mantiene una conexión abierta y
+    recibe un evento `activity` por cada actividad publicada. Se envía un
+    comentario de keep-alive cada 15 segundos sin actividad.
+    """
+    if not gym_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Se requiere el header X-Gym-ID"
+        )
+
+    subscriber = activity_feed_broadcaster.subscribe(redis, gym_id, transport="sse")
+
+    async def event_stream():
+        try:
+            yield _format_sse("connection", {
+                "message": "Conectado al feed en tiempo real",
+                "gym_id": gym_id
+            })
+            while True:
+                try:
+                    activity = await asyncio.wait_for(subscriber.receive(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                if activity is None:
+                    # El broadcaster cerró la conexión (cliente lento o apagado)
+                    yield _format_sse("close", {"reason": subscriber.close_reason})
+                    break
+                yield _format_sse("activity", activity, event_id=activity.get("id"))
+        finally:
+            activity_feed_broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 @router.websocket("/ws")
 async def websocket_feed(
     websocket: WebSocket,
@@ -314,20 +380,32 @@ async def websocket_feed(
     """
     WebSocket para recibir actualizaciones del feed en tiempo real.
 
-    Se suscribe al canal del gimnasio y envía actualizaciones cuando
-    ocurren nuevas actividades.
+    Usa la suscripción compartida del worker en lugar de abrir una conexión
+    pub/sub de Redis por cliente.
     """
     await websocket.accept()
     logger.info(f"WebSocket conectado para gym {gym_id}")
 
-    # Crear pubsub y suscribir al canal
-    pubsub = redis.pubsub()
-    channel = f"gym:{gym_id}:feed:updates"
+    subscriber = activity_feed_broadcaster.subscribe(redis, gym_id, transport="websocket")
 
-    try:
-        await pubsub.subscribe(channel)
-        logger.info(f"Suscrito a canal: {channel}")
+    async def forward_activities():
+        while True:
+            activity = await subscriber.receive()
+            if activity is None:
+                await websocket.close(code=1013, reason=subscriber.close_reason or "closed")
+                return
+            await websocket.send_json({
+                "type": "activity",
+                "data": activity
+            })
+
+    async def wait_for_disconnect():
+        # Consumir mensajes del cliente para detectar la desconexión
+        while True:
+            await websocket.receive_text()
 
+    tasks = []
+    try:
         # Enviar mensaje de bienvenida
         await websocket.send_json({
             "type": "connection",
@@ -335,43 +413,26 @@ async def websocket_feed(
             "gym_id": gym_id
         })
 
-        # Loop principal para recibir mensajes
-        while True:
-            # Obtener mensaje del canal
-            message = await pubsub.get_message(
-                ignore_subscribe_messages=True,
-                timeout=1.0
-            )
-
-            if message and message["type"] == "message":
-                try:
-                    # Decodificar y enviar
-                    data = message["data"]
-                    if isinstance(data, bytes):
-                        data = data.decode('utf-8')
-
-                    activity = json.loads(data)
-                    await websocket.send_json({
-                        "type": "activity",
-                        "data": activity
-                    })
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error decodificando mensaje: {e}")
-                except Exception as e:
-                    logger.error(f"Error procesando mensaje: {e}")
+        tasks = [
+            asyncio.create_task(forward_activities()),
+            asyncio.create_task(wait_for_disconnect())
+        ]
+        done, _pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket desconectado para gym {gym_id}")
     except Exception as e:
         logger.error(f"Error en WebSocket: {e}")
-        await websocket.close(code=1000, reason=str(e))
-    finally:
-        # Limpiar suscripción
         try:
-            await pubsub.unsubscribe(channel)
-            await pubsub.close()
-        except:
+            await websocket.close(code=1000, reason=str(e))
+        except Exception:
             pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        activity_feed_broadcaster.unsubscribe(subscriber)
 
 
 @router.get("/health", summary="Health check del Activity Feed")
@@ -418,7 +479,8 @@ async def feed_health_check(
                 "min_aggregation_threshold": 3,
                 "show_user_names": False,
                 "ttl_enabled": True
-            }
+            },
+            "realtime_stream": activity_feed_broadcaster.get_stats()
         }
     except Exception as e:
         logger.error(f"Health check falló: {e}")
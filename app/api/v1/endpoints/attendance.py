@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, Security, HTTPException, status, Body
 from sqlalchemy.orm import Session
 from typing import Dict, Any, Optional
@@ -8,6 +10,7 @@ from app.core.auth0_fastapi import Auth0User, auth
 from app.core.dependencies import module_enabled
 from app.core.tenant import verify_gym_access
 from app.models.gym import Gym
+from app.schemas.attendance import BulkCheckInRequest, BulkCheckInResponse
 from app.services.attendance import attendance_service
 from app.services.user import user_service
 from app.db.redis_client import get_redis_client
@@ -15,6 +18,10 @@ from redis.asyncio import Redis
 
 router = APIRouter()
 
+class QRCheckInTokenResponse(BaseModel):
+    token: str
+    expires_at: datetime
+
 class QRCheckInRequest(BaseModel):
     qr_code: str
     session_id: Optional[int] = None  # Si se provee, hace check-in a esta sesión específica
@@ -58,4 +65,53 @@ async def check_in(
             detail=result["message"]
         )
     
-    return result 
\ No newline at end of file
+    return result 
+
+
+
+@router.post("/check-in/bulk", response_model=BulkCheckInResponse)
+async def bulk_check_in(
+    check_in_data: BulkCheckInRequest,
+    db: Session = Depends(get_db),
+    current_gym: Gym = Depends(verify_gym_access),
+    user: Auth0User = Security(auth.get_user, scopes=["resource:write"]),
+    redis_client: Redis = Depends(get_redis_client)
+) -> Any:
+    """
+    Sincroniza en una sola petición los escaneos QR acumulados por un
+    dispositivo de recepción, por ejemplo tras trabajar sin conexión.
+
+    Cada evento lleva un `event_id` único generado por el dispositivo: reenviar
+    un lote es seguro y los eventos ya sincronizados se devuelven con
+    `duplicate=true`. La respuesta incluye un resultado por evento en el mismo
+    orden; un evento rechazado no impide registrar los demás.
+    """
+    return await attendance_service.process_bulk_check_in(
+        db,
+        events=check_in_data.events,
+        gym_id=current_gym.id,
+        redis_client=redis_client
+    )
+
+@router.get("/qr-token", response_model=QRCheckInTokenResponse)
+async def get_check_in_token(
+    db: Session = Depends(get_db),
+    current_gym: Gym = Depends(verify_gym_access),
+    user: Auth0User = Security(auth.get_user, scopes=["resource:read"]),
+    redis_client: Redis = Depends(get_redis_client)
+) -> Any:
+    """
+    Emite un token QR de check-in firmado para el usuario autenticado.
+
+    El token caduca a los pocos minutos y solo es válido en el gimnasio actual;
+    la app debe renovarlo antes de `expires_at`. El escaneo lo verifica sin
+    consultar la base de datos.
+    """
+    db_user = await user_service.get_user_by_auth0_id_cached(db, auth0_id=user.id, redis_client=redis_client)
+    if not db_user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+
+    return attendance_service.issue_checkin_token(db_user.id, current_gym.id)
@@ -36,12 +36,14 @@ from app.schemas.event import (
     EventParticipationCreate,
     EventParticipationUpdate,
     EventWithParticipantCount,
+    EventPage,
     EventParticipationWithEvent,
     EventBulkParticipationCreate,
     EventParticipationWithPayment,
-    EventCancellationResponse
+    EventCancellationResponse,
+    EventRefundJobProgress
 )
-from app.models.event import EventStatus, EventParticipationStatus, Event, EventParticipation, RefundPolicyType, PaymentStatusType
+from app.models.event import EventStatus, EventParticipationStatus, Event, EventParticipation, RefundPolicyType, PaymentStatusType, EventRefundJobStatus, EventRefundActionType
 from app.models.user import UserRole, User
 from app.models.user_gym import GymRoleType
 from app.models.stripe_profile import GymStripeAccount
@@ -54,6 +56,7 @@ import time
 from app.services.event import event_service
 from app.services.chat import chat_service
 from app.services.event_payment_service import event_payment_service
+from app.services.event_refund_jobs import event_refund_job_service
 from app.services.notification_service import notification_service
 from app.core.config import get_settings
 from app.services import sqs_service, queue_service
@@ -299,6 +302,57 @@ async def read_events(
         return events_with_counts
 
 
+@router.get("/page", response_model=EventPage)
+async def read_events_page(
+    *,
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    status: Optional[EventStatus] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    title_contains: Optional[str] = None,
+    location_contains: Optional[str] = None,
+    created_by: Optional[int] = None,
+    only_available: bool = False,
+    current_gym: GymSchema = Depends(verify_gym_access_cached),
+    current_user: Auth0User = Security(auth.get_user, scopes=["resource:read"])
+) -> Any:
+    """
+    Obtener eventos paginados por cursor, con conteos y estado del usuario.
+
+    Cada evento incluye los inscritos, la lista de espera y el estado de
+    participación y de pago del usuario actual, todo en una única consulta.
+    Para la página siguiente se envía el ``next_cursor`` de la respuesta.
+
+    Permissions:
+        - Requires 'read:events' scope (all authenticated users)
+    """
+    start_time = time.time()
+    try:
+        page = event_service.get_events_page(
+            db,
+            gym_id=current_gym.id,
+            viewer_id=current_user.id,
+            cursor=cursor,
+            limit=limit,
+            status=status,
+            start_date=start_date,
+            end_date=end_date,
+            title_contains=title_contains,
+            location_contains=location_contains,
+            created_by=created_by,
+            only_available=only_available
+        )
+    except ValueError as e:
+        # 'status' es aquí el filtro de estado, no el módulo de FastAPI
+        raise HTTPException(status_code=400, detail=str(e))
+
+    process_time = (time.time() - start_time) * 1000
+    logger.info(f"Endpoint read_events_page completado en {process_time:.2f}ms")
+    return page
+
+
 @router.get("/me", response_model=List[EventSchema])
 async def read_my_events(
     *,
@@ -584,6 +638,7 @@ async def update_event(
                     )
                     if promoted:
                         logger.info(f"{len(promoted)} usuarios promovidos de waiting list en evento {event_id}")
+                        await event_service.notify_waitlist_promotions(updated_event, promoted)
         except Exception as e:
             logger.error(f"Error promoviendo waiting list tras aumento de cupo: {e}", exc_info=True)
             
@@ -669,6 +724,7 @@ async def update_event(
                 promoted = event_participation_repository.fill_vacancies_from_waiting_list(db, event_id=event_id)
                 if promoted:
                     logger.info(f"{len(promoted)} usuarios promovidos de waiting list en evento {event_id}")
+                    await event_service.notify_waitlist_promotions(updated_event, promoted)
     except Exception as e:
         logger.error(f"Error promoviendo waiting list tras aumento de cupo: {e}", exc_info=True)
     
@@ -684,7 +740,8 @@ async def delete_event(
     reason: Optional[str] = Query(None, max_length=500, description="Razón de la cancelación del evento"),
     current_gym: GymSchema = Depends(verify_gym_access),
     current_user: Auth0User = Security(auth.get_user, scopes=["resource:admin"]),
-    redis_client: Redis = Depends(get_redis_client)
+    redis_client: Redis = Depends(get_redis_client),
+    background_tasks: BackgroundTasks
 ) -> EventCancellationResponse:
     """
     Delete/Cancel an event with automatic refunds for paid events.
@@ -721,7 +778,8 @@ async def delete_event(
         reason=reason,
         current_gym=current_gym,
         current_user=current_user,
-        redis_client=redis_client
+        redis_client=redis_client,
+        background_tasks=background_tasks
     )
 
 
@@ -734,14 +792,16 @@ async def admin_delete_event(
     reason: Optional[str] = Query(None, max_length=500, description="Razón de la cancelación del evento"),
     current_gym: GymSchema = Depends(verify_gym_access),  # Usar GymSchema
     current_user: Auth0User = Security(auth.get_user, scopes=["resource:admin"]),
-    redis_client: Redis = Depends(get_redis_client)
+    redis_client: Redis = Depends(get_redis_client),
+    background_tasks: BackgroundTasks
 ) -> EventCancellationResponse:
     """
     Administrative endpoint to cancel/delete any event with automatic refunds.
 
     **COMPORTAMIENTO MEJORADO PARA EVENTOS DE PAGO:**
-    - Reembolsa automáticamente 100% a todos los participantes que ya pagaron
-    - Cancela Payment Intents pendientes en Stripe
+    - Encola un trabajo que reembolsa el 100% a todos los participantes que ya pagaron
+      y cancela los Payment Intents pendientes en Stripe; responde sin esperar a Stripe
+      (progreso en GET /admin/{event_id}/refund-job)
     - Marca el evento como CANCELLED (no lo elimina físicamente)
     - Envía notificaciones multi-canal (Push, Email, Chat)
     - Registra auditoría completa de la cancelación
@@ -761,9 +821,10 @@ async def admin_delete_event(
         current_gym: The current gym (tenant) context
         current_user: Authenticated administrator
         redis_client: Redis client for cache invalidation
+        background_tasks: Ejecuta el trabajo de reembolsos tras responder
 
     Returns:
-        EventCancellationResponse con estadísticas de reembolsos y notificaciones
+        EventCancellationResponse con el trabajo de reembolsos encolado y las notificaciones
 
     Raises:
         HTTPException: 404 if event not found, 400 if already cancelled, 500 for other errors
@@ -819,16 +880,7 @@ async def admin_delete_event(
                     detail="Admin user not found in database"
                 )
 
-            # Procesar cancelación con reembolsos masivos
-            refund_stats = await event_payment_service.cancel_event_with_full_refunds(
-                db=db,
-                event=event,
-                gym_id=current_gym.id,
-                cancelled_by_user_id=admin_user.id,
-                reason=reason
-            )
-
-            # Obtener IDs de participantes para notificaciones
+            # IDs de participantes para notificaciones (antes de cancelar sus participaciones)
             participant_ids = [
                 p.member_id for p in event.participants
                 if p.status in [
@@ -838,6 +890,21 @@ async def admin_delete_event(
                 ]
             ]
 
+            # Cancelar el evento y encolar los reembolsos; Stripe se procesa tras responder
+            refund_job = event_refund_job_service.enqueue_cancellation(
+                db=db,
+                event=event,
+                gym_id=current_gym.id,
+                cancelled_by_user_id=admin_user.id,
+                reason=reason
+            )
+            if refund_job.status == EventRefundJobStatus.PENDING:
+                background_tasks.add_task(event_refund_job_service.run_job, refund_job.id)
+            failed_refunds = event_refund_job_service.progress(db, refund_job)["failures"]
+            payments_cancelled = sum(
+                1 for item in refund_job.items if item.action == EventRefundActionType.CANCEL_PAYMENT
+            )
+
             # Enviar notificaciones multi-canal
             notification_stats = {"push": 0, "email": 0, "chat": 0}
             if participant_ids:
@@ -849,7 +916,7 @@ async def admin_delete_event(
                         gym_id=current_gym.id,
                         gym_name=current_gym.name,
                         participant_user_ids=participant_ids,
-                        total_refunded_cents=refund_stats["total_refunded_cents"],
+                        total_refunded_cents=refund_job.scheduled_refund_cents,
                         currency=event.currency or "EUR",
                         cancellation_reason=reason
                     )
@@ -881,14 +948,18 @@ async def admin_delete_event(
                 event_title=event.title,
                 cancellation_date=event.cancellation_date or datetime.now(timezone.utc),
                 cancellation_reason=reason,
-                participants_count=refund_stats["participants_count"],
-                refunds_processed=refund_stats["refunds_processed"],
-                refunds_failed=refund_stats["refunds_failed"],
-                payments_cancelled=refund_stats["payments_cancelled"],
-                total_refunded_amount=refund_stats["total_refunded_cents"],
+                participants_count=len(participant_ids),
+                refunds_processed=refund_job.succeeded_items,
+                refunds_failed=refund_job.failed_items,
+                payments_cancelled=payments_cancelled,
+                total_refunded_amount=refund_job.refunded_cents,
                 currency=event.currency or "EUR",
-                failed_refunds=refund_stats["failed_refunds"],
-                notifications_sent=notification_stats
+                failed_refunds=failed_refunds,
+                notifications_sent=notification_stats,
+                refund_job_id=refund_job.id,
+                refund_job_status=refund_job.status.value,
+                refund_job_items=refund_job.total_items,
+                scheduled_refund_amount=refund_job.scheduled_refund_cents
             )
 
         # CASO 2: Evento gratuito -> Eliminar normalmente (comportamiento anterior)
@@ -932,7 +1003,7 @@ async def admin_delete_event(
                 participants_count=participant_count,
                 refunds_processed=0,
                 refunds_failed=0,
-                payments_cancelled=0,
+                payments_cancelled=0,  # Un evento gratuito no tiene pagos en Stripe
                 total_refunded_amount=0,
                 currency="EUR",
                 failed_refunds=[],
@@ -949,6 +1020,32 @@ async def admin_delete_event(
         )
 
 
+@router.get("/admin/{event_id}/refund-job", response_model=EventRefundJobProgress)
+async def get_event_refund_job(
+    *,
+    db: Session = Depends(get_db),
+    event_id: int = Path(..., title="Event ID"),
+    current_gym: GymSchema = Depends(verify_gym_access),
+    current_user: Auth0User = Security(auth.get_user, scopes=["resource:admin"])
+) -> EventRefundJobProgress:
+    """
+    Progreso del trabajo de reembolsos de un evento de pago cancelado.
+
+    Permissions:
+        - Requires 'resource:admin' scope (administrators)
+
+    Raises:
+        HTTPException: 404 si el evento no tiene trabajo de reembolsos en el gimnasio actual
+    """
+    job = event_refund_job_service.get_latest_job(db, event_id=event_id, gym_id=current_gym.id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Refund job not found for this event"
+        )
+    return EventRefundJobProgress(**event_refund_job_service.progress(db, job))
+
+
 # Event Participation Endpoints
 @router.post("/participation", response_model=EventParticipationWithPayment, status_code=status.HTTP_201_CREATED)
 async def register_for_event(
@@ -1752,8 +1849,8 @@ async def cancel_participation(
             # Continuar con la cancelación aunque el reembolso falle
             # El admin puede procesar el reembolso manualmente después
 
-    # Cancelar participación
-    result = event_participation_repository.cancel_participation(
+    # Cancelar participación y cubrir la plaza desde la lista de espera
+    result, promoted = event_participation_repository.cancel_and_promote(
         db, member_id=user.id, event_id=event_id
     )
 
@@ -1762,6 +1859,8 @@ async def cancel_participation(
             status_code=404,
             detail="Error al cancelar la participación"
         )
+
+    await event_service.notify_waitlist_promotions(event, promoted)
     
     # Invalidar cachés relacionadas
     if redis_client:
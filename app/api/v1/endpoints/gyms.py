@@ -16,6 +16,7 @@ from app.models.user_gym import UserGym, GymRoleType
 from app.services.gym import gym_service
 from app.services.user import user_service
 from app.services.gym_logo_service import gym_logo_service
+from app.services.membership_lifecycle import membership_lifecycle_service
 from app.schemas.gym import Gym as GymSchema, GymCreate, GymUpdate, GymStatusUpdate, GymWithStats, UserGymMembershipSchema, UserGymRoleUpdate, UserGymSchema, GymPublicSchema, GymDetailedPublicSchema
 from app.core.auth0_fastapi import auth, get_current_user, Auth0User
 from app.core.tenant import verify_gym_access, verify_admin_role
@@ -282,6 +283,7 @@ async def add_user_to_current_gym(
     
     # Añadir usuario al gimnasio (ahora síncrono)
     user_gym = gym_service.add_user_to_gym(db, gym_id=gym_id, user_id=user_id)
+    await membership_lifecycle_service.invalidate_summaries([gym_id])
     
     # Actualizar el rol más alto en Auth0
     from app.services.auth0_sync import auth0_sync_service
@@ -370,6 +372,7 @@ async def add_user_to_current_gym_by_email(
     
     # Añadir usuario al gimnasio (ahora síncrono)
     user_gym = gym_service.add_user_to_gym(db, gym_id=gym_id, user_id=user_id)
+    await membership_lifecycle_service.invalidate_summaries([gym_id])
     
     # Actualizar el rol más alto en Auth0
     from app.services.auth0_sync import auth0_sync_service
@@ -504,6 +507,7 @@ async def remove_user_from_current_gym(
     try:
         gym_service.remove_user_from_gym(db, gym_id=gym_id, user_id=user_id)
         db.commit()
+        await membership_lifecycle_service.invalidate_summaries([gym_id])
         
         # Invalidar cachés relevantes (usando el redis_client inyectado)
         if redis_client and target_role:
@@ -816,6 +820,7 @@ async def remove_user_from_gym_by_superadmin(
     try:
         gym_service.remove_user_from_gym(db, gym_id=gym_id, user_id=user_id)
         db.commit()
+        await membership_lifecycle_service.invalidate_summaries([gym_id])
         
         # Obtener redis_client para poder invalidar
         redis_client = await get_redis_client()
@@ -1103,6 +1108,7 @@ async def assign_gym_owner(
         
         db.commit()
         db.refresh(user_gym)
+        await membership_lifecycle_service.invalidate_summaries([gym_id])
         
         # Actualizar caché
         if redis_client:
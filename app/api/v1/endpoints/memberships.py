@@ -8,7 +8,7 @@ Este módulo proporciona todas las rutas relacionadas con la gestión de:
 """
 
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, Path
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status, Request, Path
 from sqlalchemy.orm import Session
 
 from app.db.session import get_db
@@ -31,10 +31,12 @@ from app.schemas.membership import (
 )
 from app.services.membership import membership_service
 from app.services.stripe_service import StripeService
+from app.services.stripe_webhook_inbox import stripe_webhook_inbox
 from app.services.user import user_service
 from app.db.redis_client import get_redis_client
 from app.middleware.rate_limit import limiter
 import logging
+import time
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
@@ -600,7 +602,8 @@ async def sync_all_plans_with_stripe(
     db: Session = Depends(get_db),
     current_user: Auth0User = Depends(auth.get_user),
     current_gym: GymSchema = Depends(verify_gym_admin_access),
-    _: None = Depends(billing_module_required)
+    _: None = Depends(billing_module_required),
+    dry_run: bool = Query(False, description="Calcular el diff sin aplicar cambios en Stripe")
 ) -> dict:
     """
     [ADMIN ONLY] Sincronizar todos los planes del gimnasio con Stripe.
@@ -609,11 +612,14 @@ async def sync_all_plans_with_stripe(
         db: Sesión de base de datos
         current_user: Usuario autenticado (Admin)
         current_gym: Gimnasio verificado
+        dry_run: Si solo se calcula el diff por plan
         
     Returns:
-        dict: Resumen de la sincronización masiva
+        dict: Resumen de la sincronización masiva con las operaciones por plan
     """
-    result = await membership_service.sync_all_plans_with_stripe(db, current_gym.id)
+    result = await membership_service.sync_all_plans_with_stripe(db, current_gym.id, dry_run=dry_run)
+    if result.get('error'):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result['error'])
     
     logger.info(f"Sincronización masiva ejecutada por admin {current_user.id}: {result['synced']}/{result['total']}")
     
@@ -622,6 +628,8 @@ async def sync_all_plans_with_stripe(
         "total_plans": result['total'],
         "synced_successfully": result['synced'],
         "failed": result['failed'],
+        "operations": result['operations'],
+        "dry_run": result['dry_run'],
         "details": result['details']
     }
 
@@ -711,7 +719,7 @@ async def get_membership_summary(
     Returns:
         MembershipSummary: Estadísticas del gimnasio
     """
-    summary = membership_service.get_gym_membership_summary(db, current_gym.id)
+    summary = await membership_service.get_gym_membership_summary(db, current_gym.id)
     
     logger.info(f"Resumen consultado por admin {current_user.id} para gym {current_gym.id}")
     return summary
@@ -1028,6 +1036,7 @@ async def handle_purchase_success(
 @limiter.limit("100 per minute")
 async def stripe_webhook(
     request: Request,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -1038,6 +1047,10 @@ async def stripe_webhook(
     - Suscripciones canceladas
     - Pagos fallidos
     
+    Solo verifica la firma y guarda el evento en el inbox (deduplicado por su
+    ID); los handlers se ejecutan después de responder, en segundo plano y
+    con el job del scheduler como respaldo.
+    
     Args:
         request: Request con payload y headers de Stripe
         db: Sesión de base de datos
@@ -1045,6 +1058,7 @@ async def stripe_webhook(
     Returns:
         dict: Confirmación de recepción
     """
+    received_at = time.perf_counter()
     try:
         # Obtener payload y signature del header
         payload = await request.body()
@@ -1056,12 +1070,19 @@ async def stripe_webhook(
                 detail="Falta signature de Stripe"
             )
         
-        # Procesar el webhook
-        result = await stripe_service.handle_webhook(payload, signature)
+        # Guardar en el inbox y responder sin esperar al procesamiento
+        result = stripe_webhook_inbox.ingest(db, payload, signature, received_at=received_at)
+        if result["status"] == "queued":
+            background_tasks.add_task(stripe_webhook_inbox.process_pending)
         
-        logger.info(f"Webhook de Stripe procesado: {result.get('event_type', 'unknown')}")
-        return {"received": True, "status": result.get("status", "processed")}
+        logger.info(
+            f"Webhook de Stripe {result['status']}: {result['event_type']} ({result['event_id']}) "
+            f"en {(time.perf_counter() - received_at) * 1000:.1f}ms"
+        )
+        return {"received": True, "status": result["status"]}
         
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"Error en webhook de Stripe: {str(e)}")
         # Devolver 200 para que Stripe no reintente
@@ -1072,14 +1093,69 @@ async def stripe_webhook(
             "message": str(e)
         }
     except Exception as e:
-        logger.error(f"Error inesperado en webhook: {str(e)}")
-        # Devolver 200 para que Stripe no reintente indefinidamente
-        return {
-            "received": True,
-            "status": "error", 
-            "error": "processing_error",
-            "message": "Error interno procesando webhook"
+        # El evento no quedó guardado: responder 500 para que Stripe lo reenvíe
+        # (el inbox deduplica si llegara a guardarse dos veces)
+        logger.error(f"Error inesperado guardando webhook: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error interno guardando webhook")
+
+
+@router.get("/webhooks/stripe/inbox")
+async def get_stripe_webhook_inbox(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200, description="Máximo de eventos DEAD a devolver"),
+    db: Session = Depends(get_db),
+    current_user: Auth0User = Depends(auth.get_user)
+):
+    """
+    Estado del inbox de webhooks de Stripe (solo super-administradores).
+    
+    Devuelve los eventos por estado, la latencia del ack (p50/p99 de las
+    últimas 24 horas) y los eventos que agotaron los reintentos (DEAD).
+    """
+    if not current_user.permissions or "platform:admin" not in current_user.permissions:
+        raise HTTPException(
+            status_code=403, 
+            detail="Acceso restringido a super-administradores"
+        )
+    
+    stats = stripe_webhook_inbox.stats(db)
+    stats["dead_letters"] = [
+        {
+            "stripe_event_id": event.stripe_event_id,
+            "event_type": event.event_type,
+            "ordering_key": event.ordering_key,
+            "attempts": event.attempts,
+            "last_error": event.last_error,
+            "received_at": event.received_at,
         }
+        for event in stripe_webhook_inbox.list_dead_letters(db, limit)
+    ]
+    return stats
+
+
+@router.post("/webhooks/stripe/inbox/{stripe_event_id}/retry")
+async def retry_stripe_webhook_event(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    stripe_event_id: str = Path(..., description="ID del evento de Stripe (evt_...)"),
+    db: Session = Depends(get_db),
+    current_user: Auth0User = Depends(auth.get_user)
+):
+    """
+    Reencolar un evento DEAD del inbox de webhooks (solo super-administradores).
+    """
+    if not current_user.permissions or "platform:admin" not in current_user.permissions:
+        raise HTTPException(
+            status_code=403, 
+            detail="Acceso restringido a super-administradores"
+        )
+    
+    if not stripe_webhook_inbox.requeue(db, stripe_event_id):
+        raise HTTPException(status_code=404, detail="Evento no encontrado en la cola de eventos muertos")
+    
+    background_tasks.add_task(stripe_webhook_inbox.process_pending)
+    logger.info(f"Webhook {stripe_event_id} reencolado por {current_user.id}")
+    return {"requeued": True, "stripe_event_id": stripe_event_id}
 
 
 # 🆕 ENDPOINTS PARA FUNCIONALIDADES AVANZADAS
@@ -6,6 +6,7 @@ from app.db.session import get_db
 from app.core.auth0_fastapi import get_current_user, Auth0User, auth
 from app.services.module import module_service
 from app.services.billing_module import billing_module_service
+from app.services.stripe_resolution_cache import stripe_resolution_cache
 from app.schemas.module import Module, ModuleCreate, ModuleUpdate, ModuleStatus, GymModuleList
 from app.core.tenant import get_tenant_id, verify_gym_admin_access, verify_super_admin_access
 from app.schemas.gym import GymSchema
@@ -86,6 +87,9 @@ async def activate_module(
 
     # Activar módulo (verificación de SUPER_ADMIN ya realizada por verify_super_admin_access)
     if module_service.activate_module_for_gym(db, gym_id, module_code):
+        if module_code == "billing":
+            # El estado del módulo forma parte de la resolución de Stripe cacheada
+            await stripe_resolution_cache.invalidate_gym_account(gym_id)
         return {"status": "success", "message": f"Módulo {module_code} activado correctamente para gimnasio {gym_id}"}
     else:
         raise HTTPException(
@@ -130,6 +134,8 @@ async def deactivate_module(
 
     # Desactivar módulo (verificación de SUPER_ADMIN ya realizada por verify_super_admin_access)
     if module_service.deactivate_module_for_gym(db, gym_id, module_code):
+        if module_code == "billing":
+            await stripe_resolution_cache.invalidate_gym_account(gym_id)
         return {"status": "success", "message": f"Módulo {module_code} desactivado correctamente para gimnasio {gym_id}"}
     else:
         raise HTTPException(
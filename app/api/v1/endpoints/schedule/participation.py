@@ -15,7 +15,8 @@ from app.schemas.schedule import (
     ClassSession as ClassSessionSchema
 )
 from app.schemas.participation_status import (
-    ParticipationStatusResponse
+    ParticipationStatusResponse,
+    SessionStatusBatchResponse
 )
 from app.models.user import User
 from app.models.user_gym import UserGym as Member
@@ -26,6 +27,7 @@ router = APIRouter()
 @router.post("/register/{session_id}", response_model=ClassParticipationSchema)
 async def register_for_class(
     session_id: int = Path(..., description="ID of the session"),
+    join_waitlist: bool = Query(False, description="Join the waitlist if the session is full"),
     db: Session = Depends(get_db),
     current_gym: Gym = Depends(verify_gym_access),
     user: Auth0User = Security(auth.get_user, scopes=["resource:write"]),
@@ -38,6 +40,8 @@ async def register_for_class(
 
     Args:
         session_id (int): The ID of the class session to register for.
+        join_waitlist (bool, optional): If the session is full, join its waitlist instead of failing.
+            Waitlisted members are promoted automatically when a seat is released. Defaults to False.
         db (Session, optional): Database session dependency. Defaults to Depends(get_db).
         current_gym (Gym, optional): Current gym context dependency. Defaults to Depends(verify_gym_access).
         user (Auth0User, optional): Authenticated user dependency. Defaults to Security(auth.get_user, scopes=["resource:write"]).
@@ -47,7 +51,7 @@ async def register_for_class(
         - Requires 'register:classes' scope.
 
     Returns:
-        ClassParticipationSchema: The created participation record.
+        ClassParticipationSchema: The created participation record (status WAITLISTED if placed on the waitlist).
 
     Raises:
         HTTPException 400: Bad request (e.g., session full, already registered, session not scheduled).
@@ -68,7 +72,8 @@ async def register_for_class(
 
     # Service layer handles checking session existence/status and registration logic
     return await class_participation_service.register_for_class(
-        db, member_id=db_user.id, session_id=session_id, gym_id=current_gym.id, redis_client=redis_client
+        db, member_id=db_user.id, session_id=session_id, gym_id=current_gym.id, redis_client=redis_client,
+        join_waitlist=join_waitlist
     )
 
 
@@ -76,6 +81,7 @@ async def register_for_class(
 async def register_member_for_class(
     session_id: int = Path(..., description="ID of the session"),
     member_id: int = Path(..., description="ID of the member to register"),
+    join_waitlist: bool = Query(False, description="Join the waitlist if the session is full"),
     db: Session = Depends(get_db),
     current_gym: Gym = Depends(verify_gym_access),
     user: Auth0User = Security(auth.get_user, scopes=["resource:admin"]),
@@ -90,6 +96,8 @@ async def register_member_for_class(
     Args:
         session_id (int): The ID of the class session.
         member_id (int): The local user ID of the member to register.
+        join_waitlist (bool, optional): If the session is full, join its waitlist instead of failing.
+            Defaults to False.
         db (Session, optional): Database session dependency. Defaults to Depends(get_db).
         current_gym (Gym, optional): Current gym context dependency. Defaults to Depends(verify_gym_access).
         user (Auth0User, optional): Authenticated user dependency. Defaults to Security(auth.get_user, scopes=["resource:admin"]).
@@ -99,7 +107,7 @@ async def register_member_for_class(
         - Requires 'manage:class_registrations' scope (typically for trainers/admins).
 
     Returns:
-        ClassParticipationSchema: The created participation record.
+        ClassParticipationSchema: The created participation record (status WAITLISTED if placed on the waitlist).
 
     Raises:
         HTTPException 400: Bad request (e.g., session full, member already registered, session not scheduled).
@@ -122,7 +130,8 @@ async def register_member_for_class(
 
     # Service layer handles the rest of the registration logic
     return await class_participation_service.register_for_class(
-        db, member_id=member_id, session_id=session_id, gym_id=current_gym.id, redis_client=redis_client
+        db, member_id=member_id, session_id=session_id, gym_id=current_gym.id, redis_client=redis_client,
+        join_waitlist=join_waitlist
     )
 
 
@@ -1069,3 +1078,64 @@ async def get_my_participation_status(
         participations=participations_data,
         total_count=len(participations_data)
     )
+
+
+@router.get("/my-status", response_model=SessionStatusBatchResponse)
+async def get_my_session_statuses(
+    session_ids: str = Query(..., description="Comma-separated list of session IDs (max 200)"),
+    db: Session = Depends(get_db),
+    current_gym: Gym = Depends(verify_gym_access),
+    user: Auth0User = Security(auth.get_user, scopes=["resource:read"]),
+    redis_client: Redis = Depends(get_redis_client)
+):
+    """
+    Get My Status for a Batch of Sessions
+
+    Devuelve el estado de participación del usuario actual en un lote de
+    sesiones con una sola consulta (o un único HMGET si está en caché).
+    Pensado para pantallas de listado que ya tienen los IDs de sesión.
+
+    Args:
+        session_ids (str): IDs de sesión separados por comas (máximo 200)
+        db: Sesión de base de datos
+        current_gym: Contexto del gimnasio actual
+        user: Usuario autenticado
+        redis_client: Cliente Redis
+
+    Returns:
+        SessionStatusBatchResponse: Mapa session_id -> estado (null si no participa)
+
+    Raises:
+        HTTPException 404: Usuario no encontrado
+        HTTPException 422: Lista de IDs inválida o demasiado larga
+    """
+    try:
+        session_ids_list = [int(sid.strip()) for sid in session_ids.split(',') if sid.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="session_ids debe contener números separados por comas"
+        )
+    if len(session_ids_list) > 200:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="No se pueden consultar más de 200 sesiones a la vez"
+        )
+
+    current_user_db = await user_service.get_user_by_auth0_id_cached(
+        db=db, auth0_id=user.id, redis_client=redis_client
+    )
+    if not current_user_db:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+
+    statuses = await class_participation_service.get_member_statuses(
+        db,
+        member_id=current_user_db.id,
+        gym_id=current_gym.id,
+        session_ids=session_ids_list,
+        redis_client=redis_client
+    )
+    return SessionStatusBatchResponse(statuses=statuses)
@@ -5,9 +5,43 @@ from app.models.gym import Gym
 from app.models.user import UserRole
 from app.models.user_gym import GymRoleType
 from app.services.gym import gym_service
+from app.services.schedule_snapshot import schedule_snapshot_service
+from fastapi import Header, Response
+from fastapi.responses import JSONResponse
+import logging
 from app.schemas.schedule import ClassSessionWithTimezone, format_session_with_timezone, SessionWithClassAndTimezone, format_session_with_class_and_timezone
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+async def _attach_my_status(
+    db: Session, user: Auth0User, gym_id: int, results: List[Any], redis_client: Optional[Redis]
+) -> None:
+    """
+    Añade `my_status` (estado del usuario actual) a cada sesión del listado
+    con una única consulta de estados en lote.
+    """
+    if not results:
+        return
+    try:
+        current_user_db = await user_service.get_user_by_auth0_id_cached(
+            db=db, auth0_id=user.id, redis_client=redis_client
+        )
+        if not current_user_db:
+            return
+        statuses = await class_participation_service.get_member_statuses(
+            db,
+            member_id=current_user_db.id,
+            gym_id=gym_id,
+            session_ids=[item.session.id for item in results],
+            redis_client=redis_client
+        )
+    except Exception as e:
+        logger.warning(f"No se pudo obtener my_status para el listado de sesiones: {e}")
+        return
+    for item in results:
+        item.my_status = statuses.get(item.session.id)
 
 @router.get("/sessions", response_model=List[SessionWithClass])
 async def get_upcoming_sessions(
@@ -79,6 +113,7 @@ async def get_upcoming_sessions(
         class_schema = Class.model_validate(class_obj) if class_obj else None
         results.append(SessionWithClass(session=session_schema, class_info=class_schema))
 
+    await _attach_my_status(db, user, current_gym.id, results, redis_client)
     return results
 
 
@@ -162,6 +197,7 @@ async def get_upcoming_sessions_with_timezone(
             )
             results.append(session_with_class_tz)
 
+    await _attach_my_status(db, user, current_gym.id, results, redis_client)
     return results
 
 
@@ -330,6 +366,12 @@ async def create_recurring_sessions(
     days_of_week: List[int] = Body(
         ..., description="Days of week (0=Mon, 6=Sun)", example=[0, 2, 4]
     ),
+    exclude_dates: Optional[List[date]] = Body(
+        None, description="Dates to skip (recurrence exceptions)"
+    ),
+    skip_special_days: bool = Body(
+        True, description="Skip gym special days when closed or outside their hours"
+    ),
     db: Session = Depends(get_db),
     user: Auth0User = Security(auth.get_user, scopes=["resource:write"]),
     current_gym: Gym = Depends(verify_gym_access),
@@ -345,6 +387,9 @@ async def create_recurring_sessions(
         start_date (date): First date to potentially create a session.
         end_date (date): Last date to potentially create a session.
         days_of_week (List[int]): List of integers representing days (0=Monday, 6=Sunday) for recurrence.
+        exclude_dates (List[date], optional): Specific dates to skip. Defaults to None.
+        skip_special_days (bool, optional): Skip dates configured as gym special days when the gym
+            is closed or the session falls outside their hours. Defaults to True.
         db (Session, optional): Database session dependency. Defaults to Depends(get_db).
         user (Auth0User, optional): Authenticated user dependency. Defaults to Security(auth.get_user, scopes=["resource:write"]).
         current_gym (Gym, optional): Current gym context dependency. Defaults to Depends(verify_gym_access).
@@ -364,7 +409,9 @@ async def create_recurring_sessions(
           },
           "start_date": "YYYY-MM-DD",
           "end_date": "YYYY-MM-DD",
-          "days_of_week": [integer] /* 0-6 */
+          "days_of_week": [integer] /* 0-6 */,
+          "exclude_dates": ["YYYY-MM-DD"] /* optional */,
+          "skip_special_days": boolean /* optional, default true */
         }
 
     Returns:
@@ -407,7 +454,9 @@ async def create_recurring_sessions(
         days_of_week=days_of_week,
         created_by_id=created_by_id,
         gym_id=current_gym.id,
-        redis_client=redis_client
+        redis_client=redis_client,
+        exclude_dates=exclude_dates,
+        skip_special_days=skip_special_days
     )
 
     # Logging después de crear las sesiones
@@ -607,6 +656,7 @@ async def get_sessions_by_date_range(
         class_schema = Class.model_validate(class_obj) if class_obj else None
         results.append(SessionWithClass(session=session_schema, class_info=class_schema))
 
+    await _attach_my_status(db, user, current_gym.id, results, redis_client)
     return results
 
 
@@ -696,9 +746,60 @@ async def get_sessions_by_date_range_with_timezone(
             )
             results.append(session_with_class_tz)
 
+    await _attach_my_status(db, user, current_gym.id, results, redis_client)
     return results
 
 
+@router.get("/day-snapshot/{day}", response_model=Dict[str, Any])
+async def get_day_snapshot(
+    day: date = Path(..., description="Day in the gym's local calendar (YYYY-MM-DD)"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    db: Session = Depends(get_db),
+    current_gym: Gym = Depends(verify_gym_access),
+    user: Auth0User = Security(auth.get_user, scopes=["resource:read"]),
+    redis_client: Redis = Depends(get_redis_client)
+) -> Any:
+    """
+    Get Daily Schedule Snapshot
+
+    Devuelve en una sola respuesta el horario del gimnasio para un día: horario
+    de apertura efectivo, sesiones con los datos de su clase y plazas
+    disponibles. La respuesta incluye un `ETag`; si el cliente envía
+    `If-None-Match` con el ETag vigente se responde `304 Not Modified` sin
+    cuerpo.
+
+    Args:
+        day (date): Día local del gimnasio (YYYY-MM-DD)
+        if_none_match (str, optional): ETag de la última respuesta recibida
+        db: Sesión de base de datos
+        current_gym: Contexto del gimnasio actual
+        user: Usuario autenticado
+        redis_client: Cliente Redis
+
+    Timezone
+    - `start`/`end` de cada sesión están en UTC (ISO 8601); `hours` está en hora local del gimnasio.
+
+    Returns:
+        Dict: {gym_id, date, hours, sessions}
+
+    Raises:
+        HTTPException 401: Invalid or missing token.
+        HTTPException 403: Token lacks required scope or user doesn't belong to the gym.
+    """
+    if if_none_match and redis_client:
+        current_etag = await schedule_snapshot_service.get_etag(redis_client, current_gym.id, day)
+        if current_etag and current_etag == if_none_match:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": current_etag})
+
+    snapshot, etag = await schedule_snapshot_service.get_day(
+        db, redis_client, current_gym.id, current_gym.timezone, day
+    )
+    return JSONResponse(
+        content=snapshot,
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
+
+
 @router.get("/trainer/{trainer_id}", response_model=List[ClassSession])
 async def get_trainer_sessions(
     trainer_id: int = Path(..., description="ID of the trainer"),
@@ -927,4 +1028,8 @@ async def delete_session(
         deleted_session = class_session_repository.remove(db, id=session_id)
         # Invalidate cache after deletion (consider adding to service layer)
         await class_session_service._invalidate_session_caches(redis_client, gym_id=current_gym.id, session_id=session_id)
+        await schedule_snapshot_service.remove_session(
+            redis_client, current_gym.id, session_id,
+            schedule_snapshot_service.local_day(deleted_session.start_time, current_gym.timezone)
+        )
         return deleted_session 
@@ -5,11 +5,13 @@ Endpoints de API para el sistema de historias.
 from typing import List, Optional
 from fastapi import APIRouter, Depends, File, UploadFile, Form, HTTPException, status, Query
 from sqlalchemy.orm import Session
+from redis.asyncio import Redis
 
 from app.core.dependencies import (
     module_enabled
 )
 from app.db.session import get_db
+from app.db.redis_client import get_redis_client
 from app.core.tenant import get_tenant_id
 from app.core.auth0_fastapi import get_current_user, get_current_db_user, Auth0User
 from app.models.user import User
@@ -27,7 +29,8 @@ from app.schemas.story import (
     StoryHighlightCreate,
     StoryHighlightUpdate,
     StoryFeedResponse,
-    StoryViewerResponse
+    StoryViewerResponse,
+    StoryStats
 )
 
 router = APIRouter(
@@ -134,6 +137,7 @@ async def get_stories_feed(
     filter_type: Optional[str] = Query(None, regex="^(all|following|close_friends)$"),
     story_types: Optional[List[str]] = Query(None),
     db: Session = Depends(get_db),
+    redis_client: Redis = Depends(get_redis_client),
     gym_id: int = Depends(get_tenant_id),
     db_user: User = Depends(get_current_db_user)  # Usar db_user en vez de current_user
 ):
@@ -145,7 +149,7 @@ async def get_stories_feed(
     - **filter_type**: Filtrar por tipo (all, following, close_friends)
     - **story_types**: Filtrar por tipos de historia específicos
     """
-    service = StoryService(db)
+    service = StoryService(db, redis_client)
     feed = await service.get_stories_feed(
         gym_id=gym_id,
         user_id=db_user.id,  # ID numérico de BD
@@ -162,6 +166,7 @@ async def get_user_stories(
     user_id: int,
     include_expired: bool = Query(False),
     db: Session = Depends(get_db),
+    redis_client: Redis = Depends(get_redis_client),
     gym_id: int = Depends(get_tenant_id),
     db_user: User = Depends(get_current_db_user)  # Usar db_user
 ):
@@ -175,7 +180,7 @@ async def get_user_stories(
     if include_expired and user_id != db_user.id:
         include_expired = False
 
-    service = StoryService(db)
+    service = StoryService(db, redis_client)
     stories = await service.get_user_stories(
         target_user_id=user_id,
         gym_id=gym_id,
@@ -214,13 +219,14 @@ async def get_user_stories(
 async def get_story(
     story_id: int,
     db: Session = Depends(get_db),
+    redis_client: Redis = Depends(get_redis_client),
     gym_id: int = Depends(get_tenant_id),
     db_user: User = Depends(get_current_db_user)
 ):
     """
     Obtener una historia específica por ID.
     """
-    service = StoryService(db)
+    service = StoryService(db, redis_client)
     story = await service.get_story_by_id(
         story_id=story_id,
         gym_id=gym_id,
@@ -249,13 +255,14 @@ async def mark_story_viewed(
     story_id: int,
     view_data: Optional[StoryViewCreate] = None,
     db: Session = Depends(get_db),
+    redis_client: Redis = Depends(get_redis_client),
     gym_id: int = Depends(get_tenant_id),
     db_user: User = Depends(get_current_db_user)
 ):
     """
     Marcar una historia como vista.
     """
-    service = StoryService(db)
+    service = StoryService(db, redis_client)
     await service.mark_story_as_viewed(
         story_id=story_id,
         gym_id=gym_id,
@@ -307,6 +314,28 @@ async def get_story_viewers(
     return viewers
 
 
+@router.get("/{story_id}/stats", response_model=StoryStats)
+async def get_story_stats(
+    story_id: int,
+    db: Session = Depends(get_db),
+    redis_client: Redis = Depends(get_redis_client),
+    gym_id: int = Depends(get_tenant_id),
+    db_user: User = Depends(get_current_db_user)
+):
+    """
+    Obtener estadísticas de una historia con el número de vistas en tiempo real.
+    Solo el dueño de la historia puede ver esta información.
+    """
+    service = StoryService(db, redis_client)
+    stats = await service.get_story_analytics(
+        story_id=story_id,
+        gym_id=gym_id,
+        user_id=db_user.id
+    )
+
+    return StoryStats(**stats)
+
+
 @router.post("/{story_id}/reaction", response_model=StoryReactionResponse)
 async def add_story_reaction(
     story_id: int,
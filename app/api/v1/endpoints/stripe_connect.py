@@ -18,6 +18,7 @@ from app.core.auth0_fastapi import Auth0User, auth
 from app.core.tenant import verify_gym_admin_access
 from app.schemas.gym import GymSchema
 from app.services.stripe_connect_service import stripe_connect_service
+from app.services.stripe_resolution_cache import stripe_resolution_cache
 from app.middleware.rate_limit import limiter
 import logging
 
@@ -378,6 +379,7 @@ async def get_connection_status(
             gym_account.charges_enabled = False
             gym_account.payouts_enabled = False
             db.commit()
+            await stripe_resolution_cache.invalidate_gym_account(current_gym.id)
 
             logger.warning(
                 f"Cuenta {gym_account.stripe_account_id} desautorizada detectada en verificación. "
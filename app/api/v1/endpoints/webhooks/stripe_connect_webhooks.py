@@ -7,6 +7,9 @@ especialmente crítico para Standard accounts que pueden desconectarse.
 Eventos manejados:
 - account.application.deauthorized: Cuando un gimnasio desconecta su cuenta
 - account.updated: Cuando se actualiza información de la cuenta
+
+Ambos invalidan la caché de resolución de Stripe del gym, que usa el
+checkout de eventos para no consultar la cuenta en cada pago.
 """
 
 from fastapi import APIRouter, Request, HTTPException, Depends
@@ -14,6 +17,7 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 from app.db.session import get_db
 from app.services.stripe_connect_service import stripe_connect_service
+from app.services.stripe_resolution_cache import stripe_resolution_cache
 from app.core.config import get_settings
 from app.middleware.rate_limit import limiter
 from app.models.stripe_profile import GymStripeAccount
@@ -129,6 +133,7 @@ async def _handle_account_deauthorized(db: Session, event: dict):
         gym_account.updated_at = datetime.utcnow()
 
         db.commit()
+        await stripe_resolution_cache.invalidate_gym_account(gym_account.gym_id)
 
         logger.warning(
             f"🚨 CUENTA DESCONECTADA - Gimnasio {gym_account.gym_id} desconectó su cuenta de Stripe. "
@@ -178,6 +183,7 @@ async def _handle_account_updated(db: Session, event: dict):
             logger.warning(
                 f"ℹ️  Cuenta actualizada pero no encontrada en BD (o inactiva): {account_id}"
             )
+            await stripe_resolution_cache.invalidate_stripe_account(db, account_id)
             return
 
         # Actualizar estado desde Stripe
@@ -197,6 +203,7 @@ async def _handle_account_updated(db: Session, event: dict):
             changes.append(f"payouts_enabled: {old_payouts} → {gym_account.payouts_enabled}")
 
         db.commit()
+        await stripe_resolution_cache.invalidate_gym_account(gym_account.gym_id)
 
         if changes:
             logger.info(
@@ -51,13 +51,23 @@ def setup_activity_feed_jobs(scheduler: AsyncIOScheduler):
         max_instances=1
     )
 
-    # Job 3: Actualizar rankings diarios a las 23:50
+    # Job 3: Reconciliar rankings diarios (se mantienen en tiempo real con ZINCRBY)
     scheduler.add_job(
-        update_daily_rankings,
+        reconcile_daily_rankings,
+        'cron',
+        minute=30,  # A mitad de cada hora
+        id='activity_feed_daily_rankings',
+        replace_existing=True,
+        max_instances=1
+    )
+
+    # Job 3b: Publicar el top 3 del día a las 23:50
+    scheduler.add_job(
+        publish_daily_ranking_highlights,
         'cron',
         hour=23,
         minute=50,
-        id='activity_feed_daily_rankings',
+        id='activity_feed_daily_ranking_highlights',
         replace_existing=True,
         max_instances=1
     )
@@ -244,13 +254,14 @@ async def generate_hourly_summary():
             db.close()
 
 
-async def update_daily_rankings():
+async def reconcile_daily_rankings():
     """
-    Actualiza rankings diarios con nombres de usuarios.
+    Reconcilia los rankings diarios con la BD.
 
-    Calcula y actualiza los top performers del día mostrando nombres.
+    Los rankings se actualizan en tiempo real en cada check-in; este job solo
+    corrige diferencias (eventos perdidos, asistencias anuladas).
     """
-    logger.info("Actualizando rankings diarios...")
+    logger.info("Reconciliando rankings diarios...")
 
     db = None
     try:
@@ -258,68 +269,63 @@ async def update_daily_rankings():
         feed_service = ActivityFeedService(redis)
 
         db = next(get_db())
-        gyms = db.query(Gym).filter(Gym.is_active == True).all()
+        aggregator = ActivityAggregator(feed_service, db)
+        gyms = db.query(Gym.id).filter(Gym.is_active == True).all()
 
-        for gym in gyms:
-            # Obtener valores de asistencia del día con nombres
-            today_start = datetime.utcnow().replace(hour=0, minute=0, second=0)
-
-            # Query para obtener conteos de asistencia con nombres de usuario
-            from app.models.user import User
-            attendance_data = db.query(
-                User.id.label('user_id'),
-                User.first_name,
-                User.last_name,
-                func.count(ClassParticipation.id).label('attendance_count')
-            ).join(
-                ClassParticipation, ClassParticipation.member_id == User.id
-            ).join(
-                ClassSession, ClassSession.id == ClassParticipation.session_id
-            ).filter(
-                and_(
-                    ClassSession.gym_id == gym.id,
-                    ClassSession.start_time >= today_start,
-                    ClassParticipation.status == ClassParticipationStatus.ATTENDED
-                )
-            ).group_by(User.id, User.first_name, User.last_name).order_by(
-                func.count(ClassParticipation.id).desc()
-            ).limit(20).all()
+        for (gym_id,) in gyms:
+            try:
+                await aggregator.reconcile_daily_rankings(gym_id)
+            except Exception as e:
+                logger.error(f"Error reconciliando rankings del gym {gym_id}: {e}")
 
-            if attendance_data:
-                # Guardar ranking con nombres y user_id para foto de perfil
-                await feed_service.add_named_ranking(
-                    gym_id=gym.id,
-                    ranking_type="attendance",
-                    entries=[
-                        {
-                            "user_id": row.user_id,
-                            "name": f"{row.first_name} {row.last_name[0]}." if row.last_name else row.first_name,
-                            "value": row.attendance_count
-                        }
-                        for row in attendance_data
-                    ],
-                    period="daily"
-                )
+        logger.info("Rankings diarios reconciliados")
 
-                # Publicar si hay suficiente actividad
-                if len(attendance_data) >= 3:
-                    top_3_names = [f"{row.first_name}" for row in attendance_data[:3]]
-                    await feed_service.publish_realtime_activity(
-                        gym_id=gym.id,
-                        activity_type="motivational",
-                        count=len(attendance_data),
-                        metadata={
-                            "message": f"🥇 Top 3 del día: {', '.join(top_3_names)}",
-                            "type": "ranking_update"
-                        }
-                    )
+    except Exception as e:
+        logger.error(f"Error reconciliando rankings: {e}")
+    finally:
+        if db:
+            db.close()
 
-            logger.debug(f"Rankings actualizados para gym {gym.id}")
 
-        logger.info("Rankings diarios actualizados")
+async def publish_daily_ranking_highlights():
+    """
+    Publica el top 3 del día a partir del ranking de asistencia en tiempo real.
+    """
+    logger.info("Publicando top 3 de rankings diarios...")
+
+    db = None
+    try:
+        redis = await get_redis_client()
+        feed_service = ActivityFeedService(redis)
+
+        db = next(get_db())
+        gyms = db.query(Gym.id).filter(Gym.is_active == True).all()
+
+        for (gym_id,) in gyms:
+            ranking = await feed_service.get_anonymous_rankings(
+                gym_id=gym_id,
+                ranking_type="attendance",
+                period="daily",
+                limit=3
+            )
+
+            # Publicar si hay suficiente actividad
+            if len(ranking) >= 3:
+                top_3_names = [entry["label"].split(" ")[0] for entry in ranking]
+                await feed_service.publish_realtime_activity(
+                    gym_id=gym_id,
+                    activity_type="motivational",
+                    count=await redis.zcard(f"gym:{gym_id}:rankings:daily:attendance"),
+                    metadata={
+                        "message": f"🥇 Top 3 del día: {', '.join(top_3_names)}",
+                        "type": "ranking_update"
+                    }
+                )
+
+        logger.info("Top 3 diarios publicados")
 
     except Exception as e:
-        logger.error(f"Error actualizando rankings: {e}")
+        logger.error(f"Error publicando top 3 diario: {e}")
     finally:
         if db:
             db.close()
@@ -344,8 +350,9 @@ async def reset_daily_counters():
             # Decodificar key si es bytes
             key_str = key.decode('utf-8') if isinstance(key, bytes) else key
 
-            # No eliminar rankings, tienen su propio TTL
-            if "ranking" not in key_str:
+            # Los rankings no diarios tienen su propio TTL; los diarios se
+            # acumulan con ZINCRBY y empiezan de cero cada día
+            if "ranking" not in key_str or ":rankings:daily:" in key_str:
                 await redis.delete(key)
                 deleted_count += 1
 
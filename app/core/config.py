@@ -23,6 +23,9 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     # 60 minutos * 24 horas * 8 días = 8 días
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
+    # Tokens QR de check-in firmados con HMAC (si no se define el secreto se usa SECRET_KEY)
+    QR_CHECKIN_SECRET: Optional[str] = os.getenv("QR_CHECKIN_SECRET", None)
+    QR_CHECKIN_TOKEN_TTL_SECONDS: int = int(os.getenv("QR_CHECKIN_TOKEN_TTL_SECONDS", "120"))
 
     # URLs de la aplicación
     BASE_URL: str = os.getenv("BASE_URL", "https://gymapi-eh6m.onrender.com")
@@ -155,6 +158,10 @@ class Settings(BaseSettings):
     STREAM_WEBHOOK_SECRET: str = os.getenv("STREAM_WEBHOOK_SECRET", "")
     STREAM_APP_ID: str = os.getenv("STREAM_APP_ID", "")
     STREAM_LOCATION: str = os.getenv("STREAM_LOCATION", "us-east")
+    # Cliente asíncrono de Activity Feeds (pool httpx + batching)
+    STREAM_FEEDS_TIMEOUT_SECONDS: float = float(os.getenv("STREAM_FEEDS_TIMEOUT_SECONDS", "3.0"))
+    STREAM_FEEDS_MAX_CONNECTIONS: int = int(os.getenv("STREAM_FEEDS_MAX_CONNECTIONS", "20"))
+    STREAM_FEEDS_BATCH_WINDOW_MS: int = int(os.getenv("STREAM_FEEDS_BATCH_WINDOW_MS", "20"))
 
     # Configuración de OneSignal para notificaciones push
     ONESIGNAL_APP_ID: Optional[str] = None
@@ -301,6 +308,7 @@ class Settings(BaseSettings):
     CACHE_TTL_NEGATIVE: int = 60 # 1 minuto
     CACHE_TTL_GYM_DETAILS: int = 3600 # 1 hora para detalles del gym
     CACHE_TTL_USER_PROFILE: int = 300 # <<< NUEVO: 5 minutos para perfil de usuario >>>
+    CACHE_TTL_MEMBERSHIP_SUMMARY: int = 600 # 10 minutos; el barrido de membresías lo invalida
     
     # AWS Configuration
     AWS_ACCESS_KEY_ID: Optional[str] = None
@@ -323,6 +331,25 @@ class Settings(BaseSettings):
     STRIPE_SUCCESS_URL: str = "http://localhost:8080/membership/success"
     STRIPE_CANCEL_URL: str = "http://localhost:8080/membership/cancel"
 
+    # Gateway de Stripe: hilos dedicados (cada uno con su sesión keep-alive) y timeout por petición
+    STRIPE_GATEWAY_MAX_WORKERS: int = int(os.getenv("STRIPE_GATEWAY_MAX_WORKERS", "16"))
+    STRIPE_TIMEOUT_SECONDS: int = int(os.getenv("STRIPE_TIMEOUT_SECONDS", "20"))
+    # Planes sincronizados en paralelo por sync_all_plans_with_stripe
+    STRIPE_PLAN_SYNC_CONCURRENCY: int = int(os.getenv("STRIPE_PLAN_SYNC_CONCURRENCY", "4"))
+
+    # Reembolsos masivos al cancelar eventos de pago
+    EVENT_REFUND_CONCURRENCY: int = int(os.getenv("EVENT_REFUND_CONCURRENCY", "8"))
+    EVENT_REFUND_MAX_RETRIES: int = int(os.getenv("EVENT_REFUND_MAX_RETRIES", "5"))
+
+    # Procesamiento diferido de webhooks de Stripe (inbox)
+    STRIPE_WEBHOOK_MAX_ATTEMPTS: int = int(os.getenv("STRIPE_WEBHOOK_MAX_ATTEMPTS", "8"))
+
+    # Ciclo de vida de membresías: días de acceso tras vencer un pago, días en mora
+    # antes de expirar y ventana de "próximas a vencer" del resumen del gym
+    MEMBERSHIP_GRACE_PERIOD_DAYS: int = int(os.getenv("MEMBERSHIP_GRACE_PERIOD_DAYS", "3"))
+    MEMBERSHIP_OVERDUE_DAYS: int = int(os.getenv("MEMBERSHIP_OVERDUE_DAYS", "30"))
+    MEMBERSHIP_EXPIRING_WINDOW_DAYS: int = int(os.getenv("MEMBERSHIP_EXPIRING_WINDOW_DAYS", "7"))
+
 # Usar una función con caché para obtener la configuración
 @lru_cache()
 def get_settings() -> Settings:
@@ -5,6 +5,7 @@ from .base import (
     track_request,
     track_db_query,
     track_redis_operation,
+    track_stripe_request,
     track_business_event
 )
 from .collectors import (
@@ -24,6 +25,7 @@ __all__ = [
     "track_request",
     "track_db_query",
     "track_redis_operation",
+    "track_stripe_request",
     "track_business_event",
     # Collectors
     "GymAPICollector",
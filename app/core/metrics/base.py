@@ -124,6 +124,49 @@ redis_connection_errors_total = Counter(
     registry=metrics_registry
 )
 
+# ============================================================================
+# MÉTRICAS DE ACTIVITY FEED EN TIEMPO REAL
+# ============================================================================
+
+activity_feed_stream_connections = Gauge(
+    'gymapi_activity_feed_stream_connections',
+    'Clients connected to the real-time activity feed',
+    ['transport'],  # sse, websocket
+    registry=metrics_registry
+)
+
+activity_feed_stream_messages_total = Counter(
+    'gymapi_activity_feed_stream_messages_total',
+    'Real-time activity feed messages fanned out to clients',
+    ['status'],  # delivered, dropped
+    registry=metrics_registry
+)
+
+activity_feed_stream_slow_disconnects_total = Counter(
+    'gymapi_activity_feed_stream_slow_disconnects_total',
+    'Clients disconnected for not keeping up with the real-time feed',
+    registry=metrics_registry
+)
+
+# ============================================================================
+# MÉTRICAS DE STRIPE
+# ============================================================================
+
+stripe_requests_total = Counter(
+    'gymapi_stripe_requests_total',
+    'Total Stripe API calls',
+    ['operation', 'status'],  # Customer.create..., success/<tipo de error>
+    registry=metrics_registry
+)
+
+stripe_request_duration_seconds = Histogram(
+    'gymapi_stripe_request_duration_seconds',
+    'Stripe API call duration in seconds',
+    ['operation'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+    registry=metrics_registry
+)
+
 # ============================================================================
 # MÉTRICAS DE NEGOCIO
 # ============================================================================
@@ -257,6 +300,14 @@ def track_redis_operation(operation: str, success: bool, duration: float,
     except Exception as e:
         logger.error(f"Error tracking Redis operation metrics: {e}")
 
+def track_stripe_request(operation: str, status: str, duration: float):
+    """Trackear una llamada a la API de Stripe."""
+    try:
+        stripe_requests_total.labels(operation=operation, status=status).inc()
+        stripe_request_duration_seconds.labels(operation=operation).observe(duration)
+    except Exception as e:
+        logger.error(f"Error tracking Stripe request metrics: {e}")
+
 def track_business_event(event_type: str, gym_id: int, status: str = "success"):
     """Trackear un evento de negocio."""
     try:
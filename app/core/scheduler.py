@@ -1,9 +1,11 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import OperationalError, DBAPIError
 from datetime import datetime, timedelta, timezone
 from functools import wraps
+import asyncio
 import logging
 import time
 
@@ -275,73 +277,36 @@ def mark_completed_sessions():
     Marca como completadas las sesiones cuya hora de finalización ya pasó.
     También actualiza sesiones a IN_PROGRESS cuando están dentro del horario.
 
-    Esta función maneja tanto datos UTC como datos naive (hora local) para
-    compatibilidad durante la migración.
+    Las transiciones se hacen con dos UPDATE ... RETURNING sobre el índice
+    parcial de sesiones activas, sin cargar sesiones en memoria.
+
+    Returns:
+        Sesiones actualizadas agrupadas por gym_id
     """
     logger.info("Running scheduled task: mark_completed_sessions")
     db = SessionLocal()
     try:
-        from sqlalchemy import and_, or_
         from sqlalchemy.exc import SQLAlchemyError
 
         current_utc = datetime.now(timezone.utc)
 
-        # Query optimizada: Una sola consulta para obtener todas las sesiones activas
-        sessions_to_update = db.query(ClassSession).filter(
-            ClassSession.status.in_([
-                ClassSessionStatus.SCHEDULED,
-                ClassSessionStatus.IN_PROGRESS
-            ])
-        ).all()
+        # Primero las terminadas (SCHEDULED o IN_PROGRESS -> COMPLETED) y luego
+        # las que están en curso (SCHEDULED -> IN_PROGRESS); son conjuntos disjuntos
+        completed = class_session_repository.mark_finished_as_completed(db, now=current_utc)
+        in_progress = class_session_repository.mark_started_as_in_progress(db, now=current_utc)
 
-        progress_count = 0
-        completion_count = 0
+        if not completed and not in_progress:
+            db.rollback()
+            logger.debug("No sessions needed status updates")
+            return {}
 
-        for session in sessions_to_update:
-            try:
-                # Manejar tanto datos UTC como naive para compatibilidad
-                session_start = session.start_time
-                session_end = session.end_time
-
-                # Si los tiempos son naive (sin timezone), asumimos que son UTC
-                if session_start.tzinfo is None:
-                    session_start = session_start.replace(tzinfo=timezone.utc)
-                if session_end.tzinfo is None:
-                    session_end = session_end.replace(tzinfo=timezone.utc)
-
-                # Ahora podemos comparar de manera segura
-                if session.status == ClassSessionStatus.SCHEDULED:
-                    if session_start <= current_utc < session_end:
-                        # Sesión debe estar IN_PROGRESS
-                        session.status = ClassSessionStatus.IN_PROGRESS
-                        db.add(session)
-                        progress_count += 1
-                        logger.debug(f"Session {session.id} marked as IN_PROGRESS")
-                    elif session_end <= current_utc:
-                        # Sesión ya terminó, directamente a COMPLETED
-                        session.status = ClassSessionStatus.COMPLETED
-                        db.add(session)
-                        completion_count += 1
-                        logger.info(f"Session {session.id} marked as COMPLETED")
-
-                elif session.status == ClassSessionStatus.IN_PROGRESS:
-                    if session_end <= current_utc:
-                        # Sesión IN_PROGRESS que ya terminó
-                        session.status = ClassSessionStatus.COMPLETED
-                        db.add(session)
-                        completion_count += 1
-                        logger.info(f"Session {session.id} marked as COMPLETED")
-
-            except Exception as session_error:
-                logger.error(f"Error processing session {session.id}: {session_error}")
-                continue
+        db.commit()
+        logger.info(f"Session status updates: {len(in_progress)} to IN_PROGRESS, {len(completed)} to COMPLETED")
 
-        # Confirmar cambios si hay actualizaciones
-        if progress_count > 0 or completion_count > 0:
-            db.commit()
-            logger.info(f"Session status updates: {progress_count} to IN_PROGRESS, {completion_count} to COMPLETED")
-        else:
-            logger.debug("No sessions needed status updates")
+        sessions_by_gym = {}
+        for row in completed + in_progress:
+            sessions_by_gym.setdefault(row.gym_id, []).append(row)
+        return sessions_by_gym
 
     except SQLAlchemyError as e:
         logger.error(f"SQLAlchemy error in mark_completed_sessions task: {str(e)}", exc_info=True)
@@ -351,6 +316,64 @@ def mark_completed_sessions():
         db.rollback()
     finally:
         db.close()
+    return {}
+
+
+async def update_session_statuses():
+    """
+    Job programado: actualiza estados de sesiones e invalida solo las cachés
+    de los gimnasios y sesiones afectados.
+    """
+    sessions_by_gym = await asyncio.to_thread(mark_completed_sessions)
+    if not sessions_by_gym:
+        return
+
+    try:
+        redis_client = await get_redis_client()
+    except Exception as e:
+        logger.error(f"Redis unavailable after session status updates: {str(e)}", exc_info=True)
+        return
+
+    from app.services.schedule import class_session_service
+    for gym_id, sessions in sessions_by_gym.items():
+        try:
+            await class_session_service.invalidate_session_status_caches(redis_client, gym_id, sessions)
+        except Exception as e:
+            # Las sesiones ya están en COMPLETED: seguir y publicarlas igualmente
+            logger.error(f"Error invalidating caches for gym {gym_id} after session status updates: {str(e)}",
+                         exc_info=True)
+
+    # Clases completadas al Activity Feed (contadores y ranking de actividad)
+    session_ids = [row.id for rows in sessions_by_gym.values() for row in rows]
+    activity = await asyncio.to_thread(load_completed_class_activity, session_ids)
+    if not activity:
+        return
+
+    try:
+        from app.services.activity_feed_service import ActivityFeedService
+        from app.services.activity_aggregator import ActivityAggregator
+
+        aggregator = ActivityAggregator(ActivityFeedService(redis_client))
+        for event in activity:
+            await aggregator.on_class_completed(event)
+    except Exception as e:
+        logger.error(f"Error publishing completed classes to the Activity Feed: {str(e)}", exc_info=True)
+
+
+def load_completed_class_activity(session_ids):
+    """
+    Carga clase, duración y asistentes de las sesiones recién completadas
+    (las que pasaron a IN_PROGRESS se descartan por estado).
+    """
+    db = SessionLocal()
+    try:
+        return class_session_repository.get_completed_class_activity(db, session_ids=session_ids)
+    except Exception as e:
+        logger.error(f"Error loading completed class activity: {str(e)}", exc_info=True)
+        return []
+    finally:
+        db.close()
+
 
 def init_scheduler():
     """
@@ -389,7 +412,7 @@ def init_scheduler():
     # Marcar sesiones como completadas cada 15 minutos
     # Ejecuta más frecuentemente que eventos para mejor UX
     _scheduler.add_job(
-        mark_completed_sessions,
+        update_session_statuses,
         trigger=CronTrigger(minute='*/15'),  # Cada 15 minutos
         id='session_completion',
         replace_existing=True
@@ -541,7 +564,8 @@ def init_scheduler():
         from app.core.activity_feed_jobs import (
             update_realtime_counters,
             generate_hourly_summary,
-            update_daily_rankings,
+            reconcile_daily_rankings,
+            publish_daily_ranking_highlights,
             reset_daily_counters,
             generate_motivational_burst,
             cleanup_expired_data
@@ -563,11 +587,21 @@ def init_scheduler():
             replace_existing=True
         )
 
-        # Rankings diarios a las 23:50
+        # Reconciliar rankings diarios con la BD cada hora (se actualizan en
+        # tiempo real con cada check-in)
         _scheduler.add_job(
-            update_daily_rankings,
-            trigger=CronTrigger(hour=23, minute=50),
+            reconcile_daily_rankings,
+            trigger=CronTrigger(minute=30),
             id='activity_feed_rankings',
+            replace_existing=True,
+            max_instances=1
+        )
+
+        # Top 3 del día a las 23:50
+        _scheduler.add_job(
+            publish_daily_ranking_highlights,
+            trigger=CronTrigger(hour=23, minute=50),
+            id='activity_feed_ranking_highlights',
             replace_existing=True
         )
 
@@ -600,6 +634,97 @@ def init_scheduler():
     except ImportError as e:
         logger.warning(f"Could not import Activity Feed jobs: {e}")
 
+    # ============================================================================
+    # JOBS DE HISTORIAS
+    # ============================================================================
+    try:
+        from app.services.story_view_ingestion import flush_story_views_job
+
+        # Persistir en lote las vistas de historias encoladas en Redis
+        _scheduler.add_job(
+            flush_story_views_job,
+            trigger=IntervalTrigger(seconds=15),
+            id='story_views_flush',
+            replace_existing=True,
+            max_instances=1
+        )
+
+        logger.info("Story view ingestion job added to scheduler")
+
+    except ImportError as e:
+        logger.warning(f"Could not import story view ingestion job: {e}")
+
+    # ============================================================================
+    # JOBS DE PAGOS Y REEMBOLSOS DE EVENTOS
+    # ============================================================================
+    try:
+        from app.services.event_refund_jobs import resume_event_refund_jobs
+        from app.services.event_payment_service import expire_pending_payments_job
+
+        # Expirar pagos pendientes vencidos y ofrecer las plazas a la lista de espera
+        _scheduler.add_job(
+            expire_pending_payments_job,
+            trigger=IntervalTrigger(minutes=10),
+            id='event_pending_payments_expiry',
+            replace_existing=True,
+            max_instances=1
+        )
+
+        # Reanudar trabajos de reembolsos no iniciados o abandonados por un worker caído
+        _scheduler.add_job(
+            resume_event_refund_jobs,
+            trigger=IntervalTrigger(minutes=5),
+            id='event_refund_jobs_resume',
+            replace_existing=True,
+            max_instances=1
+        )
+
+        logger.info("Event payment expiry and refund jobs added to scheduler")
+
+    except ImportError as e:
+        logger.warning(f"Could not import event payment jobs: {e}")
+
+    # ============================================================================
+    # INBOX DE WEBHOOKS DE STRIPE
+    # ============================================================================
+    try:
+        from app.services.stripe_webhook_inbox import process_stripe_webhook_inbox
+
+        # Respaldo de la tarea en segundo plano del webhook: reintentos vencidos
+        # y eventos que quedaron sin procesar (reinicios, workers caídos)
+        _scheduler.add_job(
+            process_stripe_webhook_inbox,
+            trigger=IntervalTrigger(minutes=1),
+            id='stripe_webhook_inbox',
+            replace_existing=True,
+            max_instances=1
+        )
+
+        logger.info("Stripe webhook inbox job added to scheduler")
+
+    except ImportError as e:
+        logger.warning(f"Could not import Stripe webhook inbox job: {e}")
+
+    # ============================================================================
+    # CICLO DE VIDA DE MEMBRESÍAS
+    # ============================================================================
+    try:
+        from app.services.membership_lifecycle import sweep_memberships_job
+
+        # Gracia, mora y expiración de membresías vencidas
+        _scheduler.add_job(
+            sweep_memberships_job,
+            trigger=CronTrigger(minute=20),  # Cada hora a los 20 minutos
+            id='membership_lifecycle_sweep',
+            replace_existing=True,
+            max_instances=1
+        )
+
+        logger.info("Membership lifecycle sweep job added to scheduler")
+
+    except ImportError as e:
+        logger.warning(f"Could not import membership lifecycle job: {e}")
+
     return _scheduler
 
 
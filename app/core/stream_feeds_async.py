@@ -0,0 +1,396 @@
+"""
+Cliente asíncrono de Stream Activity Feeds.
+
+El SDK `stream-python` que usan los repositorios de posts e historias es
+síncrono (requests), por lo que cada llamada bloqueaba el event loop desde
+métodos `async def`. Este adaptador habla directamente con la API REST de
+Stream usando httpx:
+
+- Un único `httpx.AsyncClient` por proceso con conexiones keep-alive en pool.
+- Timeout configurable por llamada.
+- Micro-batching: las llamadas a `add_activity` concurrentes sobre el mismo
+  feed se agrupan en un único POST de `add_activities`, y los `follow`
+  concurrentes en un único `follow_many`.
+
+Reutiliza el `StreamClient` del SDK (sin usarlo para hacer peticiones) para
+construir URLs, firmar los JWT y mapear errores a las mismas excepciones
+(`stream.exceptions`).
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+try:
+    from stream import serializer
+    from stream.client import StreamClient
+except ImportError:
+    serializer = None
+    StreamClient = None
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingBatch:
+    """Operaciones acumuladas durante una ventana de batching."""
+    activities: Dict[str, List[Tuple[Dict[str, Any], asyncio.Future]]] = field(
+        default_factory=lambda: defaultdict(list)
+    )
+    follows: List[Tuple[Dict[str, str], asyncio.Future]] = field(default_factory=list)
+
+
+class AsyncStreamFeedsClient:
+    """
+    Cliente asíncrono y con batching para Stream Activity Feeds.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        api_secret: str,
+        app_id: Optional[str] = None,
+        location: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout: float = 3.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        batch_window: float = 0.02,
+        max_batch_size: int = 100,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Args:
+            api_key: API key de Stream
+            api_secret: API secret de Stream
+            app_id: App ID de Stream
+            location: Región de la API (us-east, eu-west, ...)
+            base_url: URL base alternativa (tests / servidor local)
+            timeout: Timeout por defecto en segundos
+            max_connections: Conexiones máximas del pool
+            max_keepalive_connections: Conexiones keep-alive mantenidas en el pool
+            batch_window: Segundos que se esperan para agrupar operaciones
+            max_batch_size: Tamaño a partir del cual el lote se envía sin esperar
+            transport: Transporte httpx alternativo (tests)
+        """
+        # Solo se usa para URLs, firmas JWT y mapeo de errores
+        self._sdk = StreamClient(
+            api_key,
+            api_secret,
+            app_id,
+            timeout=timeout,
+            base_url=base_url,
+            location=location,
+        )
+        self.timeout = timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections
+        )
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._pending = _PendingBatch()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+        # Tokens de servidor con permisos sobre todos los feeds
+        self._feed_token = self._sdk.create_jwt_token("feed", "*", feed_id="*")
+        self._follower_token = self._sdk.create_jwt_token("follower", "*", feed_id="*")
+
+    # ------------------------------------------------------------------
+    # Transporte
+    # ------------------------------------------------------------------
+
+    def _get_http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                limits=self._limits,
+                timeout=self.timeout,
+                transport=self._transport,
+                headers=self._sdk.get_default_header()
+            )
+        return self._http
+
+    async def _make_request(
+        self,
+        method: str,
+        relative_url: str,
+        signature: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[Any] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        if not relative_url.endswith("/"):
+            relative_url += "/"
+
+        request_params = self._sdk.get_default_params()
+        request_params.update(params or {})
+        headers = {"Authorization": signature, "stream-auth-type": "jwt"}
+        content = serializer.dumps(data) if method in ("POST", "PUT", "DELETE") and data is not None else None
+
+        response = await self._get_http().request(
+            method,
+            self._sdk.get_full_url("api", relative_url),
+            params=request_params,
+            headers=headers,
+            content=content,
+            timeout=timeout if timeout is not None else self.timeout
+        )
+
+        try:
+            parsed = serializer.loads(response.text)
+        except ValueError:
+            parsed = None
+        if parsed is None or parsed.get("exception") or response.status_code >= 400:
+            self._sdk.raise_exception(parsed, status_code=response.status_code)
+        return parsed
+
+    async def aclose(self) -> None:
+        """Envía las operaciones pendientes y cierra el pool de conexiones."""
+        await self.flush()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    # ------------------------------------------------------------------
+    # Operaciones directas
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _feed_url(feed_slug: str, feed_user_id: str) -> str:
+        return f"feed/{feed_slug}/{feed_user_id}/"
+
+    async def get_feed(
+        self,
+        feed_slug: str,
+        feed_user_id: str,
+        limit: int = 25,
+        offset: int = 0,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Obtiene actividades de un feed (equivalente a `feed.get`)."""
+        return await self._make_request(
+            "GET",
+            self._feed_url(feed_slug, feed_user_id),
+            self._feed_token,
+            params={"limit": limit, "offset": offset},
+            timeout=timeout
+        )
+
+    async def add_activity(
+        self,
+        feed_slug: str,
+        feed_user_id: str,
+        activity: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Añade una actividad inmediatamente, sin batching."""
+        return await self._make_request(
+            "POST",
+            self._feed_url(feed_slug, feed_user_id),
+            self._feed_token,
+            data=activity,
+            timeout=timeout
+        )
+
+    async def remove_activity(
+        self,
+        feed_slug: str,
+        feed_user_id: str,
+        foreign_id: str,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Elimina una actividad por foreign_id."""
+        return await self._make_request(
+            "DELETE",
+            f"{self._feed_url(feed_slug, feed_user_id)}{foreign_id}/",
+            self._feed_token,
+            params={"foreign_id": "1"},
+            timeout=timeout
+        )
+
+    async def unfollow(
+        self,
+        feed_slug: str,
+        feed_user_id: str,
+        target_slug: str,
+        target_user_id: str,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Deja de seguir un feed."""
+        return await self._make_request(
+            "DELETE",
+            f"{self._feed_url(feed_slug, feed_user_id)}follows/{target_slug}:{target_user_id}/",
+            self._follower_token,
+            timeout=timeout
+        )
+
+    async def follow_many(
+        self,
+        follows: List[Dict[str, str]],
+        activity_copy_limit: Optional[int] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Crea varias relaciones de follow en una sola llamada."""
+        params = {"activity_copy_limit": activity_copy_limit} if activity_copy_limit is not None else None
+        return await self._make_request(
+            "POST",
+            "follow_many/",
+            self._follower_token,
+            params=params,
+            data=follows,
+            timeout=timeout
+        )
+
+    # ------------------------------------------------------------------
+    # Operaciones con batching
+    # ------------------------------------------------------------------
+
+    def _schedule_flush(self) -> None:
+        pending_size = len(self._pending.follows) + sum(len(v) for v in self._pending.activities.values())
+        if pending_size >= self.max_batch_size:
+            # Lote lleno: enviarlo ya sin esperar a la ventana
+            task = asyncio.ensure_future(self.flush())
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_after_window())
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.batch_window)
+        await self.flush()
+
+    async def add_activity_batched(
+        self,
+        feed_slug: str,
+        feed_user_id: str,
+        activity: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Añade una actividad agrupándola con otras dirigidas al mismo feed.
+
+        Returns:
+            La actividad creada por Stream
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.activities[f"{feed_slug}:{feed_user_id}"].append((activity, future))
+        self._schedule_flush()
+        return await future
+
+    async def follow_batched(
+        self,
+        source_slug: str,
+        source_user_id: str,
+        target_slug: str,
+        target_user_id: str
+    ) -> Dict[str, Any]:
+        """
+        Sigue un feed agrupando la operación en un `follow_many`.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.follows.append((
+            {"source": f"{source_slug}:{source_user_id}", "target": f"{target_slug}:{target_user_id}"},
+            future
+        ))
+        self._schedule_flush()
+        return await future
+
+    async def flush(self) -> None:
+        """Envía todas las operaciones acumuladas."""
+        pending, self._pending = self._pending, _PendingBatch()
+        requests = [
+            self._send_activities(feed_id, items)
+            for feed_id, items in pending.activities.items()
+        ]
+        if pending.follows:
+            requests.append(self._send_follows(pending.follows))
+        if requests:
+            await asyncio.gather(*requests)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def _send_activities(
+        self,
+        feed_id: str,
+        items: List[Tuple[Dict[str, Any], asyncio.Future]]
+    ) -> None:
+        feed_slug, feed_user_id = feed_id.split(":", 1)
+        try:
+            response = await self._make_request(
+                "POST",
+                self._feed_url(feed_slug, feed_user_id),
+                self._feed_token,
+                data={"activities": [activity for activity, _future in items]}
+            )
+            created = response.get("activities", [])
+            for index, (_activity, future) in enumerate(items):
+                self._resolve(future, created[index] if index < len(created) else {})
+        except Exception as e:
+            for _activity, future in items:
+                self._resolve(future, error=e)
+
+    async def _send_follows(self, items: List[Tuple[Dict[str, str], asyncio.Future]]) -> None:
+        try:
+            response = await self.follow_many([follow for follow, _future in items])
+            for _follow, future in items:
+                self._resolve(future, response)
+        except Exception as e:
+            for _follow, future in items:
+                self._resolve(future, error=e)
+
+
+def _create_client() -> Optional[AsyncStreamFeedsClient]:
+    settings = get_settings()
+    if serializer is None:
+        logger.warning("stream-python package not installed")
+        return None
+    if not settings.STREAM_API_KEY or not settings.STREAM_API_SECRET:
+        logger.warning("Stream Feeds credentials not configured")
+        return None
+    try:
+        return AsyncStreamFeedsClient(
+            api_key=settings.STREAM_API_KEY,
+            api_secret=settings.STREAM_API_SECRET,
+            app_id=settings.STREAM_APP_ID or None,
+            location=settings.STREAM_LOCATION,
+            timeout=settings.STREAM_FEEDS_TIMEOUT_SECONDS,
+            max_connections=settings.STREAM_FEEDS_MAX_CONNECTIONS,
+            batch_window=settings.STREAM_FEEDS_BATCH_WINDOW_MS / 1000
+        )
+    except Exception as e:
+        logger.error(f"Failed to initialize async Stream Feeds client: {str(e)}")
+        return None
+
+
+async_stream_feeds_client = _create_client()
+
+
+def get_async_stream_feeds_client() -> Optional[AsyncStreamFeedsClient]:
+    """
+    Obtiene el cliente asíncrono de Stream Activity Feeds.
+
+    Returns:
+        Cliente si está configurado, None en caso contrario
+    """
+    return async_stream_feeds_client
+
+
+async def close_async_stream_feeds_client() -> None:
+    """Cierra el pool de conexiones del cliente asíncrono al apagar la aplicación."""
+    if async_stream_feeds_client is not None:
+        await async_stream_feeds_client.aclose()
@@ -4,7 +4,7 @@ from app.models.user import User  # noqa
 from app.models.gym import Gym  # noqa
 from app.models.user_gym import UserGym  # noqa
 from app.models.trainer_member import TrainerMemberRelationship  # noqa
-from app.models.event import Event, EventParticipation  # noqa
+from app.models.event import Event, EventParticipation, EventRefundJob, EventRefundJobItem  # noqa
 from app.models.chat import ChatRoom, ChatMember  # noqa
 from app.models.schedule import (
     GymHours, 
@@ -17,6 +17,8 @@ from app.models.schedule import (
 from app.models.notification import DeviceToken  # noqa
 from app.models.stripe_profile import UserGymStripeProfile, GymStripeAccount  # noqa
 from app.models.user_gym_subscription import UserGymSubscription
+from app.models.revenue import RevenueLedgerEntry  # noqa
+from app.models.stripe_webhook import StripeWebhookEvent  # noqa
 from app.models.story import (
     Story,
     StoryView,
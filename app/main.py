@@ -23,6 +23,8 @@ from app.middleware.security_headers import SecurityHeadersMiddleware
 from app.middleware.rate_limit import limiter, RateLimitMiddleware, custom_rate_limit_exceeded_handler
 from app.core.scheduler import init_scheduler
 from app.db.redis_client import initialize_redis_pool, close_redis_client
+from app.core.stream_feeds_async import close_async_stream_feeds_client
+from app.services.activity_feed_broadcaster import activity_feed_broadcaster
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
@@ -83,6 +85,20 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.error(f"Error shutting down scheduler: {e}", exc_info=True)
     
+    # Cerrar conexiones del feed en tiempo real y su suscripción a Redis
+    try:
+        await activity_feed_broadcaster.stop()
+        logger.info("Lifespan: Broadcaster del Activity Feed detenido.")
+    except Exception as e:
+        logger.error(f"Lifespan: Error deteniendo broadcaster del Activity Feed: {e}", exc_info=True)
+
+    # Enviar lotes pendientes de Stream Feeds y cerrar su pool HTTP
+    try:
+        await close_async_stream_feeds_client()
+        logger.info("Lifespan: Cliente asíncrono de Stream Feeds cerrado.")
+    except Exception as e:
+        logger.error(f"Lifespan: Error cerrando cliente de Stream Feeds: {e}", exc_info=True)
+
     # Cerrar conexión Redis
     print("Lifespan: Intentando cerrar connection pool de Redis...")
     try:
@@ -1,7 +1,7 @@
 import enum
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, Enum, Boolean, Index
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, Enum, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -108,6 +108,8 @@ class Event(Base):
         Index('ix_events_gym_dates', 'gym_id', 'start_time', 'end_time'),
         # Índice para filtrar eventos por creador y gimnasio
         Index('ix_events_creator_gym', 'creator_id', 'gym_id'),
+        # Paginación por cursor (start_time, id) del listado de eventos
+        Index('ix_events_gym_start_id', 'gym_id', 'start_time', 'id'),
     )
 
 
@@ -164,7 +166,84 @@ class EventParticipation(Base):
         Index('ix_event_participation_event_member', 'event_id', 'member_id'),
         # Índice para buscar participaciones por gimnasio y estado
         Index('ix_event_participation_gym_status', 'gym_id', 'status'),
+        # Índice para el job de expiración de pagos pendientes
+        Index('ix_event_participation_payment_expiry', 'payment_status', 'payment_expiry'),
+        # Conteos de inscritos y lista de espera por evento en el listado
+        Index('ix_event_participation_event_status', 'event_id', 'status'),
     )
     
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class EventRefundJobStatus(str, enum.Enum):
+    """Estado de un trabajo de reembolsos masivos."""
+    PENDING = "PENDING"                              # Encolado, sin procesar
+    RUNNING = "RUNNING"                              # Un worker lo está procesando
+    COMPLETED = "COMPLETED"                          # Todos los elementos procesados con éxito
+    COMPLETED_WITH_ERRORS = "COMPLETED_WITH_ERRORS"  # Terminado con algún elemento fallido
+
+
+class EventRefundActionType(str, enum.Enum):
+    """Operación de Stripe a ejecutar para una participación."""
+    REFUND = "REFUND"                  # Reembolso del importe pagado
+    CANCEL_PAYMENT = "CANCEL_PAYMENT"  # Cancelación del Payment Intent pendiente
+
+
+class EventRefundItemStatus(str, enum.Enum):
+    """Estado de la operación de Stripe de una participación."""
+    PENDING = "PENDING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+
+class EventRefundJob(Base):
+    """Trabajo de reembolsos generado al cancelar un evento de pago."""
+    __tablename__ = "event_refund_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False, index=True)
+    gym_id = Column(Integer, ForeignKey("gyms.id"), nullable=False, index=True)
+    created_by_user_id = Column(Integer, ForeignKey("user.id"), nullable=True)
+    stripe_account_id = Column(String(255), nullable=True)
+    reason = Column(Text, nullable=True)
+
+    status = Column(Enum(EventRefundJobStatus), default=EventRefundJobStatus.PENDING, nullable=False, index=True)
+    total_items = Column(Integer, default=0, nullable=False)
+    succeeded_items = Column(Integer, default=0, nullable=False)
+    failed_items = Column(Integer, default=0, nullable=False)
+    scheduled_refund_cents = Column(Integer, default=0, nullable=False)  # Importe a reembolsar
+    refunded_cents = Column(Integer, default=0, nullable=False)          # Importe ya reembolsado
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)  # Último progreso del worker
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    items = relationship("EventRefundJobItem", back_populates="job", cascade="all, delete-orphan")
+
+
+class EventRefundJobItem(Base):
+    """Operación de Stripe pendiente o realizada para una participación del evento."""
+    __tablename__ = "event_refund_job_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("event_refund_jobs.id", ondelete="CASCADE"), nullable=False)
+    job = relationship("EventRefundJob", back_populates="items")
+    participation_id = Column(Integer, ForeignKey("event_participations.id"), nullable=False)
+    member_id = Column(Integer, nullable=False)
+
+    action = Column(Enum(EventRefundActionType), nullable=False)
+    payment_intent_id = Column(String(255), nullable=True)
+    amount_cents = Column(Integer, default=0, nullable=False)
+
+    status = Column(Enum(EventRefundItemStatus), default=EventRefundItemStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    stripe_object_id = Column(String(255), nullable=True)  # Refund o Payment Intent resultante
+    error = Column(Text, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Reanudación: elementos pendientes de un trabajo
+        Index('ix_event_refund_job_items_job_status', 'job_id', 'status'),
+        UniqueConstraint('job_id', 'participation_id', name='uq_event_refund_job_item_participation'),
+    )
@@ -0,0 +1,58 @@
+"""
+Libro de ingresos por gimnasio alimentado por los webhooks de Stripe.
+
+Cada fila es un movimiento de dinero (pago o reembolso) ya atribuido a un
+gimnasio, de modo que los resúmenes de ingresos y los payouts se calculan
+con agregados SQL en lugar de listar objetos en la API de Stripe.
+"""
+
+import enum
+
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Index, Integer, String
+from sqlalchemy.sql import func
+
+from app.db.base_class import Base
+
+
+class RevenueEntryType(str, enum.Enum):
+    """Origen del movimiento en Stripe."""
+    SUBSCRIPTION_INVOICE = "SUBSCRIPTION_INVOICE"  # Factura pagada de una suscripción
+    ONE_TIME_PAYMENT = "ONE_TIME_PAYMENT"          # Checkout de pago único
+    EVENT_PAYMENT = "EVENT_PAYMENT"                # Payment Intent de un evento de pago
+    REFUND = "REFUND"                              # Reembolso (importe negativo)
+
+
+class RevenueLedgerEntry(Base):
+    __tablename__ = "revenue_ledger_entries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    gym_id = Column(Integer, ForeignKey("gyms.id"), nullable=False)
+    entry_type = Column(Enum(RevenueEntryType), nullable=False)
+
+    # Clave idempotente del movimiento: id de factura o Payment Intent, o
+    # "refund:<charge>" para los reembolsos (acumulados por cargo)
+    source_id = Column(String(255), nullable=False, unique=True)
+    stripe_account_id = Column(String(255), nullable=True)
+
+    # Importe en céntimos con signo: negativo para reembolsos
+    amount_cents = Column(Integer, nullable=False)
+    currency = Column(String(3), nullable=False, default="EUR")
+
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=True)
+    plan_id = Column(Integer, ForeignKey("membership_plans.id"), nullable=True)
+    plan_name = Column(String(255), nullable=True)
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="SET NULL"), nullable=True)
+
+    occurred_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # Resúmenes por gimnasio y periodo
+        Index('ix_revenue_ledger_gym_occurred', 'gym_id', 'occurred_at'),
+        # Resumen de plataforma por periodo
+        Index('ix_revenue_ledger_occurred', 'occurred_at'),
+    )
+
+    def __repr__(self):
+        return f"<RevenueLedgerEntry(gym_id={self.gym_id}, source_id={self.source_id}, amount={self.amount_cents})>"
@@ -47,6 +47,7 @@ class ClassParticipationStatus(str, enum.Enum):
     ATTENDED = "attended"
     CANCELLED = "cancelled"
     NO_SHOW = "no_show"
+    WAITLISTED = "waitlisted"  # En lista de espera (sesión llena)
 
 
 class GymHours(Base):
@@ -176,6 +177,31 @@ class ClassSession(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     created_by = Column(Integer, ForeignKey("user.id"), nullable=True)
 
+    # Índices parciales sobre sesiones activas (transiciones de estado programadas)
+    __table_args__ = (
+        sa.Index(
+            'ix_class_session_active_end_time', 'end_time',
+            postgresql_where=sa.text("status IN ('SCHEDULED', 'IN_PROGRESS')")
+        ),
+        sa.Index(
+            'ix_class_session_active_start_time', 'start_time',
+            postgresql_where=sa.text("status IN ('SCHEDULED', 'IN_PROGRESS')")
+        ),
+        # Solapamiento de periodos para conflictos de entrenador y sala (requieren btree_gist)
+        sa.Index(
+            'ix_class_session_trainer_period',
+            'trainer_id', sa.text("tstzrange(start_time, end_time, '[)')"),
+            postgresql_using='gist',
+            postgresql_where=sa.text("status <> 'CANCELLED'")
+        ).ddl_if(dialect='postgresql'),
+        sa.Index(
+            'ix_class_session_room_period',
+            'gym_id', 'room', sa.text("tstzrange(start_time, end_time, '[)')"),
+            postgresql_using='gist',
+            postgresql_where=sa.text("status <> 'CANCELLED' AND room IS NOT NULL")
+        ).ddl_if(dialect='postgresql'),
+    )
+
 
 class ClassParticipation(Base):
     """Participación de miembros en sesiones de clase"""
@@ -191,6 +217,10 @@ class ClassParticipation(Base):
     cancellation_time = Column(DateTime(timezone=True), nullable=True)  # Cuando se canceló
     cancellation_reason = Column(String, nullable=True)
     
+    __table_args__ = (
+        sa.UniqueConstraint('session_id', 'member_id', name='uq_participation_session_member'),
+    )
+    
     # Relaciones
     session = relationship("ClassSession", back_populates="participations")
     gym = relationship("Gym")  # Relación con el gimnasio
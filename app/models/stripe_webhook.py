@@ -0,0 +1,56 @@
+"""
+Bandeja de entrada (inbox) de webhooks de Stripe.
+
+El endpoint del webhook solo verifica la firma y guarda el evento en bruto;
+un worker lo procesa después respetando el orden por cliente, con reintentos
+y una cola de eventos muertos (DEAD) para revisión manual.
+"""
+
+import enum
+
+from sqlalchemy import Column, DateTime, Enum, Float, Index, Integer, String, Text
+from sqlalchemy.sql import func
+
+from app.db.base_class import Base
+
+
+class StripeWebhookEventStatus(str, enum.Enum):
+    PENDING = "PENDING"        # Pendiente de procesar (o de reintentar en next_attempt_at)
+    PROCESSING = "PROCESSING"  # Reclamado por un worker
+    PROCESSED = "PROCESSED"
+    DEAD = "DEAD"              # Agotó los reintentos; requiere revisión
+
+
+class StripeWebhookEvent(Base):
+    __tablename__ = "stripe_webhook_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # ID del evento en Stripe (evt_...): deduplica los reenvíos
+    stripe_event_id = Column(String(255), nullable=False, unique=True)
+    event_type = Column(String(100), nullable=False)
+    stripe_account_id = Column(String(255), nullable=True)
+    # Clave de orden: los eventos de un mismo cliente se procesan en orden
+    ordering_key = Column(String(255), nullable=False)
+    payload = Column(Text, nullable=False)
+
+    status = Column(Enum(StripeWebhookEventStatus), nullable=False, default=StripeWebhookEventStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+
+    stripe_created_at = Column(DateTime(timezone=True), nullable=False)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    # Tiempo desde que llega la petición hasta que el evento queda guardado
+    ack_ms = Column(Float, nullable=True)
+
+    __table_args__ = (
+        # Reclamar eventos listos para procesar
+        Index('ix_stripe_webhook_events_status_next', 'status', 'next_attempt_at'),
+        # Orden por cliente
+        Index('ix_stripe_webhook_events_ordering', 'ordering_key', 'stripe_created_at', 'id'),
+    )
+
+    def __repr__(self):
+        return f"<StripeWebhookEvent(id={self.stripe_event_id}, type={self.event_type}, status={self.status})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.schema import UniqueConstraint
 from datetime import datetime
@@ -15,6 +15,15 @@ class GymRoleType(str, enum.Enum):
     TRAINER = "TRAINER"     # Entrenador
     MEMBER = "MEMBER"       # Miembro regular
 
+class MembershipLifecycleStatus(str, enum.Enum):
+    """
+    Estado del ciclo de vida de una membresía (barrido de vencimientos y webhooks).
+    """
+    ACTIVE = "active"       # Al día
+    GRACE = "grace"         # Pago vencido, conserva el acceso unos días
+    OVERDUE = "overdue"     # Pago pendiente, acceso suspendido
+    EXPIRED = "expired"     # Finalizada o cancelada
+
 class UserGym(Base):
     """
     Relación entre usuarios y gimnasios.
@@ -33,6 +42,8 @@ class UserGym(Base):
     is_active = Column(Boolean, default=True, nullable=False, index=True)
     membership_expires_at = Column(DateTime, nullable=True, index=True)
     membership_type = Column(String(50), default="free", nullable=False)  # "free", "paid", "trial"
+    # Estado del ciclo de vida (ver MembershipLifecycleStatus): "active", "grace", "overdue", "expired"
+    membership_status = Column(String(20), default="active", server_default="active", nullable=False)
     
     # --- Campos de Stripe ---
     stripe_customer_id = Column(String(255), nullable=True, index=True)
@@ -55,4 +66,6 @@ class UserGym(Base):
     # Un usuario solo puede tener un rol por gimnasio
     __table_args__ = (
         UniqueConstraint('user_id', 'gym_id', name='uq_user_gym'),
+        # Transiciones del barrido de membresías (estado + vencimiento)
+        Index('ix_user_gyms_status_expires_at', 'membership_status', 'membership_expires_at'),
     ) 
\ No newline at end of file
@@ -1,13 +1,16 @@
-from typing import List, Optional, Dict, Any, Union
+import logging
+from typing import List, Optional, Dict, Any, Tuple, Union
 from datetime import datetime, timezone
-from sqlalchemy.orm import Session, joinedload, selectinload
-from sqlalchemy import func, and_, or_, select, update
+from sqlalchemy.orm import Session, aliased, joinedload, selectinload
+from sqlalchemy import case, func, and_, or_, literal, select, tuple_, update
 
 from app.models.event import Event, EventParticipation, EventStatus, EventParticipationStatus
 from app.models.user import User, UserRole
 from app.schemas.event import EventCreate, EventUpdate, EventParticipationCreate, EventParticipationUpdate
 from fastapi.encoders import jsonable_encoder
 
+logger = logging.getLogger(__name__)
+
 
 class EventRepository:
     """Repositorio para operaciones con eventos."""
@@ -359,6 +362,104 @@ class EventRepository:
             
         return results
 
+    def get_events_page(
+        self,
+        db: Session,
+        *,
+        gym_id: int,
+        viewer_id: Optional[Union[int, str]] = None,
+        after: Optional[Tuple[datetime, int]] = None,
+        limit: int = 50,
+        status: Optional[EventStatus] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        title_contains: Optional[str] = None,
+        location_contains: Optional[str] = None,
+        created_by: Optional[int] = None,
+        only_available: bool = False
+    ) -> List[dict]:
+        """
+        Página de eventos con conteos y estado del usuario en una sola consulta.
+
+        Cada fila incluye las columnas del evento, ``participants_count``
+        (REGISTERED), ``waiting_list_count`` y el estado de participación y de
+        pago de ``viewer_id`` (ID interno o Auth0 ID). La paginación es por
+        cursor sobre ``(start_time, id)``: ``after`` es la clave de la última
+        fila de la página anterior, así que el coste no crece con la página.
+        """
+        # Conteos correlacionados por evento: PostgreSQL los evalúa solo para
+        # las filas de la página (como un JOIN LATERAL) usando el índice
+        # ix_event_participation_event_status, sin agrupar toda la tabla.
+        counts = (
+            select(
+                func.count(EventParticipation.id).filter(
+                    EventParticipation.status == EventParticipationStatus.REGISTERED
+                ),
+                func.count(EventParticipation.id).filter(
+                    EventParticipation.status == EventParticipationStatus.WAITING_LIST
+                ),
+            )
+            .where(EventParticipation.event_id == Event.id)
+        )
+        participants_count = counts.with_only_columns(
+            counts.selected_columns[0]
+        ).scalar_subquery().label('participants_count')
+        waiting_list_count = counts.with_only_columns(
+            counts.selected_columns[1]
+        ).scalar_subquery().label('waiting_list_count')
+
+        query = db.query(Event, participants_count, waiting_list_count).filter(Event.gym_id == gym_id)
+
+        # Participación propia (como mucho una fila por evento y miembro)
+        if viewer_id is not None:
+            viewer = aliased(EventParticipation)
+            if isinstance(viewer_id, str):
+                viewer_member = select(User.id).where(User.auth0_id == viewer_id).scalar_subquery()
+            else:
+                viewer_member = viewer_id
+            query = query.add_columns(
+                viewer.status.label('viewer_status'),
+                viewer.payment_status.label('viewer_payment_status')
+            ).outerjoin(
+                viewer, and_(viewer.event_id == Event.id, viewer.member_id == viewer_member)
+            )
+
+        if status:
+            query = query.filter(Event.status == status)
+        if start_date:
+            query = query.filter(Event.end_time >= start_date)
+        if end_date:
+            query = query.filter(Event.start_time <= end_date)
+        if title_contains:
+            query = query.filter(Event.title.ilike(f"%{title_contains}%"))
+        if location_contains:
+            query = query.filter(Event.location.ilike(f"%{location_contains}%"))
+        if created_by:
+            query = query.filter(Event.creator_id == created_by)
+        if only_available:
+            query = query.filter(
+                or_(Event.max_participants == 0, Event.max_participants > participants_count)
+            )
+
+        # Keyset sobre el índice ix_events_gym_start_id
+        if after is not None:
+            query = query.filter(tuple_(Event.start_time, Event.id) > tuple_(*after))
+        query = query.order_by(Event.start_time, Event.id).limit(limit)
+
+        results = []
+        for row in query.all():
+            event = row[0]
+            event_dict = {c.name: getattr(event, c.name) for c in event.__table__.columns}
+            event_dict['participants_count'] = row.participants_count or 0
+            event_dict['waiting_list_count'] = row.waiting_list_count or 0
+            event_dict['viewer_status'] = row.viewer_status if viewer_id is not None else None
+            event_dict['viewer_payment_status'] = (
+                row.viewer_payment_status if viewer_id is not None else None
+            )
+            results.append(event_dict)
+
+        return results
+
     def update_event_efficient(
         self, db: Session, *, event_id: int, event_in: EventUpdate
     ) -> Optional[Event]:
@@ -443,52 +544,6 @@ class EventRepository:
             print(f"Error al marcar evento como completado: {e}")
             return None
 
-    def _promote_from_waiting_list(self, db: Session, event_id: int) -> Optional[EventParticipation]:
-        """Promover al primer miembro en lista de espera a registrado."""
-        from app.models.event import Event, PaymentStatusType
-        from datetime import datetime, timedelta
-
-        # Obtener el evento para verificar si es de pago
-        event = db.query(Event).filter(Event.id == event_id).first()
-        if not event:
-            return None
-
-        # Obtener primer miembro en lista de espera (orden por fecha de registro)
-        waiting = (
-            db.query(EventParticipation)
-            .filter(
-                EventParticipation.event_id == event_id,
-                EventParticipation.status == EventParticipationStatus.WAITING_LIST
-            )
-            .order_by(EventParticipation.registered_at)
-            .first()
-        )
-
-        if waiting:
-            waiting.status = EventParticipationStatus.REGISTERED
-
-            # Si el evento es de pago, establecer fecha límite para pagar
-            if event.is_paid and event.price_cents:
-                waiting.payment_status = PaymentStatusType.PENDING
-                # Dar 24 horas para completar el pago
-                waiting.payment_expiry = datetime.utcnow() + timedelta(hours=24)
-
-                # TODO: Aquí se debería enviar una notificación al usuario
-                # informándole que tiene un lugar disponible y debe pagar
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.info(
-                    f"Usuario {waiting.member_id} promovido de lista de espera "
-                    f"para evento de pago {event_id}. Fecha límite de pago: {waiting.payment_expiry}"
-                )
-
-            db.add(waiting)
-            db.commit()
-            db.refresh(waiting)
-            return waiting
-
-        return None
-
 
 class EventParticipationRepository:
     """Repositorio para operaciones con participaciones en eventos."""
@@ -713,125 +768,190 @@ class EventParticipationRepository:
         self, db: Session, *, member_id: Union[int, str], event_id: int
     ) -> Optional[EventParticipation]:
         """Cancelar la participación de un miembro en un evento y promover a alguien de la lista de espera."""
+        participation, _promoted = self.cancel_and_promote(db, member_id=member_id, event_id=event_id)
+        return participation
+
+    def cancel_and_promote(
+        self, db: Session, *, member_id: Union[int, str], event_id: int
+    ) -> Tuple[Optional[EventParticipation], List[EventParticipation]]:
+        """
+        Cancelar la participación de un miembro y, si ocupaba plaza, cubrirla
+        desde la lista de espera en la misma transacción.
+
+        Returns:
+            (participación cancelada o None, participaciones promovidas)
+        """
         if isinstance(member_id, str):
             # Buscar usuario por auth0_id
             user = db.query(User).filter(User.auth0_id == member_id).first()
             if user:
                 member_id = user.id
             else:
-                return None
-                
-        # Obtener la participación
-        participation = self.get_participation_by_member_and_event(
-            db=db, member_id=member_id, event_id=event_id
-        )
-        
-        if not participation or participation.status == EventParticipationStatus.CANCELLED:
-            return None
-        
-        # Verificar si estaba registrado (para promover a alguien de la lista de espera)
-        was_registered = participation.status == EventParticipationStatus.REGISTERED
-        
-        # Cancelar la participación
-        participation.status = EventParticipationStatus.CANCELLED
-        db.add(participation)
-        db.commit()
-        db.refresh(participation)
-        
-        # Si estaba registrado, promover a alguien de la lista de espera
-        if was_registered:
-            self._promote_from_waiting_list(db, event_id)
-        
-        return participation
-    
-    def _promote_from_waiting_list(self, db: Session, event_id: int) -> Optional[EventParticipation]:
-        """Promover al primer miembro en lista de espera a registrado."""
-        from app.models.event import Event, PaymentStatusType
-        from datetime import datetime, timedelta
+                return None, []
 
-        # Obtener el evento para verificar si es de pago
-        event = db.query(Event).filter(Event.id == event_id).first()
-        if not event:
-            return None
+        # El bloqueo del evento serializa cancelaciones y promociones concurrentes
+        event = self._lock_event(db, event_id)
 
-        # Obtener primer miembro en lista de espera (orden por fecha de registro)
-        waiting = (
+        participation = (
             db.query(EventParticipation)
             .filter(
                 EventParticipation.event_id == event_id,
-                EventParticipation.status == EventParticipationStatus.WAITING_LIST
+                EventParticipation.member_id == member_id
             )
-            .order_by(EventParticipation.registered_at)
+            .populate_existing()
+            .with_for_update()
             .first()
         )
 
-        if waiting:
-            waiting.status = EventParticipationStatus.REGISTERED
-
-            # Si el evento es de pago, establecer fecha límite para pagar
-            if event.is_paid and event.price_cents:
-                waiting.payment_status = PaymentStatusType.PENDING
-                # Dar 24 horas para completar el pago
-                waiting.payment_expiry = datetime.utcnow() + timedelta(hours=24)
-
-                # TODO: Aquí se debería enviar una notificación al usuario
-                # informándole que tiene un lugar disponible y debe pagar
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.info(
-                    f"Usuario {waiting.member_id} promovido de lista de espera "
-                    f"para evento de pago {event_id}. Fecha límite de pago: {waiting.payment_expiry}"
-                )
+        if not participation or participation.status == EventParticipationStatus.CANCELLED:
+            db.rollback()
+            return None, []
 
-            db.add(waiting)
-            db.commit()
-            db.refresh(waiting)
-            return waiting
+        was_registered = participation.status == EventParticipationStatus.REGISTERED
+        participation.status = EventParticipationStatus.CANCELLED
+        db.flush()
 
-        return None
+        promoted = self._promote_locked(db, event) if was_registered else []
+        db.commit()
+        db.refresh(participation)
+        return participation, promoted
+
+    def _lock_event(self, db: Session, event_id: int) -> Optional[Event]:
+        """Evento con bloqueo de fila (SELECT ... FOR UPDATE) hasta el final de la transacción."""
+        return (
+            db.query(Event)
+            .filter(Event.id == event_id)
+            .populate_existing()
+            .with_for_update()
+            .first()
+        )
 
-    def fill_vacancies_from_waiting_list(self, db: Session, event_id: int) -> List[EventParticipation]:
-        """Promueve usuarios de la WAITING_LIST hasta cubrir las plazas libres."""
-        promoted: List[EventParticipation] = []
+    def _promote_locked(
+        self, db: Session, event: Optional[Event], limit: Optional[int] = None
+    ) -> List[EventParticipation]:
+        """
+        Promueve a REGISTERED a los primeros de la lista de espera hasta cubrir
+        las plazas libres (o `limit`). Requiere el evento bloqueado y no confirma.
 
-        from app.models.event import Event  # evitar ciclos
+        Las filas de la lista de espera se bloquean con SKIP LOCKED: una fila que
+        otra transacción está modificando (p. ej. el propio miembro cancelando
+        su espera) se salta en lugar de esperar por ella.
+        """
+        from datetime import timedelta
+        from app.models.event import PaymentStatusType
 
-        event = db.query(Event).filter(Event.id == event_id).first()
-        if not event or event.max_participants == 0:
-            return promoted
+        if not event or event.max_participants == 0 or event.status != EventStatus.SCHEDULED:
+            return []
 
         registered_count = (
-            db.query(EventParticipation)
+            db.query(func.count(EventParticipation.id))
             .filter(
-                EventParticipation.event_id == event_id,
+                EventParticipation.event_id == event.id,
                 EventParticipation.status == EventParticipationStatus.REGISTERED,
             )
-            .count()
+            .scalar()
         )
-
         available = max(event.max_participants - registered_count, 0)
+        if limit is not None:
+            available = min(available, limit)
         if available == 0:
-            return promoted
+            return []
 
         waiting_list = (
             db.query(EventParticipation)
             .filter(
-                EventParticipation.event_id == event_id,
+                EventParticipation.event_id == event.id,
                 EventParticipation.status == EventParticipationStatus.WAITING_LIST,
             )
-            .order_by(EventParticipation.registered_at)
+            .order_by(EventParticipation.registered_at, EventParticipation.id)
             .limit(available)
+            .populate_existing()
+            .with_for_update(skip_locked=True)
             .all()
         )
 
+        payment_expiry = datetime.utcnow() + timedelta(hours=24)
         for part in waiting_list:
             part.status = EventParticipationStatus.REGISTERED
-            promoted.append(part)
+            # En eventos de pago la plaza se confirma pagando en 24 horas
+            if event.is_paid and event.price_cents:
+                part.payment_status = PaymentStatusType.PENDING
+                part.payment_expiry = payment_expiry
+        db.flush()
+        return waiting_list
 
-        if promoted:
-            db.bulk_save_objects(promoted)
+    def expire_pending_payments(self, db: Session, *, now: datetime, limit: int) -> List[Any]:
+        """
+        Expira en una sola sentencia hasta `limit` pagos pendientes vencidos.
+
+        Las participaciones que ocupaban o esperaban plaza pasan a CANCELLED. Las
+        filas se reclaman con FOR UPDATE SKIP LOCKED para que dos ejecuciones
+        simultáneas del job no procesen las mismas.
+
+        Returns:
+            Filas (id, event_id, gym_id, member_id, stripe_payment_intent_id) expiradas
+        """
+        from app.models.event import PaymentStatusType
+
+        candidates = (
+            select(EventParticipation.id)
+            .where(
+                EventParticipation.payment_status == PaymentStatusType.PENDING,
+                EventParticipation.payment_expiry.isnot(None),
+                EventParticipation.payment_expiry < now
+            )
+            .order_by(EventParticipation.payment_expiry)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(EventParticipation)
+            .where(EventParticipation.id.in_(candidates))
+            .values(
+                payment_status=PaymentStatusType.EXPIRED,
+                status=case(
+                    (
+                        EventParticipation.status.in_([
+                            EventParticipationStatus.REGISTERED,
+                            EventParticipationStatus.PENDING_PAYMENT
+                        ]),
+                        literal(EventParticipationStatus.CANCELLED, EventParticipation.status.type)
+                    ),
+                    else_=EventParticipation.status
+                )
+            )
+            .returning(
+                EventParticipation.id,
+                EventParticipation.event_id,
+                EventParticipation.gym_id,
+                EventParticipation.member_id,
+                EventParticipation.stripe_payment_intent_id
+            )
+            .execution_options(synchronize_session=False)
+        )
+        rows = db.execute(stmt).all()
+        db.commit()
+        return rows
+
+    def fill_vacancies_from_waiting_list(
+        self, db: Session, event_id: int, limit: Optional[int] = None
+    ) -> List[EventParticipation]:
+        """
+        Promueve usuarios de la WAITING_LIST hasta cubrir las plazas libres, en
+        una sola transacción con el evento bloqueado.
+        """
+        try:
+            event = self._lock_event(db, event_id)
+            promoted = self._promote_locked(db, event, limit)
             db.commit()
+        except Exception:
+            db.rollback()
+            raise
 
+        if promoted:
+            logger.info(
+                f"{len(promoted)} miembros promovidos de la lista de espera del evento {event_id}"
+            )
         return promoted
 
 
@@ -7,7 +7,7 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime
 import re
 
-from app.core.stream_feeds_client import get_stream_feeds_client, is_stream_feeds_available
+from app.core.stream_feeds_async import get_async_stream_feeds_client
 from app.models.post import Post
 
 logger = logging.getLogger(__name__)
@@ -19,12 +19,8 @@ class PostFeedRepository:
     """
 
     def __init__(self):
-        self.client = None
-        if is_stream_feeds_available():
-            try:
-                self.client = get_stream_feeds_client()
-            except Exception as e:
-                logger.warning(f"Stream Feeds client no disponible: {e}")
+        # Cliente asíncrono (httpx) para no bloquear el event loop
+        self.client = get_async_stream_feeds_client()
 
     def _sanitize_user_id(self, user_id: int) -> str:
         """
@@ -38,9 +34,9 @@ class PostFeedRepository:
         sanitized = re.sub(r'[^a-zA-Z0-9_]', '_', user_id_str)
         return sanitized
 
-    def _get_feed(self, gym_id: int, user_id: int, feed_slug: str):
+    def _get_feed_id(self, gym_id: int, user_id: int) -> str:
         """
-        Obtiene un feed de Stream Feeds.
+        Obtiene el ID del feed de un usuario en Stream Feeds.
 
         Feed ID unificado: gym_{gym_id}_user_{safe_user_id}
         """
@@ -48,8 +44,7 @@ class PostFeedRepository:
             raise Exception("Stream client not available")
 
         sanitized_user_id = self._sanitize_user_id(user_id)
-        feed_id = f"gym_{gym_id}_user_{sanitized_user_id}"
-        return self.client.feed(feed_slug, feed_id)
+        return f"gym_{gym_id}_user_{sanitized_user_id}"
 
     async def create_post_activity(
         self,
@@ -93,19 +88,17 @@ class PostFeedRepository:
                 "comment_count": post.comment_count
             }
 
-            # Obtener feed del usuario
-            user_feed = self._get_feed(gym_id, user_id, "user")
-
-            # Publicar actividad
-            activity = user_feed.add_activity(activity_data)
+            # Publicar actividad en el feed del usuario
+            activity = await self.client.add_activity("user", self._get_feed_id(gym_id, user_id), activity_data)
 
             logger.info(f"Actividad de post {post.id} creada en Stream Feeds")
 
             # Si es público, también publicar en feed global del gym
             if post.privacy.value == "public":
                 try:
-                    gym_feed = self.client.feed("timeline", f"gym_{gym_id}")
-                    gym_feed.add_activity(activity_data)
+                    # El timeline del gym es el feed más caliente: se agrupa con
+                    # otras publicaciones concurrentes en un único add_activities
+                    await self.client.add_activity_batched("timeline", f"gym_{gym_id}", activity_data)
                 except Exception as e:
                     logger.error(f"Error publicando en feed global: {e}")
 
@@ -138,10 +131,8 @@ class PostFeedRepository:
             return {"results": [], "duration": "0ms"}
 
         try:
-            gym_feed = self.client.feed("timeline", f"gym_{gym_id}")
-
             # Obtener actividades con paginación
-            activities = gym_feed.get(limit=limit, offset=offset)
+            activities = await self.client.get_feed("timeline", f"gym_{gym_id}", limit=limit, offset=offset)
 
             logger.info(f"Obtenidas {len(activities.get('results', []))} actividades del feed del gym {gym_id}")
             return activities
@@ -171,10 +162,8 @@ class PostFeedRepository:
             return {"results": [], "duration": "0ms"}
 
         try:
-            gym_feed = self.client.feed("timeline", f"gym_{gym_id}")
-
             # Obtener actividades recientes
-            activities = gym_feed.get(limit=limit * 2)  # Obtener más para rankear
+            activities = await self.client.get_feed("timeline", f"gym_{gym_id}", limit=limit * 2)  # Obtener más para rankear
 
             # Rankear por engagement
             results = activities.get("results", [])
@@ -238,10 +227,8 @@ class PostFeedRepository:
             return True
 
         try:
-            user_feed = self._get_feed(gym_id, user_id, "user")
-
             # Eliminar por foreign_id
-            user_feed.remove_activity(foreign_id=f"post_{post_id}")
+            await self.client.remove_activity("user", self._get_feed_id(gym_id, user_id), f"post_{post_id}")
 
             logger.info(f"Actividad de post {post_id} eliminada de Stream Feeds")
             return True
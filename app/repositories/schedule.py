@@ -1,7 +1,9 @@
-from typing import List, Optional, Dict, Any, Union, Type
+from typing import List, Optional, Dict, Any, Union, Type, Tuple
 from datetime import datetime, time, timedelta, date, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_, or_, func, select, update, case, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import datetime as dt
 
 from app.repositories.base import BaseRepository
@@ -76,20 +78,23 @@ class GymHoursRepository(BaseRepository[GymHours, GymHoursCreate, GymHoursUpdate
         if hours:
             return hours
         
-        # Crear horarios predeterminados (9:00 AM - 9:00 PM, cerrado en domingo)
-        is_closed = day == 6  # Domingo
-        default_open = time(9, 0)  # 9:00 AM
-        default_close = time(21, 0)  # 9:00 PM
-        
-        obj_in = GymHoursCreate(
-            day_of_week=day,
-            open_time=default_open,
-            close_time=default_close,
-            is_closed=is_closed,
-            gym_id=gym_id
-        )
+        obj_in = GymHoursCreate(day_of_week=day, gym_id=gym_id, **self.default_values(day))
         return self.create(db, obj_in=obj_in)
 
+    @staticmethod
+    def default_values(day: int) -> Dict[str, Any]:
+        """
+        Horario predeterminado de un día sin registro: 9:00 AM - 9:00 PM,
+        cerrado en domingo.
+        """
+        is_closed = day == 6  # Domingo
+        # Un día cerrado no puede llevar horas de apertura/cierre
+        return {
+            "open_time": None if is_closed else time(9, 0),  # 9:00 AM
+            "close_time": None if is_closed else time(21, 0),  # 9:00 PM
+            "is_closed": is_closed,
+        }
+
 
 class GymSpecialHoursRepository(BaseRepository[GymSpecialHours, GymSpecialHoursCreate, GymSpecialHoursUpdate]):
     def get_by_date(self, db: Session, *, date_value: date, gym_id: Optional[int] = None) -> Optional[GymSpecialHours]:
@@ -471,6 +476,166 @@ class ClassSessionRepository(BaseRepository[ClassSession, ClassSessionCreate, Cl
             
         return query.order_by(ClassSession.start_time).offset(skip).limit(limit).all()
     
+    def get_overlapping(
+        self, db: Session, *, gym_id: int, start: datetime, end: datetime,
+        trainer_id: Optional[int] = None, room: Optional[str] = None,
+        exclude_ids: Optional[List[int]] = None
+    ) -> List[Any]:
+        """
+        Sesiones no canceladas del entrenador o de la sala que se solapan con [start, end).
+
+        En PostgreSQL el solapamiento se expresa con tstzrange && para usar los
+        índices GiST ix_class_session_trainer_period / ix_class_session_room_period.
+
+        Returns:
+            Filas (id, trainer_id, room, start_time, end_time)
+        """
+        owners = []
+        if trainer_id is not None:
+            owners.append(ClassSession.trainer_id == trainer_id)
+        if room:
+            owners.append(and_(ClassSession.gym_id == gym_id, ClassSession.room == room))
+        if not owners:
+            return []
+
+        if db.get_bind().dialect.name == "postgresql":
+            overlaps = func.tstzrange(ClassSession.start_time, ClassSession.end_time, '[)').op('&&')(
+                func.tstzrange(start, end, '[)')
+            )
+        else:
+            overlaps = and_(ClassSession.start_time < end, ClassSession.end_time > start)
+
+        query = db.query(
+            ClassSession.id, ClassSession.trainer_id, ClassSession.room,
+            ClassSession.start_time, ClassSession.end_time
+        ).filter(
+            ClassSession.status != ClassSessionStatus.CANCELLED,
+            overlaps,
+            or_(*owners)
+        )
+        if exclude_ids:
+            query = query.filter(ClassSession.id.notin_(exclude_ids))
+        return query.all()
+
+    def bulk_create(
+        self, db: Session, *, objs_in: List[Dict[str, Any]]
+    ) -> List[ClassSession]:
+        """
+        Crear muchas sesiones en una única transacción.
+
+        Usa un INSERT ... RETURNING multi-fila (insertmanyvalues) en lugar de
+        un insert + commit + refresh por sesión.
+
+        Args:
+            db: Sesión de base de datos
+            objs_in: Diccionarios con los campos de cada sesión (mismas claves)
+
+        Returns:
+            Sesiones creadas, ordenadas por hora de inicio
+        """
+        if not objs_in:
+            return []
+        sessions = db.scalars(
+            insert(ClassSession).returning(ClassSession),
+            objs_in
+        ).all()
+        session_ids = [session.id for session in sessions]
+        db.commit()
+
+        # Recargar todas las sesiones expiradas por el commit en una sola consulta
+        return db.query(ClassSession).filter(
+            ClassSession.id.in_(session_ids)
+        ).order_by(ClassSession.start_time, ClassSession.id).all()
+
+    def _transition_status(self, db: Session, *, conditions: List[Any], new_status: ClassSessionStatus) -> List[Any]:
+        stmt = (
+            update(ClassSession)
+            .where(*conditions)
+            .values(status=new_status)
+            .returning(
+                ClassSession.id, ClassSession.gym_id, ClassSession.trainer_id,
+                ClassSession.class_id, ClassSession.start_time
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return db.execute(stmt).all()
+
+    def mark_finished_as_completed(self, db: Session, *, now: datetime) -> List[Any]:
+        """
+        Marcar como COMPLETED (sin commit) las sesiones activas ya terminadas.
+
+        Returns:
+            Filas (id, gym_id, trainer_id, class_id, start_time) de las sesiones actualizadas
+        """
+        return self._transition_status(
+            db,
+            conditions=[
+                ClassSession.status.in_([ClassSessionStatus.SCHEDULED, ClassSessionStatus.IN_PROGRESS]),
+                ClassSession.end_time <= now
+            ],
+            new_status=ClassSessionStatus.COMPLETED
+        )
+
+    def mark_started_as_in_progress(self, db: Session, *, now: datetime) -> List[Any]:
+        """
+        Marcar como IN_PROGRESS (sin commit) las sesiones programadas que ya empezaron.
+
+        Returns:
+            Filas (id, gym_id, trainer_id, class_id, start_time) de las sesiones actualizadas
+        """
+        return self._transition_status(
+            db,
+            conditions=[
+                ClassSession.status == ClassSessionStatus.SCHEDULED,
+                ClassSession.start_time <= now,
+                ClassSession.end_time > now
+            ],
+            new_status=ClassSessionStatus.IN_PROGRESS
+        )
+
+    def get_completed_class_activity(self, db: Session, *, session_ids: List[int]) -> List[Dict[str, Any]]:
+        """
+        Resumen de actividad de las sesiones COMPLETED indicadas, en una sola
+        consulta: clase, duración y asistentes (participaciones ATTENDED).
+
+        Returns:
+            Un dict por sesión con gym_id, session_id, class_name,
+            duration_minutes y participant_ids
+        """
+        if not session_ids:
+            return []
+
+        rows = db.query(
+            ClassSession.id, ClassSession.gym_id, ClassSession.start_time, ClassSession.end_time,
+            Class.name, ClassParticipation.member_id
+        ).join(
+            Class, Class.id == ClassSession.class_id
+        ).outerjoin(
+            ClassParticipation,
+            and_(
+                ClassParticipation.session_id == ClassSession.id,
+                ClassParticipation.status == ClassParticipationStatus.ATTENDED
+            )
+        ).filter(
+            ClassSession.id.in_(session_ids),
+            ClassSession.status == ClassSessionStatus.COMPLETED
+        ).order_by(ClassSession.id).all()
+
+        activity: Dict[int, Dict[str, Any]] = {}
+        for session_id, gym_id, start_time, end_time, class_name, member_id in rows:
+            entry = activity.setdefault(session_id, {
+                "gym_id": gym_id,
+                "session_id": session_id,
+                "class_name": class_name,
+                "duration_minutes": int((end_time - start_time).total_seconds() // 60),
+                "participant_ids": [],
+            })
+            if member_id is not None:
+                entry["participant_ids"].append(member_id)
+        for entry in activity.values():
+            entry["total_participants"] = len(entry["participant_ids"])
+        return list(activity.values())
+
     def get_with_availability(
         self, db: Session, *, session_id: int
     ) -> Optional[Dict[str, Any]]:
@@ -520,6 +685,59 @@ class ClassSessionRepository(BaseRepository[ClassSession, ClassSessionCreate, Cl
         
         return session
 
+    def _capacity_expression(self):
+        """Capacidad efectiva de la sesión: override de la sesión o la de la clase"""
+        class_capacity = (
+            select(Class.max_capacity)
+            .where(Class.id == ClassSession.class_id)
+            .scalar_subquery()
+        )
+        return func.coalesce(ClassSession.override_capacity, class_capacity)
+
+    def reserve_seat(self, db: Session, *, session_id: int) -> Optional[int]:
+        """
+        Reservar una plaza de forma atómica.
+
+        Un único UPDATE condicional incrementa `current_participants` solo si
+        queda capacidad. El bloqueo de fila del UPDATE serializa las reservas
+        concurrentes de la misma sesión, por lo que nunca se sobrevende.
+        No hace commit: la reserva se confirma junto con la participación.
+
+        Returns:
+            Nuevo número de participantes, o None si la sesión está llena
+            o no está programada
+        """
+        current = func.coalesce(ClassSession.current_participants, 0)
+        stmt = (
+            update(ClassSession)
+            .where(
+                ClassSession.id == session_id,
+                ClassSession.status == ClassSessionStatus.SCHEDULED,
+                current < self._capacity_expression()
+            )
+            .values(current_participants=current + 1)
+            .returning(ClassSession.current_participants)
+            .execution_options(synchronize_session=False)
+        )
+        return db.execute(stmt).scalar_one_or_none()
+
+    def release_seat(self, db: Session, *, session_id: int) -> Optional[int]:
+        """
+        Liberar una plaza reservada (sin commit).
+
+        Returns:
+            Nuevo número de participantes, o None si la sesión no existe
+        """
+        current = func.coalesce(ClassSession.current_participants, 0)
+        stmt = (
+            update(ClassSession)
+            .where(ClassSession.id == session_id)
+            .values(current_participants=case((current > 0, current - 1), else_=0))
+            .returning(ClassSession.current_participants)
+            .execution_options(synchronize_session=False)
+        )
+        return db.execute(stmt).scalar_one_or_none()
+
 
 class ClassParticipationRepository(BaseRepository[ClassParticipation, ClassParticipationCreate, ClassParticipationUpdate]):
     def get_by_session_and_member(
@@ -624,6 +842,56 @@ class ClassParticipationRepository(BaseRepository[ClassParticipation, ClassParti
         
         return participation
     
+    def mark_attended_bulk(
+        self, db: Session, *, gym_id: int, entries: List[Dict[str, Any]]
+    ) -> List[Tuple[int, int]]:
+        """
+        Registrar la asistencia de varios miembros con un único INSERT ... ON CONFLICT.
+
+        Crea la participación si no existe o la pasa a ATTENDED si existía con
+        otro estado; las que ya estaban en ATTENDED no se modifican. Si el
+        lote repite un miembro en la misma sesión se guarda el primer escaneo.
+
+        Args:
+            db: Sesión de base de datos
+            gym_id: ID del gimnasio
+            entries: Diccionarios con session_id, member_id y attendance_time
+
+        Returns:
+            Pares (session_id, member_id) cuya asistencia se registró en esta llamada
+        """
+        rows_by_key: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        for entry in entries:
+            key = (entry["session_id"], entry["member_id"])
+            current = rows_by_key.get(key)
+            if current is None or entry["attendance_time"] < current["attendance_time"]:
+                rows_by_key[key] = {
+                    "session_id": entry["session_id"],
+                    "member_id": entry["member_id"],
+                    "gym_id": gym_id,
+                    "status": ClassParticipationStatus.ATTENDED,
+                    "attendance_time": entry["attendance_time"],
+                }
+        rows = list(rows_by_key.values())
+        if not rows:
+            return []
+
+        dialect_insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+        stmt = dialect_insert(ClassParticipation).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ClassParticipation.session_id, ClassParticipation.member_id],
+            set_={
+                "status": stmt.excluded.status,
+                "attendance_time": stmt.excluded.attendance_time,
+                "updated_at": func.now(),
+            },
+            where=ClassParticipation.status != ClassParticipationStatus.ATTENDED
+        ).returning(ClassParticipation.session_id, ClassParticipation.member_id)
+
+        recorded = [(row.session_id, row.member_id) for row in db.execute(stmt)]
+        db.commit()
+        return recorded
+
     def get_member_participation_status(
         self, db: Session, *, member_id: int, start_date: datetime, end_date: datetime,
         gym_id: Optional[int] = None, session_ids: Optional[List[int]] = None
@@ -676,6 +944,53 @@ class ClassParticipationRepository(BaseRepository[ClassParticipation, ClassParti
         
         return query.order_by(ClassParticipation.registration_time.desc()).all()
     
+    def get_statuses_for_sessions(
+        self, db: Session, *, member_id: int, session_ids: List[int], gym_id: Optional[int] = None
+    ) -> Dict[int, ClassParticipationStatus]:
+        """
+        Obtener el estado de participación de un miembro en varias sesiones con una consulta.
+
+        Returns:
+            Diccionario session_id -> estado (las sesiones sin participación no aparecen)
+        """
+        if not session_ids:
+            return {}
+        query = db.query(ClassParticipation.session_id, ClassParticipation.status).filter(
+            ClassParticipation.member_id == member_id,
+            ClassParticipation.session_id.in_(session_ids)
+        )
+        if gym_id is not None:
+            query = query.filter(ClassParticipation.gym_id == gym_id)
+        return {session_id: status for session_id, status in query}
+
+    def get_for_update(
+        self, db: Session, *, session_id: int, member_id: int, gym_id: Optional[int] = None
+    ) -> Optional[ClassParticipation]:
+        """Obtener la participación de un miembro bloqueando su fila hasta el commit"""
+        query = db.query(ClassParticipation).filter(
+            ClassParticipation.session_id == session_id,
+            ClassParticipation.member_id == member_id
+        )
+        if gym_id is not None:
+            query = query.filter(ClassParticipation.gym_id == gym_id)
+        return query.with_for_update().first()
+
+    def get_next_waitlisted(
+        self, db: Session, *, session_id: int
+    ) -> Optional[ClassParticipation]:
+        """
+        Obtener y bloquear la primera participación en lista de espera.
+
+        Usa SKIP LOCKED para que dos cancelaciones simultáneas no intenten
+        promover al mismo miembro.
+        """
+        return db.query(ClassParticipation).filter(
+            ClassParticipation.session_id == session_id,
+            ClassParticipation.status == ClassParticipationStatus.WAITLISTED
+        ).order_by(
+            ClassParticipation.registration_time, ClassParticipation.id
+        ).with_for_update(skip_locked=True).first()
+
     def cancel_participation(
         self, db: Session, *, session_id: int, member_id: int, reason: Optional[str] = None, 
         gym_id: Optional[int] = None
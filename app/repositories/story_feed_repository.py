@@ -10,11 +10,11 @@ from datetime import datetime, timedelta, timezone
 import json
 
 try:
-    from app.core.stream_feeds_client import stream_feeds_client
-    STREAM_AVAILABLE = stream_feeds_client is not None
+    from app.core.stream_feeds_async import async_stream_feeds_client
+    STREAM_AVAILABLE = async_stream_feeds_client is not None
 except Exception as e:
     logging.getLogger(__name__).warning(f"Stream Feeds not available: {e}")
-    stream_feeds_client = None
+    async_stream_feeds_client = None
     STREAM_AVAILABLE = False
 
 from app.core.config import get_settings
@@ -31,7 +31,8 @@ class StoryFeedRepository:
     """
 
     def __init__(self):
-        self.client = stream_feeds_client if STREAM_AVAILABLE else None
+        # Cliente asíncrono (httpx) para no bloquear el event loop
+        self.client = async_stream_feeds_client if STREAM_AVAILABLE else None
         self.app_id = settings.STREAM_APP_ID if STREAM_AVAILABLE else None
         self.available = STREAM_AVAILABLE
 
@@ -55,19 +56,17 @@ class StoryFeedRepository:
 
         return sanitized
 
-    def _get_feed(self, gym_id: int, user_id: int, feed_type: str = "user"):
+    def _get_feed_id(self, gym_id: int, user_id: int) -> str:
         """
-        Obtiene un feed específico de Stream.
+        Obtiene el ID de feed de un usuario en Stream.
 
         Args:
             gym_id: ID del gimnasio
             user_id: ID del usuario
-            feed_type: Tipo de feed (user, timeline, etc.)
         """
         # Sanitizar user_id para Stream
         safe_user_id = self._sanitize_user_id(user_id)
-        feed_id = f"gym_{gym_id}_user_{safe_user_id}"
-        return self.client.feed(feed_type, feed_id)
+        return f"gym_{gym_id}_user_{safe_user_id}"
 
     async def create_story_activity(
         self,
@@ -124,18 +123,15 @@ class StoryFeedRepository:
             activity_data = {k: v for k, v in activity_data.items() if v is not None}
 
             # Crear actividad en el feed del usuario
-            user_feed = self._get_feed(gym_id, user_id, "user")
-            activity = user_feed.add_activity(activity_data)
+            activity = await self.client.add_activity("user", self._get_feed_id(gym_id, user_id), activity_data)
 
             # Si la historia es pública, agregar a feeds de seguidores
             if story.privacy.value == "public":
-                # Obtener timeline feed del gimnasio
-                gym_timeline_feed = self.client.feed("timeline", f"gym_{gym_id}")
-
                 # Hacer que el timeline del gimnasio siga al usuario
-                # Esto permite que las historias públicas aparezcan en el feed global
+                # Esto permite que las historias públicas aparezcan en el feed global.
+                # Los follows concurrentes se agrupan en un único follow_many
                 try:
-                    gym_timeline_feed.follow("user", f"gym_{gym_id}_user_{safe_user_id}")
+                    await self.client.follow_batched("timeline", f"gym_{gym_id}", "user", f"gym_{gym_id}_user_{safe_user_id}")
                 except Exception as e:
                     # Puede fallar si ya está siguiendo
                     logger.debug(f"Timeline already following user: {e}")
@@ -171,10 +167,10 @@ class StoryFeedRepository:
             return {"results": [], "next": None}
 
         try:
-            user_feed = self._get_feed(gym_id, user_id, "user")
-
             # Obtener actividades con paginación
-            activities = user_feed.get(
+            activities = await self.client.get_feed(
+                "user",
+                self._get_feed_id(gym_id, user_id),
                 limit=limit,
                 offset=offset
             )
@@ -229,18 +225,20 @@ class StoryFeedRepository:
 
         try:
             # Usar timeline feed del usuario para ver historias de seguidos
-            timeline_feed = self._get_feed(gym_id, user_id, "timeline")
+            timeline_feed_id = self._get_feed_id(gym_id, user_id)
 
             # Para feed global del gimnasio
             if filter_type == "all":
-                timeline_feed = self.client.feed("timeline", f"gym_{gym_id}")
+                timeline_feed_id = f"gym_{gym_id}"
 
             # Obtener actividades con paginación
             # Asegurar que limit y offset son integers
             limit_int = int(limit) if limit else 25
             offset_int = int(offset) if offset else 0
 
-            activities = timeline_feed.get(
+            activities = await self.client.get_feed(
+                "timeline",
+                timeline_feed_id,
                 limit=limit_int,
                 offset=offset_int
             )
@@ -312,10 +310,8 @@ class StoryFeedRepository:
             return True
 
         try:
-            user_feed = self._get_feed(gym_id, user_id, "user")
-
             # Eliminar por foreign_id
-            user_feed.remove_activity(foreign_id=f"story_{story_id}")
+            await self.client.remove_activity("user", self._get_feed_id(gym_id, user_id), f"story_{story_id}")
 
             logger.info(f"Story activity {story_id} deleted from Stream")
             return True
@@ -389,10 +385,11 @@ class StoryFeedRepository:
             safe_following_id = self._sanitize_user_id(following_id)
 
             # Timeline del seguidor sigue al feed del usuario seguido
-            follower_timeline = self._get_feed(gym_id, follower_id, "timeline")
             following_user_feed = f"gym_{gym_id}_user_{safe_following_id}"
 
-            follower_timeline.follow("user", following_user_feed)
+            await self.client.follow_batched(
+                "timeline", self._get_feed_id(gym_id, follower_id), "user", following_user_feed
+            )
 
             logger.info(f"User {follower_id} now following user {following_id}")
             return True
@@ -423,10 +420,11 @@ class StoryFeedRepository:
             safe_following_id = self._sanitize_user_id(following_id)
 
             # Timeline del seguidor deja de seguir al feed del usuario
-            follower_timeline = self._get_feed(gym_id, follower_id, "timeline")
             following_user_feed = f"gym_{gym_id}_user_{safe_following_id}"
 
-            follower_timeline.unfollow("user", following_user_feed)
+            await self.client.unfollow(
+                "timeline", self._get_feed_id(gym_id, follower_id), "user", following_user_feed
+            )
 
             logger.info(f"User {follower_id} unfollowed user {following_id}")
             return True
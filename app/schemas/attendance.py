@@ -0,0 +1,34 @@
+from typing import Optional, List
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+MAX_BULK_CHECKIN_EVENTS = 500
+
+
+class BulkCheckInEvent(BaseModel):
+    """Escaneo QR registrado por un dispositivo (posiblemente sin conexión)"""
+    event_id: str = Field(..., min_length=1, max_length=64,
+                          description="Identificador único generado por el dispositivo (idempotencia)")
+    qr_code: str = Field(..., description="Código QR escaneado")
+    scanned_at: datetime = Field(..., description="Momento del escaneo según el dispositivo (ISO 8601)")
+    session_id: Optional[int] = Field(None, description="Sesión concreta en la que hacer check-in")
+
+
+class BulkCheckInRequest(BaseModel):
+    """Lote de escaneos a sincronizar"""
+    events: List[BulkCheckInEvent] = Field(..., min_length=1, max_length=MAX_BULK_CHECKIN_EVENTS)
+
+
+class BulkCheckInResult(BaseModel):
+    """Resultado del procesamiento de un escaneo"""
+    event_id: str
+    success: bool
+    message: str
+    session_id: Optional[int] = None
+    duplicate: bool = Field(False, description="El evento ya se había sincronizado antes")
+
+
+class BulkCheckInResponse(BaseModel):
+    """Respuesta de la sincronización de un lote de escaneos"""
+    results: List[BulkCheckInResult]
+    recorded: int = Field(..., description="Asistencias registradas en esta sincronización")
@@ -230,6 +230,19 @@ class EventWithParticipantCount(Event):
         arbitrary_types_allowed = True
 
 
+class EventListItem(EventWithParticipantCount):
+    """Evento del listado con lista de espera y estado del usuario que consulta."""
+    waiting_list_count: int = 0
+    viewer_status: Optional[EventParticipationStatus] = None
+    viewer_payment_status: Optional[PaymentStatusType] = None
+
+
+class EventPage(BaseModel):
+    """Página de eventos paginada por cursor."""
+    items: List[EventListItem]
+    next_cursor: Optional[str] = Field(None, description="Cursor para la página siguiente; null si no hay más")
+
+
 # Schemas for filtering and pagination
 class EventsSearchParams(BaseModel):
     """Parámetros para búsqueda y filtrado de eventos."""
@@ -284,7 +297,7 @@ class EventCancellationResponse(BaseModel):
     participants_count: int = Field(..., description="Total de participantes en el evento")
     refunds_processed: int = Field(..., description="Cantidad de reembolsos procesados exitosamente")
     refunds_failed: int = Field(..., description="Cantidad de reembolsos que fallaron")
-    payments_cancelled: int = Field(..., description="Cantidad de Payment Intents cancelados (PENDING_PAYMENT)")
+    payments_cancelled: int = Field(..., description="Pagos pendientes (PENDING_PAYMENT) cancelados cuyo Payment Intent se cancela en Stripe")
 
     # Información financiera
     total_refunded_amount: int = Field(..., description="Monto total reembolsado en centavos")
@@ -296,10 +309,41 @@ class EventCancellationResponse(BaseModel):
     # Notificaciones enviadas
     notifications_sent: Dict[str, int] = Field(..., description="Contador de notificaciones enviadas por canal (push, email, chat)")
 
+    # Trabajo de reembolsos en segundo plano (eventos de pago)
+    refund_job_id: Optional[int] = Field(None, description="ID del trabajo que ejecuta los reembolsos en Stripe")
+    refund_job_status: Optional[str] = Field(None, description="Estado del trabajo de reembolsos al responder")
+    refund_job_items: Optional[int] = Field(None, description="Operaciones de Stripe encoladas en el trabajo de reembolsos")
+    scheduled_refund_amount: Optional[int] = Field(None, description="Monto a reembolsar por el trabajo en centavos")
+
     class Config:
         from_attributes = True
 
 
+class EventRefundJobFailure(BaseModel):
+    """Operación de Stripe fallida de un trabajo de reembolsos."""
+    participation_id: int
+    member_id: int
+    action: str
+    error: Optional[str] = None
+
+
+class EventRefundJobProgress(BaseModel):
+    """Progreso del trabajo de reembolsos de un evento cancelado."""
+    job_id: int
+    event_id: int
+    status: str = Field(..., description="PENDING, RUNNING, COMPLETED o COMPLETED_WITH_ERRORS")
+    total_items: int = Field(..., description="Operaciones de Stripe del trabajo")
+    succeeded_items: int
+    failed_items: int
+    pending_items: int
+    scheduled_refund_cents: int = Field(..., description="Monto total a reembolsar en centavos")
+    refunded_cents: int = Field(..., description="Monto ya reembolsado en centavos")
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    failures: List[EventRefundJobFailure] = Field(default_factory=list)
+
+
 # Alias para Event usado en endpoints
 EventSchema = Event
 EventParticipationSchema = EventParticipation 
\ No newline at end of file
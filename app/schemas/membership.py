@@ -197,6 +197,7 @@ class MembershipStatus(BaseModel):
     days_remaining: Optional[int] = None
     plan_name: Optional[str] = None
     can_access: bool
+    membership_status: Optional[str] = None  # active, grace, overdue, expired
 
     class Config:
         from_attributes = True
@@ -260,4 +261,7 @@ class MembershipSummary(BaseModel):
     trial_members: int
     expired_members: int
     revenue_current_month: float
-    new_members_this_month: int 
\ No newline at end of file
+    new_members_this_month: int
+    expiring_members: int = 0  # Activas que vencen dentro de la ventana configurada
+    grace_members: int = 0
+    overdue_members: int = 0 
\ No newline at end of file
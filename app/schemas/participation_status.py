@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, Field
 from datetime import datetime
 from app.models.schedule import ClassParticipationStatus
@@ -47,4 +47,19 @@ class ParticipationStatusResponse(BaseModel):
                 }
             ]
         }
-    }
\ No newline at end of file
+    }
+
+class SessionStatusBatchResponse(BaseModel):
+    """Estado del usuario en un lote de sesiones (None si no participa)"""
+    statuses: Dict[int, Optional[ClassParticipationStatus]] = Field(
+        ...,
+        description="Mapa session_id -> estado de participación"
+    )
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {"statuses": {"123": "registered", "124": "waitlisted", "125": None}}
+            ]
+        }
+    }
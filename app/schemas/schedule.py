@@ -391,6 +391,7 @@ class SessionWithClassAndTimezone(BaseModel):
     """Esquema que combina SessionWithClass con información de timezone"""
     session: ClassSessionWithTimezone
     class_info: Class
+    my_status: Optional[ClassParticipationStatus] = None  # Estado del usuario actual en la sesión
 
     model_config = {
         "from_attributes": True,
@@ -522,6 +523,7 @@ class DailyScheduleResponse(BaseModel):
 class SessionWithClass(BaseModel):
     session: ClassSession
     class_info: Class
+    my_status: Optional[ClassParticipationStatus] = None  # Estado del usuario actual en la sesión
 
     model_config = {
         "from_attributes": True,
@@ -5,7 +5,8 @@ Este servicio procesa eventos del sistema (check-ins, logros, etc.) y los
 convierte en estadísticas agregadas anónimas para el Activity Feed.
 """
 
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from collections import defaultdict
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, or_
@@ -13,7 +14,7 @@ import json
 import logging
 
 from app.services.activity_feed_service import ActivityFeedService
-from app.models.schedule import ClassParticipation, ClassSession
+from app.models.schedule import ClassParticipation, ClassSession, ClassParticipationStatus
 from app.models.user import User
 
 logger = logging.getLogger(__name__)
@@ -38,6 +39,16 @@ class ActivityAggregator:
         "goals": 5,             # Publicar cada 5 metas cumplidas
     }
 
+    # Tipos de evento soportados por process_batch_events
+    EVENT_TYPES = (
+        "class_checkin",
+        "achievement_unlocked",
+        "streak_milestone",
+        "personal_record",
+        "goal_completed",
+        "class_completed",
+    )
+
     def __init__(self, feed_service: ActivityFeedService, db: Session = None):
         """
         Inicializa el agregador.
@@ -49,6 +60,212 @@ class ActivityAggregator:
         self.feed_service = feed_service
         self.db = db
 
+    # TTLs de los contadores (en segundos)
+    REALTIME_TTL = 300
+    DAILY_TTL = 86400
+    MILESTONE_TTL = 86400 * 7
+
+    def _counter_increments(self, event: Dict) -> List[Tuple[str, str, float, int]]:
+        """
+        Contadores que incrementa un evento.
+
+        Returns:
+            Lista de (nombre, key, incremento, ttl)
+        """
+        gym_id = event["gym_id"]
+        event_type = event.get("type")
+
+        if event_type == "class_checkin":
+            class_name = event.get("class_name", "Clase")
+            return [
+                ("class", f"gym:{gym_id}:realtime:by_class:{class_name.replace(' ', '_')}", 1, self.REALTIME_TTL),
+                ("total", f"gym:{gym_id}:realtime:training_count", 1, self.REALTIME_TTL),
+                ("attendance", f"gym:{gym_id}:daily:attendance", 1, self.DAILY_TTL),
+            ]
+
+        if event_type == "achievement_unlocked":
+            achievement_type = event.get("achievement_type", "general")
+            return [
+                ("daily", f"gym:{gym_id}:daily:achievements_count", 1, self.DAILY_TTL),
+                ("by_type", f"gym:{gym_id}:daily:achievements:{achievement_type}", 1, self.DAILY_TTL),
+            ]
+
+        if event_type == "streak_milestone":
+            days = event.get("streak_days", 0)
+            # Solo procesar hitos importantes
+            if days not in self.STREAK_MILESTONES:
+                return []
+            return [
+                ("milestone", f"gym:{gym_id}:daily:streak_{days}", 1, self.MILESTONE_TTL),
+                ("active", f"gym:{gym_id}:daily:active_streaks", 1, self.DAILY_TTL),
+            ]
+
+        if event_type == "personal_record":
+            return [("daily", f"gym:{gym_id}:daily:personal_records", 1, self.DAILY_TTL)]
+
+        if event_type == "goal_completed":
+            return [("daily", f"gym:{gym_id}:daily:goals_completed", 1, self.DAILY_TTL)]
+
+        if event_type == "class_completed":
+            participants = event.get("total_participants", 0)
+            duration = event.get("duration_minutes", 60)
+            return [
+                ("classes", f"gym:{gym_id}:daily:classes_completed", 1, self.DAILY_TTL),
+                # Horas totales entrenadas (aproximado)
+                ("hours", f"gym:{gym_id}:daily:total_hours", float(participants * (duration / 60)), self.DAILY_TTL),
+            ]
+
+        return []
+
+    def _ranking_increments(self, event: Dict) -> List[Dict]:
+        """
+        Incrementos de los rankings diarios que provoca un evento.
+
+        Solo los eventos que identifican al usuario (user_id en check-ins,
+        participant_ids en clases completadas) puntúan en rankings.
+        """
+        gym_id = event["gym_id"]
+        event_type = event.get("type")
+
+        if event_type == "class_checkin" and event.get("user_id"):
+            return [{
+                "gym_id": gym_id,
+                "ranking_type": "attendance",
+                "user_id": event["user_id"],
+                "amount": 1,
+                "name": event.get("user_name")
+            }]
+
+        if event_type == "class_completed" and event.get("participant_ids"):
+            hours = event.get("duration_minutes", 60) / 60
+            return [
+                {"gym_id": gym_id, "ranking_type": "activity", "user_id": user_id, "amount": hours}
+                for user_id in event["participant_ids"]
+            ]
+
+        return []
+
+    def _publications_for(self, event: Dict, counters: Dict[str, float]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Decide qué publicar para un evento a partir del valor de sus contadores
+        tras el incremento.
+
+        Returns:
+            (actividades en tiempo real, actividades que solo van al feed)
+        """
+        event_type = event.get("type")
+        realtime: List[Dict] = []
+        feed_only: List[Dict] = []
+
+        if event_type == "class_checkin":
+            class_name = event.get("class_name", "Clase")
+            total_count = counters["total"]
+            class_count = counters["class"]
+
+            # Publicar si es múltiplo del umbral
+            if total_count % self.PUBLISH_THRESHOLDS["check_ins"] == 0:
+                realtime.append({
+                    "activity_type": "training_count",
+                    "count": total_count,
+                    "metadata": {"source": "check_in"}
+                })
+
+            # Si la clase tiene suficientes personas, publicar como clase popular
+            if class_count >= 10 and class_count % 5 == 0:
+                realtime.append({
+                    "activity_type": "class_checkin",
+                    "count": class_count,
+                    "metadata": {"class_name": class_name}
+                })
+
+        elif event_type == "achievement_unlocked":
+            daily_count = counters["daily"]
+            if daily_count % self.PUBLISH_THRESHOLDS["achievements"] == 0:
+                realtime.append({
+                    "activity_type": "achievement_unlocked",
+                    "count": daily_count,
+                    "metadata": {
+                        "type": event.get("achievement_type", "general"),
+                        "today_total": daily_count
+                    }
+                })
+
+        elif event_type == "streak_milestone":
+            if "milestone" in counters:
+                realtime.append({
+                    "activity_type": "streak_milestone",
+                    "count": counters["milestone"],
+                    "metadata": {"days": event.get("streak_days", 0)}
+                })
+
+        elif event_type == "personal_record":
+            pr_count = counters["daily"]
+            if pr_count % self.PUBLISH_THRESHOLDS["personal_records"] == 0:
+                realtime.append({
+                    "activity_type": "pr_broken",
+                    "count": pr_count,
+                    "metadata": {"type": event.get("record_type", "general")}
+                })
+
+        elif event_type == "goal_completed":
+            goal_count = counters["daily"]
+            if goal_count % self.PUBLISH_THRESHOLDS["goals"] == 0:
+                realtime.append({
+                    "activity_type": "goal_completed",
+                    "count": goal_count,
+                    "metadata": {"type": event.get("goal_type", "general")}
+                })
+
+        elif event_type == "class_completed":
+            participants = event.get("total_participants", 0)
+            # Si la clase tuvo muchos participantes, publicar
+            if participants >= 15:
+                feed_only.append({
+                    "type": "class_completed",
+                    "message": f"✅ Clase completada con {participants} guerreros",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "icon": "✅"
+                })
+
+        return realtime, feed_only
+
+    async def _process_gym_events(self, gym_id: int, events: List[Dict]) -> List[Dict[str, float]]:
+        """
+        Procesa eventos de un mismo gimnasio con dos round-trips a Redis: una
+        transacción con todos los contadores y rankings y otra con todas las
+        publicaciones.
+
+        Returns:
+            Valor de los contadores de cada evento tras procesarlo
+        """
+        plans = [self._counter_increments(event) for event in events]
+        values = await self.feed_service.increment_counters(
+            [(key, amount, ttl) for plan in plans for _name, key, amount, ttl in plan],
+            ranking_increments=[ranking for event in events for ranking in self._ranking_increments(event)]
+        )
+
+        # Los INCR de la transacción se aplican en orden, así que cada evento
+        # ve exactamente el valor que habría visto procesado individualmente
+        counters_by_event = []
+        realtime: List[Dict] = []
+        feed_only: List[Dict] = []
+        position = 0
+        for event, plan in zip(events, plans):
+            counters = {name: values[position + i] for i, (name, _key, _amount, _ttl) in enumerate(plan)}
+            position += len(plan)
+            counters_by_event.append(counters)
+
+            if not plan:
+                continue
+            event_realtime, event_feed_only = self._publications_for(event, counters)
+            realtime.extend(event_realtime)
+            feed_only.extend(event_feed_only)
+
+        if realtime or feed_only:
+            await self.feed_service.publish_realtime_activities(gym_id, realtime, extra_feed_items=feed_only)
+
+        return counters_by_event
+
     async def on_class_checkin(self, event: Dict):
         """
         Procesa check-in a clase.
@@ -59,44 +276,14 @@ class ActivityAggregator:
                 - class_name: Nombre de la clase
                 - class_id: ID de la clase
                 - session_id: ID de la sesión
+                - user_id: ID del usuario (opcional, puntúa en el ranking de asistencia)
+                - user_name: Nombre a mostrar en el ranking (opcional)
         """
         gym_id = event["gym_id"]
         class_name = event.get("class_name", "Clase")
+        counters = (await self._process_gym_events(gym_id, [{**event, "type": "class_checkin"}]))[0]
 
-        # Incrementar contador de clase específica
-        class_key = f"gym:{gym_id}:realtime:by_class:{class_name.replace(' ', '_')}"
-        class_count = await self.feed_service.redis.incr(class_key)
-        await self.feed_service.redis.expire(class_key, 300)  # 5 minutos
-
-        # Incrementar contador total
-        total_key = f"gym:{gym_id}:realtime:training_count"
-        total_count = await self.feed_service.redis.incr(total_key)
-        await self.feed_service.redis.expire(total_key, 300)
-
-        # Incrementar contador diario de asistencia
-        daily_key = f"gym:{gym_id}:daily:attendance"
-        await self.feed_service.redis.incr(daily_key)
-        await self.feed_service.redis.expire(daily_key, 86400)
-
-        # Publicar si es múltiplo del umbral
-        if total_count % self.PUBLISH_THRESHOLDS["check_ins"] == 0:
-            await self.feed_service.publish_realtime_activity(
-                gym_id=gym_id,
-                activity_type="training_count",
-                count=total_count,
-                metadata={"source": "check_in"}
-            )
-
-        # Si la clase tiene suficientes personas, publicar como clase popular
-        if class_count >= 10 and class_count % 5 == 0:
-            await self.feed_service.publish_realtime_activity(
-                gym_id=gym_id,
-                activity_type="class_checkin",
-                count=class_count,
-                metadata={"class_name": class_name}
-            )
-
-        logger.info(f"Check-in procesado: gym={gym_id}, total={total_count}, {class_name}={class_count}")
+        logger.info(f"Check-in procesado: gym={gym_id}, total={counters['total']}, {class_name}={counters['class']}")
 
     async def on_achievement_unlocked(self, event: Dict):
         """
@@ -110,33 +297,9 @@ class ActivityAggregator:
         """
         gym_id = event["gym_id"]
         achievement_type = event.get("achievement_type", "general")
+        counters = (await self._process_gym_events(gym_id, [{**event, "type": "achievement_unlocked"}]))[0]
 
-        # Incrementar contador diario de logros
-        daily_count = await self.feed_service.update_aggregate_stats(
-            gym_id=gym_id,
-            stat_type="achievements_count",
-            value=1,
-            increment=True
-        )
-
-        # Incrementar contador por tipo
-        type_key = f"gym:{gym_id}:daily:achievements:{achievement_type}"
-        type_count = await self.feed_service.redis.incr(type_key)
-        await self.feed_service.redis.expire(type_key, 86400)
-
-        # Publicar cada X logros
-        if daily_count % self.PUBLISH_THRESHOLDS["achievements"] == 0:
-            await self.feed_service.publish_realtime_activity(
-                gym_id=gym_id,
-                activity_type="achievement_unlocked",
-                count=daily_count,
-                metadata={
-                    "type": achievement_type,
-                    "today_total": daily_count
-                }
-            )
-
-        logger.info(f"Logro procesado: gym={gym_id}, total_hoy={daily_count}, tipo={achievement_type}")
+        logger.info(f"Logro procesado: gym={gym_id}, total_hoy={counters['daily']}, tipo={achievement_type}")
 
     async def on_streak_milestone(self, event: Dict):
         """
@@ -154,25 +317,9 @@ class ActivityAggregator:
         if days not in self.STREAK_MILESTONES:
             return
 
-        # Contar personas con este hito
-        milestone_key = f"gym:{gym_id}:daily:streak_{days}"
-        count = await self.feed_service.redis.incr(milestone_key)
-        await self.feed_service.redis.expire(milestone_key, 86400 * 7)  # 7 días para hitos
-
-        # Actualizar contador de rachas activas
-        active_key = f"gym:{gym_id}:daily:active_streaks"
-        await self.feed_service.redis.incr(active_key)
-        await self.feed_service.redis.expire(active_key, 86400)
-
-        # Publicar hito
-        await self.feed_service.publish_realtime_activity(
-            gym_id=gym_id,
-            activity_type="streak_milestone",
-            count=count,
-            metadata={"days": days}
-        )
+        counters = (await self._process_gym_events(gym_id, [{**event, "type": "streak_milestone"}]))[0]
 
-        logger.info(f"Hito de racha: gym={gym_id}, {days} días, {count} personas")
+        logger.info(f"Hito de racha: gym={gym_id}, {days} días, {counters['milestone']} personas")
 
     async def on_personal_record(self, event: Dict):
         """
@@ -184,26 +331,9 @@ class ActivityAggregator:
                 - record_type: Tipo de récord (weight, time, reps, etc)
         """
         gym_id = event["gym_id"]
-        record_type = event.get("record_type", "general")
-
-        # Incrementar contador diario de PRs
-        pr_count = await self.feed_service.update_aggregate_stats(
-            gym_id=gym_id,
-            stat_type="personal_records",
-            value=1,
-            increment=True
-        )
-
-        # Publicar cada X PRs
-        if pr_count % self.PUBLISH_THRESHOLDS["personal_records"] == 0:
-            await self.feed_service.publish_realtime_activity(
-                gym_id=gym_id,
-                activity_type="pr_broken",
-                count=pr_count,
-                metadata={"type": record_type}
-            )
+        counters = (await self._process_gym_events(gym_id, [{**event, "type": "personal_record"}]))[0]
 
-        logger.info(f"PR procesado: gym={gym_id}, total_hoy={pr_count}")
+        logger.info(f"PR procesado: gym={gym_id}, total_hoy={counters['daily']}")
 
     async def on_goal_completed(self, event: Dict):
         """
@@ -215,26 +345,9 @@ class ActivityAggregator:
                 - goal_type: Tipo de meta
         """
         gym_id = event["gym_id"]
-        goal_type = event.get("goal_type", "general")
-
-        # Incrementar contador de metas
-        goal_count = await self.feed_service.update_aggregate_stats(
-            gym_id=gym_id,
-            stat_type="goals_completed",
-            value=1,
-            increment=True
-        )
-
-        # Publicar cada X metas
-        if goal_count % self.PUBLISH_THRESHOLDS["goals"] == 0:
-            await self.feed_service.publish_realtime_activity(
-                gym_id=gym_id,
-                activity_type="goal_completed",
-                count=goal_count,
-                metadata={"type": goal_type}
-            )
+        counters = (await self._process_gym_events(gym_id, [{**event, "type": "goal_completed"}]))[0]
 
-        logger.info(f"Meta completada: gym={gym_id}, total_hoy={goal_count}")
+        logger.info(f"Meta completada: gym={gym_id}, total_hoy={counters['daily']}")
 
     async def on_class_completed(self, event: Dict):
         """
@@ -246,37 +359,12 @@ class ActivityAggregator:
                 - class_name: Nombre de la clase
                 - total_participants: Total de participantes
                 - duration_minutes: Duración en minutos
+                - participant_ids: IDs de los asistentes (opcional, puntúan en el ranking de actividad)
         """
         gym_id = event["gym_id"]
-        participants = event.get("total_participants", 0)
-        duration = event.get("duration_minutes", 60)
-
-        # Incrementar contador de clases completadas
-        classes_key = f"gym:{gym_id}:daily:classes_completed"
-        classes_count = await self.feed_service.redis.incr(classes_key)
-        await self.feed_service.redis.expire(classes_key, 86400)
-
-        # Actualizar horas totales entrenadas (aproximado)
-        hours_key = f"gym:{gym_id}:daily:total_hours"
-        total_hours = participants * (duration / 60)
-        current_hours = await self.feed_service.redis.get(hours_key) or 0
-        new_total = float(current_hours) + total_hours
-        await self.feed_service.redis.setex(hours_key, 86400, new_total)
-
-        # Si la clase tuvo muchos participantes, publicar
-        if participants >= 15:
-            message = f"✅ Clase completada con {participants} guerreros"
-            activity = {
-                "type": "class_completed",
-                "message": message,
-                "timestamp": datetime.utcnow().isoformat(),
-                "icon": "✅"
-            }
+        await self._process_gym_events(gym_id, [{**event, "type": "class_completed"}])
 
-            feed_key = f"gym:{gym_id}:feed:activities"
-            await self.feed_service.redis.lpush(feed_key, json.dumps(activity))
-
-        logger.info(f"Clase completada: gym={gym_id}, participantes={participants}")
+        logger.info(f"Clase completada: gym={gym_id}, participantes={event.get('total_participants', 0)}")
 
     async def calculate_hourly_summary(self, gym_id: int):
         """
@@ -317,65 +405,66 @@ class ActivityAggregator:
 
         logger.info(f"Resumen horario generado: gym={gym_id}, {len(messages)} insights")
 
-    async def update_daily_rankings(self, gym_id: int):
+    async def reconcile_daily_rankings(self, gym_id: int) -> Dict[str, Dict[str, int]]:
         """
-        Actualiza rankings diarios anónimos.
+        Reconcilia los rankings diarios incrementales con la BD.
+
+        Los rankings se mantienen en tiempo real desde los eventos; este método
+        corrige la deriva (eventos perdidos, asistencias anuladas) escribiendo
+        solo las diferencias.
 
         Args:
             gym_id: ID del gimnasio
+
+        Returns:
+            Cambios aplicados por tipo de ranking
         """
         if not self.db:
-            logger.warning("No hay sesión de BD para actualizar rankings")
-            return
+            logger.warning("No hay sesión de BD para reconciliar rankings")
+            return {}
+
+        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        hours = func.sum(func.extract("epoch", ClassSession.end_time - ClassSession.start_time)) / 3600
+
+        rows = self.db.query(
+            User.id.label("user_id"),
+            User.first_name,
+            User.last_name,
+            func.count(ClassParticipation.id).label("attendance_count"),
+            hours.label("activity_hours")
+        ).join(
+            ClassParticipation, ClassParticipation.member_id == User.id
+        ).join(
+            ClassSession, ClassSession.id == ClassParticipation.session_id
+        ).filter(
+            and_(
+                ClassSession.gym_id == gym_id,
+                ClassSession.start_time >= today_start,
+                ClassParticipation.status == ClassParticipationStatus.ATTENDED
+            )
+        ).group_by(User.id, User.first_name, User.last_name).all()
+
+        def entries(value_attr: str) -> List[Dict]:
+            return [
+                {
+                    "user_id": row.user_id,
+                    "name": self.feed_service.format_ranking_name(row.first_name, row.last_name),
+                    "value": float(getattr(row, value_attr) or 0)
+                }
+                for row in rows
+            ]
+
+        result = {
+            "attendance": await self.feed_service.reconcile_ranking(
+                gym_id, "attendance", entries("attendance_count"), period="daily"
+            ),
+            "activity": await self.feed_service.reconcile_ranking(
+                gym_id, "activity", entries("activity_hours"), period="daily"
+            ),
+        }
 
-        try:
-            # Obtener estadísticas agregadas del día
-            today = datetime.utcnow().date()
-            start_of_day = datetime.combine(today, datetime.min.time())
-
-            # Top de consistencia (rachas) - solo valores
-            consistency_query = self.db.query(
-                func.count(User.id)
-            ).filter(
-                User.gym_id == gym_id,
-                User.current_streak > 0
-            ).group_by(User.current_streak).order_by(User.current_streak.desc()).limit(20)
-
-            streak_values = [row[0] for row in consistency_query.all()]
-
-            if streak_values:
-                await self.feed_service.add_anonymous_ranking(
-                    gym_id=gym_id,
-                    ranking_type="consistency",
-                    values=streak_values,
-                    period="daily"
-                )
-
-            # Top de asistencia del día - solo cantidades
-            attendance_query = self.db.query(
-                func.count(ClassParticipation.id)
-            ).join(ClassSession).filter(
-                and_(
-                    ClassSession.gym_id == gym_id,
-                    ClassSession.scheduled_at >= start_of_day,
-                    ClassParticipation.attended == True
-                )
-            ).group_by(ClassParticipation.user_id).all()
-
-            attendance_values = [row[0] for row in attendance_query if row[0] > 0]
-
-            if attendance_values:
-                await self.feed_service.add_anonymous_ranking(
-                    gym_id=gym_id,
-                    ranking_type="attendance",
-                    values=attendance_values,
-                    period="daily"
-                )
-
-            logger.info(f"Rankings actualizados: gym={gym_id}")
-
-        except Exception as e:
-            logger.error(f"Error actualizando rankings: {e}")
+        logger.info(f"Rankings reconciliados: gym={gym_id}, {result}")
+        return result
 
     async def generate_motivational_burst(self, gym_id: int):
         """
@@ -486,26 +575,21 @@ class ActivityAggregator:
         """
         Procesa múltiples eventos en batch.
 
+        Los eventos se agrupan por gimnasio y cada grupo se ingiere con dos
+        round-trips a Redis en lugar de varios por evento.
+
         Args:
             events: Lista de eventos para procesar
         """
+        events_by_gym: Dict[int, List[Dict]] = defaultdict(list)
         for event in events:
-            event_type = event.get("type")
-
-            handlers = {
-                "class_checkin": self.on_class_checkin,
-                "achievement_unlocked": self.on_achievement_unlocked,
-                "streak_milestone": self.on_streak_milestone,
-                "personal_record": self.on_personal_record,
-                "goal_completed": self.on_goal_completed,
-                "class_completed": self.on_class_completed
-            }
+            if event.get("type") in self.EVENT_TYPES and "gym_id" in event:
+                events_by_gym[event["gym_id"]].append(event)
 
-            handler = handlers.get(event_type)
-            if handler:
-                try:
-                    await handler(event)
-                except Exception as e:
-                    logger.error(f"Error procesando evento {event_type}: {e}")
+        for gym_id, gym_events in events_by_gym.items():
+            try:
+                await self._process_gym_events(gym_id, gym_events)
+            except Exception as e:
+                logger.error(f"Error procesando {len(gym_events)} eventos del gym {gym_id}: {e}")
 
-        logger.info(f"Procesados {len(events)} eventos en batch")
\ No newline at end of file
+        logger.info(f"Procesados {len(events)} eventos en batch")
@@ -0,0 +1,255 @@
+"""
+Activity Feed Broadcaster - Difusión en tiempo real del feed por gimnasio.
+
+`ActivityFeedService` publica cada actividad en `gym:{gym_id}:feed:updates`.
+En lugar de abrir una suscripción pub/sub de Redis por cliente conectado, cada
+worker mantiene una única suscripción por patrón (`gym:*:feed:updates`) y
+reparte los mensajes a las colas de los clientes SSE/WebSocket de cada
+gimnasio.
+
+Backpressure: cada cliente tiene una cola acotada. Si un cliente lento la
+llena se descarta su mensaje más antiguo, y si acumula demasiados descartes
+seguidos se le desconecta para que vuelva a conectarse y pida el feed
+completo.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set
+
+from redis.asyncio import Redis
+
+from app.core.metrics.base import (
+    activity_feed_stream_connections,
+    activity_feed_stream_messages_total,
+    activity_feed_stream_slow_disconnects_total,
+)
+
+logger = logging.getLogger(__name__)
+
+# Centinela que indica al cliente que su suscripción se ha cerrado
+_CLOSE = object()
+
+
+@dataclass(eq=False)
+class FeedSubscriber:
+    """Cliente conectado al feed en tiempo real de un gimnasio."""
+    gym_id: int
+    transport: str
+    queue: asyncio.Queue
+    dropped: int = 0
+    closed: bool = False
+    close_reason: Optional[str] = None
+
+    async def receive(self) -> Optional[Dict[str, Any]]:
+        """
+        Espera la siguiente actividad.
+
+        Returns:
+            La actividad, o None si el broadcaster cerró la suscripción
+        """
+        message = await self.queue.get()
+        return None if message is _CLOSE else message
+
+
+class ActivityFeedBroadcaster:
+    """
+    Suscriptor único de Redis por worker que reparte el feed a los clientes.
+    """
+
+    CHANNEL_PATTERN = "gym:*:feed:updates"
+
+    # Mensajes pendientes por cliente antes de empezar a descartar
+    CLIENT_QUEUE_SIZE = 50
+    # Descartes consecutivos tras los que se desconecta al cliente
+    MAX_CONSECUTIVE_DROPS = 100
+    # Espera antes de reintentar la suscripción si Redis falla
+    RECONNECT_DELAY_SECONDS = 2.0
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[FeedSubscriber]] = defaultdict(set)
+        self._listener: Optional[asyncio.Task] = None
+        self._redis: Optional[Redis] = None
+        self._stats = {
+            "messages_received": 0,
+            "messages_delivered": 0,
+            "messages_dropped": 0,
+            "slow_disconnects": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def _ensure_listener(self, redis: Redis) -> None:
+        if self._listener is None or self._listener.done():
+            self._redis = redis
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Detiene la suscripción y cierra todas las conexiones de clientes."""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in list(subscribers):
+                self._close(subscriber, "shutdown")
+
+    async def _listen(self) -> None:
+        """Bucle del suscriptor compartido, con reconexión ante errores."""
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(self.CHANNEL_PATTERN)
+                logger.info(f"Suscrito a {self.CHANNEL_PATTERN} para el feed en tiempo real")
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "pmessage":
+                        self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en el suscriptor del feed en tiempo real: {e}")
+                await asyncio.sleep(self.RECONNECT_DELAY_SECONDS)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    # ------------------------------------------------------------------
+    # Suscripciones de clientes
+    # ------------------------------------------------------------------
+
+    def subscribe(self, redis: Redis, gym_id: int, transport: str) -> FeedSubscriber:
+        """
+        Registra un cliente para recibir el feed de un gimnasio.
+
+        Args:
+            redis: Cliente Redis (se usa para arrancar el suscriptor compartido)
+            gym_id: ID del gimnasio
+            transport: "sse" o "websocket" (para métricas)
+
+        Returns:
+            Suscripción del cliente; debe liberarse con `unsubscribe`
+        """
+        subscriber = FeedSubscriber(
+            gym_id=gym_id,
+            transport=transport,
+            queue=asyncio.Queue(maxsize=self.CLIENT_QUEUE_SIZE)
+        )
+        self._subscribers[gym_id].add(subscriber)
+        activity_feed_stream_connections.labels(transport=transport).inc()
+        self._ensure_listener(redis)
+        return subscriber
+
+    def unsubscribe(self, subscriber: FeedSubscriber) -> None:
+        """Libera la suscripción de un cliente desconectado."""
+        subscribers = self._subscribers.get(subscriber.gym_id)
+        if subscribers is None or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[subscriber.gym_id]
+        activity_feed_stream_connections.labels(transport=subscriber.transport).dec()
+
+    def _close(self, subscriber: FeedSubscriber, reason: str) -> None:
+        subscriber.closed = True
+        subscriber.close_reason = reason
+        self.unsubscribe(subscriber)
+        # Vaciar la cola para garantizar que el centinela cabe
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(_CLOSE)
+
+    # ------------------------------------------------------------------
+    # Reparto
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _gym_id_from_channel(channel: str) -> Optional[int]:
+        # gym:{gym_id}:feed:updates
+        try:
+            return int(channel.split(":")[1])
+        except (IndexError, ValueError):
+            return None
+
+    def _dispatch(self, channel: Any, data: Any) -> int:
+        """
+        Reparte un mensaje de Redis a los clientes del gimnasio.
+
+        Returns:
+            Número de clientes a los que se entregó
+        """
+        if isinstance(channel, bytes):
+            channel = channel.decode("utf-8")
+        gym_id = self._gym_id_from_channel(channel)
+        subscribers = self._subscribers.get(gym_id)
+        if not subscribers:
+            return 0
+
+        try:
+            activity = json.loads(data)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error decodificando mensaje del feed: {e}")
+            return 0
+
+        self._stats["messages_received"] += 1
+        delivered = 0
+        for subscriber in list(subscribers):
+            if self._offer(subscriber, activity):
+                delivered += 1
+        return delivered
+
+    def _offer(self, subscriber: FeedSubscriber, activity: Dict[str, Any]) -> bool:
+        """Encola una actividad para un cliente sin bloquear el reparto."""
+        if subscriber.queue.full():
+            # Cliente lento: descartar el mensaje más antiguo
+            subscriber.queue.get_nowait()
+            subscriber.dropped += 1
+            self._stats["messages_dropped"] += 1
+            activity_feed_stream_messages_total.labels(status="dropped").inc()
+
+            if subscriber.dropped >= self.MAX_CONSECUTIVE_DROPS:
+                logger.warning(
+                    f"Cliente {subscriber.transport} del gym {subscriber.gym_id} desconectado por lentitud"
+                )
+                self._stats["slow_disconnects"] += 1
+                activity_feed_stream_slow_disconnects_total.inc()
+                self._close(subscriber, "slow_consumer")
+                return False
+        else:
+            subscriber.dropped = 0
+
+        subscriber.queue.put_nowait(activity)
+        self._stats["messages_delivered"] += 1
+        activity_feed_stream_messages_total.labels(status="delivered").inc()
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Métricas de conexiones y mensajes de este worker.
+        """
+        by_transport: Dict[str, int] = defaultdict(int)
+        for subscribers in self._subscribers.values():
+            for subscriber in subscribers:
+                by_transport[subscriber.transport] += 1
+
+        return {
+            "listener_running": self._listener is not None and not self._listener.done(),
+            "connections": sum(by_transport.values()),
+            "connections_by_transport": dict(by_transport),
+            "gyms_connected": len(self._subscribers),
+            **self._stats,
+        }
+
+
+activity_feed_broadcaster = ActivityFeedBroadcaster()
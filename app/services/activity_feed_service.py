@@ -7,7 +7,7 @@ solo cantidades y estadísticas agregadas, sin exponer nombres de usuarios.
 Principio: "Números que motivan, sin nombres que comprometan"
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import json
 import asyncio
 from datetime import datetime, timedelta
@@ -51,6 +51,9 @@ class ActivityFeedService:
         "motivational": "💫"
     }
 
+    # Tamaño máximo de la lista del feed por gimnasio
+    FEED_MAX_ITEMS = 100
+
     def __init__(self, redis: Redis):
         """
         Inicializa el servicio con conexión a Redis.
@@ -60,7 +63,7 @@ class ActivityFeedService:
         """
         self.redis = redis
 
-    async def publish_realtime_activity(
+    def build_realtime_activity(
         self,
         gym_id: int,
         activity_type: str,
@@ -68,51 +71,159 @@ class ActivityFeedService:
         metadata: Optional[Dict] = None
     ) -> Optional[Dict]:
         """
-        Publica actividad en tiempo real (solo cantidades).
-
-        Args:
-            gym_id: ID del gimnasio
-            activity_type: Tipo de actividad
-            count: Cantidad/número para mostrar
-            metadata: Metadatos adicionales (opcional)
+        Construye el mensaje de una actividad en tiempo real sin escribir en Redis.
 
         Returns:
-            Dict con la actividad publicada o None si no cumple umbral
+            Dict con la actividad o None si no cumple el umbral de privacidad
         """
         # No publicar si está por debajo del umbral de privacidad
         if count < self.MIN_AGGREGATION_THRESHOLD and activity_type in ["training_count", "class_checkin"]:
             logger.info(f"Actividad no publicada: count={count} < threshold={self.MIN_AGGREGATION_THRESHOLD}")
             return None
 
-        # Actualizar contador en Redis
-        key = f"gym:{gym_id}:realtime:{activity_type}"
-        await self.redis.setex(key, self.TTL_CONFIG["realtime"], count)
-
-        # Crear mensaje para feed
-        activity = {
-            "id": f"{gym_id}_{activity_type}_{datetime.utcnow().timestamp()}",
+        now = datetime.utcnow()
+        return {
+            "id": f"{gym_id}_{activity_type}_{now.timestamp()}",
             "type": "realtime",
             "subtype": activity_type,
             "count": count,
             "message": self._generate_message(activity_type, count, metadata),
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": now.isoformat(),
             "icon": self.ACTIVITY_ICONS.get(activity_type, "📊"),
             "ttl_minutes": self.TTL_CONFIG["realtime"] // 60
         }
 
-        # Agregar al feed
+    def _queue_feed_items(
+        self,
+        pipe,
+        gym_id: int,
+        activities: List[Dict],
+        publish: bool = True
+    ) -> None:
+        """
+        Encola en un pipeline la inserción de actividades en el feed del gimnasio.
+
+        Un único LPUSH con todas las actividades, seguido de LTRIM y EXPIRE una
+        sola vez, y un PUBLISH por actividad para los subscriptores real-time.
+        """
+        if not activities:
+            return
+
         feed_key = f"gym:{gym_id}:feed:activities"
-        await self.redis.lpush(feed_key, json.dumps(activity))
-        await self.redis.ltrim(feed_key, 0, 99)  # Mantener últimas 100 actividades
-        await self.redis.expire(feed_key, self.TTL_CONFIG["feed"])
+        payloads = [json.dumps(activity) for activity in activities]
+        pipe.lpush(feed_key, *payloads)
+        pipe.ltrim(feed_key, 0, self.FEED_MAX_ITEMS - 1)  # Mantener últimas 100 actividades
+        pipe.expire(feed_key, self.TTL_CONFIG["feed"])
+
+        if publish:
+            channel = f"gym:{gym_id}:feed:updates"
+            for payload in payloads:
+                pipe.publish(channel, payload)
+
+    async def publish_realtime_activity(
+        self,
+        gym_id: int,
+        activity_type: str,
+        count: int,
+        metadata: Optional[Dict] = None
+    ) -> Optional[Dict]:
+        """
+        Publica actividad en tiempo real (solo cantidades).
+
+        Args:
+            gym_id: ID del gimnasio
+            activity_type: Tipo de actividad
+            count: Cantidad/número para mostrar
+            metadata: Metadatos adicionales (opcional)
+
+        Returns:
+            Dict con la actividad publicada o None si no cumple umbral
+        """
+        published = await self.publish_realtime_activities(
+            gym_id,
+            [{"activity_type": activity_type, "count": count, "metadata": metadata}]
+        )
+        return published[0] if published else None
+
+    async def publish_realtime_activities(
+        self,
+        gym_id: int,
+        items: List[Dict],
+        extra_feed_items: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        """
+        Publica varias actividades de un gimnasio en una sola transacción
+        (MULTI/EXEC, un único round-trip a Redis).
+
+        Args:
+            gym_id: ID del gimnasio
+            items: Lista de dicts con activity_type, count y metadata (opcional)
+            extra_feed_items: Actividades ya construidas que solo se añaden al feed
+
+        Returns:
+            Lista de actividades publicadas (las que superan el umbral)
+        """
+        activities = []
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for item in items:
+                activity_type = item["activity_type"]
+                count = item["count"]
+                activity = self.build_realtime_activity(gym_id, activity_type, count, item.get("metadata"))
+                if activity is None:
+                    continue
+
+                # Actualizar contador en Redis
+                pipe.setex(f"gym:{gym_id}:realtime:{activity_type}", self.TTL_CONFIG["realtime"], count)
+                activities.append(activity)
+
+            # El feed es una lista LPUSH: la actividad más reciente va al final del lote
+            self._queue_feed_items(pipe, gym_id, activities)
+            self._queue_feed_items(pipe, gym_id, extra_feed_items or [], publish=False)
 
-        # Publicar para subscriptores real-time (WebSocket)
-        channel = f"gym:{gym_id}:feed:updates"
-        await self.redis.publish(channel, json.dumps(activity))
+            if activities or extra_feed_items:
+                await pipe.execute()
 
-        logger.info(f"Actividad publicada: {activity_type} con count={count} para gym={gym_id}")
+        for activity in activities:
+            logger.info(f"Actividad publicada: {activity['subtype']} con count={activity['count']} para gym={gym_id}")
 
-        return activity
+        return activities
+
+    async def increment_counters(
+        self,
+        increments: List[Tuple[str, float, int]],
+        ranking_increments: Optional[List[Dict]] = None
+    ) -> List[float]:
+        """
+        Incrementa varios contadores y renueva su TTL en una sola transacción.
+
+        Args:
+            increments: Lista de (key, incremento, ttl_segundos). Los incrementos
+                enteros usan INCRBY y los decimales INCRBYFLOAT.
+            ranking_increments: Incrementos de rankings que se aplican en la
+                misma transacción (ver `_queue_ranking_increment`)
+
+        Returns:
+            Valor de cada contador tras su incremento, en el mismo orden
+        """
+        if not increments and not ranking_increments:
+            return []
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for key, amount, ttl in increments:
+                if isinstance(amount, float):
+                    pipe.incrbyfloat(key, amount)
+                else:
+                    pipe.incrby(key, amount)
+                pipe.expire(key, ttl)
+            for ranking in ranking_increments or []:
+                self._queue_ranking_increment(pipe, **ranking)
+            results = await pipe.execute()
+
+        # Los resultados alternan valor del contador / resultado de EXPIRE
+        return [
+            float(value) if isinstance(amount, float) else int(value)
+            for value, (_key, amount, _ttl) in zip(results[:2 * len(increments):2], increments)
+        ]
 
     async def update_aggregate_stats(
         self,
@@ -136,8 +247,7 @@ class ActivityFeedService:
         key = f"gym:{gym_id}:daily:{stat_type}"
 
         if increment:
-            new_value = await self.redis.incr(key)
-            await self.redis.expire(key, self.TTL_CONFIG["daily"])
+            new_value = (await self.increment_counters([(key, 1, self.TTL_CONFIG["daily"])]))[0]
         else:
             await self.redis.setex(key, self.TTL_CONFIG["daily"], value)
             new_value = value
@@ -361,10 +471,9 @@ class ActivityFeedService:
             }
 
             # Agregar al feed
-            feed_key = f"gym:{gym_id}:feed:activities"
-            await self.redis.lpush(feed_key, json.dumps(activity))
-            await self.redis.ltrim(feed_key, 0, 99)
-            await self.redis.expire(feed_key, self.TTL_CONFIG["feed"])
+            async with self.redis.pipeline(transaction=True) as pipe:
+                self._queue_feed_items(pipe, gym_id, [activity], publish=False)
+                await pipe.execute()
 
             return activity
 
@@ -411,6 +520,42 @@ class ActivityFeedService:
             "top_values": values[:10] if len(values) >= 10 else values
         }
 
+    @staticmethod
+    def _ranking_keys(gym_id: int, ranking_type: str, period: str) -> Tuple[str, str, str]:
+        key = f"gym:{gym_id}:rankings:{period}:{ranking_type}"
+        return key, f"{key}:names", f"{key}:users"
+
+    @staticmethod
+    def format_ranking_name(first_name: Optional[str], last_name: Optional[str]) -> str:
+        """Nombre corto para mostrar en rankings ("Ana G.")."""
+        first_name = first_name or ""
+        return f"{first_name} {last_name[0]}." if last_name else first_name
+
+    def _queue_ranking_increment(
+        self,
+        pipe,
+        gym_id: int,
+        ranking_type: str,
+        user_id: int,
+        amount: float,
+        name: Optional[str] = None,
+        period: str = "daily"
+    ) -> None:
+        """
+        Encola el incremento de la puntuación de un usuario en un ranking.
+
+        El ranking es un sorted set con el user_id como miembro, así que se
+        mantiene al día con ZINCRBY sin recalcularlo.
+        """
+        key, names_key, _users_key = self._ranking_keys(gym_id, ranking_type, period)
+        ttl = self.TTL_CONFIG.get(period, self.TTL_CONFIG["weekly"])
+
+        pipe.zincrby(key, amount, str(user_id))
+        pipe.expire(key, ttl)
+        if name:
+            pipe.hsetnx(names_key, str(user_id), name)
+            pipe.expire(names_key, ttl)
+
     async def add_named_ranking(
         self,
         gym_id: int,
@@ -430,36 +575,26 @@ class ActivityFeedService:
         Returns:
             Ranking creado
         """
-        key = f"gym:{gym_id}:rankings:{period}:{ranking_type}"
-        names_key = f"gym:{gym_id}:rankings:{period}:{ranking_type}:names"
-        users_key = f"gym:{gym_id}:rankings:{period}:{ranking_type}:users"
-
-        # Limpiar ranking anterior
-        await self.redis.delete(key)
-        await self.redis.delete(names_key)
-        await self.redis.delete(users_key)
+        key, names_key, users_key = self._ranking_keys(gym_id, ranking_type, period)
 
-        # Agregar valores con nombres y user_ids
+        # Valores con nombres; el miembro es el user_id (o la posición si no hay usuario)
+        scores = {}
         names_map = {}
-        users_map = {}
         for i, entry in enumerate(entries[:20]):  # Top 20
-            member_key = f"pos_{i+1}"
-            await self.redis.zadd(key, {member_key: entry["value"]})
+            member_key = str(entry["user_id"]) if entry.get("user_id") else f"pos_{i+1}"
+            scores[member_key] = entry["value"]
             names_map[member_key] = entry["name"]
-            if entry.get("user_id"):
-                users_map[member_key] = str(entry["user_id"])
 
-        # Guardar nombres y user_ids en hashes separados
-        if names_map:
-            await self.redis.hset(names_key, mapping=names_map)
-        if users_map:
-            await self.redis.hset(users_key, mapping=users_map)
-
-        # Establecer TTL según período
         ttl = self.TTL_CONFIG.get(period, self.TTL_CONFIG["weekly"])
-        await self.redis.expire(key, ttl)
-        await self.redis.expire(names_key, ttl)
-        await self.redis.expire(users_key, ttl)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            # Limpiar ranking anterior
+            pipe.delete(key, names_key, users_key)
+            if scores:
+                pipe.zadd(key, scores)
+                pipe.hset(names_key, mapping=names_map)
+            pipe.expire(key, ttl)
+            pipe.expire(names_key, ttl)
+            await pipe.execute()
 
         logger.info(f"Ranking con nombres actualizado: {ranking_type} con {len(entries)} entradas")
 
@@ -469,6 +604,62 @@ class ActivityFeedService:
             "entries": entries[:20]
         }
 
+    async def reconcile_ranking(
+        self,
+        gym_id: int,
+        ranking_type: str,
+        entries: List[Dict],
+        period: str = "daily"
+    ) -> Dict[str, int]:
+        """
+        Corrige un ranking incremental contra los valores reales de la BD.
+
+        Solo escribe las diferencias: usuarios con puntuación distinta, usuarios
+        que faltan y usuarios que ya no deberían estar (p. ej. asistencia anulada).
+
+        Args:
+            gym_id: ID del gimnasio
+            ranking_type: Tipo de ranking
+            entries: Valores reales, lista de dicts con {user_id, name, value}
+            period: Período del ranking
+
+        Returns:
+            Número de miembros actualizados y eliminados
+        """
+        key, names_key, _users_key = self._ranking_keys(gym_id, ranking_type, period)
+        current = {
+            (member.decode() if isinstance(member, bytes) else member): score
+            for member, score in await self.redis.zrange(key, 0, -1, withscores=True)
+        }
+        expected = {str(entry["user_id"]): float(entry["value"]) for entry in entries if entry["value"]}
+
+        changed = {
+            member: score for member, score in expected.items()
+            if abs(current.get(member, 0.0) - score) > 1e-6
+        }
+        removed = [member for member in current if member not in expected]
+
+        if changed or removed:
+            ttl = self.TTL_CONFIG.get(period, self.TTL_CONFIG["weekly"])
+            names_map = {str(entry["user_id"]): entry["name"] for entry in entries if entry.get("name")}
+            async with self.redis.pipeline(transaction=True) as pipe:
+                if changed:
+                    pipe.zadd(key, changed)
+                if removed:
+                    pipe.zrem(key, *removed)
+                if names_map:
+                    pipe.hset(names_key, mapping=names_map)
+                    pipe.expire(names_key, ttl)
+                pipe.expire(key, ttl)
+                await pipe.execute()
+
+            logger.info(
+                f"Ranking {ranking_type} reconciliado para gym={gym_id}: "
+                f"{len(changed)} actualizados, {len(removed)} eliminados"
+            )
+
+        return {"updated": len(changed), "removed": len(removed)}
+
     async def get_anonymous_rankings(
         self,
         gym_id: int,
@@ -488,36 +679,33 @@ class ActivityFeedService:
         Returns:
             Lista con las posiciones del ranking incluyendo user_id para foto
         """
-        key = f"gym:{gym_id}:rankings:{period}:{ranking_type}"
-        names_key = f"gym:{gym_id}:rankings:{period}:{ranking_type}:names"
-        users_key = f"gym:{gym_id}:rankings:{period}:{ranking_type}:users"
+        key, names_key, users_key = self._ranking_keys(gym_id, ranking_type, period)
 
-        # Obtener top scores
+        # Obtener top scores (O(log n + limit))
         top_scores = await self.redis.zrevrange(key, 0, limit - 1, withscores=True)
+        if not top_scores:
+            return []
+
+        members = [member.decode() if isinstance(member, bytes) else member for member, _score in top_scores]
 
-        # Intentar obtener nombres y user_ids
-        names_map = await self.redis.hgetall(names_key)
-        users_map = await self.redis.hgetall(users_key)
+        # Nombres y user_ids solo de los miembros mostrados
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(names_key, members)
+            pipe.hmget(users_key, members)
+            names, legacy_user_ids = await pipe.execute()
 
         rankings = []
-        for i, (member, score) in enumerate(top_scores, 1):
-            member_str = member.decode() if isinstance(member, bytes) else member
-            member_key = member_str.encode() if isinstance(member_str, str) else member_str
-
-            # Buscar nombre si existe
-            name = None
-            if names_map:
-                name_bytes = names_map.get(member_key)
-                if name_bytes:
-                    name = name_bytes.decode() if isinstance(name_bytes, bytes) else name_bytes
-
-            # Buscar user_id si existe
+        for i, ((_member, score), member, name, legacy_user_id) in enumerate(
+            zip(top_scores, members, names, legacy_user_ids), 1
+        ):
+            name = name.decode() if isinstance(name, bytes) else name
+
+            # Los rankings antiguos usaban miembros pos_N con un hash de user_ids
             user_id = None
-            if users_map:
-                user_id_bytes = users_map.get(member_key)
-                if user_id_bytes:
-                    user_id_str = user_id_bytes.decode() if isinstance(user_id_bytes, bytes) else user_id_bytes
-                    user_id = int(user_id_str)
+            if member.isdigit():
+                user_id = int(member)
+            elif legacy_user_id:
+                user_id = int(legacy_user_id.decode() if isinstance(legacy_user_id, bytes) else legacy_user_id)
 
             rankings.append({
                 "position": i,
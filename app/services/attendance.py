@@ -1,18 +1,79 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import hashlib
+import hmac
+import json
+import logging
 import random
 import string
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from redis.asyncio import Redis
 
+from app.core.config import get_settings
 from app.models.user import User
-from app.models.schedule import ClassSession, ClassParticipation, ClassParticipationStatus
+from app.models.user_gym import UserGym
+from app.models.schedule import Class, ClassSession, ClassSessionStatus
+from app.services.cache_service import cache_service
 from app.services.schedule import class_participation_service, class_session_service
 from app.services.gym import gym_service
 from app.repositories.schedule import class_participation_repository
+from app.schemas.attendance import BulkCheckInEvent
+
+logger = logging.getLogger(__name__)
+
+# Prefijo de los tokens QR firmados: CK1.{user_id}.{gym_id}.{expira}.{firma}
+CHECKIN_TOKEN_PREFIX = "CK1"
+# Margen alrededor del inicio de la sesión en el que se admite el check-in
+CHECKIN_WINDOW = timedelta(minutes=30)
+# El índice de sesiones abiertas cubre más que la ventana para seguir siendo
+# válido durante todo su TTL; la ventana exacta se aplica al leerlo
+OPEN_SESSIONS_HORIZON = timedelta(hours=2)
+OPEN_SESSIONS_TTL = 600
+# Sincronización offline: resultados guardados por event_id para que reenviar
+# un lote sea idempotente, y límites aceptados para la hora del dispositivo
+SYNCED_EVENT_TTL = 7 * 24 * 3600
+MAX_OFFLINE_AGE = timedelta(hours=24)
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+
+def _epoch(value: datetime) -> float:
+    """Convierte un datetime (naive = UTC) a segundos epoch."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
 
 class AttendanceService:
+    async def _publish_checkin_activity(
+        self,
+        db: Session,
+        redis_client: Redis,
+        gym_id: int,
+        user_id: int,
+        session: Dict[str, Any]
+    ) -> None:
+        """
+        Envía el check-in al Activity Feed (contadores y ranking de asistencia
+        en tiempo real). Nunca hace fallar el check-in.
+        """
+        try:
+            from app.services.activity_feed_service import ActivityFeedService
+            from app.services.activity_aggregator import ActivityAggregator
+
+            user = db.query(User.first_name, User.last_name).filter(User.id == user_id).first()
+
+            await ActivityAggregator(ActivityFeedService(redis_client)).on_class_checkin({
+                "gym_id": gym_id,
+                "class_name": session.get("class_name") or "Clase",
+                "class_id": session["class_id"],
+                "session_id": session["id"],
+                "user_id": user_id,
+                "user_name": ActivityFeedService.format_ranking_name(user.first_name, user.last_name) if user else None
+            })
+        except Exception as e:
+            logger.warning(f"Error publicando check-in en el Activity Feed: {e}")
+
     async def generate_qr_code(self, user_id: int) -> str:
         """
         Genera un código QR único para un usuario.
@@ -35,6 +96,193 @@ class AttendanceService:
         # Formato final: U{user_id}_{hash}
         return f"U{user_id}_{hash_short}"
 
+    @staticmethod
+    def _sign(payload: str) -> str:
+        settings = get_settings()
+        secret = settings.QR_CHECKIN_SECRET or settings.SECRET_KEY
+        return hmac.new(secret.encode(), payload.encode(), hashlib.sha256).hexdigest()[:32]
+
+    def issue_checkin_token(
+        self, user_id: int, gym_id: int, now: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Emite un token QR de check-in firmado y de corta duración.
+
+        El token solo es válido para el gimnasio indicado; la pertenencia del
+        usuario se verifica al emitirlo, de modo que el escaneo no consulta la BD.
+
+        Args:
+            user_id: ID del usuario
+            gym_id: ID del gimnasio
+            now: Instante de emisión (por defecto, ahora)
+
+        Returns:
+            Dict con el token y su fecha de expiración
+        """
+        now = now or datetime.now(timezone.utc)
+        expires_at = int(now.timestamp()) + get_settings().QR_CHECKIN_TOKEN_TTL_SECONDS
+        payload = f"{user_id}.{gym_id}.{expires_at}"
+        return {
+            "token": f"{CHECKIN_TOKEN_PREFIX}.{payload}.{self._sign(payload)}",
+            "expires_at": datetime.fromtimestamp(expires_at, tz=timezone.utc)
+        }
+
+    def verify_checkin_token(
+        self, token: str, gym_id: int, now: Optional[datetime] = None
+    ) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Verifica un token QR firmado sin acceder a la base de datos.
+
+        Returns:
+            Tupla (user_id, None) si es válido o (None, mensaje de error)
+        """
+        parts = token.split(".")
+        if len(parts) != 5 or parts[0] != CHECKIN_TOKEN_PREFIX:
+            return None, "Código QR inválido"
+
+        payload = ".".join(parts[1:4])
+        if not hmac.compare_digest(self._sign(payload), parts[4]):
+            return None, "Código QR inválido"
+
+        try:
+            user_id, token_gym_id, expires_at = (int(part) for part in parts[1:4])
+        except ValueError:
+            return None, "Código QR inválido"
+
+        if token_gym_id != gym_id:
+            return None, "Usuario no pertenece a este gimnasio"
+        if expires_at < (now or datetime.now(timezone.utc)).timestamp():
+            return None, "Código QR caducado"
+        return user_id, None
+
+    def _resolve_member(
+        self, db: Session, qr_code: str, gym_id: int, now: datetime
+    ) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Obtiene el usuario de un código QR.
+
+        Los tokens firmados se verifican en memoria; los códigos U{user_id}_{hash}
+        anteriores siguen admitiéndose comprobando la pertenencia en la BD.
+        """
+        if qr_code.startswith(f"{CHECKIN_TOKEN_PREFIX}."):
+            return self.verify_checkin_token(qr_code, gym_id, now=now)
+
+        try:
+            # El formato es U{user_id}_{hash}
+            user_id = int(qr_code.split('_')[0].replace('U', ''))
+        except (ValueError, IndexError):
+            return None, "Código QR inválido"
+
+        if not gym_service.check_user_in_gym(db, user_id=user_id, gym_id=gym_id):
+            return None, "Usuario no pertenece a este gimnasio"
+        return user_id, None
+
+    def _load_sessions(
+        self,
+        db: Session,
+        gym_id: int,
+        start: datetime,
+        end: datetime,
+        session_ids: Tuple[int, ...] = ()
+    ) -> List[Dict[str, Any]]:
+        """
+        Sesiones no canceladas que empiezan entre start y end (más las indicadas
+        en session_ids), en una sola consulta.
+        """
+        in_range = and_(ClassSession.start_time >= start, ClassSession.start_time <= end)
+        rows = (
+            db.query(
+                ClassSession.id, ClassSession.class_id, ClassSession.start_time,
+                ClassSession.end_time, Class.name
+            )
+            .join(Class, Class.id == ClassSession.class_id)
+            .filter(
+                ClassSession.gym_id == gym_id,
+                ClassSession.status != ClassSessionStatus.CANCELLED,
+                or_(in_range, ClassSession.id.in_(session_ids)) if session_ids else in_range
+            )
+            .all()
+        )
+        return [
+            {
+                "id": row.id,
+                "class_id": row.class_id,
+                "class_name": row.name,
+                "start": _epoch(row.start_time),
+                "end": _epoch(row.end_time)
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def _closest_session(
+        sessions: List[Dict[str, Any]], at: datetime, session_id: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Sesión (la indicada o la más cercana) cuyo inicio está a ±30 minutos de at."""
+        window = CHECKIN_WINDOW.total_seconds()
+        candidates = [
+            s for s in sessions
+            if abs(s["start"] - at.timestamp()) <= window and (not session_id or s["id"] == session_id)
+        ]
+        return min(candidates, key=lambda s: abs(s["start"] - at.timestamp()), default=None)
+
+    async def get_open_sessions(
+        self,
+        db: Session,
+        gym_id: int,
+        redis_client: Optional[Redis] = None,
+        now: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Sesiones del gimnasio que admiten check-in en este momento (±30 minutos).
+
+        El índice se guarda en Redis bajo el namespace de sesiones del gimnasio,
+        por lo que cualquier cambio en el horario lo invalida.
+        """
+        now = now or datetime.now(timezone.utc)
+
+        async def db_fetch():
+            return self._load_sessions(db, gym_id, now - CHECKIN_WINDOW, now + OPEN_SESSIONS_HORIZON)
+
+        sessions = await cache_service.get_or_set_json(
+            redis_client,
+            f"checkin:open_sessions:{gym_id}",
+            db_fetch,
+            expiry_seconds=OPEN_SESSIONS_TTL,
+            namespaces=[f"sessions:gym:{gym_id}"]
+        )
+        window = CHECKIN_WINDOW.total_seconds()
+        return [s for s in sessions or [] if abs(s["start"] - now.timestamp()) <= window]
+
+    async def _after_check_ins(
+        self,
+        db: Session,
+        redis_client: Optional[Redis],
+        gym_id: int,
+        check_ins: List[Tuple[int, Dict[str, Any]]]
+    ) -> None:
+        """Invalida las cachés de los miembros con asistencia nueva y publica los check-ins."""
+        if not redis_client or not check_ins:
+            return
+
+        member_ids = {user_id for user_id, _session in check_ins}
+        try:
+            # Invalidar last_attendance_date y el dashboard summary de los usuarios
+            await redis_client.delete(*[
+                key
+                for user_id in member_ids
+                for key in (f"last_attendance:{user_id}:{gym_id}", f"dashboard_summary:{user_id}:{gym_id}")
+            ])
+        except Exception as e:
+            # No fallar el check-in si la invalidación de caché falla
+            logger.warning(f"Error invalidando caché después de check-in: {e}")
+
+        await class_participation_service.invalidate_members_participation_cache(
+            member_ids=member_ids, gym_id=gym_id, redis_client=redis_client
+        )
+        for user_id, session in check_ins:
+            await self._publish_checkin_activity(db, redis_client, gym_id, user_id, session)
+
     async def process_check_in(
         self,
         db: Session,
@@ -49,169 +297,239 @@ class AttendanceService:
         
         Args:
             db: Sesión de base de datos
-            qr_code: Código QR del usuario
+            qr_code: Código QR del usuario (token firmado o código U{user_id}_{hash})
             gym_id: ID del gimnasio actual
             redis_client: Cliente de Redis opcional para caché
+            session_id: Sesión concreta en la que hacer check-in (opcional)
             
         Returns:
             Dict con el resultado del check-in
         """
-        # Extraer user_id del código QR
-        try:
-            # El formato es U{user_id}_{hash}
-            parts = qr_code.split('_')[0]  # Tomar la parte antes del _
-            user_id = int(parts.replace('U', ''))
-            
-            # Verificar que el usuario pertenece al gimnasio actual
-            membership = gym_service.check_user_in_gym(db, user_id=user_id, gym_id=gym_id)
-            if not membership:
-                return {
-                    "success": False,
-                    "message": "Usuario no pertenece a este gimnasio"
-                }
-                
-        except (ValueError, IndexError):
+        now = datetime.now(timezone.utc)
+        user_id, error = self._resolve_member(db, qr_code, gym_id, now)
+        if error:
             return {
                 "success": False,
-                "message": "Código QR inválido"
+                "message": error
             }
 
-        # Buscar una clase próxima (±30 minutos desde ahora)
-        now = datetime.utcnow()
-        window_start = now - timedelta(minutes=30)
-        window_end = now + timedelta(minutes=30)
-        
-        # Obtener sesiones próximas
-        upcoming_sessions = await class_session_service.get_sessions_by_date_range(
-            db,
-            start_date=window_start.date(),
-            end_date=window_end.date(),
-            gym_id=gym_id,
-            redis_client=redis_client
-        )
-        
-        # Filtrar sesiones dentro de la ventana de tiempo
-        valid_sessions = [
-            session for session in upcoming_sessions
-            if window_start <= session.start_time <= window_end
-        ]
-        
-        # Si se especifica session_id, buscar esa sesión específica
+        valid_sessions = await self.get_open_sessions(db, gym_id, redis_client, now=now)
+        closest_session = self._closest_session(valid_sessions, now, session_id)
+
         if session_id:
-            target_session = await class_session_service.get_session(
-                db, session_id=session_id, gym_id=gym_id, redis_client=redis_client
-            )
-            if not target_session:
-                return {
-                    "success": False,
-                    "message": "Sesión no encontrada o no pertenece a este gimnasio"
-                }
-            # Validar que la sesión está dentro de la ventana de tiempo
-            if not (window_start <= target_session.start_time <= window_end):
+            if not closest_session:
+                # Distinguir una sesión inexistente de una fuera de la ventana
+                target_session = await class_session_service.get_session(
+                    db, session_id=session_id, gym_id=gym_id, redis_client=redis_client
+                )
+                if not target_session:
+                    return {
+                        "success": False,
+                        "message": "Sesión no encontrada o no pertenece a este gimnasio"
+                    }
+                if target_session.status == ClassSessionStatus.CANCELLED:
+                    return {
+                        "success": False,
+                        "message": "La sesión está cancelada"
+                    }
                 return {
                     "success": False,
                     "message": "La sesión está fuera del horario de check-in (±30 minutos)"
                 }
-            closest_session = target_session
-        else:
-            # Comportamiento original: buscar sesión más cercana
-            if not valid_sessions:
-                return {
-                    "success": False,
-                    "message": "No hay clases disponibles para check-in en este momento"
-                }
+        elif not closest_session:
+            return {
+                "success": False,
+                "message": "No hay clases disponibles para check-in en este momento"
+            }
 
-            # Tomar la sesión más cercana a la hora actual
-            closest_session = min(
-                valid_sessions,
-                key=lambda s: abs((s.start_time - now).total_seconds())
-            )
-        
-        # Verificar si el usuario ya tiene participación en esta sesión
-        existing_participation = class_participation_repository.get_by_session_and_member(
+        recorded = class_participation_repository.mark_attended_bulk(
             db,
-            session_id=closest_session.id,
-            member_id=user_id,
-            gym_id=gym_id
+            gym_id=gym_id,
+            entries=[{"session_id": closest_session["id"], "member_id": user_id, "attendance_time": now}]
         )
-        
-        if existing_participation:
-            if existing_participation.status == ClassParticipationStatus.ATTENDED:
-                return {
-                    "success": False,
-                    "message": "Ya has hecho check-in en esta clase"
-                }
-            # Actualizar estado a ATTENDED
-            updated_participation = class_participation_repository.update(
-                db, 
-                db_obj=existing_participation,
-                obj_in={
-                    "status": ClassParticipationStatus.ATTENDED,
-                    "attendance_time": now
-                }
-            )
-
-            # Invalidar caché de last_attendance_date después de actualizar asistencia
-            if redis_client:
-                try:
-                    cache_key = f"last_attendance:{user_id}:{gym_id}"
-                    await redis_client.delete(cache_key)
-                    # También invalidar caché del dashboard summary
-                    dashboard_cache_key = f"dashboard_summary:{user_id}:{gym_id}"
-                    await redis_client.delete(dashboard_cache_key)
-                except Exception as e:
-                    # No fallar el check-in si la invalidación de caché falla
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.warning(f"Error invalidando caché después de check-in: {e}")
-
+        if not recorded:
             return {
-                "success": True,
-                "message": "Check-in realizado correctamente",
-                "session": {
-                    "id": closest_session.id,
-                    "start_time": closest_session.start_time,
-                    "end_time": closest_session.end_time
-                }
+                "success": False,
+                "message": "Ya has hecho check-in en esta clase"
             }
-        else:
-            # Crear nueva participación con estado ATTENDED
-            participation_data = {
-                "session_id": closest_session.id,
-                "member_id": user_id,
-                "status": ClassParticipationStatus.ATTENDED,
-                "gym_id": gym_id,
-                "attendance_time": now
+
+        await self._after_check_ins(db, redis_client, gym_id, [(user_id, closest_session)])
+
+        return {
+            "success": True,
+            "message": "Check-in realizado correctamente",
+            "session": {
+                "id": closest_session["id"],
+                "start_time": datetime.fromtimestamp(closest_session["start"], tz=timezone.utc),
+                "end_time": datetime.fromtimestamp(closest_session["end"], tz=timezone.utc)
             }
-            
-            new_participation = class_participation_repository.create(
-                db,
-                obj_in=participation_data
-            )
+        }
+
+    def _members_in_gym(self, db: Session, user_ids: List[int], gym_id: int) -> set:
+        """IDs de los usuarios indicados que pertenecen al gimnasio (una consulta)."""
+        if not user_ids:
+            return set()
+        rows = db.query(UserGym.user_id).filter(UserGym.gym_id == gym_id, UserGym.user_id.in_(user_ids))
+        return {row.user_id for row in rows}
+
+    async def _get_synced_results(
+        self, redis_client: Optional[Redis], gym_id: int, event_ids: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Resultados guardados de eventos ya sincronizados (un MGET)."""
+        if not redis_client or not event_ids:
+            return {}
+        try:
+            stored = await redis_client.mget([f"checkin:sync:{gym_id}:{event_id}" for event_id in event_ids])
+        except Exception as e:
+            logger.warning(f"Error leyendo eventos de check-in sincronizados: {e}")
+            return {}
+        return {
+            event_id: {**json.loads(value), "duplicate": True}
+            for event_id, value in zip(event_ids, stored) if value
+        }
+
+    async def _store_synced_results(
+        self, redis_client: Optional[Redis], gym_id: int, results: Dict[str, Dict[str, Any]]
+    ) -> None:
+        if not redis_client or not results:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for event_id, result in results.items():
+                    pipe.set(f"checkin:sync:{gym_id}:{event_id}", json.dumps(result), ex=SYNCED_EVENT_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error guardando eventos de check-in sincronizados: {e}")
+
+    async def process_bulk_check_in(
+        self,
+        db: Session,
+        events: List[BulkCheckInEvent],
+        gym_id: int,
+        redis_client: Optional[Redis] = None
+    ) -> Dict[str, Any]:
+        """
+        Sincroniza un lote de escaneos QR registrados por un dispositivo, que
+        puede haberlos acumulado sin conexión.
+
+        Cada escaneo se asocia a la sesión que empezaba a ±30 minutos de su
+        momento (scanned_at). La caducidad de los tokens firmados se comprueba
+        contra scanned_at, ya acotado por MAX_OFFLINE_AGE y MAX_CLOCK_SKEW,
+        para aceptar escaneos acumulados sin conexión. Un token reenviado solo
+        vale para la sesión de su escaneo original y la asistencia de cada
+        miembro y sesión se registra una sola vez.
+        Las sesiones de todo el lote se resuelven con una consulta y las
+        asistencias se escriben con un único upsert. Reenviar un evento ya
+        sincronizado devuelve el resultado guardado sin volver a procesarlo.
+
+        Args:
+            db: Sesión de base de datos
+            events: Escaneos a sincronizar
+            gym_id: ID del gimnasio actual
+            redis_client: Cliente de Redis opcional
+
+        Returns:
+            Dict con el resultado de cada evento (en el orden recibido) y el
+            número de asistencias registradas
+        """
+        now = datetime.now(timezone.utc)
+        unique_events: Dict[str, BulkCheckInEvent] = {}
+        for event in events:
+            unique_events.setdefault(event.event_id, event)
+        results = await self._get_synced_results(redis_client, gym_id, list(unique_events))
+        pending = [event for event_id, event in unique_events.items() if event_id not in results]
+
+        new_results: Dict[str, Dict[str, Any]] = {}
 
-            # Invalidar caché de last_attendance_date después de crear nueva asistencia
-            if redis_client:
+        def fail(event: BulkCheckInEvent, message: str) -> None:
+            new_results[event.event_id] = {"event_id": event.event_id, "success": False, "message": message}
+
+        # Resolver miembros: tokens firmados en memoria, códigos antiguos con una consulta
+        resolved: List[Tuple[BulkCheckInEvent, int, datetime]] = []
+        legacy: List[Tuple[BulkCheckInEvent, int, datetime]] = []
+        for event in pending:
+            scanned_at = event.scanned_at if event.scanned_at.tzinfo else event.scanned_at.replace(tzinfo=timezone.utc)
+            if scanned_at > now + MAX_CLOCK_SKEW:
+                fail(event, "La fecha del escaneo está en el futuro")
+            elif scanned_at < now - MAX_OFFLINE_AGE:
+                fail(event, "El escaneo es demasiado antiguo para sincronizarse")
+            elif event.qr_code.startswith(f"{CHECKIN_TOKEN_PREFIX}."):
+                user_id, error = self.verify_checkin_token(event.qr_code, gym_id, now=scanned_at)
+                if error:
+                    fail(event, error)
+                else:
+                    resolved.append((event, user_id, scanned_at))
+            else:
                 try:
-                    cache_key = f"last_attendance:{user_id}:{gym_id}"
-                    await redis_client.delete(cache_key)
-                    # También invalidar caché del dashboard summary
-                    dashboard_cache_key = f"dashboard_summary:{user_id}:{gym_id}"
-                    await redis_client.delete(dashboard_cache_key)
-                except Exception as e:
-                    # No fallar el check-in si la invalidación de caché falla
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.warning(f"Error invalidando caché después de check-in: {e}")
+                    legacy.append((event, int(event.qr_code.split('_')[0].replace('U', '')), scanned_at))
+                except (ValueError, IndexError):
+                    fail(event, "Código QR inválido")
 
-            return {
-                "success": True,
-                "message": "Check-in realizado correctamente",
-                "session": {
-                    "id": closest_session.id,
-                    "start_time": closest_session.start_time,
-                    "end_time": closest_session.end_time
+        members = self._members_in_gym(db, list({user_id for _e, user_id, _t in legacy}), gym_id)
+        for event, user_id, scanned_at in legacy:
+            if user_id in members:
+                resolved.append((event, user_id, scanned_at))
+            else:
+                fail(event, "Usuario no pertenece a este gimnasio")
+
+        # Resolver sesiones de todo el lote con una consulta
+        sessions: List[Dict[str, Any]] = []
+        if resolved:
+            scan_times = [scanned_at for _e, _u, scanned_at in resolved]
+            sessions = self._load_sessions(
+                db, gym_id,
+                min(scan_times) - CHECKIN_WINDOW,
+                max(scan_times) + CHECKIN_WINDOW,
+                session_ids=tuple({e.session_id for e, _u, _t in resolved if e.session_id})
+            )
+
+        matched: List[Tuple[BulkCheckInEvent, int, datetime, Dict[str, Any]]] = []
+        for event, user_id, scanned_at in resolved:
+            session = self._closest_session(sessions, scanned_at, event.session_id)
+            if session:
+                matched.append((event, user_id, scanned_at, session))
+            elif event.session_id:
+                fail(event, "Sesión no encontrada o fuera del horario de check-in (±30 minutos)")
+            else:
+                fail(event, "No había clases disponibles para check-in en ese momento")
+
+        recorded = set(class_participation_repository.mark_attended_bulk(
+            db,
+            gym_id=gym_id,
+            entries=[
+                {"session_id": session["id"], "member_id": user_id, "attendance_time": scanned_at}
+                for _event, user_id, scanned_at, session in matched
+            ]
+        )) if matched else set()
+
+        check_ins: List[Tuple[int, Dict[str, Any]]] = []
+        # El escaneo más antiguo de un mismo miembro y sesión es el que cuenta
+        for event, user_id, _scanned_at, session in sorted(matched, key=lambda m: m[2]):
+            if (session["id"], user_id) in recorded:
+                recorded.discard((session["id"], user_id))
+                check_ins.append((user_id, session))
+                new_results[event.event_id] = {
+                    "event_id": event.event_id, "success": True,
+                    "message": "Check-in realizado correctamente", "session_id": session["id"]
                 }
-            }
+            else:
+                new_results[event.event_id] = {
+                    "event_id": event.event_id, "success": False,
+                    "message": "Ya has hecho check-in en esta clase", "session_id": session["id"]
+                }
+
+        await self._store_synced_results(redis_client, gym_id, new_results)
+        await self._after_check_ins(db, redis_client, gym_id, check_ins)
+
+        results.update(new_results)
+        seen = set()
+        ordered = []
+        for event in events:
+            result = results[event.event_id]
+            ordered.append({**result, "duplicate": True} if event.event_id in seen else result)
+            seen.add(event.event_id)
+
+        return {"results": ordered, "recorded": len(check_ins)}
 
 # Instancia global del servicio
 attendance_service = AttendanceService() 
\ No newline at end of file
@@ -10,6 +10,7 @@ import logging
 
 from app.services.module import module_service
 from app.services.stripe_service import StripeService
+from app.services.stripe_resolution_cache import stripe_resolution_cache
 from app.services.membership import membership_service
 from app.models.gym import Gym
 from app.core.config import get_settings
@@ -69,6 +70,7 @@ class BillingModuleService:
                     "success": False,
                     "error": "Error al activar el módulo billing en la base de datos"
                 }
+            await stripe_resolution_cache.invalidate_gym_account(gym_id)
             
             # Sincronizar planes existentes con Stripe (opcional)
             sync_result = await self._sync_existing_plans_with_stripe(db, gym_id)
@@ -132,6 +134,7 @@ class BillingModuleService:
                     "success": False,
                     "error": "Error al desactivar el módulo billing en la base de datos"
                 }
+            await stripe_resolution_cache.invalidate_gym_account(gym_id)
             
             # Opcionalmente desactivar productos en Stripe (pero no eliminar)
             if not preserve_stripe_data:
@@ -1,6 +1,6 @@
 import json
 import logging
-from typing import Any, Optional, TypeVar, Generic, Type, List, Dict, Callable
+from typing import Any, Optional, TypeVar, Generic, Type, List, Dict, Callable, Sequence
 from datetime import datetime, time, timedelta
 
 from pydantic import BaseModel
@@ -49,7 +49,8 @@ class CacheService:
         db_fetch_func: Callable,
         model_class: Type[T],
         expiry_seconds: int = 300,  # 5 minutos por defecto
-        is_list: bool = False
+        is_list: bool = False,
+        namespaces: Sequence[str] = ()
     ) -> Any:
         """
         Obtiene un objeto de Redis o lo establece si no existe. Maneja Pydantic de forma transparente.
@@ -62,6 +63,7 @@ class CacheService:
             model_class: Clase del modelo Pydantic que se debe devolver
             expiry_seconds: Tiempo de expiración en segundos
             is_list: Si es True, se espera/devuelve una lista de objetos
+            namespaces: Namespaces versionados de los que depende la clave
             
         Returns:
             El objeto o lista de objetos solicitados
@@ -69,6 +71,13 @@ class CacheService:
         if not redis_client:
             logger.warning("Cliente Redis no disponible, ejecutando consulta sin caché")
             return await db_fetch_func()
+
+        if namespaces:
+            try:
+                cache_key = await CacheService.versioned_key(redis_client, cache_key, *namespaces)
+            except Exception as e:
+                logger.warning(f"No se pudo obtener la versión de {list(namespaces)}, consultando sin caché: {e}")
+                return await db_fetch_func()
             
         # Intentar obtener del caché
         try:
@@ -344,6 +353,59 @@ class CacheService:
         
         return profiles
     
+    # ------------------------------------------------------------------
+    # Namespaces versionados
+    #
+    # Cada namespace (p.ej. "sessions:gym:4") tiene un contador de generación
+    # en Redis cuyo valor se incrusta en las claves que dependen de él.
+    # Invalidar es un INCR: las claves antiguas dejan de leerse y caducan por
+    # su TTL, sin SCAN ni tracking sets.
+    # ------------------------------------------------------------------
+
+    NAMESPACE_PREFIX = "cache_ns"
+    # Debe superar el mayor TTL de las claves versionadas: si el contador
+    # caduca y vuelve a 0 no debe quedar ninguna clave de esa generación
+    NAMESPACE_TTL = 7 * 24 * 3600
+
+    @staticmethod
+    async def namespace_versions(redis_client: Redis, *namespaces: str) -> List[int]:
+        """
+        Obtiene la generación actual de varios namespaces con un único MGET.
+
+        Returns:
+            Lista de versiones en el mismo orden (0 si el namespace no existe)
+        """
+        if not namespaces:
+            return []
+        values = await redis_client.mget([f"{CacheService.NAMESPACE_PREFIX}:{ns}" for ns in namespaces])
+        return [int(value) if value else 0 for value in values]
+
+    @staticmethod
+    async def versioned_key(redis_client: Redis, base_key: str, *namespaces: str) -> str:
+        """
+        Construye la clave de caché incrustando la generación de sus namespaces.
+        """
+        versions = await CacheService.namespace_versions(redis_client, *namespaces)
+        return f"{base_key}:ns:{'.'.join(str(v) for v in versions)}"
+
+    @staticmethod
+    async def bump_namespaces(redis_client: Optional[Redis], *namespaces: str) -> None:
+        """
+        Invalida todas las claves de los namespaces dados incrementando su generación.
+        """
+        if not redis_client or not namespaces:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for namespace in dict.fromkeys(namespaces):
+                    key = f"{CacheService.NAMESPACE_PREFIX}:{namespace}"
+                    pipe.incr(key)
+                    pipe.expire(key, CacheService.NAMESPACE_TTL)
+                await pipe.execute()
+            logger.debug(f"Namespaces invalidados: {list(namespaces)}")
+        except Exception as e:
+            logger.error(f"Error invalidando namespaces {list(namespaces)}: {e}", exc_info=True)
+
     @staticmethod
     @time_redis_operation
     async def delete_pattern(redis_client: Redis, pattern: str) -> int:
@@ -415,7 +477,8 @@ class CacheService:
         redis_client: Redis,
         cache_key: str,
         db_fetch_func: Callable,
-        expiry_seconds: int = 300  # 5 minutos por defecto
+        expiry_seconds: int = 300,  # 5 minutos por defecto
+        namespaces: Sequence[str] = ()
     ) -> Any:
         """
         Obtiene y deserializa datos JSON de Redis o los establece si no existen.
@@ -426,6 +489,7 @@ class CacheService:
             cache_key: Clave única para identificar el objeto en caché
             db_fetch_func: Función que obtiene los datos de la BD si no están en caché
             expiry_seconds: Tiempo de expiración en segundos
+            namespaces: Namespaces versionados de los que depende la clave
             
         Returns:
             Diccionario o lista de diccionarios con los datos deserializados
@@ -433,6 +497,13 @@ class CacheService:
         if not redis_client:
             logger.warning("Cliente Redis no disponible, ejecutando consulta sin caché")
             return await db_fetch_func()
+
+        if namespaces:
+            try:
+                cache_key = await CacheService.versioned_key(redis_client, cache_key, *namespaces)
+            except Exception as e:
+                logger.warning(f"No se pudo obtener la versión de {list(namespaces)}, consultando sin caché: {e}")
+                return await db_fetch_func()
             
         # Intentar obtener del caché
         try:
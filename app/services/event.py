@@ -5,8 +5,10 @@ Este módulo proporciona un servicio que encapsula la lógica de negocio
 relacionada con eventos utilizando caché para mejorar el rendimiento.
 """
 
+import asyncio
+import base64
 import logging
-from typing import List, Optional, Union, Dict, Any, Callable
+from typing import List, Optional, Tuple, Union, Dict, Any, Callable
 from datetime import datetime
 import json
 
@@ -22,6 +24,8 @@ from app.schemas.event import (
     EventParticipationCreate,
     EventParticipationUpdate,
     EventWithParticipantCount,
+    EventListItem,
+    EventPage,
     EventDetail
 )
 from app.services.cache_service import CacheService
@@ -29,6 +33,25 @@ from app.core.profiling import time_redis_operation, register_cache_hit, registe
 
 logger = logging.getLogger(__name__)
 
+EVENT_PAGE_MAX_LIMIT = 100
+
+
+def encode_event_cursor(start_time: datetime, event_id: int) -> str:
+    """Cursor opaco con la clave ``(start_time, id)`` del último evento de una página."""
+    payload = json.dumps({"t": start_time.isoformat(), "id": event_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_event_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverso de ``encode_event_cursor``. Lanza ValueError si el cursor no es válido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), int(payload["id"])
+    except Exception as e:
+        raise ValueError(f"Cursor de eventos inválido: {cursor}") from e
+
+
 class EventService:
     """
     Servicio para gestionar eventos con soporte para caché.
@@ -131,7 +154,8 @@ class EventService:
                     db_fetch_func=db_fetch,
                     model_class=EventWithParticipantCount,
                     expiry_seconds=300,  # 5 minutos de TTL
-                    is_list=True
+                    is_list=True,
+                    namespaces=self._list_namespaces(gym_id)
                 )
                 return result
             else:
@@ -141,6 +165,43 @@ class EventService:
             # Fallback a la BD en caso de error
             return await db_fetch()
 
+    def get_events_page(
+        self,
+        db: Session,
+        *,
+        gym_id: int,
+        viewer_id: Optional[Union[int, str]] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        **filters: Any
+    ) -> EventPage:
+        """
+        Listado de eventos paginado por cursor, con conteos y estado del usuario.
+
+        No se cachea porque el estado de participación es propio de cada
+        usuario; la consulta es única por página y usa keyset sobre
+        ``(start_time, id)``.
+
+        Raises:
+            ValueError: Si el cursor no es válido
+        """
+        limit = max(1, min(limit, EVENT_PAGE_MAX_LIMIT))
+        after = decode_event_cursor(cursor) if cursor else None
+
+        # Se pide una fila de más para saber si hay página siguiente
+        rows = event_repository.get_events_page(
+            db, gym_id=gym_id, viewer_id=viewer_id, after=after, limit=limit + 1, **filters
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = encode_event_cursor(last["start_time"], last["id"])
+
+        return EventPage(items=[EventListItem(**row) for row in rows], next_cursor=next_cursor)
+
     async def get_event_cached(
         self,
         db: Session,
@@ -207,7 +268,8 @@ class EventService:
                     db_fetch_func=db_fetch,
                     model_class=EventDetail,
                     expiry_seconds=300,  # 5 minutos de TTL
-                    is_list=False
+                    is_list=False,
+                    namespaces=[f"event:{event_id}"]
                 )
                 return result
             else:
@@ -306,7 +368,8 @@ class EventService:
                         db_fetch_func=db_fetch,
                         model_class=EventWithParticipantCount,  # Cambiado de EventSchema a EventWithParticipantCount
                         expiry_seconds=300,  # 5 minutos de TTL
-                        is_list=True
+                        is_list=True,
+                        namespaces=[self.ALL_EVENTS_NAMESPACE, f"events:creator:{creator_id}"]
                     )
                     logger.debug(f"Éxito en CacheService.get_or_set. Obtenidos {len(result)} eventos.")
                     return result
@@ -399,6 +462,7 @@ class EventService:
                         logger.info(
                             f"Se promovieron {len(promoted)} usuarios de la waiting list para evento {event_id}"
                         )
+                        await self.notify_waitlist_promotions(updated_event, promoted)
         except Exception as promo_exc:
             logger.error(
                 f"Error al promover usuarios de la waiting list tras aumentar capacidad de evento {event_id}: {promo_exc}",
@@ -456,6 +520,53 @@ class EventService:
         
         return result
     
+    # Namespaces versionados de la caché de eventos:
+    # - events:all          -> todos los listados (invalidación global)
+    # - events:gym:{id}     -> listados filtrados por gimnasio
+    # - events:gym:any      -> listados sin filtro de gimnasio
+    # - events:creator:{id} -> listados de un creador
+    # - event:{id}          -> detalle de un evento (con y sin gym_id)
+    ALL_EVENTS_NAMESPACE = "events:all"
+    UNSCOPED_EVENTS_NAMESPACE = "events:gym:any"
+
+    async def notify_waitlist_promotions(
+        self,
+        event: Event,
+        promoted: List[EventParticipation]
+    ) -> None:
+        """
+        Avisa en lote a los miembros promovidos desde la lista de espera. Se
+        llama después de confirmar la promoción; un fallo solo se registra.
+
+        El envío se hace en un hilo sin la sesión de la petición (una Session
+        no es segura entre hilos): los datos del evento se leen antes.
+        """
+        if not promoted:
+            return
+
+        from app.services.notification_service import notification_service
+
+        try:
+            await asyncio.to_thread(
+                notification_service.notify_waitlist_promotion,
+                None,
+                event_title=event.title,
+                event_id=event.id,
+                gym_id=event.gym_id,
+                promoted_user_ids=[participation.member_id for participation in promoted],
+                payment_deadline=next(
+                    (participation.payment_expiry for participation in promoted if participation.payment_expiry),
+                    None
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error notificando promociones de lista de espera del evento {event.id}: {e}", exc_info=True)
+
+    def _list_namespaces(self, gym_id: Optional[int]) -> List[str]:
+        if gym_id:
+            return [self.ALL_EVENTS_NAMESPACE, f"events:gym:{gym_id}"]
+        return [self.ALL_EVENTS_NAMESPACE, self.UNSCOPED_EVENTS_NAMESPACE]
+
     async def invalidate_event_caches(
         self,
         redis_client: Redis,
@@ -464,38 +575,29 @@ class EventService:
         creator_id: Optional[int] = None
     ) -> None:
         """
-        Invalida cachés relacionadas con eventos.
+        Invalida cachés relacionadas con eventos incrementando sus namespaces.
         
         Args:
             redis_client: Cliente Redis
             event_id: ID del evento específico (opcional)
-            gym_id: ID del gimnasio (opcional)
+            gym_id: ID del gimnasio (opcional; sin él se invalidan los listados de todos los gimnasios)
             creator_id: ID del creador (opcional)
         """
-        patterns = []
+        namespaces = [self.UNSCOPED_EVENTS_NAMESPACE]
         
-        # Invalidar caché de evento específico
         if event_id:
-            patterns.append(f"event:detail:{event_id}")
-        
-        # Invalidar cachés de listas de eventos
-        patterns.append("events:list:*")
+            namespaces.append(f"event:{event_id}")
         
-        # Invalidar cachés específicas de gimnasio
+        # Listados del gimnasio, o de todos si no se conoce
         if gym_id:
-            patterns.append(f"events:list:*gym:{gym_id}*")
+            namespaces.append(f"events:gym:{gym_id}")
+        else:
+            namespaces.append(self.ALL_EVENTS_NAMESPACE)
             
-        # Invalidar cachés específicas de creador
         if creator_id:
-            patterns.append(f"events:creator:{creator_id}:*")
+            namespaces.append(f"events:creator:{creator_id}")
         
-        # Eliminar cachés usando patrones
-        for pattern in patterns:
-            try:
-                count = await CacheService.delete_pattern(redis_client, pattern)
-                logger.debug(f"Invalidadas {count} cachés con patrón: {pattern}")
-            except Exception as e:
-                logger.error(f"Error invalidando cachés con patrón {pattern}: {e}", exc_info=True)
+        await CacheService.bump_namespaces(redis_client, *namespaces)
 
     # === Métodos para participaciones === #
     
@@ -541,7 +643,8 @@ class EventService:
                     db_fetch_func=db_fetch,
                     model_class=EventParticipationSchema,
                     expiry_seconds=300,  # 5 minutos de TTL
-                    is_list=True
+                    is_list=True,
+                    namespaces=[f"event:{event_id}"]
                 )
                 return result
             else:
@@ -10,8 +10,9 @@ Este servicio gestiona:
 """
 
 from typing import Optional, Dict, Any, List
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
+import asyncio
 import logging
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
@@ -21,14 +22,19 @@ from app.models.stripe_profile import GymStripeAccount, UserGymStripeProfile
 from app.models.user import User
 from app.models.gym import Gym
 from app.core.config import get_settings
-from app.services.module import module_service
 from app.services.stripe_service import stripe_service
+from app.services.stripe_gateway import idempotency_key, stripe_gateway
+from app.services.stripe_resolution_cache import GymStripeResolution, stripe_resolution_cache
+from app.services.stripe_retry import RateLimitGate, StripeRetryPolicy
 
 import stripe
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Participaciones expiradas por lote en expire_pending_payments
+EXPIRY_BATCH_SIZE = 500
+
 
 class EventPaymentService:
     """Servicio para gestionar pagos de eventos."""
@@ -57,40 +63,44 @@ class EventPaymentService:
         Returns:
             True si Stripe está habilitado y configurado
         """
+        return await self._resolve_chargeable_account(db, gym_id) is not None
+
+    async def _resolve_chargeable_account(self, db: Session, gym_id: int) -> Optional[GymStripeResolution]:
+        """
+        Cuenta Connect del gym si puede cobrar (módulo billing activo y cargos
+        habilitados), resuelta desde la caché de Stripe.
+        """
+        account = await stripe_resolution_cache.get_gym_account(db, gym_id)
+
         # Verificar módulo de billing activo
-        billing_enabled = module_service.get_gym_module_status(db, gym_id, "billing")
-        if not billing_enabled:
+        if not account.billing_enabled:
             logger.warning(f"Módulo billing no habilitado para gym {gym_id}")
-            return False
+            return None
 
         # Verificar cuenta de Stripe Connect
-        stripe_account = db.query(GymStripeAccount).filter(
-            GymStripeAccount.gym_id == gym_id,
-            GymStripeAccount.is_active == True
-        ).first()
-
-        if not stripe_account:
+        if not account.stripe_account_id:
             logger.warning(
                 f"Cuenta Stripe no configurada o inactiva para gym {gym_id}. "
                 f"Use GET /api/v1/stripe-connect/accounts/connection-status para verificar."
             )
-            return False
+            return None
 
-        if not stripe_account.charges_enabled:
+        if not account.charges_enabled:
             logger.warning(
                 f"Cuenta Stripe no habilitada para cargos en gym {gym_id}. "
-                f"Onboarding completado: {stripe_account.onboarding_completed}"
+                f"Onboarding completado: {account.onboarding_completed}"
             )
-            return False
+            return None
 
-        return True
+        return account
 
     async def create_payment_intent_for_event(
         self,
         db: Session,
         event: Event,
         user: User,
-        gym_id: int
+        gym_id: int,
+        idempotency_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Crear un Payment Intent para el pago de un evento.
@@ -100,59 +110,68 @@ class EventPaymentService:
             event: Evento a pagar
             user: Usuario que realiza el pago
             gym_id: ID del gimnasio
+            idempotency_key: Clave para que un reintento no cree un segundo Payment Intent
 
         Returns:
             Diccionario con client_secret y payment_intent_id
         """
+        stripe_account = None
         try:
-            # Validar que Stripe esté habilitado
-            if not await self.verify_stripe_enabled(db, gym_id):
+            # Validar que Stripe esté habilitado y obtener la cuenta Connect del gym (cacheada)
+            stripe_account = await self._resolve_chargeable_account(db, gym_id)
+            if not stripe_account:
                 raise ValueError("Stripe no está habilitado para este gimnasio")
 
             # Verificar que el evento sea de pago
             if not event.is_paid or event.price_cents is None:
                 raise ValueError("El evento no requiere pago")
 
-            # Obtener cuenta de Stripe Connect del gym
-            stripe_account = db.query(GymStripeAccount).filter(
-                GymStripeAccount.gym_id == gym_id,
-                GymStripeAccount.is_active == True
-            ).first()
-
-            if not stripe_account:
-                raise ValueError(
-                    "Cuenta de Stripe no configurada o inactiva. "
-                    "Contacte al administrador."
-                )
-
             logger.info(
                 f"[Stripe Account] Usando cuenta de Stripe Connect del gym {gym_id}: "
                 f"{stripe_account.stripe_account_id}"
             )
 
+            async def create_intent(customer_id: str, key: Optional[str]):
+                return await stripe_gateway.call(
+                    stripe.PaymentIntent.create,
+                    idempotency_key=key,
+                    amount=event.price_cents,
+                    currency=event.currency.lower(),
+                    customer=customer_id,
+                    metadata={
+                        "event_id": str(event.id),
+                        "user_id": str(user.id),
+                        "gym_id": str(gym_id),
+                        "event_title": event.title
+                    },
+                    description=f"Pago para evento: {event.title}",
+                    stripe_account=stripe_account.stripe_account_id,
+                    # Configuración para captura automática
+                    capture_method="automatic",
+                    # Permitir guardar método de pago para futuros pagos
+                    setup_future_usage="on_session"
+                )
+
             # Buscar o crear customer de Stripe para el usuario
-            stripe_profile = await self._get_or_create_stripe_customer(
+            customer_id = await self._resolve_stripe_customer_id(
                 db, user, gym_id, stripe_account.stripe_account_id
             )
 
             # Crear Payment Intent con Stripe Connect
-            payment_intent = stripe.PaymentIntent.create(
-                amount=event.price_cents,
-                currency=event.currency.lower(),
-                customer=stripe_profile.stripe_customer_id,
-                metadata={
-                    "event_id": str(event.id),
-                    "user_id": str(user.id),
-                    "gym_id": str(gym_id),
-                    "event_title": event.title
-                },
-                description=f"Pago para evento: {event.title}",
-                stripe_account=stripe_account.stripe_account_id,
-                # Configuración para captura automática
-                capture_method="automatic",
-                # Permitir guardar método de pago para futuros pagos
-                setup_future_usage="on_session"
-            )
+            try:
+                payment_intent = await create_intent(customer_id, idempotency_key)
+            except stripe.error.InvalidRequestError as e:
+                if "No such customer" not in str(e):
+                    raise
+                # El customer cacheado se borró en Stripe: resolverlo de nuevo (lo recrea)
+                logger.warning(f"Customer {customer_id} ya no existe en {stripe_account.stripe_account_id}, recreándolo")
+                await stripe_resolution_cache.invalidate_customer(stripe_account.stripe_account_id, gym_id, user.id)
+                customer_id = await self._resolve_stripe_customer_id(
+                    db, user, gym_id, stripe_account.stripe_account_id
+                )
+                payment_intent = await create_intent(
+                    customer_id, f"{idempotency_key}-{customer_id}" if idempotency_key else None
+                )
 
             logger.info(f"Payment Intent creado: {payment_intent.id} para evento {event.id}")
 
@@ -165,6 +184,7 @@ class EventPaymentService:
 
         except stripe.error.PermissionError as e:
             # Cuenta desautorizada o inactiva
+            await stripe_resolution_cache.invalidate_gym_account(gym_id)
             logger.error(
                 f"Cuenta de Stripe desconectada o sin permisos: {e}. "
                 f"Gym {gym_id}, Account: {stripe_account.stripe_account_id if stripe_account else 'N/A'}. "
@@ -215,13 +235,10 @@ class EventPaymentService:
             Diccionario con client_secret y payment_intent_id
         """
         try:
-            # Obtener cuenta de Stripe Connect
-            stripe_account = db.query(GymStripeAccount).filter(
-                GymStripeAccount.gym_id == gym_id,
-                GymStripeAccount.is_active == True
-            ).first()
+            # Obtener cuenta de Stripe Connect (cacheada)
+            stripe_account = await stripe_resolution_cache.get_gym_account(db, gym_id)
 
-            if not stripe_account:
+            if not stripe_account.stripe_account_id:
                 raise ValueError(
                     "Cuenta de Stripe no configurada o inactiva. "
                     "Verifique el estado con GET /api/v1/stripe-connect/accounts/connection-status"
@@ -241,7 +258,8 @@ class EventPaymentService:
 
                 try:
                     # Intentar recuperar Payment Intent existente
-                    existing_pi = stripe.PaymentIntent.retrieve(
+                    existing_pi = await stripe_gateway.call(
+                        stripe.PaymentIntent.retrieve,
                         participation.stripe_payment_intent_id,
                         stripe_account=stripe_account.stripe_account_id
                     )
@@ -317,7 +335,12 @@ class EventPaymentService:
                 db=db,
                 event=event,
                 user=user,
-                gym_id=gym_id
+                gym_id=gym_id,
+                # Incluye el Payment Intent que se sustituye: uno nuevo tras cancelar el anterior
+                # no debe reutilizar la clave del original
+                idempotency_key=idempotency_key(
+                    "event-payment-intent", participation.id, participation.stripe_payment_intent_id
+                )
             )
 
             # Validar consistencia del client_secret
@@ -351,6 +374,29 @@ class EventPaymentService:
             )
             raise
 
+    async def _resolve_stripe_customer_id(
+        self,
+        db: Session,
+        user: User,
+        gym_id: int,
+        stripe_account_id: str
+    ) -> str:
+        """
+        ID del customer de Stripe del usuario en la cuenta del gym.
+
+        Usa la caché de Stripe; solo en un fallo de caché se consulta el perfil
+        local y se verifica (o crea) el customer en Stripe.
+        """
+        customer_id = await stripe_resolution_cache.get_customer_id(stripe_account_id, gym_id, user.id)
+        if customer_id:
+            return customer_id
+
+        stripe_profile = await self._get_or_create_stripe_customer(db, user, gym_id, stripe_account_id)
+        await stripe_resolution_cache.set_customer_id(
+            stripe_account_id, gym_id, user.id, stripe_profile.stripe_customer_id
+        )
+        return stripe_profile.stripe_customer_id
+
     async def _get_or_create_stripe_customer(
         self,
         db: Session,
@@ -378,11 +424,13 @@ class EventPaymentService:
             )
         ).first()
 
+        replaced_customer_id = None
         if stripe_profile:
             # Verificar que el customer existe en la cuenta Connect actual
             try:
                 # Intentar recuperar el customer de la cuenta Connect
-                stripe.Customer.retrieve(
+                await stripe_gateway.call(
+                    stripe.Customer.retrieve,
                     stripe_profile.stripe_customer_id,
                     stripe_account=stripe_account_id
                 )
@@ -397,6 +445,7 @@ class EventPaymentService:
                         f"{stripe_account_id}. Creando nuevo customer y actualizando perfil."
                     )
                     # El customer no existe en esta cuenta Connect, eliminar el perfil viejo
+                    replaced_customer_id = stripe_profile.stripe_customer_id
                     db.delete(stripe_profile)
                     db.commit()
                     # Continuar para crear uno nuevo
@@ -405,7 +454,11 @@ class EventPaymentService:
 
         # Crear nuevo customer en Stripe
         try:
-            customer = stripe.Customer.create(
+            customer = await stripe_gateway.call(
+                stripe.Customer.create,
+                idempotency_key=idempotency_key(
+                    "event-payment-customer", stripe_account_id, gym_id, user.id, replaced_customer_id
+                ),
                 email=user.email,
                 name=f"{user.first_name} {user.last_name}".strip() or user.email,
                 metadata={
@@ -518,7 +571,8 @@ class EventPaymentService:
                 )
 
                 try:
-                    payment_intent = stripe.PaymentIntent.retrieve(
+                    payment_intent = await stripe_gateway.call(
+                        stripe.PaymentIntent.retrieve,
                         pi_id_to_use,
                         stripe_account=stripe_account.stripe_account_id
                     )
@@ -572,7 +626,8 @@ class EventPaymentService:
 
                 logger.info(f"[Nivel 3] Query de búsqueda: {search_query}")
 
-                result = stripe.PaymentIntent.search(
+                result = await stripe_gateway.call(
+                    stripe.PaymentIntent.search,
                     query=search_query,
                     stripe_account=stripe_account.stripe_account_id,
                     limit=10  # Máximo razonable
@@ -768,7 +823,11 @@ class EventPaymentService:
                     "No se puede procesar el reembolso."
                 )
 
-            refund = stripe.Refund.create(
+            refund = await stripe_gateway.call(
+                stripe.Refund.create,
+                idempotency_key=idempotency_key(
+                    "event-refund-participation", participation.id, participation.stripe_payment_intent_id
+                ),
                 payment_intent=participation.stripe_payment_intent_id,
                 amount=refund_info["amount"],
                 reason="requested_by_customer",
@@ -886,51 +945,111 @@ class EventPaymentService:
             logger.error(f"Error creando oportunidad de pago: {e}")
             raise
 
-    async def expire_pending_payments(self, db: Session) -> List[int]:
+    async def expire_pending_payments(
+        self,
+        db: Session,
+        batch_size: int = EXPIRY_BATCH_SIZE,
+        now: Optional[datetime] = None
+    ) -> List[int]:
         """
         Expirar pagos pendientes que han pasado su fecha límite.
-        Esto se ejecutaría como un job programado.
+        Se ejecuta como job programado (expire_pending_payments_job).
+
+        Por lotes: cada lote se expira y confirma con un único UPDATE ... RETURNING
+        (un fallo a mitad no pierde lo ya procesado), después se cancelan sus
+        Payment Intents en Stripe de forma concurrente y con reintentos, y las
+        plazas liberadas se ofrecen a la lista de espera.
 
         Args:
             db: Sesión de base de datos
+            batch_size: Participaciones por lote
+            now: Instante de referencia (por defecto, ahora en UTC)
 
         Returns:
             Lista de IDs de participaciones expiradas
         """
+        from app.repositories.event import event_participation_repository
+        from app.services.event import event_service
+
+        now = now or datetime.now(timezone.utc)
+        expired_ids: List[int] = []
+        promoted_count = 0
+
         try:
-            now = datetime.utcnow()
-
-            # Buscar participaciones con pago pendiente y fecha expirada
-            expired_participations = db.query(EventParticipation).filter(
-                and_(
-                    EventParticipation.payment_status == PaymentStatusType.PENDING,
-                    EventParticipation.payment_expiry is not None,
-                    EventParticipation.payment_expiry < now
-                )
-            ).all()
+            while True:
+                rows = event_participation_repository.expire_pending_payments(db, now=now, limit=batch_size)
+                if not rows:
+                    break
+                expired_ids.extend(row.id for row in rows)
 
-            expired_ids = []
-            for participation in expired_participations:
-                # Cancelar Payment Intent en Stripe si existe
-                if participation.stripe_payment_intent_id:
-                    try:
-                        stripe.PaymentIntent.cancel(participation.stripe_payment_intent_id)
-                    except stripe.error.StripeError as e:
-                        logger.warning(f"Error cancelando Payment Intent {participation.stripe_payment_intent_id}: {e}")
+                await self._cancel_expired_payment_intents(db, rows)
 
-                # Marcar como expirado
-                participation.payment_status = PaymentStatusType.EXPIRED
-                expired_ids.append(participation.id)
+                for event_id in sorted({row.event_id for row in rows}):
+                    promoted = event_participation_repository.fill_vacancies_from_waiting_list(db, event_id)
+                    promoted_count += len(promoted)
+                    if promoted:
+                        await event_service.notify_waitlist_promotions(db.get(Event, event_id), promoted)
 
-            db.commit()
+                if len(rows) < batch_size:
+                    break
 
-            logger.info(f"Expirados {len(expired_ids)} pagos pendientes")
+            logger.info(
+                f"Expirados {len(expired_ids)} pagos pendientes; "
+                f"{promoted_count} miembros promovidos desde lista de espera"
+            )
             return expired_ids
 
         except Exception as e:
             logger.error(f"Error expirando pagos pendientes: {e}")
+            db.rollback()
             raise
 
+    async def _cancel_expired_payment_intents(self, db: Session, rows: List[Any]) -> int:
+        """
+        Cancelar en Stripe los Payment Intents de participaciones expiradas.
+
+        Las participaciones ya están expiradas en la BD: un fallo aquí solo deja
+        el Payment Intent abierto en Stripe hasta que caduque allí.
+
+        Returns:
+            Número de Payment Intents cancelados
+        """
+        rows = [row for row in rows if row.stripe_payment_intent_id]
+        if not rows:
+            return 0
+
+        accounts = {
+            account.gym_id: account.stripe_account_id
+            for account in db.query(GymStripeAccount).filter(
+                GymStripeAccount.gym_id.in_({row.gym_id for row in rows})
+            )
+        }
+
+        policy = StripeRetryPolicy(max_retries=settings.EVENT_REFUND_MAX_RETRIES)
+        gate = RateLimitGate()
+        semaphore = asyncio.Semaphore(settings.EVENT_REFUND_CONCURRENCY)
+
+        async def cancel(row):
+            async with semaphore:
+                return row, await policy.call(
+                    stripe.PaymentIntent.cancel,
+                    row.stripe_payment_intent_id,
+                    stripe_account=accounts.get(row.gym_id),
+                    idempotency_key=f"expire-participation-{row.id}-{row.stripe_payment_intent_id}",
+                    gate=gate
+                )
+
+        cancelled = 0
+        for row, result in await asyncio.gather(*(cancel(row) for row in rows)):
+            if result.succeeded:
+                cancelled += 1
+            else:
+                logger.warning(
+                    f"Error cancelando Payment Intent {row.stripe_payment_intent_id} "
+                    f"de la participación {row.id}: {result.error}"
+                )
+        return cancelled
+
     async def _process_successful_payment(
         self,
         db: Session,
@@ -996,318 +1115,21 @@ class EventPaymentService:
 
         return participation
 
-    async def cancel_event_with_full_refunds(
-        self,
-        db: Session,
-        event: Event,
-        gym_id: int,
-        cancelled_by_user_id: int,
-        reason: Optional[str] = None
-    ) -> Dict[str, Any]:
-        """
-        Cancelar un evento y procesar reembolsos automáticos del 100% para todos los participantes.
-
-        Este método:
-        - Reembolsa 100% a todos los participantes con payment_status=PAID (ignora políticas de reembolso)
-        - Cancela Payment Intents pendientes (status=PENDING_PAYMENT)
-        - Marca todas las participaciones como CANCELLED
-        - Actualiza el evento con información de auditoría
-        - Continúa procesando aunque algunos reembolsos fallen
-
-        Args:
-            db: Sesión de base de datos
-            event: Evento a cancelar
-            gym_id: ID del gimnasio
-            cancelled_by_user_id: ID del usuario admin que cancela
-            reason: Razón de la cancelación
-
-        Returns:
-            Diccionario con estadísticas de la cancelación:
-            - participants_count: Total de participantes
-            - refunds_processed: Reembolsos exitosos
-            - refunds_failed: Reembolsos fallidos
-            - payments_cancelled: Payment Intents cancelados
-            - total_refunded_cents: Total reembolsado en centavos
-            - failed_refunds: Lista de errores
-        """
-        try:
-            logger.info(
-                f"╔════════════════════════════════════════════════════════════════╗\n"
-                f"║ INICIANDO CANCELACIÓN MASIVA DE EVENTO                        ║\n"
-                f"╠════════════════════════════════════════════════════════════════╣\n"
-                f"║ Evento ID: {event.id}\n"
-                f"║ Título: {event.title}\n"
-                f"║ Gym ID: {gym_id}\n"
-                f"║ Es pago: {event.is_paid}\n"
-                f"║ Precio: {event.price_cents/100 if event.price_cents else 0:.2f} {event.currency or 'EUR'}\n"
-                f"║ Cancelado por User ID: {cancelled_by_user_id}\n"
-                f"║ Razón: {reason or 'Sin razón especificada'}\n"
-                f"╚════════════════════════════════════════════════════════════════╝"
-            )
-
-            # Obtener cuenta de Stripe del gimnasio
-            stripe_account = db.query(GymStripeAccount).filter(
-                GymStripeAccount.gym_id == gym_id,
-                GymStripeAccount.is_active == True
-            ).first()
-
-            if not stripe_account and event.is_paid:
-                raise ValueError(
-                    "No se encontró cuenta de Stripe activa para el gimnasio. "
-                    "Verifique la configuración de Stripe Connect."
-                )
-
-            # Obtener todas las participaciones activas del evento
-            participations = db.query(EventParticipation).filter(
-                and_(
-                    EventParticipation.event_id == event.id,
-                    EventParticipation.gym_id == gym_id,
-                    EventParticipation.status.in_([
-                        EventParticipationStatus.REGISTERED,
-                        EventParticipationStatus.PENDING_PAYMENT,
-                        EventParticipationStatus.WAITING_LIST
-                    ])
-                )
-            ).all()
-
-            # Estadísticas de procesamiento
-            stats = {
-                "participants_count": len(participations),
-                "refunds_processed": 0,
-                "refunds_failed": 0,
-                "payments_cancelled": 0,
-                "total_refunded_cents": 0,
-                "failed_refunds": []
-            }
-
-            # Procesar cada participación
-            for participation in participations:
-                try:
-                    # CASO 1: Participante ya pagó -> Reembolsar 100%
-                    if participation.payment_status == PaymentStatusType.PAID:
-                        if not participation.stripe_payment_intent_id:
-                            logger.warning(
-                                f"Participación {participation.id} marcada como PAID "
-                                f"pero sin stripe_payment_intent_id"
-                            )
-                            stats["refunds_failed"] += 1
-                            stats["failed_refunds"].append({
-                                "participation_id": participation.id,
-                                "member_id": participation.member_id,
-                                "error": "Sin Payment Intent ID"
-                            })
-                            continue
-
-                        # Reembolsar 100% del monto pagado
-                        refund_amount = participation.amount_paid_cents or 0
-
-                        if refund_amount > 0:
-                            logger.info(
-                                f"[Reembolso] Iniciando reembolso para participación {participation.id} - "
-                                f"Member ID: {participation.member_id} - "
-                                f"Payment Intent: {participation.stripe_payment_intent_id} - "
-                                f"Monto: {refund_amount} centavos (€{refund_amount/100:.2f})"
-                            )
-
-                            try:
-                                refund = stripe.Refund.create(
-                                    payment_intent=participation.stripe_payment_intent_id,
-                                    amount=refund_amount,  # 100% del monto
-                                    reason="requested_by_customer",
-                                    metadata={
-                                        "event_id": str(event.id),
-                                        "participation_id": str(participation.id),
-                                        "refund_reason": reason or "Evento cancelado por administrador",
-                                        "cancelled_by_user_id": str(cancelled_by_user_id)
-                                    },
-                                    stripe_account=stripe_account.stripe_account_id
-                                )
-
-                                # Actualizar participación
-                                participation.payment_status = PaymentStatusType.REFUNDED
-                                participation.refund_date = datetime.utcnow()
-                                participation.refund_amount_cents = refund_amount
-                                participation.status = EventParticipationStatus.CANCELLED
-
-                                stats["refunds_processed"] += 1
-                                stats["total_refunded_cents"] += refund_amount
-
-                                logger.info(
-                                    f"[Reembolso] ✅ EXITOSO - Refund ID: {refund.id} - "
-                                    f"Participación: {participation.id} - "
-                                    f"Member: {participation.member_id} - "
-                                    f"Monto reembolsado: €{refund_amount/100:.2f} {event.currency or 'EUR'} - "
-                                    f"Status: {refund.get('status', 'N/A')}"
-                                )
-
-                            except stripe.error.StripeError as e:
-                                error_type = type(e).__name__
-                                error_code = getattr(e, 'code', 'N/A')
-                                error_message = str(e)
-
-                                logger.error(
-                                    f"[Reembolso] ❌ ERROR - Participación {participation.id} - "
-                                    f"Member: {participation.member_id} - "
-                                    f"Payment Intent: {participation.stripe_payment_intent_id} - "
-                                    f"Error Type: {error_type} - "
-                                    f"Error Code: {error_code} - "
-                                    f"Message: {error_message}"
-                                )
-
-                                stats["refunds_failed"] += 1
-                                stats["failed_refunds"].append({
-                                    "participation_id": participation.id,
-                                    "member_id": participation.member_id,
-                                    "error": f"{error_type}: {error_message}",
-                                    "error_code": error_code
-                                })
-                                # Continuar con otros reembolsos
-                                continue
-                        else:
-                            logger.warning(
-                                f"[Reembolso] ⚠️ Participación {participation.id} marcada como PAID "
-                                f"pero con monto 0 o None - Saltando reembolso"
-                            )
-
-                    # CASO 2: Pago pendiente -> Cancelar Payment Intent
-                    elif participation.status == EventParticipationStatus.PENDING_PAYMENT:
-                        if participation.stripe_payment_intent_id:
-                            logger.info(
-                                f"[Cancelación PI] Cancelando Payment Intent pendiente - "
-                                f"Participación: {participation.id} - "
-                                f"Member: {participation.member_id} - "
-                                f"Payment Intent: {participation.stripe_payment_intent_id}"
-                            )
-
-                            try:
-                                # Cancelar Payment Intent en Stripe
-                                cancelled_pi = stripe.PaymentIntent.cancel(
-                                    participation.stripe_payment_intent_id,
-                                    stripe_account=stripe_account.stripe_account_id
-                                )
-
-                                participation.payment_status = PaymentStatusType.EXPIRED
-                                participation.status = EventParticipationStatus.CANCELLED
-
-                                stats["payments_cancelled"] += 1
-
-                                logger.info(
-                                    f"[Cancelación PI] ✅ EXITOSO - Payment Intent cancelado - "
-                                    f"PI ID: {participation.stripe_payment_intent_id} - "
-                                    f"Participación: {participation.id} - "
-                                    f"Member: {participation.member_id} - "
-                                    f"Status: {cancelled_pi.get('status', 'N/A')}"
-                                )
-
-                            except stripe.error.StripeError as e:
-                                error_type = type(e).__name__
-                                error_code = getattr(e, 'code', 'N/A')
-
-                                logger.warning(
-                                    f"[Cancelación PI] ⚠️ ERROR (continuando) - "
-                                    f"Participación {participation.id} - "
-                                    f"Member: {participation.member_id} - "
-                                    f"Payment Intent: {participation.stripe_payment_intent_id} - "
-                                    f"Error Type: {error_type} - "
-                                    f"Error Code: {error_code} - "
-                                    f"Message: {str(e)}"
-                                )
-                                # Marcar como cancelado de todas formas
-                                participation.status = EventParticipationStatus.CANCELLED
-                                participation.payment_status = PaymentStatusType.EXPIRED
-
-                                logger.info(
-                                    f"[Cancelación PI] Participación {participation.id} marcada como "
-                                    f"CANCELLED/EXPIRED a pesar del error"
-                                )
-                        else:
-                            # Sin Payment Intent, solo marcar como cancelado
-                            logger.info(
-                                f"[Cancelación PI] Participación {participation.id} (Member: {participation.member_id}) "
-                                f"sin Payment Intent - Marcando como CANCELLED/EXPIRED"
-                            )
-                            participation.status = EventParticipationStatus.CANCELLED
-                            participation.payment_status = PaymentStatusType.EXPIRED
-
-                    # CASO 3: Participante sin pago (evento gratuito o waiting list)
-                    else:
-                        logger.info(
-                            f"[Cancelación] Participación {participation.id} (Member: {participation.member_id}) - "
-                            f"Status: {participation.status.value} - Sin pago - Marcando como CANCELLED"
-                        )
-                        participation.status = EventParticipationStatus.CANCELLED
-
-                except Exception as e:
-                    logger.error(f"Error procesando participación {participation.id}: {e}")
-                    stats["failed_refunds"].append({
-                        "participation_id": participation.id,
-                        "member_id": participation.member_id,
-                        "error": str(e)
-                    })
-                    continue
-
-            # Actualizar evento con información de auditoría
-            from app.models.event import EventStatus
-            event.status = EventStatus.CANCELLED
-            event.cancellation_date = datetime.utcnow()
-            event.cancelled_by_user_id = cancelled_by_user_id
-            event.cancellation_reason = reason
-            event.total_refunded_cents = stats["total_refunded_cents"]
-
-            # Commit de todos los cambios
-            db.commit()
-
-            # Calcular totales para el resumen
-            total_refunded_amount = stats["total_refunded_cents"] / 100
-            success_rate = (
-                (stats["refunds_processed"] / (stats["refunds_processed"] + stats["refunds_failed"]) * 100)
-                if (stats["refunds_processed"] + stats["refunds_failed"]) > 0
-                else 100
-            )
-
-            logger.info(
-                f"\n╔════════════════════════════════════════════════════════════════╗\n"
-                f"║ CANCELACIÓN DE EVENTO COMPLETADA                              ║\n"
-                f"╠════════════════════════════════════════════════════════════════╣\n"
-                f"║ Evento ID: {event.id} - {event.title}\n"
-                f"║ \n"
-                f"║ 📊 RESUMEN DE PARTICIPANTES:\n"
-                f"║   • Total participantes procesados: {stats['participants_count']}\n"
-                f"║ \n"
-                f"║ 💰 REEMBOLSOS:\n"
-                f"║   • ✅ Exitosos: {stats['refunds_processed']}\n"
-                f"║   • ❌ Fallidos: {stats['refunds_failed']}\n"
-                f"║   • Tasa de éxito: {success_rate:.1f}%\n"
-                f"║   • Total reembolsado: €{total_refunded_amount:.2f} {event.currency or 'EUR'}\n"
-                f"║ \n"
-                f"║ 🚫 PAYMENT INTENTS CANCELADOS:\n"
-                f"║   • Pagos pendientes cancelados: {stats['payments_cancelled']}\n"
-                f"║ \n"
-                f"║ 📝 AUDITORÍA:\n"
-                f"║   • Cancelado por User ID: {cancelled_by_user_id}\n"
-                f"║   • Fecha: {event.cancellation_date}\n"
-                f"║   • Razón: {reason or 'Sin razón especificada'}\n"
-                f"╚════════════════════════════════════════════════════════════════╝"
-            )
-
-            # Log de errores detallados si los hay
-            if stats["refunds_failed"] > 0:
-                logger.warning(
-                    f"\n⚠️ ERRORES DE REEMBOLSO DETALLADOS ({stats['refunds_failed']} fallos):\n" +
-                    "\n".join([
-                        f"  • Participación {err['participation_id']} (Member {err['member_id']}): "
-                        f"{err.get('error', 'Error desconocido')}"
-                        for err in stats["failed_refunds"]
-                    ])
-                )
-
-            return stats
-
-        except Exception as e:
-            logger.error(f"Error en cancelación masiva de evento {event.id}: {e}")
-            db.rollback()
-            raise
-
 
 # Instancia global del servicio
-event_payment_service = EventPaymentService()
\ No newline at end of file
+event_payment_service = EventPaymentService()
+
+
+async def expire_pending_payments_job():
+    """
+    Job del scheduler que expira los pagos pendientes vencidos de eventos.
+    """
+    from app.db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        await event_payment_service.expire_pending_payments(db)
+    except Exception as e:
+        logger.error(f"Error en el job de expiración de pagos de eventos: {e}", exc_info=True)
+    finally:
+        db.close()
@@ -0,0 +1,497 @@
+"""
+Event Refund Jobs - Reembolsos masivos al cancelar eventos de pago.
+
+Cancelar un evento con cientos de participantes no puede esperar a que Stripe
+responda a cada reembolso dentro de la petición HTTP. La cancelación se divide
+en dos fases:
+
+- ``enqueue_cancellation`` marca el evento y las participaciones sin pago como
+  canceladas y registra, en la misma transacción, un trabajo con un elemento por
+  cada operación de Stripe pendiente (reembolso o cancelación de Payment Intent).
+- ``run_job`` ejecuta esos elementos con concurrencia acotada, claves de
+  idempotencia estables (reintentar nunca duplica un reembolso) y espera
+  exponencial compartida ante los 429 de Stripe. El resultado de cada elemento
+  se confirma en la BD al terminarlo, de modo que un trabajo interrumpido se
+  reanuda con solo los elementos pendientes (``resume_event_refund_jobs``).
+  Mientras haya elementos en curso el latido del trabajo se renueva cada
+  ``HEARTBEAT_INTERVAL``, aunque ninguno termine (p. ej. esperando un 429).
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import stripe
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.event import (
+    Event,
+    EventParticipation,
+    EventParticipationStatus,
+    EventRefundActionType,
+    EventRefundItemStatus,
+    EventRefundJob,
+    EventRefundJobItem,
+    EventRefundJobStatus,
+    EventStatus,
+    PaymentStatusType,
+)
+from app.models.stripe_profile import GymStripeAccount
+from app.services.stripe_retry import (
+    BACKOFF_BASE_SECONDS,
+    BACKOFF_MAX_SECONDS,
+    RateLimitGate,
+    StripeCallResult,
+    StripeRetryPolicy,
+)
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Un trabajo RUNNING sin progreso durante este tiempo se considera abandonado
+STALE_JOB_AFTER = timedelta(minutes=5)
+# Frecuencia con la que el worker renueva el latido con operaciones en curso
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+
+
+class _StripeCall(NamedTuple):
+    """Datos primitivos de una operación, seguros para ejecutarse en otro hilo."""
+    item_id: int
+    action: EventRefundActionType
+    payment_intent_id: str
+    amount_cents: int
+    stripe_account_id: Optional[str]
+    idempotency_key: str
+    metadata: Dict[str, str]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class EventRefundJobService:
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base_seconds: float = BACKOFF_BASE_SECONDS,
+        backoff_max_seconds: float = BACKOFF_MAX_SECONDS,
+        heartbeat_interval_seconds: float = HEARTBEAT_INTERVAL.total_seconds()
+    ):
+        self.concurrency = max(1, concurrency or settings.EVENT_REFUND_CONCURRENCY)
+        self.heartbeat_interval_seconds = heartbeat_interval_seconds
+        self.retry_policy = StripeRetryPolicy(
+            max_retries=settings.EVENT_REFUND_MAX_RETRIES if max_retries is None else max_retries,
+            backoff_base_seconds=backoff_base_seconds,
+            backoff_max_seconds=backoff_max_seconds
+        )
+
+    # ------------------------------------------------------------------
+    # Encolado
+    # ------------------------------------------------------------------
+
+    def enqueue_cancellation(
+        self,
+        db: Session,
+        event: Event,
+        gym_id: int,
+        cancelled_by_user_id: int,
+        reason: Optional[str] = None
+    ) -> EventRefundJob:
+        """
+        Cancela el evento y registra el trabajo de reembolsos en una transacción.
+
+        - Participaciones PAID: elemento REFUND por el 100% de lo pagado (sin
+          Payment Intent el elemento nace FAILED para revisión manual).
+        - PENDING_PAYMENT: se marcan CANCELLED/EXPIRED y, si tienen Payment
+          Intent, elemento CANCEL_PAYMENT.
+        - Resto (lista de espera, sin pago): CANCELLED directamente.
+
+        Args:
+            db: Sesión de base de datos
+            event: Evento a cancelar
+            gym_id: ID del gimnasio
+            cancelled_by_user_id: ID del usuario admin que cancela
+            reason: Razón de la cancelación
+
+        Returns:
+            Trabajo creado (COMPLETED si no había nada que enviar a Stripe)
+        """
+        stripe_account = db.query(GymStripeAccount).filter(
+            GymStripeAccount.gym_id == gym_id,
+            GymStripeAccount.is_active == True
+        ).first()
+
+        if not stripe_account and event.is_paid:
+            raise ValueError(
+                "No se encontró cuenta de Stripe activa para el gimnasio. "
+                "Verifique la configuración de Stripe Connect."
+            )
+
+        participations = db.query(EventParticipation).filter(
+            and_(
+                EventParticipation.event_id == event.id,
+                EventParticipation.gym_id == gym_id,
+                EventParticipation.status.in_([
+                    EventParticipationStatus.REGISTERED,
+                    EventParticipationStatus.PENDING_PAYMENT,
+                    EventParticipationStatus.WAITING_LIST
+                ])
+            )
+        ).all()
+
+        job = EventRefundJob(
+            event_id=event.id,
+            gym_id=gym_id,
+            created_by_user_id=cancelled_by_user_id,
+            stripe_account_id=stripe_account.stripe_account_id if stripe_account else None,
+            reason=reason,
+            status=EventRefundJobStatus.PENDING,
+            total_items=0,
+            succeeded_items=0,
+            failed_items=0,
+            scheduled_refund_cents=0,
+            refunded_cents=0
+        )
+
+        for participation in participations:
+            if participation.payment_status == PaymentStatusType.PAID:
+                amount = participation.amount_paid_cents or 0
+                if not participation.stripe_payment_intent_id:
+                    logger.warning(
+                        f"Participación {participation.id} marcada como PAID sin stripe_payment_intent_id"
+                    )
+                    job.items.append(EventRefundJobItem(
+                        participation_id=participation.id,
+                        member_id=participation.member_id,
+                        action=EventRefundActionType.REFUND,
+                        amount_cents=amount,
+                        status=EventRefundItemStatus.FAILED,
+                        attempts=0,
+                        error="Sin Payment Intent ID"
+                    ))
+                    job.failed_items += 1
+                elif amount > 0:
+                    job.items.append(EventRefundJobItem(
+                        participation_id=participation.id,
+                        member_id=participation.member_id,
+                        action=EventRefundActionType.REFUND,
+                        payment_intent_id=participation.stripe_payment_intent_id,
+                        amount_cents=amount,
+                        status=EventRefundItemStatus.PENDING,
+                        attempts=0
+                    ))
+                    job.scheduled_refund_cents += amount
+                else:
+                    logger.warning(
+                        f"Participación {participation.id} marcada como PAID con monto 0 - Sin reembolso"
+                    )
+                    participation.status = EventParticipationStatus.CANCELLED
+
+            elif participation.status == EventParticipationStatus.PENDING_PAYMENT:
+                # La plaza se libera ya; la cancelación en Stripe es solo higiene
+                participation.status = EventParticipationStatus.CANCELLED
+                participation.payment_status = PaymentStatusType.EXPIRED
+                if participation.stripe_payment_intent_id:
+                    job.items.append(EventRefundJobItem(
+                        participation_id=participation.id,
+                        member_id=participation.member_id,
+                        action=EventRefundActionType.CANCEL_PAYMENT,
+                        payment_intent_id=participation.stripe_payment_intent_id,
+                        amount_cents=0,
+                        status=EventRefundItemStatus.PENDING,
+                        attempts=0
+                    ))
+
+            else:
+                participation.status = EventParticipationStatus.CANCELLED
+
+        job.total_items = len(job.items)
+        if job.total_items == job.failed_items:
+            self._mark_finished(job, event)
+        db.add(job)
+
+        event.status = EventStatus.CANCELLED
+        event.cancellation_date = _utcnow()
+        event.cancelled_by_user_id = cancelled_by_user_id
+        event.cancellation_reason = reason
+        event.total_refunded_cents = 0
+
+        db.commit()
+        db.refresh(job)
+
+        logger.info(
+            f"Evento {event.id} cancelado: {len(participations)} participaciones, "
+            f"trabajo de reembolsos {job.id} con {job.total_items} operaciones de Stripe "
+            f"({job.scheduled_refund_cents} centavos a reembolsar)"
+        )
+        return job
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+
+    async def run_job(self, job_id: int, session_factory: Optional[Callable[[], Session]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Ejecuta los elementos pendientes de un trabajo.
+
+        Solo un worker puede tener el trabajo a la vez: se reclama con un UPDATE
+        condicional (PENDING, o RUNNING sin progreso reciente).
+
+        Returns:
+            Progreso final del trabajo, o None si otro worker lo tiene o ya terminó
+        """
+        if session_factory is None:
+            from app.db.session import SessionLocal
+            session_factory = SessionLocal
+
+        db = session_factory()
+        try:
+            if not self._claim(db, job_id):
+                logger.info(f"Trabajo de reembolsos {job_id} terminado o en curso en otro worker")
+                return None
+
+            job = db.get(EventRefundJob, job_id)
+            event = db.get(Event, job.event_id)
+            items = db.query(EventRefundJobItem).filter(
+                EventRefundJobItem.job_id == job_id,
+                EventRefundJobItem.status == EventRefundItemStatus.PENDING
+            ).order_by(EventRefundJobItem.id).all()
+            items_by_id = {item.id: item for item in items}
+
+            refund_participation_ids = [
+                item.participation_id for item in items if item.action == EventRefundActionType.REFUND
+            ]
+            participations = {
+                participation.id: participation
+                for participation in db.query(EventParticipation).filter(
+                    EventParticipation.id.in_(refund_participation_ids)
+                )
+            } if refund_participation_ids else {}
+
+            logger.info(
+                f"Trabajo de reembolsos {job_id} (evento {job.event_id}): "
+                f"{len(items)} operaciones pendientes, concurrencia {self.concurrency}"
+            )
+
+            # El límite de Stripe es por cuenta: un 429 frena a todos los workers
+            gate = RateLimitGate()
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def execute(call: _StripeCall):
+                async with semaphore:
+                    return call, await self.retry_policy.call(self._call_stripe, call, gate=gate)
+
+            pending = {asyncio.create_task(execute(self._build_call(job, item))) for item in items}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=self.heartbeat_interval_seconds, return_when=asyncio.FIRST_COMPLETED
+                )
+                for finished in done:
+                    call, outcome = finished.result()
+                    item = items_by_id[call.item_id]
+                    self._record_outcome(job, item, participations.get(item.participation_id), outcome)
+                # Renovar el latido aunque no haya terminado ningún elemento
+                job.heartbeat_at = _utcnow()
+                db.commit()
+
+            self._mark_finished(job, event)
+            db.commit()
+
+            logger.info(
+                f"Trabajo de reembolsos {job_id} terminado: {job.succeeded_items} correctas, "
+                f"{job.failed_items} fallidas, {job.refunded_cents} centavos reembolsados"
+            )
+            return self.progress(db, job)
+        except Exception as e:
+            logger.error(f"Error ejecutando el trabajo de reembolsos {job_id}: {e}", exc_info=True)
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _claim(self, db: Session, job_id: int) -> bool:
+        now = _utcnow()
+        result = db.execute(
+            update(EventRefundJob)
+            .where(
+                EventRefundJob.id == job_id,
+                or_(
+                    EventRefundJob.status == EventRefundJobStatus.PENDING,
+                    and_(
+                        EventRefundJob.status == EventRefundJobStatus.RUNNING,
+                        EventRefundJob.heartbeat_at < now - STALE_JOB_AFTER
+                    )
+                )
+            )
+            .values(
+                status=EventRefundJobStatus.RUNNING,
+                started_at=func.coalesce(EventRefundJob.started_at, now),
+                heartbeat_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return result.rowcount == 1
+
+    @staticmethod
+    def _build_call(job: EventRefundJob, item: EventRefundJobItem) -> _StripeCall:
+        return _StripeCall(
+            item_id=item.id,
+            action=item.action,
+            payment_intent_id=item.payment_intent_id,
+            amount_cents=item.amount_cents,
+            stripe_account_id=job.stripe_account_id,
+            # Estable entre reintentos y reanudaciones del mismo trabajo
+            idempotency_key=f"event-refund-job-{job.id}-participation-{item.participation_id}",
+            metadata={
+                "event_id": str(job.event_id),
+                "participation_id": str(item.participation_id),
+                "refund_reason": job.reason or "Evento cancelado por administrador",
+                "cancelled_by_user_id": str(job.created_by_user_id),
+            }
+        )
+
+    @staticmethod
+    def _call_stripe(call: _StripeCall) -> Any:
+        if call.action == EventRefundActionType.REFUND:
+            return stripe.Refund.create(
+                payment_intent=call.payment_intent_id,
+                amount=call.amount_cents,
+                reason="requested_by_customer",
+                metadata=call.metadata,
+                stripe_account=call.stripe_account_id,
+                idempotency_key=call.idempotency_key
+            )
+        return stripe.PaymentIntent.cancel(
+            call.payment_intent_id,
+            stripe_account=call.stripe_account_id,
+            idempotency_key=call.idempotency_key
+        )
+
+    @staticmethod
+    def _record_outcome(
+        job: EventRefundJob,
+        item: EventRefundJobItem,
+        participation: Optional[EventParticipation],
+        outcome: StripeCallResult
+    ) -> None:
+        now = _utcnow()
+        item.attempts = (item.attempts or 0) + outcome.attempts
+
+        if not outcome.succeeded:
+            item.status = EventRefundItemStatus.FAILED
+            item.error = outcome.error
+            job.failed_items += 1
+            logger.error(
+                f"[Reembolso] Participación {item.participation_id} (Member {item.member_id}) "
+                f"falló tras {outcome.attempts} intentos: {outcome.error}"
+            )
+            return
+
+        item.status = EventRefundItemStatus.SUCCEEDED
+        item.stripe_object_id = outcome.value.get("id")
+        item.error = None
+        job.succeeded_items += 1
+
+        if item.action == EventRefundActionType.REFUND:
+            job.refunded_cents += item.amount_cents
+            if participation is not None:
+                participation.payment_status = PaymentStatusType.REFUNDED
+                participation.refund_date = now
+                participation.refund_amount_cents = item.amount_cents
+                participation.status = EventParticipationStatus.CANCELLED
+
+    @staticmethod
+    def _mark_finished(job: EventRefundJob, event: Optional[Event]) -> None:
+        job.status = (
+            EventRefundJobStatus.COMPLETED if not job.failed_items
+            else EventRefundJobStatus.COMPLETED_WITH_ERRORS
+        )
+        job.finished_at = _utcnow()
+        if event is not None:
+            event.total_refunded_cents = job.refunded_cents
+
+    # ------------------------------------------------------------------
+    # Consulta y reanudación
+    # ------------------------------------------------------------------
+
+    def get_latest_job(self, db: Session, event_id: int, gym_id: int) -> Optional[EventRefundJob]:
+        return db.query(EventRefundJob).filter(
+            EventRefundJob.event_id == event_id,
+            EventRefundJob.gym_id == gym_id
+        ).order_by(EventRefundJob.id.desc()).first()
+
+    def progress(self, db: Session, job: EventRefundJob) -> Dict[str, Any]:
+        """Progreso del trabajo con el detalle de los elementos fallidos."""
+        failed = db.query(EventRefundJobItem).filter(
+            EventRefundJobItem.job_id == job.id,
+            EventRefundJobItem.status == EventRefundItemStatus.FAILED
+        ).order_by(EventRefundJobItem.id).all()
+
+        return {
+            "job_id": job.id,
+            "event_id": job.event_id,
+            "status": job.status.value,
+            "total_items": job.total_items,
+            "succeeded_items": job.succeeded_items,
+            "failed_items": job.failed_items,
+            "pending_items": job.total_items - job.succeeded_items - job.failed_items,
+            "scheduled_refund_cents": job.scheduled_refund_cents,
+            "refunded_cents": job.refunded_cents,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+            "failures": [
+                {
+                    "participation_id": item.participation_id,
+                    "member_id": item.member_id,
+                    "action": item.action.value,
+                    "error": item.error,
+                }
+                for item in failed
+            ],
+        }
+
+    def get_resumable_job_ids(self, db: Session) -> List[int]:
+        """Trabajos sin empezar o abandonados por un worker caído."""
+        stale_before = _utcnow() - STALE_JOB_AFTER
+        rows = db.query(EventRefundJob.id).filter(
+            or_(
+                EventRefundJob.status == EventRefundJobStatus.PENDING,
+                and_(
+                    EventRefundJob.status == EventRefundJobStatus.RUNNING,
+                    EventRefundJob.heartbeat_at < stale_before
+                )
+            )
+        ).order_by(EventRefundJob.id).all()
+        return [row.id for row in rows]
+
+
+event_refund_job_service = EventRefundJobService()
+
+
+async def resume_event_refund_jobs():
+    """
+    Job del scheduler que reanuda trabajos de reembolsos pendientes o abandonados.
+    """
+    from app.db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        job_ids = event_refund_job_service.get_resumable_job_ids(db)
+    except Exception as e:
+        logger.error(f"Error buscando trabajos de reembolsos pendientes: {e}", exc_info=True)
+        return
+    finally:
+        db.close()
+
+    for job_id in job_ids:
+        try:
+            await event_refund_job_service.run_job(job_id, SessionLocal)
+        except Exception as e:
+            logger.error(f"Error reanudando el trabajo de reembolsos {job_id}: {e}", exc_info=True)
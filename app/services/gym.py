@@ -152,7 +152,8 @@ class GymService:
     ) -> UserGym:
         """
         Añade un usuario a un gimnasio con el rol especificado.
-        Por defecto, el rol es MEMBER.
+        Por defecto, el rol es MEMBER. Quien llama invalida después el resumen
+        de membresías del gimnasio.
         
         Args:
             db: Sesión de base de datos
@@ -209,6 +210,9 @@ class GymService:
         """
         Eliminar un usuario de un gimnasio.
         Impide eliminar usuarios SUPER_ADMIN.
+
+        No hace commit: quien llama confirma la transacción y después invalida
+        el resumen de membresías del gimnasio.
         """
         # Verificar que el usuario a eliminar existe y NO es SUPER_ADMIN
         user_to_remove = db.query(User).filter(User.id == user_id).first()
@@ -0,0 +1,200 @@
+"""
+Gym Hours Calendar - Horario efectivo precalculado por gimnasio.
+
+Resolver el horario de una fecha exige consultar el día especial y el horario
+semanal. Este servicio materializa, para un horizonte móvil de 90 días, el
+horario que rige cada fecha en un array indexado por el desplazamiento del día
+respecto al inicio del calendario, de modo que consultar cualquier fecha del
+horizonte es O(1) en memoria.
+
+El calendario se guarda en Redis en forma compacta (los 7 días semanales más
+los días especiales por desplazamiento) bajo el namespace versionado
+``gym_hours:{gym_id}``, que se incrementa al modificar el horario semanal o
+cualquier día especial.
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from redis.asyncio import Redis
+from sqlalchemy.orm import Session
+
+from app.repositories.schedule import gym_hours_repository, gym_special_hours_repository
+from app.services.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_PAST_DAYS = 7
+CALENDAR_HORIZON_DAYS = 90
+CALENDAR_TTL = 24 * 3600
+
+
+class EffectiveHours(NamedTuple):
+    """Horario que rige una fecha (o un día de la semana)."""
+    open_time: Optional[time]
+    close_time: Optional[time]
+    is_closed: bool
+    is_special: bool
+    source_id: Optional[int]
+    description: Optional[str] = None
+
+    def fits(self, start_local: datetime, end_local: datetime) -> bool:
+        """Comprobar si una sesión (hora local) cabe en este horario."""
+        if self.is_closed:
+            return False
+        if self.open_time and start_local.time() < self.open_time:
+            return False
+        if (self.close_time and end_local.date() == start_local.date()
+                and end_local.time() > self.close_time):
+            return False
+        return True
+
+
+def _time_str(value: Optional[time]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _parse_time(value: Optional[str]) -> Optional[time]:
+    return time.fromisoformat(value) if value else None
+
+
+class GymHoursCalendar:
+    """Horario efectivo de un gimnasio para un rango de fechas contiguo."""
+
+    __slots__ = ("gym_id", "start", "weekly", "days")
+
+    def __init__(self, gym_id: int, start: date, weekly: List[EffectiveHours], days: List[EffectiveHours]):
+        self.gym_id = gym_id
+        self.start = start
+        self.weekly = weekly
+        self.days = days
+
+    @property
+    def end(self) -> date:
+        return self.start + timedelta(days=len(self.days) - 1)
+
+    def covers(self, start: date, end: date) -> bool:
+        return self.start <= start and end <= self.end
+
+    def get(self, day: date) -> Optional[EffectiveHours]:
+        """Horario efectivo de una fecha, o None si está fuera del calendario."""
+        offset = (day - self.start).days
+        if 0 <= offset < len(self.days):
+            return self.days[offset]
+        return None
+
+    def to_payload(self) -> Dict[str, Any]:
+        """Representación compacta: horario semanal y días especiales por desplazamiento."""
+        def row(hours: EffectiveHours) -> List[Any]:
+            return [_time_str(hours.open_time), _time_str(hours.close_time), hours.is_closed,
+                    hours.source_id, hours.description]
+
+        return {
+            "start": self.start.isoformat(),
+            "length": len(self.days),
+            "weekly": [row(hours) for hours in self.weekly],
+            "special": {str(offset): row(hours) for offset, hours in enumerate(self.days) if hours.is_special},
+        }
+
+    @classmethod
+    def from_payload(cls, gym_id: int, payload: Dict[str, Any]) -> "GymHoursCalendar":
+        def entry(row: List[Any], is_special: bool) -> EffectiveHours:
+            open_time, close_time, is_closed, source_id, description = row
+            return EffectiveHours(_parse_time(open_time), _parse_time(close_time), is_closed,
+                                  is_special, source_id, description)
+
+        start = date.fromisoformat(payload["start"])
+        weekly = [entry(row, False) for row in payload["weekly"]]
+        special = {int(offset): entry(row, True) for offset, row in payload["special"].items()}
+        days = [
+            special.get(offset) or weekly[(start + timedelta(days=offset)).weekday()]
+            for offset in range(payload["length"])
+        ]
+        return cls(gym_id, start, weekly, days)
+
+
+class GymHoursCalendarService:
+
+    @staticmethod
+    def namespace(gym_id: int) -> str:
+        return f"gym_hours:{gym_id}"
+
+    def build(self, db: Session, gym_id: int, start: date, end: date) -> GymHoursCalendar:
+        """
+        Materializa el calendario de [start, end] con una consulta del horario
+        semanal y otra de los días especiales del rango. Los días de la semana
+        sin registro usan el horario predeterminado sin escribirlo en la BD.
+        """
+        weekly_rows = {hours.day_of_week: hours for hours in gym_hours_repository.get_all_days(db, gym_id=gym_id)}
+        weekly = []
+        for day in range(7):
+            hours = weekly_rows.get(day)
+            if hours:
+                weekly.append(EffectiveHours(hours.open_time, hours.close_time, bool(hours.is_closed), False, hours.id))
+            else:
+                default = gym_hours_repository.default_values(day)
+                weekly.append(EffectiveHours(default["open_time"], default["close_time"], default["is_closed"],
+                                             False, None))
+
+        special = {
+            special.date: EffectiveHours(special.open_time, special.close_time, bool(special.is_closed),
+                                         True, special.id, special.description)
+            for special in gym_special_hours_repository.get_by_date_range(
+                db, start_date=start, end_date=end, gym_id=gym_id
+            )
+        }
+
+        days = []
+        current = start
+        while current <= end:
+            days.append(special.get(current) or weekly[current.weekday()])
+            current += timedelta(days=1)
+        return GymHoursCalendar(gym_id, start, weekly, days)
+
+    async def get_calendar(
+        self,
+        db: Session,
+        gym_id: int,
+        redis_client: Optional[Redis] = None,
+        today: Optional[date] = None
+    ) -> GymHoursCalendar:
+        """
+        Calendario del horizonte móvil (7 días atrás, 90 días adelante), desde
+        Redis o materializado desde la BD.
+        """
+        today = today or datetime.now(timezone.utc).date()
+        start = today - timedelta(days=CALENDAR_PAST_DAYS)
+        end = today + timedelta(days=CALENDAR_HORIZON_DAYS)
+
+        async def db_fetch():
+            return self.build(db, gym_id, start, end).to_payload()
+
+        payload = await cache_service.get_or_set_json(
+            redis_client,
+            f"gym_hours:calendar:{gym_id}:{start.isoformat()}",
+            db_fetch,
+            expiry_seconds=CALENDAR_TTL,
+            namespaces=[self.namespace(gym_id)]
+        )
+        return GymHoursCalendar.from_payload(gym_id, payload)
+
+    async def get_calendar_for_range(
+        self,
+        db: Session,
+        gym_id: int,
+        start: date,
+        end: date,
+        redis_client: Optional[Redis] = None
+    ) -> GymHoursCalendar:
+        """Calendario que cubre [start, end]; fuera del horizonte se materializa solo ese rango."""
+        calendar = await self.get_calendar(db, gym_id, redis_client)
+        if calendar.covers(start, end):
+            return calendar
+        return self.build(db, gym_id, start, end)
+
+    async def invalidate(self, redis_client: Optional[Redis], gym_id: int) -> None:
+        await cache_service.bump_namespaces(redis_client, self.namespace(gym_id))
+
+
+gym_hours_calendar_service = GymHoursCalendarService()
@@ -1,31 +1,30 @@
 """
 Servicio para el tracking y distribución de ingresos por gimnasio.
 Maneja la contabilidad de pagos en una arquitectura multi-tenant con una sola cuenta de Stripe.
+
+Los importes salen del libro de ingresos local (``revenue_ledger_entries``),
+alimentado por los webhooks de Stripe; ver ``app.services.revenue_ledger``.
 """
 
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func, extract
+from sqlalchemy import case, func
 import logging
-import stripe
 
-from app.core.config import get_settings
 from app.models.gym import Gym
-from app.models.user_gym import UserGym
-from app.models.membership import MembershipPlan
+from app.models.revenue import RevenueEntryType, RevenueLedgerEntry
 
-settings = get_settings()
 logger = logging.getLogger(__name__)
 
+# Comisión de la plataforma sobre lo cobrado neto de reembolsos
+PLATFORM_FEE_RATE = 0.05
+
 class GymRevenueService:
     """
     Servicio para gestionar ingresos y distribución de pagos por gimnasio.
     """
     
-    def __init__(self):
-        stripe.api_key = settings.STRIPE_SECRET_KEY
-    
     async def get_gym_revenue_summary(
         self, 
         db: Session, 
@@ -57,26 +56,43 @@ class GymRevenueService:
             if not gym:
                 raise ValueError(f"Gimnasio {gym_id} no encontrado")
             
-            # Buscar todos los pagos de este gimnasio en Stripe
-            payments = await self._get_stripe_payments_for_gym(gym_id, start_date, end_date)
+            # Agregado por tipo, plan y moneda sobre el libro de ingresos local
+            plan_name = func.coalesce(RevenueLedgerEntry.plan_name, 'Unknown')
+            rows = db.query(
+                RevenueLedgerEntry.entry_type,
+                plan_name.label('plan_name'),
+                RevenueLedgerEntry.currency,
+                func.count(RevenueLedgerEntry.id).label('count'),
+                func.sum(RevenueLedgerEntry.amount_cents).label('amount_cents')
+            ).filter(
+                RevenueLedgerEntry.gym_id == gym_id,
+                RevenueLedgerEntry.occurred_at >= start_date,
+                RevenueLedgerEntry.occurred_at <= end_date
+            ).group_by(
+                RevenueLedgerEntry.entry_type,
+                plan_name,
+                RevenueLedgerEntry.currency
+            ).all()
             
-            # Calcular métricas
-            total_revenue = sum(payment['amount'] for payment in payments) / 100  # Convertir de centavos
-            total_transactions = len(payments)
+            # Calcular métricas (los reembolsos tienen importe negativo)
+            payments = [row for row in rows if row.entry_type != RevenueEntryType.REFUND]
+            total_revenue = sum(row.amount_cents for row in payments) / 100  # Convertir de centavos
+            total_refunds = -sum(row.amount_cents for row in rows if row.entry_type == RevenueEntryType.REFUND) / 100
+            total_transactions = sum(row.count for row in payments)
             
             # Agrupar por tipo de plan
             revenue_by_plan = {}
-            for payment in payments:
-                plan_name = payment.get('metadata', {}).get('plan_name', 'Unknown')
-                if plan_name not in revenue_by_plan:
-                    revenue_by_plan[plan_name] = {'count': 0, 'revenue': 0}
-                revenue_by_plan[plan_name]['count'] += 1
-                revenue_by_plan[plan_name]['revenue'] += payment['amount'] / 100
+            for row in payments:
+                if row.plan_name not in revenue_by_plan:
+                    revenue_by_plan[row.plan_name] = {'count': 0, 'revenue': 0}
+                revenue_by_plan[row.plan_name]['count'] += row.count
+                revenue_by_plan[row.plan_name]['revenue'] += row.amount_cents / 100
             
-            # Calcular comisión de la plataforma (ejemplo: 5%)
-            platform_fee_rate = 0.05
-            platform_fee = total_revenue * platform_fee_rate
-            gym_net_revenue = total_revenue - platform_fee
+            # Comisión de la plataforma sobre lo cobrado neto de reembolsos
+            platform_fee_rate = PLATFORM_FEE_RATE
+            platform_fee = (total_revenue - total_refunds) * platform_fee_rate
+            gym_net_revenue = total_revenue - total_refunds - platform_fee
+            currency = rows[0].currency if rows else 'EUR'
             
             return {
                 'gym_id': gym_id,
@@ -87,9 +103,10 @@ class GymRevenueService:
                 },
                 'revenue': {
                     'total_gross': total_revenue,
+                    'refunds': total_refunds,
                     'platform_fee': platform_fee,
                     'gym_net': gym_net_revenue,
-                    'currency': 'EUR'  # O la moneda que uses
+                    'currency': currency
                 },
                 'transactions': {
                     'total_count': total_transactions,
@@ -105,90 +122,6 @@ class GymRevenueService:
             logger.error(f"Error obteniendo resumen de ingresos para gym {gym_id}: {str(e)}")
             raise
 
-    async def _get_stripe_payments_for_gym(
-        self, 
-        gym_id: int, 
-        start_date: datetime, 
-        end_date: datetime
-    ) -> List[Dict[str, Any]]:
-        """
-        Obtener todos los pagos de Stripe para un gimnasio específico.
-        
-        Args:
-            gym_id: ID del gimnasio
-            start_date: Fecha de inicio
-            end_date: Fecha de fin
-            
-        Returns:
-            List: Lista de pagos de Stripe
-        """
-        try:
-            # Convertir fechas a timestamps
-            start_timestamp = int(start_date.timestamp())
-            end_timestamp = int(end_date.timestamp())
-            
-            # Buscar charges (pagos únicos) y invoices (suscripciones)
-            gym_payments = []
-            
-            # 1. Buscar charges (pagos únicos)
-            charges = stripe.Charge.list(
-                created={
-                    'gte': start_timestamp,
-                    'lte': end_timestamp
-                },
-                limit=100,
-                expand=['data.metadata']
-            )
-            
-            for charge in charges.data:
-                if charge.metadata.get('gym_id') == str(gym_id) and charge.status == 'succeeded':
-                    gym_payments.append({
-                        'id': charge.id,
-                        'type': 'charge',
-                        'amount': charge.amount,
-                        'currency': charge.currency,
-                        'created': charge.created,
-                        'metadata': charge.metadata,
-                        'description': charge.description
-                    })
-            
-            # 2. Buscar invoices (suscripciones)
-            invoices = stripe.Invoice.list(
-                created={
-                    'gte': start_timestamp,
-                    'lte': end_timestamp
-                },
-                status='paid',
-                limit=100,
-                expand=['data.metadata', 'data.subscription']
-            )
-            
-            for invoice in invoices.data:
-                # Verificar si pertenece al gimnasio (puede estar en metadata del invoice o subscription)
-                gym_id_meta = invoice.metadata.get('gym_id')
-                if not gym_id_meta and invoice.subscription:
-                    # Buscar en metadata de la suscripción
-                    subscription = stripe.Subscription.retrieve(invoice.subscription)
-                    gym_id_meta = subscription.metadata.get('gym_id')
-                
-                if gym_id_meta == str(gym_id):
-                    gym_payments.append({
-                        'id': invoice.id,
-                        'type': 'invoice',
-                        'amount': invoice.amount_paid,
-                        'currency': invoice.currency,
-                        'created': invoice.created,
-                        'metadata': invoice.metadata,
-                        'description': f"Subscription payment - {invoice.subscription}"
-                    })
-            
-            logger.info(f"Encontrados {len(gym_payments)} pagos para gym {gym_id}")
-            return gym_payments
-            
-        except stripe.error.StripeError as e:
-            logger.error(f"Error obteniendo pagos de Stripe para gym {gym_id}: {str(e)}")
-            return []
-    
     async def get_platform_revenue_summary(
         self, 
         db: Session,
@@ -213,8 +146,23 @@ class GymRevenueService:
             if not start_date:
                 start_date = end_date - timedelta(days=30)
             
-            # Obtener todos los gimnasios activos
-            active_gyms = db.query(Gym).filter(Gym.is_active == True).all()
+            # Un único agregado por gimnasio sobre el libro de ingresos
+            is_refund = RevenueLedgerEntry.entry_type == RevenueEntryType.REFUND
+            totals = db.query(
+                RevenueLedgerEntry.gym_id,
+                func.sum(case((is_refund, 0), else_=RevenueLedgerEntry.amount_cents)).label('gross_cents'),
+                func.sum(case((is_refund, -RevenueLedgerEntry.amount_cents), else_=0)).label('refund_cents'),
+                func.count(case((is_refund, None), else_=RevenueLedgerEntry.id)).label('count'),
+                func.max(RevenueLedgerEntry.currency).label('currency')
+            ).filter(
+                RevenueLedgerEntry.occurred_at >= start_date,
+                RevenueLedgerEntry.occurred_at <= end_date
+            ).group_by(RevenueLedgerEntry.gym_id).subquery()
+            
+            # Todos los gimnasios activos, tengan o no movimientos
+            gyms = db.query(
+                Gym.id, Gym.name, totals.c.gross_cents, totals.c.refund_cents, totals.c.count, totals.c.currency
+            ).outerjoin(totals, totals.c.gym_id == Gym.id).filter(Gym.is_active == True).order_by(Gym.id).all()
             
             platform_summary = {
                 'period': {
@@ -230,24 +178,30 @@ class GymRevenueService:
                 'gyms': []
             }
             
-            # Obtener resumen para cada gimnasio
-            for gym in active_gyms:
-                gym_summary = await self.get_gym_revenue_summary(
-                    db, gym.id, start_date, end_date
-                )
+            for gym in gyms:
+                gross = (gym.gross_cents or 0) / 100
+                refunds = (gym.refund_cents or 0) / 100
+                platform_fee = (gross - refunds) * PLATFORM_FEE_RATE
+                revenue = {
+                    'total_gross': gross,
+                    'refunds': refunds,
+                    'platform_fee': platform_fee,
+                    'gym_net': gross - refunds - platform_fee,
+                    'currency': gym.currency or 'EUR'
+                }
                 
                 # Agregar a totales de la plataforma
-                platform_summary['totals']['gross_revenue'] += gym_summary['revenue']['total_gross']
-                platform_summary['totals']['platform_fees'] += gym_summary['revenue']['platform_fee']
-                platform_summary['totals']['gym_payouts'] += gym_summary['revenue']['gym_net']
-                platform_summary['totals']['total_transactions'] += gym_summary['transactions']['total_count']
+                platform_summary['totals']['gross_revenue'] += revenue['total_gross']
+                platform_summary['totals']['platform_fees'] += revenue['platform_fee']
+                platform_summary['totals']['gym_payouts'] += revenue['gym_net']
+                platform_summary['totals']['total_transactions'] += gym.count or 0
                 
                 # Agregar resumen del gimnasio
                 platform_summary['gyms'].append({
                     'gym_id': gym.id,
                     'gym_name': gym.name,
-                    'revenue': gym_summary['revenue'],
-                    'transaction_count': gym_summary['transactions']['total_count']
+                    'revenue': revenue,
+                    'transaction_count': gym.count or 0
                 })
             
             return platform_summary
@@ -281,17 +235,15 @@ class GymRevenueService:
                 db, gym_id, start_date, end_date
             )
             
-            # Obtener información bancaria del gimnasio (si la tienes almacenada)
-            gym = db.query(Gym).filter(Gym.id == gym_id).first()
-            
             payout_details = {
                 'gym_id': gym_id,
-                'gym_name': gym.name,
+                'gym_name': revenue_summary['gym_name'],
                 'period': revenue_summary['period'],
                 'payout_amount': revenue_summary['revenue']['gym_net'],
                 'currency': revenue_summary['revenue']['currency'],
                 'transaction_count': revenue_summary['transactions']['total_count'],
                 'gross_revenue': revenue_summary['revenue']['total_gross'],
+                'refunds': revenue_summary['revenue']['refunds'],
                 'platform_fee': revenue_summary['revenue']['platform_fee'],
                 'status': 'pending',
                 'created_at': datetime.now().isoformat()
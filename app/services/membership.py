@@ -2,11 +2,13 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 import logging
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, case, func
 
+from app.core.config import get_settings
 from app.models.membership import MembershipPlan
-from app.models.user_gym import UserGym, GymRoleType
+from app.models.user_gym import UserGym, GymRoleType, MembershipLifecycleStatus
 from app.models.gym import Gym
+from app.services.membership_lifecycle import has_access, membership_lifecycle_service
 from app.schemas.membership import (
     MembershipPlanCreate, 
     MembershipPlanUpdate,
@@ -16,6 +18,7 @@ from app.schemas.membership import (
 )
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 
 class MembershipService:
@@ -181,40 +184,39 @@ class MembershipService:
     ) -> MembershipStatus:
         """Obtener estado detallado de membresía"""
         
-        user_gym = self.get_user_membership(db, user_id, gym_id)
-        gym = db.query(Gym).filter(Gym.id == gym_id).first()
+        # Gym y membresía en una sola consulta
+        row = db.query(Gym.name, UserGym).outerjoin(
+            UserGym,
+            and_(UserGym.gym_id == Gym.id, UserGym.user_id == user_id)
+        ).filter(Gym.id == gym_id).first()
+        gym_name, user_gym = row if row else (None, None)
         
-        if not user_gym or not gym:
+        if not user_gym or not gym_name:
             return MembershipStatus(
                 user_id=user_id,
                 gym_id=gym_id,
-                gym_name=gym.name if gym else "Desconocido",
+                gym_name=gym_name or "Desconocido",
                 is_active=False,
                 membership_type="none",
                 can_access=False
             )
         
-        # Verificar si está expirada
-        is_expired = False
+        # El acceso se calcula sin esperar al barrido (incluye el periodo de gracia)
+        now = datetime.now()
         days_remaining = None
-        
-        if user_gym.membership_expires_at:
-            now = datetime.now()
-            is_expired = user_gym.membership_expires_at < now
-            if not is_expired:
-                days_remaining = (user_gym.membership_expires_at - now).days
-        
-        can_access = user_gym.is_active and not is_expired
+        if user_gym.membership_expires_at and user_gym.membership_expires_at >= now:
+            days_remaining = (user_gym.membership_expires_at - now).days
         
         return MembershipStatus(
             user_id=user_id,
             gym_id=gym_id,
-            gym_name=gym.name,
+            gym_name=gym_name,
             is_active=user_gym.is_active,
             membership_type=user_gym.membership_type,
             expires_at=user_gym.membership_expires_at,
             days_remaining=days_remaining,
-            can_access=can_access
+            can_access=has_access(user_gym, now),
+            membership_status=user_gym.membership_status
         )
 
     def update_user_membership(
@@ -287,6 +289,7 @@ class MembershipService:
                 role=GymRoleType.MEMBER,
                 is_active=True,
                 membership_type=membership_type,
+                membership_status=MembershipLifecycleStatus.ACTIVE.value,
                 membership_expires_at=datetime.now() + timedelta(days=duration_days),
                 # 🆕 NO GUARDAR DATOS DE STRIPE EN USERGYM
                 # stripe_customer_id=stripe_customer_id,
@@ -299,6 +302,7 @@ class MembershipService:
             # Actualizar membresía existente
             user_gym.is_active = True
             user_gym.membership_type = membership_type
+            user_gym.membership_status = MembershipLifecycleStatus.ACTIVE.value
             user_gym.membership_expires_at = datetime.now() + timedelta(days=duration_days)
             # 🆕 NO ACTUALIZAR DATOS DE STRIPE EN USERGYM
             # user_gym.stripe_customer_id = stripe_customer_id or user_gym.stripe_customer_id
@@ -310,6 +314,7 @@ class MembershipService:
         db.refresh(user_gym)
         
         logger.info(f"Membresía activada para user {user_id} en gym {gym_id} por {duration_days} días")
+        await membership_lifecycle_service.invalidate_summaries([gym_id])
         
         # 🆕 VERIFICAR QUE EXISTE PERFIL DE STRIPE SI ES PAGO
         if membership_type == "paid":
@@ -326,7 +331,7 @@ class MembershipService:
         
         return user_gym
 
-    def deactivate_membership(
+    async def deactivate_membership(
         self, 
         db: Session, 
         user_id: int, 
@@ -340,9 +345,11 @@ class MembershipService:
             return False
         
         user_gym.is_active = False
+        user_gym.membership_status = MembershipLifecycleStatus.EXPIRED.value
         user_gym.notes = f"Desactivada: {reason} - {datetime.now().isoformat()}"
         
         db.commit()
+        await membership_lifecycle_service.invalidate_summaries([gym_id])
         
         logger.info(f"Membresía desactivada para user {user_id} en gym {gym_id}. Razón: {reason}")
         return True
@@ -369,48 +376,21 @@ class MembershipService:
     async def sync_all_plans_with_stripe(
         self, 
         db: Session, 
-        gym_id: int
+        gym_id: int,
+        dry_run: bool = False
     ) -> Dict[str, Any]:
-        """Sincronizar todos los planes de un gimnasio con Stripe"""
+        """
+        Sincronizar todos los planes de un gimnasio con Stripe.
+
+        Compara el catálogo de Stripe de la cuenta del gym con los planes y solo
+        aplica los cambios necesarios (ver ``StripePlanSyncService``). Con
+        ``dry_run`` devuelve el diff por plan sin tocar Stripe.
+        """
         try:
             # Importación lazy para evitar circular imports
-            from app.services.stripe_service import get_stripe_service
-            stripe_service = get_stripe_service()
-            
-            plans = self.get_membership_plans(db, gym_id, active_only=False)
-            results = {
-                'total': len(plans),
-                'synced': 0,
-                'failed': 0,
-                'details': []
-            }
-            
-            for plan in plans:
-                try:
-                    success = await stripe_service.sync_plan_with_stripe(db, plan.id)
-                    if success:
-                        results['synced'] += 1
-                        results['details'].append({
-                            'plan_id': plan.id,
-                            'name': plan.name,
-                            'status': 'synced'
-                        })
-                    else:
-                        results['failed'] += 1
-                        results['details'].append({
-                            'plan_id': plan.id,
-                            'name': plan.name,
-                            'status': 'failed'
-                        })
-                except Exception as e:
-                    results['failed'] += 1
-                    results['details'].append({
-                        'plan_id': plan.id,
-                        'name': plan.name,
-                        'status': 'error',
-                        'error': str(e)
-                    })
-            
+            from app.services.stripe_plan_sync import stripe_plan_sync_service
+
+            results = await stripe_plan_sync_service.sync_gym_plans(db, gym_id, dry_run=dry_run)
             logger.info(f"Sincronización masiva gym {gym_id}: {results['synced']}/{results['total']} exitosos")
             return results
             
@@ -420,79 +400,79 @@ class MembershipService:
                 'total': 0,
                 'synced': 0,
                 'failed': 0,
+                'details': [],
                 'error': str(e)
             }
 
     def expire_memberships(self, db: Session) -> int:
-        """Expirar membresías vencidas (para tarea programada)"""
+        """
+        Aplicar las transiciones de vencimiento (gracia, mora y expiración).
+
+        El job programado usa ``membership_lifecycle_service.run_sweep``, que
+        además notifica a los miembros e invalida los resúmenes cacheados.
+        """
         
-        now = datetime.now()
-        expired_memberships = db.query(UserGym).filter(
-            UserGym.is_active == True,
-            UserGym.membership_expires_at < now,
-            UserGym.membership_type.in_(["paid", "trial"])
-        ).all()
-        
-        count = 0
-        for membership in expired_memberships:
-            membership.is_active = False
-            membership.notes = f"Expirada automáticamente: {now.isoformat()}"
-            count += 1
+        events = membership_lifecycle_service.sweep(db)
+        count = sum(len(event.user_ids) for event in events)
         
         if count > 0:
             db.commit()
-            logger.info(f"Expiradas {count} membresías automáticamente")
+            logger.info(f"Transiciones de membresía aplicadas: {count}")
         
         return count
 
-    def get_gym_membership_summary(
+    async def get_gym_membership_summary(
         self, 
         db: Session, 
         gym_id: int
     ) -> MembershipSummary:
-        """Obtener resumen de membresías para un gimnasio"""
-        
-        # Consultas básicas
-        total_members = db.query(UserGym).filter(UserGym.gym_id == gym_id).count()
-        
-        active_members = db.query(UserGym).filter(
-            UserGym.gym_id == gym_id,
-            UserGym.is_active == True
-        ).count()
-        
-        paid_members = db.query(UserGym).filter(
-            UserGym.gym_id == gym_id,
-            UserGym.membership_type == "paid",
-            UserGym.is_active == True
-        ).count()
-        
-        trial_members = db.query(UserGym).filter(
-            UserGym.gym_id == gym_id,
-            UserGym.membership_type == "trial",
-            UserGym.is_active == True
-        ).count()
-        
-        expired_members = db.query(UserGym).filter(
-            UserGym.gym_id == gym_id,
-            UserGym.is_active == False
-        ).count()
-        
-        # Miembros nuevos este mes
-        start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        new_members_this_month = db.query(UserGym).filter(
-            UserGym.gym_id == gym_id,
-            UserGym.created_at >= start_of_month
-        ).count()
-        
-        return MembershipSummary(
-            total_members=total_members,
-            active_members=active_members,
-            paid_members=paid_members,
-            trial_members=trial_members,
-            expired_members=expired_members,
-            revenue_current_month=0.0,  # Se calculará con Stripe en Fase 2
-            new_members_this_month=new_members_this_month
-        )
+        """
+        Obtener resumen de membresías para un gimnasio.
+
+        Se calcula con una sola consulta agregada y se cachea por gimnasio en el
+        namespace ``membership_summary:{gym_id}``, que incrementan el barrido y
+        cualquier alta, baja o cambio de estado de ``UserGym``.
+        """
+        
+        async def db_fetch() -> MembershipSummary:
+            now = datetime.now()
+            start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            expiring_until = now + timedelta(days=settings.MEMBERSHIP_EXPIRING_WINDOW_DAYS)
+        
+            def count_if(*conditions):
+                return func.coalesce(func.sum(case((and_(*conditions), 1), else_=0)), 0)
+        
+            counts = db.query(
+                func.count(UserGym.id),
+                count_if(UserGym.is_active == True),
+                count_if(UserGym.is_active == True, UserGym.membership_type == "paid"),
+                count_if(UserGym.is_active == True, UserGym.membership_type == "trial"),
+                count_if(UserGym.is_active == False),
+                count_if(UserGym.created_at >= start_of_month),
+                count_if(
+                    UserGym.membership_status == MembershipLifecycleStatus.ACTIVE.value,
+                    UserGym.is_active == True,
+                    UserGym.membership_expires_at >= now,
+                    UserGym.membership_expires_at < expiring_until
+                ),
+                count_if(UserGym.membership_status == MembershipLifecycleStatus.GRACE.value),
+                count_if(UserGym.membership_status == MembershipLifecycleStatus.OVERDUE.value),
+            ).filter(UserGym.gym_id == gym_id).one()
+        
+            return MembershipSummary(
+                total_members=counts[0],
+                active_members=counts[1],
+                paid_members=counts[2],
+                trial_members=counts[3],
+                expired_members=counts[4],
+                revenue_current_month=0.0,  # Se calculará con Stripe en Fase 2
+                new_members_this_month=counts[5],
+                expiring_members=counts[6],
+                grace_members=counts[7],
+                overdue_members=counts[8]
+            )
+
+        return await membership_lifecycle_service.get_summary(gym_id, db_fetch)
 
 
 # Instancia global del servicio
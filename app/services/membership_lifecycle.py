@@ -0,0 +1,293 @@
+"""
+Membership Lifecycle - Barrido de vencimientos y estado de suscripciones.
+
+``expire_memberships`` cargaba cada ``UserGym`` vencido y lo desactivaba fila
+a fila, y los webhooks de suscripción actualizaban las membresías de una en
+una. Aquí cada transición de estado es un único ``UPDATE ... RETURNING``:
+
+- ``active`` -> ``grace``: pago vencido sin renovar; se mantiene el acceso
+  durante ``MEMBERSHIP_GRACE_PERIOD_DAYS``.
+- ``active``/``grace`` -> ``overdue``: terminó la gracia; se suspende el
+  acceso hasta que llegue el pago.
+- ``active``/``grace``/``overdue`` -> ``expired``: pagos en mora más de
+  ``MEMBERSHIP_OVERDUE_DAYS`` y pruebas vencidas.
+
+Las transiciones se aplican de la más avanzada a la primera, así una
+membresía con varios días de retraso salta directamente a su estado final y
+genera un solo evento. Las filas devueltas se agrupan por gimnasio y
+transición para enviar una notificación push por grupo, y se invalidan los
+resúmenes cacheados de los gimnasios afectados incrementando su namespace
+versionado ``membership_summary:{gym_id}``; cualquier escritura sobre
+``UserGym`` debe hacer lo mismo.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import and_, exists, or_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db.redis_client import get_redis_client
+from app.models.stripe_profile import UserGymStripeProfile
+from app.models.user_gym import MembershipLifecycleStatus, UserGym
+from app.schemas.membership import MembershipSummary
+from app.services.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+ACCESS_STATUSES = (MembershipLifecycleStatus.ACTIVE.value, MembershipLifecycleStatus.GRACE.value)
+
+# Estado local para cada estado de suscripción de Stripe: (estado, is_active)
+SUBSCRIPTION_STATUS_MAP = {
+    'active': (MembershipLifecycleStatus.ACTIVE, True),
+    'trialing': (MembershipLifecycleStatus.ACTIVE, True),
+    'past_due': (MembershipLifecycleStatus.GRACE, True),  # Stripe sigue reintentando el cobro
+    'unpaid': (MembershipLifecycleStatus.OVERDUE, False),
+    'incomplete': (MembershipLifecycleStatus.OVERDUE, False),
+    'paused': (MembershipLifecycleStatus.OVERDUE, False),
+    'canceled': (MembershipLifecycleStatus.EXPIRED, False),
+    'incomplete_expired': (MembershipLifecycleStatus.EXPIRED, False),
+}
+
+
+class MembershipTransitionEvent(NamedTuple):
+    """Membresías de un gimnasio que entraron en un estado en la misma pasada."""
+    transition: str  # Estado de destino (MembershipLifecycleStatus)
+    gym_id: int
+    user_ids: List[int]
+
+
+def has_access(user_gym: UserGym, now: Optional[datetime] = None) -> bool:
+    """
+    Acceso efectivo de una membresía sin esperar al barrido: los pagos
+    vencidos conservan el acceso durante el periodo de gracia.
+    """
+    if not user_gym.is_active or user_gym.membership_status not in ACCESS_STATUSES:
+        return False
+    if not user_gym.membership_expires_at:
+        return True
+    access_until = user_gym.membership_expires_at
+    if user_gym.membership_type == "paid":
+        access_until += timedelta(days=settings.MEMBERSHIP_GRACE_PERIOD_DAYS)
+    return (now or datetime.now()) < access_until
+
+
+def _group_events(transition: str, rows: Sequence[Any]) -> List[MembershipTransitionEvent]:
+    user_ids_by_gym: Dict[int, List[int]] = {}
+    for row in rows:
+        user_ids_by_gym.setdefault(row.gym_id, []).append(row.user_id)
+    return [
+        MembershipTransitionEvent(transition=transition, gym_id=gym_id, user_ids=user_ids)
+        for gym_id, user_ids in user_ids_by_gym.items()
+    ]
+
+
+class MembershipLifecycleService:
+
+    def __init__(self, redis_factory: Callable[[], Awaitable[Any]] = get_redis_client):
+        self._redis_factory = redis_factory
+
+    # === Transiciones ===
+
+    def _transition(
+        self,
+        db: Session,
+        *,
+        conditions: List[Any],
+        status: MembershipLifecycleStatus,
+        is_active: bool,
+        note: str
+    ) -> List[MembershipTransitionEvent]:
+        stmt = (
+            update(UserGym)
+            .where(*conditions)
+            .values(membership_status=status.value, is_active=is_active, notes=note)
+            .returning(UserGym.id, UserGym.user_id, UserGym.gym_id)
+            .execution_options(synchronize_session=False)
+        )
+        return _group_events(status.value, db.execute(stmt).all())
+
+    def sweep(self, db: Session, now: Optional[datetime] = None) -> List[MembershipTransitionEvent]:
+        """
+        Aplicar (sin commit) las transiciones por vencimiento.
+
+        Returns:
+            Eventos de transición agrupados por gimnasio
+        """
+        now = now or datetime.now()
+        grace_cutoff = now - timedelta(days=settings.MEMBERSHIP_GRACE_PERIOD_DAYS)
+        overdue_cutoff = now - timedelta(days=settings.MEMBERSHIP_OVERDUE_DAYS)
+        stamp = now.isoformat()
+
+        expired = self._transition(
+            db,
+            conditions=[
+                UserGym.membership_status.in_([
+                    MembershipLifecycleStatus.ACTIVE.value,
+                    MembershipLifecycleStatus.GRACE.value,
+                    MembershipLifecycleStatus.OVERDUE.value,
+                ]),
+                or_(
+                    and_(UserGym.membership_type == "paid", UserGym.membership_expires_at < overdue_cutoff),
+                    and_(UserGym.membership_type == "trial", UserGym.membership_expires_at < now),
+                ),
+            ],
+            status=MembershipLifecycleStatus.EXPIRED,
+            is_active=False,
+            note=f"Expirada automáticamente: {stamp}"
+        )
+        overdue = self._transition(
+            db,
+            conditions=[
+                UserGym.membership_status.in_(ACCESS_STATUSES),
+                UserGym.membership_type == "paid",
+                UserGym.membership_expires_at < grace_cutoff,
+            ],
+            status=MembershipLifecycleStatus.OVERDUE,
+            is_active=False,
+            note=f"Acceso suspendido por pago pendiente: {stamp}"
+        )
+        grace = self._transition(
+            db,
+            conditions=[
+                UserGym.membership_status == MembershipLifecycleStatus.ACTIVE.value,
+                UserGym.is_active == True,
+                UserGym.membership_type == "paid",
+                UserGym.membership_expires_at < now,
+            ],
+            status=MembershipLifecycleStatus.GRACE,
+            is_active=True,
+            note=f"Periodo de gracia iniciado: {stamp}"
+        )
+        return expired + overdue + grace
+
+    def apply_subscription_status(
+        self,
+        db: Session,
+        subscription_ids: Iterable[str],
+        stripe_status: str
+    ) -> List[MembershipTransitionEvent]:
+        """
+        Llevar (sin commit) las membresías de varias suscripciones al estado
+        que corresponde al de Stripe. Las que ya estaban en ese estado no se
+        tocan ni generan eventos.
+        """
+        subscription_ids = [sid for sid in subscription_ids if sid]
+        mapped = SUBSCRIPTION_STATUS_MAP.get(stripe_status)
+        if not subscription_ids or not mapped:
+            return []
+
+        status, is_active = mapped
+        return self._transition(
+            db,
+            conditions=[
+                exists().where(
+                    UserGymStripeProfile.user_id == UserGym.user_id,
+                    UserGymStripeProfile.gym_id == UserGym.gym_id,
+                    UserGymStripeProfile.stripe_subscription_id.in_(subscription_ids)
+                ),
+                or_(UserGym.membership_status != status.value, UserGym.is_active != is_active),
+            ],
+            status=status,
+            is_active=is_active,
+            note=f"Stripe status: {stripe_status} - {datetime.now().isoformat()}"
+        )
+
+    # === Job programado ===
+
+    def _sweep_in_session(self) -> List[MembershipTransitionEvent]:
+        from app.db.session import SessionLocal
+
+        db = SessionLocal()
+        try:
+            events = self.sweep(db)
+            db.commit()
+            return events
+        except Exception as e:
+            logger.error(f"Error en el barrido de membresías: {str(e)}", exc_info=True)
+            db.rollback()
+            return []
+        finally:
+            db.close()
+
+    async def run_sweep(self) -> Dict[str, int]:
+        """
+        Job programado: aplica las transiciones, invalida los resúmenes de los
+        gimnasios afectados y notifica a los miembros.
+
+        Returns:
+            Número de membresías por estado de destino
+        """
+        events = await asyncio.to_thread(self._sweep_in_session)
+        counts: Dict[str, int] = {}
+        for event in events:
+            counts[event.transition] = counts.get(event.transition, 0) + len(event.user_ids)
+        if counts:
+            logger.info(f"Barrido de membresías: {counts}")
+        await self.publish(events)
+        return counts
+
+    async def publish(self, events: List[MembershipTransitionEvent]) -> None:
+        """Invalidar resúmenes y enviar una notificación por gimnasio y transición."""
+        if not events:
+            return
+        await self.invalidate_summaries({event.gym_id for event in events})
+
+        from app.services.notification_service import notification_service
+        for event in events:
+            try:
+                await asyncio.to_thread(
+                    notification_service.notify_membership_transition,
+                    None,
+                    event.gym_id,
+                    event.transition,
+                    event.user_ids
+                )
+            except Exception as e:
+                logger.error(f"Error notificando transición {event.transition} en gym {event.gym_id}: {str(e)}")
+
+    # === Resumen cacheado por gimnasio ===
+
+    @staticmethod
+    def namespace(gym_id: int) -> str:
+        """Namespace versionado del resumen de membresías de un gimnasio."""
+        return f"membership_summary:{gym_id}"
+
+    async def _redis(self):
+        try:
+            return await self._redis_factory()
+        except Exception as e:
+            logger.warning(f"Redis no disponible para el resumen de membresías: {e}")
+            return None
+
+    async def get_summary(
+        self,
+        gym_id: int,
+        db_fetch: Callable[[], Awaitable[MembershipSummary]]
+    ) -> MembershipSummary:
+        """Resumen del gimnasio desde caché; ``db_fetch`` lo calcula si falta."""
+        return await cache_service.get_or_set(
+            await self._redis(),
+            f"membership_summary:gym:{gym_id}",
+            db_fetch,
+            MembershipSummary,
+            expiry_seconds=settings.CACHE_TTL_MEMBERSHIP_SUMMARY,
+            namespaces=[self.namespace(gym_id)]
+        )
+
+    async def invalidate_summaries(self, gym_ids: Iterable[int]) -> None:
+        namespaces = [self.namespace(gym_id) for gym_id in set(gym_ids)]
+        if namespaces:
+            await cache_service.bump_namespaces(await self._redis(), *namespaces)
+
+
+membership_lifecycle_service = MembershipLifecycleService()
+
+
+async def sweep_memberships_job() -> None:
+    """Job programado del barrido de membresías."""
+    await membership_lifecycle_service.run_sweep()
@@ -2,6 +2,7 @@ import requests
 import logging
 import json
 import os
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 
@@ -19,6 +20,27 @@ if not ONESIGNAL_APP_ID:
 if not ONESIGNAL_REST_API_KEY:
     logger.warning("⚠️  ONESIGNAL_REST_API_KEY no configurado - las notificaciones push estarán deshabilitadas")
 
+# Notificación push por estado de destino de una membresía (título, mensaje)
+MEMBERSHIP_TRANSITION_MESSAGES = {
+    "active": (
+        "Membresía reactivada",
+        "Tu membresía vuelve a estar activa. ¡Te esperamos en el gimnasio!"
+    ),
+    "grace": (
+        "Pago de membresía pendiente",
+        "No hemos podido renovar tu membresía. Mantienes el acceso unos días mientras se completa el pago."
+    ),
+    "overdue": (
+        "Acceso suspendido",
+        "Tu membresía tiene un pago pendiente y el acceso se ha suspendido. Renuévala para volver a entrenar."
+    ),
+    "expired": (
+        "Tu membresía ha expirado",
+        "Tu membresía ha finalizado. Puedes renovarla desde la app cuando quieras."
+    ),
+}
+
+
 class OneSignalService:
     def __init__(self, app_id: str, api_key: str):
         self.app_id = app_id
@@ -333,6 +355,98 @@ class OneSignalService:
 
         return stats
 
+    def notify_waitlist_promotion(
+        self,
+        db: Optional[Session],
+        event_title: str,
+        event_id: int,
+        gym_id: int,
+        promoted_user_ids: List[int],
+        payment_deadline: Optional[datetime] = None
+    ) -> int:
+        """
+        Avisar en una sola notificación push a los miembros promovidos desde la
+        lista de espera de un evento.
+
+        Args:
+            db: Sesión de base de datos (opcional)
+            event_title: Título del evento
+            event_id: ID del evento
+            gym_id: ID del gimnasio
+            promoted_user_ids: IDs internos de los miembros promovidos
+            payment_deadline: Fecha límite de pago (eventos de pago)
+
+        Returns:
+            Número de destinatarios alcanzados
+        """
+        if not promoted_user_ids:
+            return 0
+
+        title = f"¡Tienes plaza en {event_title}!"
+        if payment_deadline:
+            message = (
+                f"Se ha liberado una plaza en '{event_title}'. "
+                f"Completa el pago antes del {payment_deadline:%d/%m/%Y %H:%M} UTC para confirmarla."
+            )
+        else:
+            message = f"Se ha liberado una plaza en '{event_title}' y ya estás inscrito."
+
+        result = self.send_to_users(
+            user_ids=[str(uid) for uid in promoted_user_ids],
+            title=title,
+            message=message,
+            data={
+                "type": "event_waitlist_promoted",
+                "event_id": event_id,
+                "payment_required": payment_deadline is not None
+            },
+            db=db,
+            gym_id=gym_id
+        )
+        if not result.get("success"):
+            logger.error(f"Error notificando promociones de lista de espera del evento {event_id}: {result.get('errors')}")
+            return 0
+        return result.get("recipients") or len(promoted_user_ids)
+
+    def notify_membership_transition(
+        self,
+        db: Optional[Session],
+        gym_id: int,
+        transition: str,
+        user_ids: List[int]
+    ) -> int:
+        """
+        Avisar en una sola notificación push a los miembros de un gimnasio
+        cuya membresía cambió al mismo estado (barrido de vencimientos o
+        webhooks de suscripción).
+
+        Args:
+            db: Sesión de base de datos (opcional)
+            gym_id: ID del gimnasio
+            transition: Estado de destino ("active", "grace", "overdue", "expired")
+            user_ids: IDs internos de los miembros afectados
+
+        Returns:
+            Número de destinatarios alcanzados
+        """
+        content = MEMBERSHIP_TRANSITION_MESSAGES.get(transition)
+        if not user_ids or not content:
+            return 0
+
+        title, message = content
+        result = self.send_to_users(
+            user_ids=[str(uid) for uid in user_ids],
+            title=title,
+            message=message,
+            data={"type": f"membership_{transition}"},
+            db=db,
+            gym_id=gym_id
+        )
+        if not result.get("success"):
+            logger.error(f"Error notificando membresías '{transition}' del gym {gym_id}: {result.get('errors')}")
+            return 0
+        return result.get("recipients") or len(user_ids)
+
 
 # Instancia global
 notification_service = OneSignalService(
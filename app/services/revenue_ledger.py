@@ -0,0 +1,324 @@
+"""
+Libro de ingresos - Registro local de pagos y reembolsos de Stripe por gimnasio.
+
+Los movimientos se registran desde los webhooks de Stripe (checkout, facturas
+pagadas, pagos de eventos y reembolsos) y, para el histórico, con
+``backfill`` recorriendo la API con auto-paginación. Cada movimiento tiene una
+clave idempotente (``source_id``), así que recibir un webhook dos veces o
+repetir el backfill no duplica importes.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import stripe
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import case, func
+
+from app.models.membership import MembershipPlan
+from app.models.revenue import RevenueEntryType, RevenueLedgerEntry
+from app.models.stripe_profile import GymStripeAccount, UserGymStripeProfile
+from app.models.user_gym_subscription import UserGymSubscription
+
+logger = logging.getLogger(__name__)
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _from_timestamp(value: Optional[int]) -> datetime:
+    if not value:
+        return datetime.now(timezone.utc)
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+class RevenueLedgerService:
+
+    # === Registro de movimientos ===
+
+    def record_webhook_event(
+        self,
+        db: Session,
+        event_type: str,
+        obj: Dict[str, Any],
+        stripe_account: Optional[str] = None,
+        occurred_at: Optional[datetime] = None
+    ) -> Optional[RevenueLedgerEntry]:
+        """Registra el movimiento de un webhook si el tipo de evento genera ingresos."""
+        if event_type == 'checkout.session.completed':
+            return self.record_checkout_completed(db, obj, stripe_account)
+        if event_type == 'invoice.payment_succeeded':
+            return self.record_invoice_paid(db, obj, stripe_account)
+        if event_type == 'payment_intent.succeeded':
+            return self.record_event_payment(db, obj, stripe_account)
+        if event_type == 'charge.refunded':
+            return self.record_charge_refunded(db, obj, stripe_account, occurred_at=occurred_at)
+        return None
+
+    def record_checkout_completed(
+        self, db: Session, session: Dict[str, Any], stripe_account: Optional[str] = None
+    ) -> Optional[RevenueLedgerEntry]:
+        """
+        Checkout de pago único. Los checkouts de suscripción no se registran
+        aquí: su primer cobro llega como ``invoice.payment_succeeded``.
+        """
+        if session.get('mode') != 'payment' or session.get('payment_status') not in (None, 'paid'):
+            return None
+        metadata = session.get('metadata') or {}
+        account = stripe_account or metadata.get('stripe_account_id')
+        gym_id = _to_int(metadata.get('gym_id')) or self._gym_for_account(db, account)
+        if not gym_id:
+            logger.warning(f"Checkout {session.get('id')} sin gimnasio, no se registra en el libro")
+            return None
+
+        plan_id = _to_int(metadata.get('plan_id'))
+        return self._upsert(
+            db,
+            source_id=session.get('payment_intent') or session['id'],
+            entry_type=RevenueEntryType.ONE_TIME_PAYMENT,
+            gym_id=gym_id,
+            stripe_account_id=account,
+            amount_cents=session.get('amount_total') or 0,
+            currency=session.get('currency'),
+            user_id=_to_int(metadata.get('user_id')),
+            plan_id=plan_id,
+            plan_name=metadata.get('plan_name') or self._plan_name(db, plan_id),
+            occurred_at=_from_timestamp(session.get('created')),
+        )
+
+    def record_invoice_paid(
+        self, db: Session, invoice: Dict[str, Any], stripe_account: Optional[str] = None
+    ) -> Optional[RevenueLedgerEntry]:
+        """Factura pagada de una suscripción (alta y renovaciones)."""
+        amount = invoice.get('amount_paid') or 0
+        if amount <= 0:
+            # Facturas de periodo de prueba o cubiertas por saldo
+            return None
+
+        metadata = dict(invoice.get('metadata') or {})
+        subscription_details = invoice.get('subscription_details') or {}
+        metadata = {**(subscription_details.get('metadata') or {}), **metadata}
+
+        subscription_id = invoice.get('subscription')
+        profile = self._profile_for_invoice(db, subscription_id, invoice.get('customer'), stripe_account)
+        gym_id = (
+            _to_int(metadata.get('gym_id'))
+            or (profile.gym_id if profile else None)
+            or self._gym_for_account(db, stripe_account)
+        )
+        if not gym_id:
+            logger.warning(f"Factura {invoice.get('id')} sin gimnasio, no se registra en el libro")
+            return None
+
+        plan_id = _to_int(metadata.get('plan_id'))
+        if not plan_id and subscription_id:
+            plan_id = db.query(UserGymSubscription.plan_id).filter(
+                UserGymSubscription.stripe_subscription_id == subscription_id
+            ).scalar()
+
+        paid_at = (invoice.get('status_transitions') or {}).get('paid_at') or invoice.get('created')
+        return self._upsert(
+            db,
+            source_id=invoice['id'],
+            entry_type=RevenueEntryType.SUBSCRIPTION_INVOICE,
+            gym_id=gym_id,
+            stripe_account_id=stripe_account or (profile.stripe_account_id if profile else None),
+            amount_cents=amount,
+            currency=invoice.get('currency'),
+            user_id=profile.user_id if profile else _to_int(metadata.get('user_id')),
+            plan_id=plan_id,
+            plan_name=metadata.get('plan_name') or self._plan_name(db, plan_id),
+            occurred_at=_from_timestamp(paid_at),
+        )
+
+    def record_event_payment(
+        self, db: Session, payment_intent: Dict[str, Any], stripe_account: Optional[str] = None
+    ) -> Optional[RevenueLedgerEntry]:
+        """Payment Intent de un evento de pago (metadata con ``event_id``)."""
+        metadata = payment_intent.get('metadata') or {}
+        event_id = _to_int(metadata.get('event_id'))
+        if not event_id or payment_intent.get('status') not in (None, 'succeeded'):
+            return None
+        gym_id = _to_int(metadata.get('gym_id')) or self._gym_for_account(db, stripe_account)
+        if not gym_id:
+            logger.warning(f"Payment intent {payment_intent.get('id')} sin gimnasio, no se registra en el libro")
+            return None
+
+        return self._upsert(
+            db,
+            source_id=payment_intent['id'],
+            entry_type=RevenueEntryType.EVENT_PAYMENT,
+            gym_id=gym_id,
+            stripe_account_id=stripe_account,
+            amount_cents=payment_intent.get('amount_received') or payment_intent.get('amount') or 0,
+            currency=payment_intent.get('currency'),
+            user_id=_to_int(metadata.get('user_id')),
+            event_id=event_id,
+            occurred_at=_from_timestamp(payment_intent.get('created')),
+        )
+
+    def record_charge_refunded(
+        self,
+        db: Session,
+        charge: Dict[str, Any],
+        stripe_account: Optional[str] = None,
+        occurred_at: Optional[datetime] = None
+    ) -> Optional[RevenueLedgerEntry]:
+        """
+        Reembolso de un cargo. ``amount_refunded`` es acumulado, así que se
+        mantiene una única entrada por cargo que se actualiza con cada
+        reembolso parcial. El gimnasio y el plan se toman del pago original.
+        """
+        amount_refunded = charge.get('amount_refunded') or 0
+        if amount_refunded <= 0:
+            return None
+
+        original = db.query(RevenueLedgerEntry).filter(
+            RevenueLedgerEntry.source_id.in_(
+                [key for key in (charge.get('invoice'), charge.get('payment_intent')) if key]
+            )
+        ).first()
+        metadata = charge.get('metadata') or {}
+        gym_id = (
+            (original.gym_id if original else None)
+            or _to_int(metadata.get('gym_id'))
+            or self._gym_for_account(db, stripe_account)
+        )
+        if not gym_id:
+            logger.warning(f"Reembolso del cargo {charge.get('id')} sin gimnasio, no se registra en el libro")
+            return None
+
+        return self._upsert(
+            db,
+            source_id=f"refund:{charge['id']}",
+            entry_type=RevenueEntryType.REFUND,
+            gym_id=gym_id,
+            stripe_account_id=stripe_account or (original.stripe_account_id if original else None),
+            amount_cents=-amount_refunded,
+            currency=charge.get('currency'),
+            user_id=original.user_id if original else None,
+            plan_id=original.plan_id if original else None,
+            plan_name=original.plan_name if original else None,
+            event_id=original.event_id if original else None,
+            occurred_at=occurred_at or _from_timestamp(charge.get('created')),
+        )
+
+    # === Backfill ===
+
+    def backfill(
+        self,
+        db: Session,
+        *,
+        since: datetime,
+        until: Optional[datetime] = None,
+        stripe_account: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Carga el histórico de una cuenta de Stripe en el libro.
+
+        Recorre con ``auto_paging_iter`` (todas las páginas, no solo las
+        primeras 100) facturas pagadas, checkouts completados, Payment Intents
+        de eventos y cargos reembolsados creados en el periodo. Es idempotente:
+        puede repetirse sobre el mismo periodo.
+
+        Returns:
+            Número de movimientos registrados por tipo
+        """
+        created = {'gte': int(since.timestamp())}
+        if until:
+            created['lte'] = int(until.timestamp())
+        options = {'created': created, 'limit': 100}
+        if stripe_account:
+            options['stripe_account'] = stripe_account
+
+        counts = {entry_type.value: 0 for entry_type in RevenueEntryType}
+        sources = (
+            (stripe.Invoice.list(status='paid', **options), self.record_invoice_paid),
+            (stripe.checkout.Session.list(status='complete', **options), self.record_checkout_completed),
+            (stripe.PaymentIntent.list(**options), self.record_event_payment),
+            (stripe.Charge.list(**options), self.record_charge_refunded),
+        )
+        for listing, record in sources:
+            for obj in listing.auto_paging_iter():
+                entry = record(db, obj, stripe_account)
+                if entry is not None:
+                    counts[entry.entry_type.value] += 1
+
+        logger.info(f"Backfill del libro de ingresos ({stripe_account or 'plataforma'}): {counts}")
+        return counts
+
+    # === Auxiliares ===
+
+    def _upsert(self, db: Session, **values: Any) -> RevenueLedgerEntry:
+        """
+        Inserta o actualiza el movimiento por ``source_id`` y confirma.
+
+        Los webhooks pueden llegar desordenados: se conserva el importe de
+        mayor magnitud (los reembolsos son acumulados y negativos, así que un
+        ``charge.refunded`` atrasado no reduce el total) y la fecha original.
+        """
+        values['currency'] = (values.get('currency') or 'EUR').upper()
+        dialect_insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+        stmt = dialect_insert(RevenueLedgerEntry).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RevenueLedgerEntry.source_id],
+            set_={
+                'amount_cents': case(
+                    (func.abs(stmt.excluded.amount_cents) > func.abs(RevenueLedgerEntry.amount_cents),
+                     stmt.excluded.amount_cents),
+                    else_=RevenueLedgerEntry.amount_cents
+                ),
+                'updated_at': func.now(),
+            }
+        ).returning(RevenueLedgerEntry.id)
+        entry_id = db.execute(stmt).scalar_one()
+        db.commit()
+        return db.get(RevenueLedgerEntry, entry_id, populate_existing=True)
+
+    def _gym_for_account(self, db: Session, stripe_account: Optional[str]) -> Optional[int]:
+        if not stripe_account:
+            return None
+        return db.query(GymStripeAccount.gym_id).filter(
+            GymStripeAccount.stripe_account_id == stripe_account
+        ).scalar()
+
+    def _profile_for_invoice(
+        self,
+        db: Session,
+        subscription_id: Optional[str],
+        customer_id: Optional[str],
+        stripe_account: Optional[str]
+    ) -> Optional[UserGymStripeProfile]:
+        """Perfil local del cliente, sin pedir la suscripción a Stripe."""
+        if subscription_id:
+            profile = db.query(UserGymStripeProfile).filter(
+                UserGymStripeProfile.stripe_subscription_id == subscription_id
+            ).first()
+            if profile:
+                return profile
+            profile = db.query(UserGymStripeProfile).join(
+                UserGymSubscription, UserGymSubscription.user_gym_stripe_profile_id == UserGymStripeProfile.id
+            ).filter(UserGymSubscription.stripe_subscription_id == subscription_id).first()
+            if profile:
+                return profile
+        if customer_id:
+            query = db.query(UserGymStripeProfile).filter(UserGymStripeProfile.stripe_customer_id == customer_id)
+            if stripe_account:
+                query = query.filter(UserGymStripeProfile.stripe_account_id == stripe_account)
+            return query.first()
+        return None
+
+    def _plan_name(self, db: Session, plan_id: Optional[int]) -> Optional[str]:
+        if not plan_id:
+            return None
+        return db.query(MembershipPlan.name).filter(MembershipPlan.id == plan_id).scalar()
+
+
+revenue_ledger_service = RevenueLedgerService()
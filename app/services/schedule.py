@@ -1,5 +1,5 @@
-from typing import List, Optional, Dict, Any, Union
-from datetime import datetime, time, timedelta, date
+from typing import List, Optional, Dict, Any, Union, Iterable
+from datetime import datetime, time, timedelta, date, timezone
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_
@@ -46,6 +46,9 @@ from app.schemas.schedule import (
 import logging
 from redis.asyncio import Redis
 from app.services.cache_service import cache_service
+from app.services.schedule_snapshot import schedule_snapshot_service
+from app.services.gym_hours_calendar import GymHoursCalendar, gym_hours_calendar_service
+from app.services.session_conflicts import session_conflict_service
 from app.schemas.schedule import ClassCategoryCustom as ClassCategoryCustomSchema
 from app.schemas.schedule import Class as ClassSchema # Añadir importación para Class
 from app.schemas.schedule import ClassSession as ClassSessionSchema # Añadir importación para ClassSession
@@ -101,7 +104,10 @@ class GymHoursService:
     # --- Añadir método helper para invalidación de caché --- 
     async def _invalidate_gym_hours_cache(self, redis_client: Redis, gym_id: int, day: Optional[int] = None, date_value: Optional[date] = None):
         """
-        Invalida la caché de horarios de gimnasio.
+        Invalida la caché de horarios de gimnasio: los horarios por día,
+        semanales y el calendario efectivo comparten el namespace del
+        calendario (`gym_hours:{gym_id}`); las instantáneas diarias afectadas
+        se borran.
         
         Args:
             redis_client: Cliente Redis
@@ -111,37 +117,19 @@ class GymHoursService:
         """
         if not redis_client:
             return
-            
-        tracking_set_key = f"cache_keys:gym_hours:{gym_id}"
-        keys_to_delete = []
-        
+
+        # Horarios por día, semanales y calendario de horarios efectivos
+        await gym_hours_calendar_service.invalidate(redis_client, gym_id)
+
         try:
-            # Invalidar clave específica de día si se proporciona
-            if day is not None:
-                keys_to_delete.append(f"gym_hours:day:{day}:gym:{gym_id}")
-                
-            # Invalidar clave específica de fecha si se proporciona
+            # Instantáneas diarias afectadas por el horario
             if date_value is not None:
-                date_str = date_value.isoformat()
-                keys_to_delete.append(f"gym_hours:date:{date_str}:gym:{gym_id}")
-            
-            # Claves adicionales a invalidar siempre
-            keys_to_delete.append(f"gym_hours:all:gym:{gym_id}")
-            
-            # Obtener las claves de lista desde el Set de seguimiento
-            list_cache_keys = await redis_client.smembers(tracking_set_key)
-            if list_cache_keys:
-                # Convertir bytes a strings si es necesario (depende de la configuración de redis-py)
-                list_cache_keys_str = [key.decode('utf-8') if isinstance(key, bytes) else key for key in list_cache_keys]
-                keys_to_delete.extend(list_cache_keys_str)
-                # Añadir el propio Set a la lista para borrarlo también
-                keys_to_delete.append(tracking_set_key)
-            
-            # Borrar todas las claves encontradas
-            if keys_to_delete:
-                deleted_count = await redis_client.delete(*keys_to_delete)
-                logger.debug(f"Invalidated {deleted_count} gym hours cache keys for gym {gym_id}: {keys_to_delete}")
-                
+                snapshot_keys = [schedule_snapshot_service.key(gym_id, date_value)]
+            else:
+                snapshot_keys = schedule_snapshot_service.weekday_keys(gym_id, weekday=day)
+            if snapshot_keys:
+                deleted_count = await redis_client.delete(*snapshot_keys)
+                logger.debug(f"Invalidated {deleted_count} schedule snapshots for gym {gym_id}")
         except Exception as e:
             logger.error(f"Error invalidating gym hours cache for gym {gym_id}: {e}", exc_info=True)
     # --- Fin método helper ---
@@ -175,18 +163,12 @@ class GymHoursService:
             return self.get_gym_hours_by_day(db, day, gym_id)
             
         cache_key = f"gym_hours:day:{day}:gym:{gym_id}"
-        tracking_set_key = f"cache_keys:gym_hours:{gym_id}"
-        
-        # Indica si el resultado vino de la BD
-        fetched_from_db = False
         
         async def db_fetch():
-            nonlocal fetched_from_db
             result = gym_hours_repository.get_by_day(db, day=day, gym_id=gym_id)
             # Si no hay resultados, creamos valores predeterminados
             if not result:
                 result = gym_hours_repository.get_or_create_default(db, day=day, gym_id=gym_id)
-            fetched_from_db = True
             return result
             
         hours = await cache_service.get_or_set(
@@ -195,17 +177,9 @@ class GymHoursService:
             db_fetch_func=db_fetch,
             model_class=GymHours,
             expiry_seconds=3600 * 24, # 24 horas
-            is_list=False
+            is_list=False,
+            namespaces=[gym_hours_calendar_service.namespace(gym_id)]
         )
-        
-        # Si se obtuvo de la BD, añadir la clave al set de seguimiento
-        if fetched_from_db and redis_client and hours is not None:
-            try:
-                await redis_client.sadd(tracking_set_key, cache_key)
-                await redis_client.expire(tracking_set_key, 3600 * 24 * 7) # 7 días
-                logger.debug(f"Added cache key {cache_key} to tracking set {tracking_set_key}")
-            except Exception as e:
-                logger.error(f"Error adding cache key {cache_key} to set {tracking_set_key}: {e}", exc_info=True)
                 
         return hours
     
@@ -241,13 +215,8 @@ class GymHoursService:
             return self.get_all_gym_hours(db, gym_id)
             
         cache_key = f"gym_hours:all:gym:{gym_id}"
-        tracking_set_key = f"cache_keys:gym_hours:{gym_id}"
-        
-        # Indica si el resultado vino de la BD
-        fetched_from_db = False
         
         async def db_fetch():
-            nonlocal fetched_from_db
             result = gym_hours_repository.get_all_days(db, gym_id=gym_id)
             # Comprobar si tenemos los 7 días de la semana
             if len(result) < 7:
@@ -260,7 +229,6 @@ class GymHoursService:
                         result.append(new_day)
                 # Ordenar por día de la semana
                 result.sort(key=lambda x: x.day_of_week)
-            fetched_from_db = True
             return result
             
         hours = await cache_service.get_or_set(
@@ -269,17 +237,9 @@ class GymHoursService:
             db_fetch_func=db_fetch,
             model_class=GymHours,
             expiry_seconds=3600 * 24, # 24 horas
-            is_list=True
+            is_list=True,
+            namespaces=[gym_hours_calendar_service.namespace(gym_id)]
         )
-        
-        # Si se obtuvo de la BD, añadir la clave al set de seguimiento
-        if fetched_from_db and redis_client and hours is not None:
-            try:
-                await redis_client.sadd(tracking_set_key, cache_key)
-                await redis_client.expire(tracking_set_key, 3600 * 24 * 7) # 7 días
-                logger.debug(f"Added cache key {cache_key} to tracking set {tracking_set_key}")
-            except Exception as e:
-                logger.error(f"Error adding cache key {cache_key} to set {tracking_set_key}: {e}", exc_info=True)
                 
         return hours
     
@@ -306,169 +266,6 @@ class GymHoursService:
             
         return result
     
-    def _create_default_hours(self, db: Session, gym_id: int) -> List[Any]:
-        """
-        Crea los horarios predeterminados para un gimnasio.
-        Método interno usado para reemplazar initialize_default_hours.
-        
-        Args:
-            db: Sesión de base de datos
-            gym_id: ID del gimnasio
-        """
-        default_hours = []
-        
-        # Horarios predeterminados (Lunes a Viernes: 9am-9pm, Sábado: 10am-6pm, Domingo: cerrado)
-        default_schedule = {
-            0: (time(9, 0), time(21, 0), False),  # Lunes
-            1: (time(9, 0), time(21, 0), False),  # Martes
-            2: (time(9, 0), time(21, 0), False),  # Miércoles
-            3: (time(9, 0), time(21, 0), False),  # Jueves
-            4: (time(9, 0), time(21, 0), False),  # Viernes
-            5: (time(10, 0), time(18, 0), False), # Sábado
-            6: (None, None, True)                 # Domingo (cerrado)
-        }
-        
-        for day in range(7):
-            open_time, close_time, is_closed = default_schedule[day]
-            
-            # Crear el objeto de datos para el repositorio, incluyendo gym_id
-            obj_in_data = {
-                "day_of_week": day,
-                "open_time": open_time,
-                "close_time": close_time,
-                "is_closed": is_closed,
-                "gym_id": gym_id
-            }
-            
-            # Verificar si ya existen horarios para este día
-            existing_hours = gym_hours_repository.get_by_day(db, day=day, gym_id=gym_id)
-            if existing_hours:
-                # Si ya existen, actualizar solo si es necesario
-                # Crear un objeto de actualización solo con los campos que cambian
-                update_data = {}
-                if existing_hours.open_time != open_time:
-                    update_data['open_time'] = open_time
-                if existing_hours.close_time != close_time:
-                    update_data['close_time'] = close_time
-                if existing_hours.is_closed != is_closed:
-                    update_data['is_closed'] = is_closed
-                    
-                if update_data: # Solo actualizar si hay cambios
-                    hours = gym_hours_repository.update(db, db_obj=existing_hours, obj_in=update_data)
-                else:
-                    hours = existing_hours
-            else:
-                # Si no existen, crear nuevos usando obj_in_data (que ya tiene gym_id)
-                hours = gym_hours_repository.create(db, obj_in=obj_in_data)
-            
-            default_hours.append(hours)
-        
-        return default_hours
-    
-    def get_hours_for_date(self, db: Session, date_value: date, gym_id: int) -> Dict[str, Any]:
-        """
-        Obtener los horarios del gimnasio para una fecha específica.
-        
-        Args:
-            db: Sesión de base de datos
-            date_value: Fecha a consultar
-            gym_id: ID del gimnasio
-        """
-        # Implementación directa sin caché para evitar asyncio.run en contextos async
-        special_hours = gym_special_hours_repository.get_by_date(db, date_value=date_value, gym_id=gym_id)
-        day_of_week = date_value.weekday()
-        regular_hours = gym_hours_repository.get_by_day(db, day=day_of_week, gym_id=gym_id)
-        if not regular_hours:
-            regular_hours = gym_hours_repository.get_or_create_default(db, day=day_of_week, gym_id=gym_id)
-
-        result = {
-            "date": date_value,
-            "day_of_week": day_of_week,
-            "regular_hours": {
-                "id": regular_hours.id,
-                "open_time": regular_hours.open_time,
-                "close_time": regular_hours.close_time,
-                "is_closed": regular_hours.is_closed
-            },
-            "special_hours": None,
-            "is_special": special_hours is not None
-        }
-
-        if special_hours:
-            result["special_hours"] = {
-                "id": special_hours.id,
-                "open_time": special_hours.open_time,
-                "close_time": special_hours.close_time,
-                "is_closed": special_hours.is_closed,
-                "description": special_hours.description
-            }
-
-        if special_hours:
-            result["effective_hours"] = {
-                "open_time": special_hours.open_time,
-                "close_time": special_hours.close_time,
-                "is_closed": special_hours.is_closed,
-                "source": "special",
-                "source_id": special_hours.id
-            }
-        else:
-            result["effective_hours"] = {
-                "open_time": regular_hours.open_time,
-                "close_time": regular_hours.close_time,
-                "is_closed": regular_hours.is_closed,
-                "source": "regular",
-                "source_id": regular_hours.id
-            }
-
-        return result
-    
-    async def get_hours_for_date_cached(self, db: Session, date_value: date, gym_id: int, redis_client: Optional[Redis] = None) -> Dict[str, Any]:
-        """
-        Obtener los horarios del gimnasio para una fecha específica (con caché).
-        
-        Args:
-            db: Sesión de base de datos
-            date_value: Fecha a consultar
-            gym_id: ID del gimnasio
-            redis_client: Cliente Redis opcional
-        """
-        if not redis_client:
-            return await self._get_hours_for_date_internal(db, date_value, gym_id)
-            
-        date_str = date_value.isoformat()
-        cache_key = f"gym_hours:date:{date_str}:gym:{gym_id}"
-        tracking_set_key = f"cache_keys:gym_hours:{gym_id}"
-        
-        # Indica si el resultado vino de la BD
-        fetched_from_db = False
-        
-        async def db_fetch():
-            nonlocal fetched_from_db
-            result = await self._get_hours_for_date_internal(db, date_value, gym_id)
-            fetched_from_db = True
-            return result
-            
-        # Esta función no usa un modelo de Pydantic directamente, sino un diccionario de resultados
-        # Usamos expiry_seconds más corto ya que este dato puede cambiar con más frecuencia
-        # debido a la configuración de horarios especiales
-        hours_data = await cache_service.get_or_set_json(
-            redis_client=redis_client,
-            cache_key=cache_key,
-            db_fetch_func=db_fetch,
-            expiry_seconds=3600 * 12, # 12 horas
-        )
-        
-        # Si se obtuvo de la BD, añadir la clave al set de seguimiento
-        if fetched_from_db and redis_client and hours_data is not None:
-            try:
-                await redis_client.sadd(tracking_set_key, cache_key)
-                await redis_client.expire(tracking_set_key, 3600 * 24 * 7) # 7 días
-                logger.debug(f"Added cache key {cache_key} to tracking set {tracking_set_key}")
-            except Exception as e:
-                logger.error(f"Error adding cache key {cache_key} to set {tracking_set_key}: {e}", exc_info=True)
-                
-        return hours_data
-    
     def create_or_update_gym_hours(
         self, db: Session, day: int, gym_hours_data: Union[GymHoursCreate, GymHoursUpdate],
         gym_id: int
@@ -573,128 +370,74 @@ class GymHoursService:
         
         return default_hours
     
-    def get_hours_for_date(self, db: Session, date_value: date, gym_id: int) -> Dict[str, Any]:
-        """
-        Obtener los horarios del gimnasio para una fecha específica.
-        
-        Args:
-            db: Sesión de base de datos
-            date_value: Fecha a consultar
-            gym_id: ID del gimnasio
-        """
-        # Implementación directa sin caché para evitar asyncio.run en contextos async
-        special_hours = gym_special_hours_repository.get_by_date(db, date_value=date_value, gym_id=gym_id)
+    @staticmethod
+    def _date_response(calendar: GymHoursCalendar, date_value: date) -> Dict[str, Any]:
+        """Respuesta de horarios de una fecha a partir del calendario efectivo."""
         day_of_week = date_value.weekday()
-        regular_hours = gym_hours_repository.get_by_day(db, day=day_of_week, gym_id=gym_id)
-        if not regular_hours:
-            regular_hours = gym_hours_repository.get_or_create_default(db, day=day_of_week, gym_id=gym_id)
+        regular_hours = calendar.weekly[day_of_week]
+        effective = calendar.get(date_value)
 
         result = {
             "date": date_value,
             "day_of_week": day_of_week,
             "regular_hours": {
-                "id": regular_hours.id,
+                "id": regular_hours.source_id,
                 "open_time": regular_hours.open_time,
                 "close_time": regular_hours.close_time,
                 "is_closed": regular_hours.is_closed
             },
             "special_hours": None,
-            "is_special": special_hours is not None
+            "is_special": effective.is_special,
+            "effective_hours": {
+                "open_time": effective.open_time,
+                "close_time": effective.close_time,
+                "is_closed": effective.is_closed,
+                "source": "special" if effective.is_special else "regular",
+                "source_id": effective.source_id
+            }
         }
 
-        if special_hours:
+        if effective.is_special:
             result["special_hours"] = {
-                "id": special_hours.id,
-                "open_time": special_hours.open_time,
-                "close_time": special_hours.close_time,
-                "is_closed": special_hours.is_closed,
-                "description": special_hours.description
-            }
-
-        if special_hours:
-            result["effective_hours"] = {
-                "open_time": special_hours.open_time,
-                "close_time": special_hours.close_time,
-                "is_closed": special_hours.is_closed,
-                "source": "special",
-                "source_id": special_hours.id
-            }
-        else:
-            result["effective_hours"] = {
-                "open_time": regular_hours.open_time,
-                "close_time": regular_hours.close_time,
-                "is_closed": regular_hours.is_closed,
-                "source": "regular",
-                "source_id": regular_hours.id
+                "id": effective.source_id,
+                "open_time": effective.open_time,
+                "close_time": effective.close_time,
+                "is_closed": effective.is_closed,
+                "description": effective.description
             }
 
         return result
 
-    # Implementación interna para la versión cacheada
-    async def _get_hours_for_date_internal(self, db: Session, date_value: date, gym_id: int) -> Dict[str, Any]:
+    def get_hours_for_date(self, db: Session, date_value: date, gym_id: int) -> Dict[str, Any]:
         """
-        Implementación interna del método get_hours_for_date para ser usada por get_hours_for_date_cached.
+        Obtener los horarios del gimnasio para una fecha específica.
         
         Args:
             db: Sesión de base de datos
             date_value: Fecha a consultar
             gym_id: ID del gimnasio
         """
-        # Verificar si hay horarios especiales para esta fecha
-        special_hours = gym_special_hours_repository.get_by_date(db, date_value=date_value, gym_id=gym_id)
-        
-        # Obtener día de la semana (0=Lunes, 6=Domingo)
-        day_of_week = date_value.weekday()
-        
-        # Obtener horarios regulares para este día
-        regular_hours = gym_hours_repository.get_by_day(db, day=day_of_week, gym_id=gym_id)
-        if not regular_hours:
-            # Si no hay horarios regulares, crear con valores predeterminados
-            regular_hours = gym_hours_repository.get_or_create_default(db, day=day_of_week, gym_id=gym_id)
-        
-        # Preparar la respuesta con la información completa y mejorada
-        result = {
-            "date": date_value,
-            "day_of_week": day_of_week,
-            "regular_hours": {
-                "id": regular_hours.id,
-                "open_time": regular_hours.open_time,
-                "close_time": regular_hours.close_time,
-                "is_closed": regular_hours.is_closed
-            },
-            "special_hours": None,
-            "is_special": special_hours is not None
-        }
-        
-        # Si hay horarios especiales, incluirlos en la respuesta
-        if special_hours:
-            result["special_hours"] = {
-                "id": special_hours.id,
-                "open_time": special_hours.open_time,
-                "close_time": special_hours.close_time,
-                "is_closed": special_hours.is_closed,
-                "description": special_hours.description
-            }
-            
-        # Determinar el horario efectivo para esta fecha (especial o regular)
-        if special_hours:
-            result["effective_hours"] = {
-                "open_time": special_hours.open_time,
-                "close_time": special_hours.close_time,
-                "is_closed": special_hours.is_closed,
-                "source": "special",
-                "source_id": special_hours.id
-            }
-        else:
-            result["effective_hours"] = {
-                "open_time": regular_hours.open_time,
-                "close_time": regular_hours.close_time,
-                "is_closed": regular_hours.is_closed,
-                "source": "regular",
-                "source_id": regular_hours.id
-            }
+        calendar = gym_hours_calendar_service.build(db, gym_id, date_value, date_value)
+        return self._date_response(calendar, date_value)
+    
+    async def get_hours_for_date_cached(self, db: Session, date_value: date, gym_id: int, redis_client: Optional[Redis] = None) -> Dict[str, Any]:
+        """
+        Obtener los horarios del gimnasio para una fecha específica (con caché).
+
+        Las fechas del horizonte del calendario precalculado se resuelven en
+        memoria sin consultar la BD.
         
-        return result
+        Args:
+            db: Sesión de base de datos
+            date_value: Fecha a consultar
+            gym_id: ID del gimnasio
+            redis_client: Cliente Redis opcional
+        """
+        calendar = await gym_hours_calendar_service.get_calendar_for_range(
+            db, gym_id, date_value, date_value, redis_client=redis_client
+        )
+        return self._date_response(calendar, date_value)
+
 
     def apply_defaults_to_range(
         self, db: Session, start_date: date, end_date: date, gym_id: int, overwrite_existing: bool = False
@@ -753,6 +496,26 @@ class GymHoursService:
         # Simplemente devolvemos una lista vacía para mantener compatibilidad con la API
         return []
         
+    @staticmethod
+    def _range_response(calendar: GymHoursCalendar, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+        """Horario efectivo de cada fecha de [start_date, end_date]."""
+        result: List[Dict[str, Any]] = []
+        current_date = start_date
+        while current_date <= end_date:
+            hours = calendar.get(current_date)
+            result.append({
+                "date": current_date,
+                "day_of_week": current_date.weekday(),
+                "open_time": hours.open_time,
+                "close_time": hours.close_time,
+                "is_closed": hours.is_closed,
+                "is_special": hours.is_special,
+                "description": hours.description,
+                "source_id": hours.source_id
+            })
+            current_date += timedelta(days=1)
+        return result
+
     def get_schedule_for_date_range(
         self, db: Session, start_date: date, end_date: date, gym_id: int
     ) -> List[Dict[str, Any]]:
@@ -765,64 +528,19 @@ class GymHoursService:
             end_date: Fecha de fin
             gym_id: ID del gimnasio
         """
-        # Implementación directa sin caché para evitar asyncio.run en contextos async
         if end_date < start_date:
             raise ValueError("La fecha de fin no puede ser anterior a la fecha de inicio")
-        special_hours = gym_special_hours_repository.get_by_date_range(
-            db, start_date=start_date, end_date=end_date, gym_id=gym_id
-        )
-        special_hours_dict = {str(hour.date): hour for hour in special_hours}
-        weekly_hours = self.get_all_gym_hours(db, gym_id=gym_id)
-        weekly_hours_dict = {hour.day_of_week: hour for hour in weekly_hours}
-
-        result: List[Dict[str, Any]] = []
-        current_date = start_date
-        while current_date <= end_date:
-            day_of_week = current_date.weekday()
-            date_str = str(current_date)
-            if date_str in special_hours_dict:
-                sh = special_hours_dict[date_str]
-                entry = {
-                    "date": current_date,
-                    "day_of_week": day_of_week,
-                    "open_time": sh.open_time,
-                    "close_time": sh.close_time,
-                    "is_closed": sh.is_closed,
-                    "is_special": True,
-                    "description": sh.description,
-                    "source_id": sh.id
-                }
-            else:
-                wh = weekly_hours_dict.get(day_of_week)
-                if not wh:
-                    is_closed = day_of_week == 6
-                    open_time = None if is_closed else time(9, 0)
-                    close_time = None if is_closed else time(21, 0)
-                    source_id = None
-                else:
-                    is_closed = wh.is_closed
-                    open_time = wh.open_time
-                    close_time = wh.close_time
-                    source_id = wh.id
-                entry = {
-                    "date": current_date,
-                    "day_of_week": day_of_week,
-                    "open_time": open_time,
-                    "close_time": close_time,
-                    "is_closed": is_closed,
-                    "is_special": False,
-                    "description": None,
-                    "source_id": source_id
-                }
-            result.append(entry)
-            current_date += timedelta(days=1)
-        return result
+        calendar = gym_hours_calendar_service.build(db, gym_id, start_date, end_date)
+        return self._range_response(calendar, start_date, end_date)
         
     async def get_schedule_for_date_range_cached(
         self, db: Session, start_date: date, end_date: date, gym_id: int, redis_client: Optional[Redis] = None
     ) -> List[Dict[str, Any]]:
         """
         Obtener el horario del gimnasio para un rango de fechas (con caché).
+
+        Los rangos dentro del horizonte del calendario precalculado se resuelven
+        en memoria; los que lo exceden se materializan con dos consultas.
         
         Args:
             db: Sesión de base de datos
@@ -831,123 +549,22 @@ class GymHoursService:
             gym_id: ID del gimnasio
             redis_client: Cliente Redis opcional
         """
-        # Si no hay Redis, o el rango es muy grande, procesar sin caché
-        if not redis_client or (end_date - start_date).days > 31:  # Si es más de un mes, no cachear
-            # Implementación directa sin caché para evitar recursión
-            # Verificar que el rango de fechas sea válido
-            if end_date < start_date:
-                raise ValueError("La fecha de fin no puede ser anterior a la fecha de inicio")
-                
-            # Obtener los horarios especiales para este rango
-            special_hours = gym_special_hours_repository.get_by_date_range(
-                db, start_date=start_date, end_date=end_date, gym_id=gym_id
-            )
-            
-            # Crear un diccionario de horarios especiales por fecha para acceso rápido
-            special_hours_dict = {str(hour.date): hour for hour in special_hours}
-            
-            # Obtener los horarios semanales predeterminados (usando la versión cacheada)
-            weekly_hours = await self.get_all_gym_hours_cached(db, gym_id=gym_id, redis_client=None)
-            if not weekly_hours:
-                # Si no hay horarios semanales, crearlos con valores predeterminados
-                weekly_hours = self._create_default_hours(db, gym_id=gym_id)
-                
-            # Crear un diccionario de horarios por día de la semana para acceso rápido
-            weekly_hours_dict = {hour.day_of_week: hour for hour in weekly_hours}
-            
-            # Preparar la respuesta
-            result = []
-            current_date = start_date
-            
-            while current_date <= end_date:
-                # Obtener el día de la semana (0=Lunes, 6=Domingo)
-                day_of_week = current_date.weekday()
-                date_str = str(current_date)
-                
-                # Verificar si hay un horario especial para esta fecha
-                if date_str in special_hours_dict:
-                    special_hour = special_hours_dict[date_str]
-                    schedule_entry = {
-                        "date": current_date,
-                        "day_of_week": day_of_week,
-                        "open_time": special_hour.open_time,
-                        "close_time": special_hour.close_time,
-                        "is_closed": special_hour.is_closed,
-                        "is_special": True,
-                        "description": special_hour.description,
-                        "source_id": special_hour.id
-                    }
-                else:
-                    # Usar el horario semanal para este día
-                    weekly_hour = weekly_hours_dict.get(day_of_week)
-                    if not weekly_hour:
-                        # Si no hay horario para este día, usar valores predeterminados
-                        is_closed = day_of_week == 6  # Cerrado en domingo
-                        open_time = time(9, 0) if not is_closed else None
-                        close_time = time(21, 0) if not is_closed else None
-                        source_id = None
-                    else:
-                        # Usar el horario semanal para este día
-                        is_closed = weekly_hour.is_closed
-                        open_time = weekly_hour.open_time
-                        close_time = weekly_hour.close_time
-                        source_id = weekly_hour.id
-                        
-                    schedule_entry = {
-                        "date": current_date,
-                        "day_of_week": day_of_week,
-                        "open_time": open_time,
-                        "close_time": close_time,
-                        "is_closed": is_closed,
-                        "is_special": False,
-                        "description": None,
-                        "source_id": source_id
-                    }
-                    
-                result.append(schedule_entry)
-                
-                # Avanzar al siguiente día
-                current_date += timedelta(days=1)
-                
-            return result
-
-        # Para rangos pequeños, usar caché por fecha individual
-        schedule_list = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            # Obtener horario efectivo para cada fecha usando el método cacheado
-            daily_schedule = await self.get_hours_for_date_cached(
-                db=db, 
-                date_value=current_date, 
-                gym_id=gym_id, 
-                redis_client=redis_client
-            )
-            
-            # Convertir el formato de respuesta de get_hours_for_date_cached a DailyScheduleResponse
-            effective_hours = daily_schedule.get("effective_hours", {})
-            schedule_entry = {
-                "date": current_date,
-                "day_of_week": current_date.weekday(),
-                "open_time": effective_hours.get("open_time"),
-                "close_time": effective_hours.get("close_time"),
-                "is_closed": effective_hours.get("is_closed", False),
-                "is_special": daily_schedule.get("is_special", False),
-                "description": daily_schedule.get("special_hours", {}).get("description") if daily_schedule.get("special_hours") else None,
-                "source_id": effective_hours.get("source_id")
-            }
-            
-            schedule_list.append(schedule_entry)
-            current_date += timedelta(days=1)
-            
-        return schedule_list
+        if end_date < start_date:
+            raise ValueError("La fecha de fin no puede ser anterior a la fecha de inicio")
+        calendar = await gym_hours_calendar_service.get_calendar_for_range(
+            db, gym_id, start_date, end_date, redis_client=redis_client
+        )
+        return self._range_response(calendar, start_date, end_date)
 
 
 class GymSpecialHoursService:
     # --- Añadir método helper para invalidación de caché ---
     async def _invalidate_special_hours_cache(self, redis_client: Redis, gym_id: int, special_day_id: Optional[int] = None, date_value: Optional[date] = None):
         """
-        Invalida la caché de días especiales.
+        Invalida la caché de días especiales: las consultas por fecha y los
+        próximos días incrementando el namespace `special_days:{gym_id}` junto
+        al del calendario de horarios efectivos, y el detalle y la instantánea
+        diaria afectados.
         
         Args:
             redis_client: Cliente Redis
@@ -957,31 +574,21 @@ class GymSpecialHoursService:
         """
         if not redis_client:
             return
-            
-        tracking_set_key = f"cache_keys:special_days:{gym_id}"
+
+        await cache_service.bump_namespaces(
+            redis_client, f"special_days:{gym_id}", gym_hours_calendar_service.namespace(gym_id)
+        )
+
         keys_to_delete = []
         
         try:
             # Invalidar clave específica de ID si se proporciona
             if special_day_id is not None:
                 keys_to_delete.append(f"special_day:detail:{special_day_id}")
-                
-            # Invalidar clave específica de fecha si se proporciona
+
+            # Instantánea diaria del día especial
             if date_value is not None:
-                date_str = date_value.isoformat()
-                keys_to_delete.append(f"special_day:date:{date_str}:gym:{gym_id}")
-            
-            # Claves adicionales a invalidar siempre
-            keys_to_delete.append(f"special_days:upcoming:gym:{gym_id}")
-            
-            # Obtener las claves de lista desde el Set de seguimiento
-            list_cache_keys = await redis_client.smembers(tracking_set_key)
-            if list_cache_keys:
-                # Convertir bytes a strings si es necesario
-                list_cache_keys_str = [key.decode('utf-8') if isinstance(key, bytes) else key for key in list_cache_keys]
-                keys_to_delete.extend(list_cache_keys_str)
-                # Añadir el propio Set a la lista para borrarlo también
-                keys_to_delete.append(tracking_set_key)
+                keys_to_delete.append(schedule_snapshot_service.key(gym_id, date_value))
             
             # Borrar todas las claves encontradas
             if keys_to_delete:
@@ -1039,16 +646,9 @@ class GymSpecialHoursService:
             
         date_str = date_value.isoformat()
         cache_key = f"special_day:date:{date_str}:gym:{gym_id}"
-        tracking_set_key = f"cache_keys:special_days:{gym_id}"
-        
-        # Indica si el resultado vino de la BD
-        fetched_from_db = False
         
         async def db_fetch():
-            nonlocal fetched_from_db
-            result = gym_special_hours_repository.get_by_date(db, date_value=date_value, gym_id=gym_id)
-            fetched_from_db = True
-            return result
+            return gym_special_hours_repository.get_by_date(db, date_value=date_value, gym_id=gym_id)
         
         special_day = await cache_service.get_or_set(
             redis_client=redis_client,
@@ -1056,18 +656,10 @@ class GymSpecialHoursService:
             db_fetch_func=db_fetch,
             model_class=GymSpecialHours,
             expiry_seconds=3600 * 12, # 12 horas
-            is_list=False
+            is_list=False,
+            namespaces=[f"special_days:{gym_id}"]
         )
         
-        # Si se obtuvo de la BD, añadir la clave al set de seguimiento
-        if fetched_from_db and redis_client and special_day is not None:
-            try:
-                await redis_client.sadd(tracking_set_key, cache_key)
-                await redis_client.expire(tracking_set_key, 3600 * 24 * 7) # 7 días
-                logger.debug(f"Added cache key {cache_key} to tracking set {tracking_set_key}")
-            except Exception as e:
-                logger.error(f"Error adding cache key {cache_key} to set {tracking_set_key}: {e}", exc_info=True)
-        
         return special_day
     
     def get_special_hours_by_date(self, db: Session, date_value: date, gym_id: int) -> Any:
@@ -1095,16 +687,9 @@ class GymSpecialHoursService:
             return self.get_upcoming_special_days(db, limit, gym_id)
             
         cache_key = f"special_days:upcoming:gym:{gym_id}:limit:{limit}"
-        tracking_set_key = f"cache_keys:special_days:{gym_id}"
-        
-        # Indica si el resultado vino de la BD
-        fetched_from_db = False
         
         async def db_fetch():
-            nonlocal fetched_from_db
-            result = gym_special_hours_repository.get_upcoming_special_days(db, limit=limit, gym_id=gym_id)
-            fetched_from_db = True
-            return result
+            return gym_special_hours_repository.get_upcoming_special_days(db, limit=limit, gym_id=gym_id)
         
         special_days = await cache_service.get_or_set(
             redis_client=redis_client,
@@ -1112,18 +697,10 @@ class GymSpecialHoursService:
             db_fetch_func=db_fetch,
             model_class=GymSpecialHours,
             expiry_seconds=3600 * 6, # 6 horas
-            is_list=True
+            is_list=True,
+            namespaces=[f"special_days:{gym_id}"]
         )
         
-        # Si se obtuvo de la BD, añadir la clave al set de seguimiento
-        if fetched_from_db and redis_client and special_days is not None:
-            try:
-                await redis_client.sadd(tracking_set_key, cache_key)
-                await redis_client.expire(tracking_set_key, 3600 * 24 * 7) # 7 días
-                logger.debug(f"Added cache key {cache_key} to tracking set {tracking_set_key}")
-            except Exception as e:
-                logger.error(f"Error adding cache key {cache_key} to set {tracking_set_key}: {e}", exc_info=True)
-        
         return special_days
     
     def get_upcoming_special_days(self, db: Session, limit: int = 10, gym_id: int = None) -> List[Any]:
@@ -1291,34 +868,20 @@ class GymSpecialHoursService:
 class ClassCategoryService:
     # --- Añadir método helper para invalidación --- 
     async def _invalidate_custom_category_caches(self, redis_client: Redis, gym_id: int, category_id: Optional[int] = None):
+        """
+        Invalida el detalle de una categoría y los listados de categorías del
+        gimnasio incrementando el namespace `categories:gym:{gym_id}`.
+        """
         if not redis_client:
             return
-        logger = logging.getLogger(__name__)
-        tracking_set_key = f"cache_keys:categories:gym:{gym_id}"
-        keys_to_delete = []
         
-        try:
-            # Borrar clave de detalle si se proporciona ID
-            if category_id:
-                detail_key = f"category:custom:detail:{category_id}"
-                keys_to_delete.append(detail_key)
-                
-            # Obtener claves de lista desde el Set de seguimiento
-            list_cache_keys = await redis_client.smembers(tracking_set_key)
-            if list_cache_keys:
-                # Convertir bytes a strings si es necesario (depende de la configuración de redis-py)
-                list_cache_keys_str = [key.decode('utf-8') if isinstance(key, bytes) else key for key in list_cache_keys]
-                keys_to_delete.extend(list_cache_keys_str)
-                # Añadir el propio Set a la lista para borrarlo también
-                keys_to_delete.append(tracking_set_key) 
-                
-            # Borrar todas las claves encontradas (detalle, listas y el set)
-            if keys_to_delete:
-                deleted_count = await redis_client.delete(*keys_to_delete)
-                logger.debug(f"Invalidated {deleted_count} category cache keys for gym {gym_id}: {keys_to_delete}")
-                
-        except Exception as e:
-            logger.error(f"Error invalidating category cache for gym {gym_id}: {e}", exc_info=True)
+        if category_id:
+            try:
+                await redis_client.delete(f"category:custom:detail:{category_id}")
+            except Exception as e:
+                logger.error(f"Error invalidating category detail cache for category {category_id}: {e}", exc_info=True)
+        
+        await cache_service.bump_namespaces(redis_client, f"categories:gym:{gym_id}")
     # --- Fin método helper --- 
     
     async def get_category(self, db: Session, category_id: int, gym_id: int, redis_client: Optional[Redis] = None) -> Any:
@@ -1363,43 +926,24 @@ class ClassCategoryService:
         return category
     
     async def get_categories_by_gym(self, db: Session, gym_id: int, active_only: bool = True, redis_client: Optional[Redis] = None) -> List[Any]:
-        """Obtener categorías para un gimnasio específico (con caché) y registrar la clave en un Set."""
+        """Obtener categorías para un gimnasio específico (con caché versionada por gimnasio)."""
         
         cache_key = f"categories:custom:gym:{gym_id}:active:{active_only}"
-        tracking_set_key = f"cache_keys:categories:gym:{gym_id}"
         
         async def db_fetch():
             if active_only:
-                return class_category_repository.get_active_categories(db, gym_id=gym_id)
-            return class_category_repository.get_by_gym(db, gym_id=gym_id)
-
-        # Indica si el resultado vino de la BD (y por tanto, se añadió a caché)
-        fetched_from_db = False
-        
-        async def db_fetch_wrapper():
-            nonlocal fetched_from_db
-            result = await db_fetch()
-            fetched_from_db = True # Marcar que se accedió a la BD
-            return result
+                return class_category_repository.get_active_categories(db, gym_id=gym_id)
+            return class_category_repository.get_by_gym(db, gym_id=gym_id)
 
         categories = await cache_service.get_or_set(
             redis_client=redis_client,
             cache_key=cache_key,
-            db_fetch_func=db_fetch_wrapper, # Usar el wrapper
+            db_fetch_func=db_fetch,
             model_class=ClassCategoryCustomSchema,
             expiry_seconds=3600, # 1 hora
-            is_list=True
+            is_list=True,
+            namespaces=[f"categories:gym:{gym_id}"]
         )
-        
-        # Si se obtuvo de la BD y se guardó en caché, añadir la clave al Set de seguimiento
-        if fetched_from_db and redis_client and categories is not None: # Asegurarse que no hubo error
-            try:
-                await redis_client.sadd(tracking_set_key, cache_key)
-                # Opcional: Poner un TTL al Set para que no crezca indefinidamente si algo falla
-                await redis_client.expire(tracking_set_key, 3600 * 24) # Ej: 1 día
-                logger.debug(f"Added cache key {cache_key} to tracking set {tracking_set_key}")
-            except Exception as e:
-                logger.error(f"Error adding cache key {cache_key} to set {tracking_set_key}: {e}", exc_info=True)
 
         return categories
     
@@ -1493,41 +1037,21 @@ class ClassCategoryService:
 class ClassService:
     # --- Añadir método helper para invalidación ---
     async def _invalidate_class_caches(self, redis_client: Optional[Redis], gym_id: int, class_id: Optional[int] = None, category_id: Optional[int] = None, difficulty: Optional[str] = None):
+        """
+        Invalida el detalle de una clase y todos los listados de clases del
+        gimnasio (generales, por categoría, por dificultad y búsquedas)
+        incrementando el namespace `classes:gym:{gym_id}`.
+        """
         if not redis_client:
             return
         
-        keys_to_delete = []
-        patterns_to_delete = []
-        
-        # Clave de detalle
         if class_id:
-            keys_to_delete.append(f"schedule:class:detail:{class_id}")
-            
-        # Patrones de lista general y por gimnasio
-        patterns_to_delete.append(f"schedule:classes:gym:{gym_id}:*")
-        patterns_to_delete.append(f"schedule:classes:all:*") # Por si acaso, aunque no la estamos usando ahora mismo
+            try:
+                await redis_client.delete(f"schedule:class:detail:{class_id}")
+            except Exception as e:
+                logger.error(f"Error invalidating class detail cache for class {class_id}: {e}", exc_info=True)
         
-        # Patrones de búsqueda y filtrado
-        patterns_to_delete.append(f"schedule:classes:search:gym:{gym_id}:*")
-        if category_id:
-            patterns_to_delete.append(f"schedule:classes:category:{category_id}:gym:{gym_id}:*")
-        if difficulty:
-             patterns_to_delete.append(f"schedule:classes:difficulty:{difficulty}:gym:{gym_id}:*")
-             
-        try:
-            if keys_to_delete:
-                deleted_keys = await redis_client.delete(*keys_to_delete)
-                logger.debug(f"Invalidated {deleted_keys} class detail keys: {keys_to_delete}")
-                
-            deleted_pattern_count = 0
-            for pattern in patterns_to_delete:
-                deleted_count = await cache_service.delete_pattern(redis_client, pattern)
-                deleted_pattern_count += deleted_count
-                logger.debug(f"Invalidated {deleted_count} keys with pattern: {pattern}")
-            logger.debug(f"Total invalidated class keys from patterns: {deleted_pattern_count}")
-            
-        except Exception as e:
-            logger.error(f"Error invalidating class cache for gym {gym_id} (class: {class_id}): {e}", exc_info=True)
+        await cache_service.bump_namespaces(redis_client, f"classes:gym:{gym_id}")
     # --- Fin método helper ---
     
     async def get_class(self, db: Session, class_id: int, gym_id: int, redis_client: Optional[Redis] = None) -> Any:
@@ -1597,7 +1121,8 @@ class ClassService:
             db_fetch_func=db_fetch,
             model_class=ClassSchema,
             expiry_seconds=1800, # 30 minutos para listas
-            is_list=True
+            is_list=True,
+            namespaces=[f"classes:gym:{gym_id}"]
         )
         return classes
     
@@ -1645,10 +1170,6 @@ class ClassService:
                 detail="Clase no encontrada en este gimnasio"
             )
         
-        # Guardar categoría y dificultad originales para invalidación
-        original_category_id = class_obj.category_id
-        original_difficulty = class_obj.difficulty_level.value if class_obj.difficulty_level else None
-        
         # Actualizar en BD
         updated_class = class_repository.update(db, db_obj=class_obj, obj_in=class_data)
         
@@ -1660,11 +1181,8 @@ class ClassService:
             category_id=updated_class.category_id, 
             difficulty=updated_class.difficulty_level.value if updated_class.difficulty_level else None
         )
-        # Invalidar también para la categoría/dificultad original si cambiaron
-        if original_category_id != updated_class.category_id:
-             await self._invalidate_class_caches(redis_client=redis_client, gym_id=gym_id, category_id=original_category_id)
-        if original_difficulty != (updated_class.difficulty_level.value if updated_class.difficulty_level else None):
-             await self._invalidate_class_caches(redis_client=redis_client, gym_id=gym_id, difficulty=original_difficulty)
+        # Las instantáneas diarias copian nombre y capacidad de la clase
+        await schedule_snapshot_service.invalidate_gym(redis_client, gym_id)
              
         return updated_class
     
@@ -1735,7 +1253,8 @@ class ClassService:
             db_fetch_func=db_fetch,
             model_class=ClassSchema,
             expiry_seconds=1800, # 30 mins
-            is_list=True
+            is_list=True,
+            namespaces=[f"classes:gym:{gym_id}"]
         )
         return classes
     
@@ -1767,7 +1286,8 @@ class ClassService:
             db_fetch_func=db_fetch,
             model_class=ClassSchema,
             expiry_seconds=1800, # 30 mins
-            is_list=True
+            is_list=True,
+            namespaces=[f"classes:gym:{gym_id}"]
         )
         return classes
     
@@ -1812,7 +1332,8 @@ class ClassService:
             db_fetch_func=db_fetch,
             model_class=ClassSchema,
             expiry_seconds=600, # 10 mins para búsquedas
-            is_list=True
+            is_list=True,
+            namespaces=[f"classes:gym:{gym_id}"]
         )
         return classes
 
@@ -1986,6 +1507,15 @@ class ClassSessionService:
         else:
             logger.warning(f"   ⚠️ start_time o end_time faltantes, no se puede convertir timezone")
         
+        # VALIDACIÓN: El entrenador y la sala deben estar libres
+        session_conflict_service.ensure_no_conflicts(
+            db,
+            gym_id=gym_id,
+            intervals=[(obj_in_data.get("start_time"), obj_in_data.get("end_time"))],
+            trainer_id=obj_in_data.get("trainer_id"),
+            room=obj_in_data.get("room")
+        )
+        
         # Agregar ID del creador si se proporciona
         if created_by_id:
             obj_in_data["created_by"] = created_by_id
@@ -2007,83 +1537,107 @@ class ClassSessionService:
     
         # Invalidar cachés relevantes (ej. listas de sesiones futuras, por fecha, por trainer, etc.)
         await self._invalidate_session_caches(redis_client, gym_id=gym_id, trainer_id=created_session.trainer_id, class_id=created_session.class_id)
+        await schedule_snapshot_service.upsert_session(redis_client, created_session, class_obj, gym.timezone)
         
         return created_session
     
     # Añadir método helper para invalidar caché de sesión
+    @staticmethod
+    def _session_namespaces(gym_id: int, trainer_id: Optional[int] = None, class_id: Optional[int] = None) -> List[str]:
+        """Namespaces versionados de los que dependen los listados de sesiones."""
+        namespaces = [f"sessions:gym:{gym_id}"]
+        if trainer_id:
+            namespaces.append(f"sessions:trainer:{trainer_id}")
+        if class_id:
+            namespaces.append(f"sessions:class:{class_id}")
+        return namespaces
+
     async def _invalidate_session_caches(self, redis_client: Optional[Redis], gym_id: int, session_id: Optional[int] = None, trainer_id: Optional[int] = None, class_id: Optional[int] = None):
         """
-        Invalidar cachés de sesiones de manera inteligente usando tracking sets.
+        Invalidar cachés de sesiones.
+
+        Los detalles de sesión se eliminan por clave y los listados se
+        invalidan incrementando la generación de sus namespaces (un INCR por
+        namespace, sin SCAN).
         """
         if not redis_client:
             return
             
-        from app.services.cache_service import cache_service
+        namespaces = self._session_namespaces(gym_id, trainer_id=trainer_id, class_id=class_id)
+        if session_id:
+            try:
+                await redis_client.delete(
+                    f"schedule:session:detail:{session_id}",
+                    f"schedule:session:detail_with_availability:{session_id}"
+                )
+            except Exception as e:
+                logger.error(f"Error invalidating session detail caches for session {session_id}: {e}", exc_info=True)
         
-        keys_to_delete = []
-        tracking_sets_to_process = []
+        await cache_service.bump_namespaces(redis_client, *namespaces)
 
-        # Cachés específicos de sesión
-        if session_id:
-            keys_to_delete.extend([
-                f"schedule:session:detail:{session_id}",
-                f"schedule:session:detail_with_availability:{session_id}",
-                f"schedule:participations:session:{session_id}:gym:{gym_id}:*"
+    async def invalidate_session_status_caches(
+        self, redis_client: Optional[Redis], gym_id: int, sessions: List[Any]
+    ) -> None:
+        """
+        Invalidar las cachés de un lote de sesiones de un gimnasio cuyo estado cambió.
+
+        Args:
+            redis_client: Cliente Redis
+            gym_id: ID del gimnasio
+            sessions: Filas (id, gym_id, trainer_id, class_id, start_time) de las sesiones
+        """
+        if not redis_client or not sessions:
+            return
+
+        detail_keys = []
+        for session in sessions:
+            detail_keys.extend([
+                f"schedule:session:detail:{session.id}",
+                f"schedule:session:detail_with_availability:{session.id}"
             ])
-        
-        # Tracking sets a procesar para invalidación masiva
-        tracking_sets_to_process.append(f"cache_keys:sessions:{gym_id}")
-        
-        if trainer_id:
-            tracking_sets_to_process.append(f"cache_keys:sessions:trainer:{trainer_id}")
-            
-        if class_id:
-            tracking_sets_to_process.append(f"cache_keys:sessions:class:{class_id}")
-        
         try:
-            # Eliminar claves específicas
-            if keys_to_delete:
-                # Separar claves directas de patrones
-                direct_keys = [k for k in keys_to_delete if '*' not in k]
-                pattern_keys = [k for k in keys_to_delete if '*' in k]
-                
-                if direct_keys:
-                    deleted_keys = await redis_client.delete(*direct_keys)
-                    logger.debug(f"Invalidated {deleted_keys} direct session keys: {direct_keys}")
-                
-                # Procesar patrones
-                for pattern in pattern_keys:
-                    deleted_count = await cache_service.delete_pattern(redis_client, pattern)
-                    logger.debug(f"Invalidated {deleted_count} keys with pattern: {pattern}")
-            
-            # Procesar tracking sets para invalidación inteligente
-            total_invalidated = 0
-            for tracking_set in tracking_sets_to_process:
-                try:
-                    # Obtener todas las claves del tracking set
-                    cached_keys = await redis_client.smembers(tracking_set)
-                    if cached_keys:
-                        # Convertir bytes a strings si es necesario
-                        if isinstance(next(iter(cached_keys)), bytes):
-                            cached_keys = [key.decode('utf-8') for key in cached_keys]
-                        
-                        # Eliminar las claves
-                        deleted_count = await redis_client.delete(*cached_keys)
-                        total_invalidated += deleted_count
-                        
-                        # Limpiar el tracking set
-                        await redis_client.delete(tracking_set)
-                        
-                        logger.debug(f"Invalidated {deleted_count} cached keys from tracking set {tracking_set}")
-                    
-                except Exception as set_error:
-                    logger.warning(f"Error processing tracking set {tracking_set}: {set_error}")
-            
-            if total_invalidated > 0:
-                logger.info(f"Total invalidated session cache keys: {total_invalidated}")
-            
+            await redis_client.delete(*detail_keys)
         except Exception as e:
-            logger.error(f"Error invalidating session caches for gym {gym_id}: {e}", exc_info=True)
+            logger.warning(f"Error invalidando detalles de sesiones del gym {gym_id}: {e}")
+
+        # Listados del gimnasio y de cada entrenador/clase afectados
+        for trainer_id, class_id in {(s.trainer_id, s.class_id) for s in sessions}:
+            await self._invalidate_session_caches(
+                redis_client, gym_id=gym_id, trainer_id=trainer_id, class_id=class_id
+            )
+
+        await schedule_snapshot_service.invalidate_sessions(
+            redis_client, gym_id, [s.start_time for s in sessions]
+        )
+
+    @staticmethod
+    def _expand_weekly_recurrence(
+        start_date: date,
+        end_date: date,
+        days_of_week: List[int],
+        exclude_dates: Optional[List[date]] = None
+    ) -> List[date]:
+        """
+        Expandir un patrón semanal a la lista ordenada de fechas.
+
+        Args:
+            start_date: Primera fecha posible
+            end_date: Última fecha posible (incluida)
+            days_of_week: Días de la semana (0=Lunes, 6=Domingo)
+            exclude_dates: Excepciones (fechas concretas a omitir, como EXDATE)
+
+        Returns:
+            Fechas de las ocurrencias
+        """
+        excluded = set(exclude_dates or [])
+        occurrences = []
+        for weekday in set(days_of_week):
+            current = start_date + timedelta(days=(weekday - start_date.weekday()) % 7)
+            while current <= end_date:
+                if current not in excluded:
+                    occurrences.append(current)
+                current += timedelta(weeks=1)
+        return sorted(occurrences)
 
     async def create_recurring_sessions(
         self, db: Session, 
@@ -2093,9 +1647,18 @@ class ClassSessionService:
         days_of_week: List[int],  # 0=Lunes, 1=Martes, etc.
         created_by_id: Optional[int] = None,
         gym_id: int = None, # Añadir gym_id
-        redis_client: Optional[Redis] = None # Añadir redis_client
+        redis_client: Optional[Redis] = None, # Añadir redis_client
+        exclude_dates: Optional[List[date]] = None,
+        skip_special_days: bool = True
     ) -> List[Any]:
-        """Crear sesiones recurrentes basadas en días de la semana e invalidar caché"""
+        """
+        Crear sesiones recurrentes basadas en días de la semana e invalidar caché.
+
+        El patrón se expande en memoria, se descartan las excepciones
+        (`exclude_dates`) y, si `skip_special_days` es True, los días especiales
+        del gimnasio en los que está cerrado o la sesión queda fuera de su
+        horario. Todas las sesiones se insertan en un único lote y transacción.
+        """
         if not gym_id:
              raise HTTPException(status_code=400, detail="Gym ID is required")
 
@@ -2140,75 +1703,75 @@ class ClassSessionService:
         base_end_time = session_base_data["end_time"]
         
         # Necesitamos solo la hora/minutos, no la fecha
-        base_start_hour = base_start_time.hour
-        base_start_minute = base_start_time.minute
+        base_start = time(hour=base_start_time.hour, minute=base_start_time.minute)
         
         # Si end_time está definido, extraer también su hora/minutos
+        base_end = None
+        duration_minutes = None
         if base_end_time:
-            base_end_hour = base_end_time.hour
-            base_end_minute = base_end_time.minute
-            # Calcular duración si no está disponible
-            duration_minutes = ((base_end_hour * 60 + base_end_minute) - 
-                              (base_start_hour * 60 + base_start_minute))
+            base_end = time(hour=base_end_time.hour, minute=base_end_time.minute)
         else:
-            # Si no hay end_time pero tenemos la duración de la clase
+            # Si no hay end_time usamos la duración de la clase
             duration_minutes = class_obj.duration
         
-        created_sessions = []
-        current_date = start_date
+        occurrences = self._expand_weekly_recurrence(start_date, end_date, days_of_week, exclude_dates)
         
-        # Iterar por cada día en el rango
-        while current_date <= end_date:
-            # Verificar si el día actual está en la lista de días seleccionados
-            if current_date.weekday() in days_of_week:
-                # Crear una copia de los datos base para esta sesión
-                session_data = session_base_data.copy()
-                
-                # Crear datetime para este día específico con la hora base
-                new_start_datetime = datetime.combine(
-                    current_date,
-                    time(hour=base_start_hour, minute=base_start_minute)
-                )
-
-                # VALIDACIÓN: Verificar que esta sesión específica esté en el futuro
-                if not is_session_in_future(new_start_datetime, gym.timezone):
-                    # Omitir sesiones que ya pasaron (por ejemplo, si es hoy pero la hora ya pasó)
-                    logger.info(f"Omitiendo sesión en el pasado: {new_start_datetime} (timezone: {gym.timezone})")
-                    current_date += timedelta(days=1)
-                    continue
-
-                session_data["start_time"] = new_start_datetime
-                
-                # Calcular end_time basado en la duración
-                if "end_time" in session_data and session_data["end_time"]:
-                    # Si tenemos end_time, crear uno nuevo con la misma fecha
-                    new_end_datetime = datetime.combine(
-                        current_date,
-                        time(hour=base_end_hour, minute=base_end_minute)
-                    )
-                    session_data["end_time"] = new_end_datetime
-                elif duration_minutes:
-                    # Calcular end_time basado en la duración
-                    new_end_datetime = new_start_datetime + timedelta(minutes=duration_minutes)
-                    session_data["end_time"] = new_end_datetime
-                
-                # Convertir/normalizar tiempos a UTC antes de crear la sesión
-                from app.core.timezone_utils import normalize_to_utc
-                session_data["start_time"] = normalize_to_utc(session_data["start_time"], gym.timezone)
-                session_data["end_time"] = normalize_to_utc(session_data["end_time"], gym.timezone)
-                
-                # Crear la sesión
-                session = class_session_repository.create(
-                    db, obj_in=session_data
-                )
-                created_sessions.append(session)
-                
-            # Avanzar al siguiente día
-            current_date += timedelta(days=1)
+        # Días especiales del rango desde el calendario de horarios efectivos
+        calendar = None
+        if occurrences and skip_special_days:
+            calendar = await gym_hours_calendar_service.get_calendar_for_range(
+                db, gym_id, occurrences[0], occurrences[-1], redis_client=redis_client
+            )
+        
+        from app.core.timezone_utils import normalize_to_utc
+        sessions_data = []
+        for occurrence in occurrences:
+            # Crear datetime para este día específico con la hora base
+            new_start_datetime = datetime.combine(occurrence, base_start)
+            if base_end:
+                new_end_datetime = datetime.combine(occurrence, base_end)
+            elif duration_minutes:
+                new_end_datetime = new_start_datetime + timedelta(minutes=duration_minutes)
+            else:
+                new_end_datetime = None
+            
+            hours = calendar.get(occurrence) if calendar else None
+            if hours and hours.is_special and not hours.fits(new_start_datetime, new_end_datetime or new_start_datetime):
+                logger.info(f"Omitiendo sesión en día especial: {occurrence} ({hours.description})")
+                continue
+            
+            # VALIDACIÓN: Verificar que esta sesión específica esté en el futuro
+            if not is_session_in_future(new_start_datetime, gym.timezone):
+                # Omitir sesiones que ya pasaron (por ejemplo, si es hoy pero la hora ya pasó)
+                logger.info(f"Omitiendo sesión en el pasado: {new_start_datetime} (timezone: {gym.timezone})")
+                continue
+            
+            # Convertir/normalizar tiempos a UTC antes de crear la sesión
+            sessions_data.append({
+                **session_base_data,
+                "start_time": normalize_to_utc(new_start_datetime, gym.timezone),
+                "end_time": normalize_to_utc(new_end_datetime, gym.timezone),
+            })
+        
+        # VALIDACIÓN: Todas las ocurrencias contra la agenda del entrenador y la sala en una consulta
+        session_conflict_service.ensure_no_conflicts(
+            db,
+            gym_id=gym_id,
+            intervals=[(data["start_time"], data["end_time"]) for data in sessions_data],
+            trainer_id=session_base_data.get("trainer_id"),
+            room=session_base_data.get("room")
+        )
+        
+        # Insertar todas las sesiones en un único lote
+        created_sessions = class_session_repository.bulk_create(db, objs_in=sessions_data)
             
-        # Invalidar cachés relevantes una vez después del bucle
+        # Invalidar cachés relevantes una vez para todo el lote
         if created_sessions:
              await self._invalidate_session_caches(redis_client, gym_id=gym_id, trainer_id=base_session_data.trainer_id, class_id=base_session_data.class_id)
+             await schedule_snapshot_service.invalidate_days(
+                 redis_client, gym_id,
+                 {schedule_snapshot_service.local_day(s.start_time, gym.timezone) for s in created_sessions}
+             )
         
         return created_sessions
     
@@ -2236,6 +1799,7 @@ class ClassSessionService:
         # Guardar datos originales para invalidación si cambian
         original_trainer_id = session.trainer_id
         original_class_id = session.class_id
+        original_start_time = session.start_time
         
         # Preparar datos de actualización
         update_data = session_data.model_dump(exclude_unset=True)
@@ -2256,6 +1820,21 @@ class ClassSessionService:
             if "end_time" in update_data and update_data["end_time"] is not None:
                 update_data["end_time"] = normalize_to_utc(update_data["end_time"], gym.timezone)
         
+        # VALIDACIÓN: Si cambia el horario, el entrenador o la sala, deben quedar libres
+        if session.status != ClassSessionStatus.CANCELLED and \
+                {"start_time", "end_time", "trainer_id", "room"} & update_data.keys():
+            session_conflict_service.ensure_no_conflicts(
+                db,
+                gym_id=gym_id,
+                intervals=[(
+                    update_data.get("start_time") or session.start_time,
+                    update_data.get("end_time") or session.end_time
+                )],
+                trainer_id=update_data.get("trainer_id") or session.trainer_id,
+                room=update_data["room"] if "room" in update_data else session.room,
+                exclude_session_ids=[session_id]
+            )
+        
         # Actualizar en BD
         updated_session = class_session_repository.update(
             db, db_obj=session, obj_in=update_data
@@ -2274,6 +1853,14 @@ class ClassSessionService:
              await self._invalidate_session_caches(redis_client, gym_id=gym_id, trainer_id=original_trainer_id)
         if original_class_id != updated_session.class_id:
              await self._invalidate_session_caches(redis_client, gym_id=gym_id, class_id=original_class_id)
+
+        if redis_client:
+            class_obj = class_repository.get(db, id=updated_session.class_id)
+            if class_obj:
+                await schedule_snapshot_service.upsert_session(
+                    redis_client, updated_session, class_obj, gym.timezone,
+                    previous_start_time=original_start_time
+                )
              
         return updated_session
     
@@ -2305,6 +1892,15 @@ class ClassSessionService:
             trainer_id=trainer_id, 
             class_id=class_id
         )
+
+        if redis_client:
+            from app.repositories.gym import gym_repository
+            gym = gym_repository.get(db, id=gym_id)
+            class_obj = class_repository.get(db, id=class_id)
+            if gym and class_obj:
+                await schedule_snapshot_service.upsert_session(
+                    redis_client, cancelled_session, class_obj, gym.timezone
+                )
         
         return cancelled_session
     
@@ -2326,18 +1922,11 @@ class ClassSessionService:
             )
             
         cache_key = f"schedule:sessions:upcoming:gym:{gym_id}:skip:{skip}:limit:{limit}"
-        tracking_set_key = f"cache_keys:sessions:{gym_id}"
-        
-        # Indica si el resultado vino de la BD
-        fetched_from_db = False
         
         async def db_fetch():
-            nonlocal fetched_from_db
-            result = class_session_repository.get_upcoming_sessions(
+            return class_session_repository.get_upcoming_sessions(
                 db, skip=skip, limit=limit, gym_id=gym_id
             )
-            fetched_from_db = True
-            return result
         
         # Usar el servicio de caché genérico
         from app.services.cache_service import cache_service
@@ -2349,17 +1938,10 @@ class ClassSessionService:
             db_fetch_func=db_fetch,
             model_class=ClassSession,
             expiry_seconds=300,  # 5 minutos para sesiones próximas
-            is_list=True
+            is_list=True,
+            namespaces=self._session_namespaces(gym_id)
         )
         
-        # Añadir a tracking set para invalidación
-        if fetched_from_db:
-            try:
-                await redis_client.sadd(tracking_set_key, cache_key)
-                await redis_client.expire(tracking_set_key, 3600)  # 1 hora de tracking
-            except Exception as e:
-                logger.warning(f"No se pudo añadir clave a tracking set: {e}")
-        
         return sessions
     
     async def get_sessions_by_date_range(
@@ -2389,21 +1971,14 @@ class ClassSessionService:
         start_str = start_date.isoformat()
         end_str = end_date.isoformat()
         cache_key = f"schedule:sessions:range:gym:{gym_id}:start:{start_str}:end:{end_str}:skip:{skip}:limit:{limit}"
-        tracking_set_key = f"cache_keys:sessions:{gym_id}"
-        
-        # Indica si el resultado vino de la BD
-        fetched_from_db = False
         
         async def db_fetch():
-            nonlocal fetched_from_db
             start_datetime = datetime.combine(start_date, time.min)
             end_datetime = datetime.combine(end_date, time.max)
-            result = class_session_repository.get_by_date_range(
+            return class_session_repository.get_by_date_range(
                 db, start_date=start_datetime, end_date=end_datetime,
                 skip=skip, limit=limit, gym_id=gym_id
             )
-            fetched_from_db = True
-            return result
         
         # Usar el servicio de caché genérico
         from app.services.cache_service import cache_service
@@ -2415,17 +1990,10 @@ class ClassSessionService:
             db_fetch_func=db_fetch,
             model_class=ClassSession,
             expiry_seconds=900,  # 15 minutos para rangos de fechas
-            is_list=True
+            is_list=True,
+            namespaces=self._session_namespaces(gym_id)
         )
         
-        # Añadir a tracking set para invalidación
-        if fetched_from_db:
-            try:
-                await redis_client.sadd(tracking_set_key, cache_key)
-                await redis_client.expire(tracking_set_key, 3600)  # 1 hora de tracking
-            except Exception as e:
-                logger.warning(f"No se pudo añadir clave a tracking set: {e}")
-        
         return sessions
     
     async def get_sessions_by_trainer(
@@ -2453,24 +2021,15 @@ class ClassSessionService:
             )
             
         cache_key = f"schedule:sessions:trainer:{trainer_id}:gym:{gym_id}:upcoming:{upcoming_only}:skip:{skip}:limit:{limit}"
-        tracking_set_key = f"cache_keys:sessions:{gym_id}"
-        trainer_tracking_key = f"cache_keys:sessions:trainer:{trainer_id}"
-        
-        # Indica si el resultado vino de la BD
-        fetched_from_db = False
         
         async def db_fetch():
-            nonlocal fetched_from_db
             if upcoming_only:
-                result = class_session_repository.get_trainer_upcoming_sessions(
-                    db, trainer_id=trainer_id, skip=skip, limit=limit, gym_id=gym_id
-                )
-            else:
-                result = class_session_repository.get_by_trainer(
+                return class_session_repository.get_trainer_upcoming_sessions(
                     db, trainer_id=trainer_id, skip=skip, limit=limit, gym_id=gym_id
                 )
-            fetched_from_db = True
-            return result
+            return class_session_repository.get_by_trainer(
+                db, trainer_id=trainer_id, skip=skip, limit=limit, gym_id=gym_id
+            )
         
         # Usar el servicio de caché genérico
         from app.services.cache_service import cache_service
@@ -2482,19 +2041,10 @@ class ClassSessionService:
             db_fetch_func=db_fetch,
             model_class=ClassSession,
             expiry_seconds=600,  # 10 minutos para sesiones por trainer
-            is_list=True
+            is_list=True,
+            namespaces=self._session_namespaces(gym_id, trainer_id=trainer_id)
         )
         
-        # Añadir a tracking sets para invalidación
-        if fetched_from_db:
-            try:
-                await redis_client.sadd(tracking_set_key, cache_key)
-                await redis_client.sadd(trainer_tracking_key, cache_key)
-                await redis_client.expire(tracking_set_key, 3600)  # 1 hora de tracking
-                await redis_client.expire(trainer_tracking_key, 3600)  # 1 hora de tracking
-            except Exception as e:
-                logger.warning(f"No se pudo añadir clave a tracking sets: {e}")
-        
         return sessions
     
     async def get_sessions_by_class(
@@ -2515,19 +2065,11 @@ class ClassSessionService:
             )
 
         cache_key = f"schedule:sessions:class:{class_id}:gym:{gym_id}:skip:{skip}:limit:{limit}"
-        tracking_set_key = f"cache_keys:sessions:{gym_id}"
-        class_tracking_key = f"cache_keys:sessions:class:{class_id}"
-        
-        # Indica si el resultado vino de la BD
-        fetched_from_db = False
         
         async def db_fetch():
-            nonlocal fetched_from_db
-            result = class_session_repository.get_by_class(
+            return class_session_repository.get_by_class(
                 db, class_id=class_id, skip=skip, limit=limit, gym_id=gym_id
             )
-            fetched_from_db = True
-            return result
         
         # Usar el servicio de caché genérico
         from app.services.cache_service import cache_service
@@ -2539,37 +2081,33 @@ class ClassSessionService:
             db_fetch_func=db_fetch,
             model_class=ClassSession,
             expiry_seconds=600,  # 10 minutos para sesiones por clase
-            is_list=True
+            is_list=True,
+            namespaces=self._session_namespaces(gym_id, class_id=class_id)
         )
         
-        # Añadir a tracking sets para invalidación
-        if fetched_from_db:
-            try:
-                await redis_client.sadd(tracking_set_key, cache_key)
-                await redis_client.sadd(class_tracking_key, cache_key)
-                await redis_client.expire(tracking_set_key, 3600)  # 1 hora de tracking
-                await redis_client.expire(class_tracking_key, 3600)  # 1 hora de tracking
-            except Exception as e:
-                logger.warning(f"No se pudo añadir clave a tracking sets: {e}")
-        
         return sessions
 
 
 class ClassParticipationService:
-    async def register_for_class(self, db: Session, member_id: int, session_id: int, gym_id: int, redis_client: Optional[Redis] = None) -> Any:
-        """Registrar a un miembro en una sesión de clase e invalidar caché de sesión"""
-        # Nota: Añadir gym_id y redis_client
+    async def register_for_class(self, db: Session, member_id: int, session_id: int, gym_id: int, redis_client: Optional[Redis] = None, join_waitlist: bool = False) -> Any:
+        """
+        Registrar a un miembro en una sesión de clase e invalidar caché de sesión.
+
+        La plaza se reserva con un UPDATE condicional sobre `current_participants`
+        (ver `ClassSessionRepository.reserve_seat`) que se confirma en la misma
+        transacción que la participación, de modo que las inscripciones
+        concurrentes nunca superan la capacidad. Si la sesión está llena y
+        `join_waitlist` es True, el miembro queda en lista de espera y se le
+        promociona automáticamente cuando otro miembro cancela.
+        """
         # Verificar si la sesión existe, está programada y pertenece al gimnasio
-        session_data = class_session_repository.get_with_availability(db, session_id=session_id)
-        if not session_data or session_data["session"].gym_id != gym_id:
+        session = class_session_repository.get(db, id=session_id)
+        if not session or session.gym_id != gym_id:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Sesión no encontrada en este gimnasio"
             )
         
-        session = session_data["session"]
-        class_obj = session_data["class"] # Ya sabemos que la sesión pertenece al gym_id
-        
         # Validar que la sesión esté en estado programado
         if session.status != ClassSessionStatus.SCHEDULED:
             raise HTTPException(
@@ -2593,117 +2131,172 @@ class ClassParticipationService:
                 detail="No se puede registrar en una sesión que ya ha comenzado o terminado"
             )
         
-        # Validar que la sesión no esté llena
-        if session_data["is_full"]:
+        # Verificar si el miembro ya está registrado o en lista de espera
+        existing = class_participation_repository.get_by_session_and_member(
+            db, session_id=session_id, member_id=member_id, gym_id=gym_id
+        )
+        if existing and existing.status != ClassParticipationStatus.CANCELLED:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="La sesión está llena"
+                detail=(
+                    "Ya estás en la lista de espera de esta clase"
+                    if existing.status == ClassParticipationStatus.WAITLISTED
+                    else "Ya estás registrado en esta clase"
+                )
             )
         
-        # Verificar si el miembro ya está registrado
-        existing = class_participation_repository.get_by_session_and_member(
-            db, session_id=session_id, member_id=member_id, gym_id=gym_id # Añadir gym_id
-        )
+        # Reservar plaza de forma atómica (sin commit todavía)
+        if class_session_repository.reserve_seat(db, session_id=session_id) is not None:
+            new_status = ClassParticipationStatus.REGISTERED
+        elif join_waitlist:
+            new_status = ClassParticipationStatus.WAITLISTED
+        else:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="La sesión está llena"
+            )
         
-        participation_result = None
-        if existing:
-            if existing.status == ClassParticipationStatus.CANCELLED:
-                # Reactivar registro
+        # Crear o reactivar la participación; el commit confirma también la reserva
+        from sqlalchemy.exc import IntegrityError
+        try:
+            if existing:
                 participation_result = class_participation_repository.update(
                     db, db_obj=existing,
                     obj_in={
-                        "status": ClassParticipationStatus.REGISTERED,
+                        "status": new_status,
+                        "registration_time": datetime.now(timezone.utc),
                         "cancellation_time": None,
                         "cancellation_reason": None
                     }
                 )
             else:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Ya estás registrado en esta clase"
-                )
-        else:
-            # Crear nueva participación con manejo de carrera por constraint único
-            participation_data = {
-                "session_id": session_id,
-                "member_id": member_id,
-                "status": ClassParticipationStatus.REGISTERED,
-                "gym_id": gym_id  # Asignar el gym_id
-            }
-            from sqlalchemy.exc import IntegrityError
-            try:
                 participation_result = class_participation_repository.create(
-                    db, obj_in=participation_data
-                )
-            except IntegrityError:
-                # Otro proceso registró simultáneamente; recuperar el existente
-                db.rollback()
-                participation_result = class_participation_repository.get_by_session_and_member(
-                    db, session_id=session_id, member_id=member_id, gym_id=gym_id
+                    db, obj_in={
+                        "session_id": session_id,
+                        "member_id": member_id,
+                        "status": new_status,
+                        "gym_id": gym_id
+                    }
                 )
-        
-        # Actualizar contador de participantes y validar resultado
-        if participation_result:
-            class_session_repository.update_participant_count(db, session_id=session_id)
-            # Invalidar cachés de sesión y participación al final
-            await self._invalidate_session_caches_from_participation(
-                session_id=session_id,
-                gym_id=gym_id,
-                redis_client=redis_client,
-                trainer_id=session.trainer_id, 
-                class_id=session.class_id
-            )
-            # Invalidar cache de participation status del miembro
-            await self.invalidate_member_participation_cache(
-                member_id=member_id, gym_id=gym_id, redis_client=redis_client
+        except IntegrityError:
+            # Otro proceso registró simultáneamente al mismo miembro; el rollback
+            # deshace también la reserva de plaza
+            db.rollback()
+            participation_result = class_participation_repository.get_by_session_and_member(
+                db, session_id=session_id, member_id=member_id, gym_id=gym_id
             )
-            return participation_result
+        
+        if not participation_result:
+            # Si por alguna razón no se creó/actualizó la participación
+            raise HTTPException(status_code=500, detail="No se pudo completar el registro")
+        
+        if participation_result.status == ClassParticipationStatus.WAITLISTED:
+            logger.info(f"Miembro {member_id} añadido a la lista de espera de la sesión {session_id}")
         else:
-             # Si por alguna razón no se creó/actualizó la participación
-             raise HTTPException(status_code=500, detail="No se pudo completar el registro")
+            await schedule_snapshot_service.update_availability(redis_client, session, gym.timezone)
+        
+        # Invalidar cachés de sesión y participación al final
+        await self._invalidate_session_caches_from_participation(
+            session_id=session_id,
+            gym_id=gym_id,
+            redis_client=redis_client,
+            trainer_id=session.trainer_id, 
+            class_id=session.class_id
+        )
+        # Invalidar cache de participation status del miembro
+        await self.invalidate_member_participation_cache(
+            member_id=member_id, gym_id=gym_id, redis_client=redis_client
+        )
+        return participation_result
+
+    def _promote_from_waitlist(self, db: Session, session_id: int) -> Optional[ClassParticipation]:
+        """
+        Promocionar al primer miembro de la lista de espera (sin commit).
+
+        Returns:
+            La participación promocionada, o None si no hay lista de espera
+            o no queda plaza
+        """
+        candidate = class_participation_repository.get_next_waitlisted(db, session_id=session_id)
+        if not candidate:
+            return None
+        if class_session_repository.reserve_seat(db, session_id=session_id) is None:
+            return None
+        candidate.status = ClassParticipationStatus.REGISTERED
+        return candidate
 
     async def cancel_registration(self, db: Session, member_id: int, session_id: int, gym_id: int, reason: Optional[str] = None, redis_client: Optional[Redis] = None) -> Any:
-        """Cancelar el registro de un miembro en una sesión e invalidar caché de sesión"""
-        # Nota: Añadir gym_id y redis_client
-        # Verificar si la participación existe y pertenece al gimnasio
-        participation = class_participation_repository.get_by_session_and_member(
-            db, session_id=session_id, member_id=member_id, gym_id=gym_id # Añadir gym_id
+        """
+        Cancelar el registro de un miembro en una sesión e invalidar caché de sesión.
+
+        Si se libera una plaza, el primer miembro de la lista de espera se
+        promociona en la misma transacción.
+        """
+        # Bloquear la participación para que dos cancelaciones simultáneas no
+        # liberen la misma plaza dos veces
+        participation = class_participation_repository.get_for_update(
+            db, session_id=session_id, member_id=member_id, gym_id=gym_id
         )
         
         if not participation:
+            db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No estás registrado en esta clase"
             )
         
-        # ... (resto de validaciones: status) ...
+        if participation.status == ClassParticipationStatus.CANCELLED:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El registro ya está cancelado"
+            )
+        
         session = class_session_repository.get(db, id=session_id) # Necesitamos la sesión para invalidar
         
-        # Cancelar la participación
-        cancelled_participation = class_participation_repository.cancel_participation(
-            db, session_id=session_id, member_id=member_id, reason=reason, gym_id=gym_id # Pasar gym_id
-        )
+        previous_status = participation.status
+        participation.status = ClassParticipationStatus.CANCELLED
+        participation.cancellation_time = datetime.now(timezone.utc)
+        if reason:
+            participation.cancellation_reason = reason
         
-        # Actualizar contador y validar resultado
-        if cancelled_participation:
-            # Actualizar contador (cancel_participation ya lo hace, pero aseguramos)
-            class_session_repository.update_participant_count(db, session_id=session_id)
-            # Invalidar cachés de sesión
-            if session: # Asegurar que tenemos la sesión
-                await self._invalidate_session_caches_from_participation(
-                    session_id=session_id,
-                    gym_id=gym_id,
-                    redis_client=redis_client,
-                    trainer_id=session.trainer_id, 
-                    class_id=session.class_id
-                )
-            # Invalidar cache de participation status del miembro
+        # Solo los registros confirmados ocupan plaza
+        promoted = None
+        if previous_status == ClassParticipationStatus.REGISTERED:
+            class_session_repository.release_seat(db, session_id=session_id)
+            promoted = self._promote_from_waitlist(db, session_id)
+        
+        db.commit()
+        db.refresh(participation)
+        
+        if promoted:
+            logger.info(
+                f"Miembro {promoted.member_id} promocionado desde la lista de espera de la sesión {session_id}"
+            )
             await self.invalidate_member_participation_cache(
-                member_id=member_id, gym_id=gym_id, redis_client=redis_client
+                member_id=promoted.member_id, gym_id=gym_id, redis_client=redis_client
             )
-            return cancelled_participation
-        else:
-             raise HTTPException(status_code=500, detail="No se pudo completar la cancelación")
+        
+        # Invalidar cachés de sesión
+        if session: # Asegurar que tenemos la sesión
+            if previous_status == ClassParticipationStatus.REGISTERED and redis_client:
+                from app.repositories.gym import gym_repository
+                gym = gym_repository.get(db, id=gym_id)
+                if gym:
+                    await schedule_snapshot_service.update_availability(redis_client, session, gym.timezone)
+            await self._invalidate_session_caches_from_participation(
+                session_id=session_id,
+                gym_id=gym_id,
+                redis_client=redis_client,
+                trainer_id=session.trainer_id, 
+                class_id=session.class_id
+            )
+        # Invalidar cache de participation status del miembro
+        await self.invalidate_member_participation_cache(
+            member_id=member_id, gym_id=gym_id, redis_client=redis_client
+        )
+        return participation
     
     async def mark_attendance(self, db: Session, member_id: int, session_id: int, gym_id: int, redis_client: Optional[Redis] = None) -> Any:
         """Marcar la asistencia de un miembro a una sesión"""
@@ -2723,9 +2316,14 @@ class ClassParticipationService:
         # ... (resto de validaciones: status) ...
         
         # Marcar la asistencia
-        return class_participation_repository.mark_attendance(
+        updated = class_participation_repository.mark_attendance(
             db, session_id=session_id, member_id=member_id, gym_id=gym_id # Pasar gym_id
         )
+        # El estado del miembro (my_status) cambia
+        await self.invalidate_member_participation_cache(
+            member_id=member_id, gym_id=gym_id, redis_client=redis_client
+        )
+        return updated
     
     async def mark_no_show(self, db: Session, member_id: int, session_id: int, gym_id: int, redis_client: Optional[Redis] = None) -> Any:
         """Marcar que un miembro no asistió a una sesión"""
@@ -2749,6 +2347,9 @@ class ClassParticipationService:
             db, db_obj=participation,
             obj_in={"status": ClassParticipationStatus.NO_SHOW}
         )
+        await self.invalidate_member_participation_cache(
+            member_id=member_id, gym_id=gym_id, redis_client=redis_client
+        )
         
         return updated
     
@@ -2808,11 +2409,14 @@ class ClassParticipationService:
         start_str = start_date.strftime("%Y%m%d")
         end_str = end_date.strftime("%Y%m%d")
         
-        cache_key = f"participation_status:{gym_id}:{member_id}:{start_str}:{end_str}:{session_ids_str}"
-        tracking_key = f"cache_keys:participation_status:{gym_id}:{member_id}"
+        base_key = f"participation_status:{gym_id}:{member_id}:{start_str}:{end_str}:{session_ids_str}"
+        cache_key = None
         
         # Intentar obtener del cache
         try:
+            cache_key = await cache_service.versioned_key(
+                redis_client, base_key, self._member_status_namespace(gym_id, member_id)
+            )
             cached_data = await redis_client.get(cache_key)
             if cached_data:
                 import json
@@ -2830,6 +2434,9 @@ class ClassParticipationService:
         formatted_results = [self._format_participation_status(p) for p in participations]
         
         # Guardar en cache con TTL de 5 minutos (datos menos volátiles)
+        # Sin versión del namespace no se cachea: la clave no podría invalidarse
+        if cache_key is None:
+            return formatted_results
         try:
             import json
             await redis_client.setex(
@@ -2837,14 +2444,76 @@ class ClassParticipationService:
                 300,  # 5 minutos 
                 json.dumps(formatted_results, default=str)
             )
-            # Añadir a tracking set para invalidación
-            await redis_client.sadd(tracking_key, cache_key)
-            await redis_client.expire(tracking_key, 3600)  # 1 hora de tracking
         except Exception as e:
             logger.warning(f"Error setting cache: {e}")
         
         return formatted_results
     
+    # Marca de "sin participación" en el hash de estados del miembro
+    _NO_PARTICIPATION = "-"
+    STATUS_HASH_TTL = 300
+
+    async def get_member_statuses(
+        self, db: Session, member_id: int, gym_id: int, session_ids: List[int],
+        redis_client: Optional[Redis] = None
+    ) -> Dict[int, Optional[ClassParticipationStatus]]:
+        """
+        Obtener el estado de un miembro en un lote de sesiones.
+
+        Usa un hash de Redis por miembro (session_id -> estado), versionado con
+        el namespace de estados del miembro: un HMGET para todo el lote y una
+        única consulta para las sesiones que falten.
+
+        Returns:
+            Diccionario session_id -> estado (None si no participa)
+        """
+        session_ids = list(dict.fromkeys(session_ids))
+        if not session_ids:
+            return {}
+
+        result: Dict[int, Optional[ClassParticipationStatus]] = {}
+        missing = session_ids
+        hash_key = None
+        if redis_client:
+            try:
+                hash_key = await cache_service.versioned_key(
+                    redis_client, f"participation_status:hash:{gym_id}:{member_id}",
+                    self._member_status_namespace(gym_id, member_id)
+                )
+                values = await redis_client.hmget(hash_key, [str(sid) for sid in session_ids])
+                missing = []
+                for sid, value in zip(session_ids, values):
+                    if value is None:
+                        missing.append(sid)
+                    else:
+                        result[sid] = None if value == self._NO_PARTICIPATION else ClassParticipationStatus(value)
+            except Exception as e:
+                logger.warning(f"Error leyendo estados de participación del miembro {member_id}: {e}")
+                hash_key = None
+                missing = session_ids
+                result = {}
+
+        if missing:
+            found = class_participation_repository.get_statuses_for_sessions(
+                db, member_id=member_id, session_ids=missing, gym_id=gym_id
+            )
+            for sid in missing:
+                result[sid] = found.get(sid)
+
+            if hash_key:
+                try:
+                    async with redis_client.pipeline(transaction=False) as pipe:
+                        pipe.hset(hash_key, mapping={
+                            str(sid): result[sid].value if result[sid] else self._NO_PARTICIPATION
+                            for sid in missing
+                        })
+                        pipe.expire(hash_key, self.STATUS_HASH_TTL)
+                        await pipe.execute()
+                except Exception as e:
+                    logger.warning(f"Error guardando estados de participación del miembro {member_id}: {e}")
+
+        return result
+
     def _format_participation_status(self, participation: ClassParticipation) -> Dict[str, Any]:
         """Formatear participación a diccionario ultra-ligero"""
         return {
@@ -2859,19 +2528,19 @@ class ClassParticipationService:
         self, member_id: int, gym_id: int, redis_client: Optional[Redis] = None
     ):
         """Invalidar cache de participaciones de un miembro específico"""
-        if not redis_client:
-            return
-            
-        try:
-            tracking_key = f"cache_keys:participation_status:{gym_id}:{member_id}"
-            cache_keys = await redis_client.smembers(tracking_key)
-            
-            if cache_keys:
-                await redis_client.delete(*cache_keys)
-                await redis_client.delete(tracking_key)
-                logger.info(f"Invalidated {len(cache_keys)} participation status cache keys for member {member_id}")
-        except Exception as e:
-            logger.warning(f"Error invalidating participation status cache: {e}")
+        await cache_service.bump_namespaces(redis_client, self._member_status_namespace(gym_id, member_id))
+
+    async def invalidate_members_participation_cache(
+        self, member_ids: Iterable[int], gym_id: int, redis_client: Optional[Redis] = None
+    ):
+        """Invalidar cache de participaciones de varios miembros en un solo pipeline"""
+        await cache_service.bump_namespaces(
+            redis_client, *[self._member_status_namespace(gym_id, member_id) for member_id in member_ids]
+        )
+
+    @staticmethod
+    def _member_status_namespace(gym_id: int, member_id: int) -> str:
+        return f"participation_status:{gym_id}:{member_id}"
 
     async def get_member_participations(
         self, db: Session, member_id: int, skip: int = 0, limit: int = 100, gym_id: Optional[int] = None, redis_client: Optional[Redis] = None
@@ -2920,6 +2589,10 @@ class ClassParticipationService:
         
         # Intentar obtener de caché o generar nuevos datos
         try:
+            # Versionada con los estados del miembro: se invalida al inscribirse o cancelar
+            cache_key = await cache_service.versioned_key(
+                redis_client, cache_key, self._member_status_namespace(gym_id, member_id)
+            )
             cached_data = await redis_client.get(cache_key)
             
             if cached_data:
@@ -3069,43 +2742,11 @@ class ClassParticipationService:
         Esto incluye:
         - Detalles de la sesión (con y sin disponibilidad).
         - Listas de participantes de esa sesión.
-        - Posiblemente listas generales donde la disponibilidad podría cambiar (upcoming, range, etc.).
+        - Listas generales donde la disponibilidad podría cambiar (upcoming, range, etc.).
         """
-        if not redis_client:
-            return
-            
-        keys_to_delete = []
-        patterns_to_delete = []
-
-        # Claves de detalle de la sesión
-        keys_to_delete.append(f"schedule:session:detail:{session_id}")
-        keys_to_delete.append(f"schedule:session:detail_with_availability:{session_id}")
-        
-        # Patrón de participantes de esta sesión específica
-        patterns_to_delete.append(f"schedule:participations:session:{session_id}:gym:{gym_id}:*")
-        
-        # Invalidar listas generales donde la disponibilidad podría cambiar (más seguro)
-        patterns_to_delete.append(f"schedule:sessions:upcoming:gym:{gym_id}:*") 
-        patterns_to_delete.append(f"schedule:sessions:range:gym:{gym_id}:*") 
-        if trainer_id:
-             patterns_to_delete.append(f"schedule:sessions:trainer:{trainer_id}:gym:{gym_id}:*")
-        if class_id:
-             patterns_to_delete.append(f"schedule:sessions:class:{class_id}:gym:{gym_id}:*")
-             
-        try:
-            if keys_to_delete:
-                deleted_keys = await redis_client.delete(*keys_to_delete)
-                logger.debug(f"Invalidated {deleted_keys} session detail keys from participation change: {keys_to_delete}")
-            
-            deleted_pattern_count = 0
-            for pattern in patterns_to_delete:
-                deleted_count = await cache_service.delete_pattern(redis_client, pattern)
-                deleted_pattern_count += deleted_count
-                logger.debug(f"Invalidated {deleted_count} keys with pattern from participation change: {pattern}")
-            logger.debug(f"Total invalidated keys from patterns due to participation change: {deleted_pattern_count}")
-            
-        except Exception as e:
-             logger.error(f"Error invalidating session cache {session_id} from participation change: {e}", exc_info=True)
+        await class_session_service._invalidate_session_caches(
+            redis_client, gym_id=gym_id, session_id=session_id, trainer_id=trainer_id, class_id=class_id
+        )
 
 
 # Instantiate services
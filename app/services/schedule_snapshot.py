@@ -0,0 +1,325 @@
+"""
+Schedule Snapshot Service - Horario diario desnormalizado por gimnasio.
+
+La pantalla principal de la app combinaba horarios del gimnasio, sesiones del
+rango, información de clase y disponibilidad, cada uno con su propia caché.
+Este servicio guarda por gimnasio y día una única instantánea en un hash de
+Redis:
+
+    schedule:snapshot:{gym_id}:{YYYY-MM-DD}
+        v         -> versión (se usa como ETag)
+        hours     -> horario efectivo del día (JSON compacto)
+        s:{id}    -> sesión + datos de clase (JSON compacto)
+        n:{id}    -> participantes registrados de la sesión
+
+Las escrituras (crear/editar/cancelar sesión, inscripciones) parchean solo
+los campos afectados e incrementan la versión en un script Lua atómico, sin
+reconstruir el día. Si la instantánea no existe el parche se ignora: se
+construirá completa en la siguiente lectura.
+"""
+
+import json
+import logging
+import time as time_module
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from redis.asyncio import Redis
+from sqlalchemy.orm import Session
+
+from app.core.timezone_utils import convert_gym_time_to_utc, convert_utc_to_local
+from app.models.schedule import Class, ClassSession, ClassSessionStatus
+from app.services.gym_hours_calendar import EffectiveHours, gym_hours_calendar_service
+
+logger = logging.getLogger(__name__)
+
+# Aplica los cambios solo si la instantánea existe e incrementa su versión.
+# ARGV: pares (campo, valor); un valor vacío elimina el campo.
+_PATCH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+for i = 1, #ARGV, 2 do
+    if ARGV[i + 1] == '' then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    else
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+end
+return redis.call('HINCRBY', KEYS[1], 'v', 1)
+"""
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def _format_time(value: Optional[time]) -> Optional[str]:
+    return value.strftime("%H:%M") if value else None
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class ScheduleSnapshotService:
+    """
+    Construye, parchea y sirve la instantánea diaria del horario de un gimnasio.
+    """
+
+    KEY_PREFIX = "schedule:snapshot"
+    # Acota la vida de una instantánea que se construyó a la vez que un parche
+    SNAPSHOT_TTL = 1800
+    # Días futuros afectados por un cambio del horario semanal
+    HORIZON_DAYS = 60
+
+    def key(self, gym_id: int, day: date) -> str:
+        return f"{self.KEY_PREFIX}:{gym_id}:{day.isoformat()}"
+
+    @staticmethod
+    def etag_for(gym_id: int, day: date, version: Any) -> str:
+        return f'"{gym_id}-{day.isoformat()}-{version}"'
+
+    @staticmethod
+    def local_day(start_time: datetime, gym_timezone: str) -> date:
+        """Día local del gimnasio en el que empieza una sesión."""
+        return convert_utc_to_local(start_time, gym_timezone).date()
+
+    # ------------------------------------------------------------------
+    # Construcción
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _hours_entry(hours: EffectiveHours) -> Dict[str, Any]:
+        return {
+            "open": _format_time(hours.open_time),
+            "close": _format_time(hours.close_time),
+            "closed": hours.is_closed,
+            "special": hours.is_special,
+            "description": hours.description,
+        }
+
+    @staticmethod
+    def session_entry(session: ClassSession, class_obj: Class) -> Dict[str, Any]:
+        """Entrada compacta de una sesión con los datos de su clase."""
+        capacity = session.override_capacity if session.override_capacity is not None else class_obj.max_capacity
+        status_value = session.status.value if session.status else ClassSessionStatus.SCHEDULED.value
+        return {
+            "id": session.id,
+            "class_id": class_obj.id,
+            "name": class_obj.name,
+            "category_id": class_obj.category_id,
+            "difficulty": class_obj.difficulty_level.value if class_obj.difficulty_level else None,
+            "trainer_id": session.trainer_id,
+            "start": _as_utc(session.start_time).isoformat(),
+            "end": _as_utc(session.end_time).isoformat(),
+            "room": session.room,
+            "status": status_value,
+            "capacity": capacity,
+        }
+
+    def _day_bounds(self, day: date, gym_timezone: str) -> Tuple[datetime, datetime]:
+        start = convert_gym_time_to_utc(datetime.combine(day, time.min), gym_timezone)
+        end = convert_gym_time_to_utc(datetime.combine(day + timedelta(days=1), time.min), gym_timezone)
+        return start, end
+
+    def build_fields(
+        self, db: Session, gym_id: int, gym_timezone: str, day: date, hours: Optional[EffectiveHours] = None
+    ) -> Dict[str, str]:
+        """
+        Construye los campos del hash de un día con una consulta de sesiones.
+
+        Args:
+            hours: Horario efectivo del día (del calendario); si no se indica
+                se materializa solo ese día
+        """
+        if hours is None:
+            hours = gym_hours_calendar_service.build(db, gym_id, day, day).get(day)
+        start_utc, end_utc = self._day_bounds(day, gym_timezone)
+        rows = db.query(ClassSession, Class).join(
+            Class, Class.id == ClassSession.class_id
+        ).filter(
+            ClassSession.gym_id == gym_id,
+            ClassSession.start_time >= start_utc,
+            ClassSession.start_time < end_utc
+        ).all()
+
+        fields = {
+            "v": str(int(time_module.time() * 1000)),
+            "hours": _dumps(self._hours_entry(hours)),
+        }
+        for session, class_obj in rows:
+            fields[f"s:{session.id}"] = _dumps(self.session_entry(session, class_obj))
+            fields[f"n:{session.id}"] = str(session.current_participants or 0)
+        return fields
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def _assemble(self, gym_id: int, day: date, fields: Dict[str, str]) -> Dict[str, Any]:
+        sessions = []
+        for field, value in fields.items():
+            if not field.startswith("s:"):
+                continue
+            entry = json.loads(value)
+            registered = int(fields.get(f"n:{entry['id']}", 0))
+            entry["registered"] = registered
+            entry["available"] = max((entry["capacity"] or 0) - registered, 0)
+            sessions.append(entry)
+        sessions.sort(key=lambda s: (s["start"], s["id"]))
+        return {
+            "gym_id": gym_id,
+            "date": day.isoformat(),
+            "hours": json.loads(fields["hours"]),
+            "sessions": sessions,
+        }
+
+    async def get_etag(self, redis_client: Redis, gym_id: int, day: date) -> Optional[str]:
+        """ETag actual del día, o None si la instantánea no existe."""
+        try:
+            version = await redis_client.hget(self.key(gym_id, day), "v")
+        except Exception as e:
+            logger.warning(f"Error leyendo versión de la instantánea {gym_id}/{day}: {e}")
+            return None
+        return self.etag_for(gym_id, day, version) if version else None
+
+    async def get_day(
+        self, db: Session, redis_client: Optional[Redis], gym_id: int, gym_timezone: str, day: date
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Obtiene la instantánea de un día, construyéndola si no existe.
+
+        Returns:
+            (instantánea, etag)
+        """
+        key = self.key(gym_id, day)
+        fields = None
+        if redis_client:
+            try:
+                fields = await redis_client.hgetall(key)
+            except Exception as e:
+                logger.warning(f"Error leyendo instantánea {key}: {e}")
+
+        if not fields:
+            calendar = await gym_hours_calendar_service.get_calendar_for_range(
+                db, gym_id, day, day, redis_client=redis_client
+            )
+            fields = self.build_fields(db, gym_id, gym_timezone, day, hours=calendar.get(day))
+            if redis_client:
+                try:
+                    async with redis_client.pipeline(transaction=True) as pipe:
+                        pipe.delete(key)
+                        pipe.hset(key, mapping=fields)
+                        pipe.expire(key, self.SNAPSHOT_TTL)
+                        await pipe.execute()
+                except Exception as e:
+                    logger.warning(f"Error guardando instantánea {key}: {e}")
+
+        return self._assemble(gym_id, day, fields), self.etag_for(gym_id, day, fields["v"])
+
+    # ------------------------------------------------------------------
+    # Parches incrementales
+    # ------------------------------------------------------------------
+
+    async def _patch(self, redis_client: Optional[Redis], key: str, changes: Dict[str, str]) -> None:
+        if not redis_client or not changes:
+            return
+        args = []
+        for field, value in changes.items():
+            args.extend([field, value])
+        try:
+            await redis_client.eval(_PATCH_SCRIPT, 1, key, *args)
+        except Exception as e:
+            logger.warning(f"Error parcheando instantánea {key}: {e}")
+            await self._drop(redis_client, [key])
+
+    async def _drop(self, redis_client: Redis, keys: List[str]) -> None:
+        try:
+            await redis_client.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Error eliminando instantáneas {keys}: {e}")
+
+    async def upsert_session(
+        self,
+        redis_client: Optional[Redis],
+        session: ClassSession,
+        class_obj: Class,
+        gym_timezone: str,
+        previous_start_time: Optional[datetime] = None
+    ) -> None:
+        """
+        Añade o actualiza una sesión en la instantánea de su día.
+
+        Args:
+            previous_start_time: Hora de inicio anterior, si la sesión se movió
+        """
+        day = self.local_day(session.start_time, gym_timezone)
+        if previous_start_time is not None:
+            previous_day = self.local_day(previous_start_time, gym_timezone)
+            if previous_day != day:
+                await self.remove_session(redis_client, session.gym_id, session.id, previous_day)
+
+        await self._patch(redis_client, self.key(session.gym_id, day), {
+            f"s:{session.id}": _dumps(self.session_entry(session, class_obj)),
+            f"n:{session.id}": str(session.current_participants or 0),
+        })
+
+    async def remove_session(
+        self, redis_client: Optional[Redis], gym_id: int, session_id: int, day: date
+    ) -> None:
+        """Elimina una sesión de la instantánea de un día."""
+        await self._patch(redis_client, self.key(gym_id, day), {
+            f"s:{session_id}": "",
+            f"n:{session_id}": "",
+        })
+
+    async def update_availability(
+        self, redis_client: Optional[Redis], session: ClassSession, gym_timezone: str
+    ) -> None:
+        """Actualiza el número de registrados de una sesión tras una inscripción o cancelación."""
+        day = self.local_day(session.start_time, gym_timezone)
+        await self._patch(redis_client, self.key(session.gym_id, day), {
+            f"n:{session.id}": str(session.current_participants or 0),
+        })
+
+    async def invalidate_days(self, redis_client: Optional[Redis], gym_id: int, days: Iterable[date]) -> None:
+        """Elimina las instantáneas de varios días (se reconstruyen al leerlas)."""
+        keys = [self.key(gym_id, day) for day in set(days)]
+        if redis_client and keys:
+            await self._drop(redis_client, keys)
+
+    async def invalidate_gym(self, redis_client: Optional[Redis], gym_id: int) -> None:
+        """Elimina las instantáneas próximas de un gimnasio (p.ej. al editar una clase)."""
+        if redis_client:
+            await self._drop(redis_client, self.weekday_keys(gym_id))
+
+    async def invalidate_sessions(
+        self, redis_client: Optional[Redis], gym_id: int, start_times: Iterable[datetime]
+    ) -> None:
+        """
+        Elimina las instantáneas que pueden contener sesiones con estos inicios.
+
+        Se usa cuando no se conoce la zona horaria del gimnasio (jobs): se
+        invalidan el día UTC de cada inicio y sus adyacentes.
+        """
+        days = set()
+        for start_time in start_times:
+            utc_day = _as_utc(start_time).date()
+            days.update(utc_day + timedelta(days=offset) for offset in (-1, 0, 1))
+        await self.invalidate_days(redis_client, gym_id, days)
+
+    def weekday_keys(self, gym_id: int, weekday: Optional[int] = None) -> List[str]:
+        """
+        Claves de los próximos días afectados por un cambio del horario semanal.
+
+        Args:
+            weekday: Día de la semana modificado (0=Lunes); None para todos
+        """
+        # Desde ayer (UTC) para cubrir gimnasios con desfase horario
+        first_day = datetime.now(timezone.utc).date() - timedelta(days=1)
+        days = (first_day + timedelta(days=offset) for offset in range(self.HORIZON_DAYS + 1))
+        return [self.key(gym_id, day) for day in days if weekday is None or day.weekday() == weekday]
+
+
+schedule_snapshot_service = ScheduleSnapshotService()
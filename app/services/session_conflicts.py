@@ -0,0 +1,156 @@
+"""
+Session Conflicts - Detección de solapamientos de entrenador y sala.
+
+Antes de crear o mover sesiones se comprueba que el entrenador no tenga otra
+sesión a la misma hora y que la sala no esté ocupada. Para una serie
+recurrente se validan todas las ocurrencias a la vez: una única consulta trae
+las sesiones existentes que se solapan con el rango completo de la serie
+(índices GiST sobre tstzrange en PostgreSQL) y cada ocurrencia se contrasta
+en memoria con un índice de intervalos.
+"""
+
+import logging
+from bisect import bisect_left
+from datetime import datetime, timezone
+from itertools import accumulate
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.repositories.schedule import class_session_repository
+
+logger = logging.getLogger(__name__)
+
+# Número máximo de solapamientos detallados en el mensaje de error
+MAX_REPORTED_CONFLICTS = 10
+
+
+def _epoch(value: datetime) -> float:
+    """Convierte un datetime (naive = UTC) a segundos epoch."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class IntervalIndex:
+    """
+    Intervalos semiabiertos [inicio, fin) ordenados por inicio, con el máximo
+    fin acumulado para cortar la búsqueda en cuanto ningún intervalo anterior
+    pueda alcanzar el inicio consultado.
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[datetime, datetime, Any]]):
+        items = sorted(((_epoch(start), _epoch(end), value) for start, end, value in intervals),
+                       key=lambda item: item[0])
+        self._starts = [item[0] for item in items]
+        self._ends = [item[1] for item in items]
+        self._values = [item[2] for item in items]
+        self._max_end = list(accumulate(self._ends, max))
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def overlapping(self, start: datetime, end: datetime) -> List[Any]:
+        """Valores de los intervalos que se solapan con [start, end)."""
+        start_ts, end_ts = _epoch(start), _epoch(end)
+        result = []
+        i = bisect_left(self._starts, end_ts) - 1
+        while i >= 0 and self._max_end[i] > start_ts:
+            if self._ends[i] > start_ts:
+                result.append(self._values[i])
+            i -= 1
+        return result
+
+
+class SessionConflictService:
+
+    def find_conflicts(
+        self,
+        db: Session,
+        *,
+        gym_id: int,
+        intervals: Sequence[Tuple[datetime, datetime]],
+        trainer_id: Optional[int] = None,
+        room: Optional[str] = None,
+        exclude_session_ids: Optional[List[int]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Solapamientos de los intervalos propuestos (UTC) con las sesiones existentes.
+
+        Args:
+            db: Sesión de base de datos
+            gym_id: ID del gimnasio (las salas son por gimnasio)
+            intervals: Pares (inicio, fin) propuestos
+            trainer_id: Entrenador de las sesiones propuestas
+            room: Sala de las sesiones propuestas
+            exclude_session_ids: Sesiones a ignorar (la propia sesión al editarla)
+
+        Returns:
+            Lista de dicts con index (del intervalo propuesto), start_time,
+            end_time, session_id y reason ('trainer' o 'room')
+        """
+        intervals = [(start, end) for start, end in intervals if start and end]
+        if not intervals or (trainer_id is None and not room):
+            return []
+
+        existing = class_session_repository.get_overlapping(
+            db,
+            gym_id=gym_id,
+            start=min(start for start, _end in intervals),
+            end=max(end for _start, end in intervals),
+            trainer_id=trainer_id,
+            room=room,
+            exclude_ids=exclude_session_ids
+        )
+        if not existing:
+            return []
+
+        indexes = {
+            "trainer": IntervalIndex(
+                (row.start_time, row.end_time, row.id) for row in existing
+                if trainer_id is not None and row.trainer_id == trainer_id
+            ),
+            "room": IntervalIndex(
+                (row.start_time, row.end_time, row.id) for row in existing if room and row.room == room
+            ),
+        }
+
+        conflicts = []
+        for position, (start, end) in enumerate(intervals):
+            for reason, index in indexes.items():
+                for session_id in index.overlapping(start, end):
+                    conflicts.append({
+                        "index": position,
+                        "start_time": start,
+                        "end_time": end,
+                        "session_id": session_id,
+                        "reason": reason,
+                    })
+        return conflicts
+
+    def ensure_no_conflicts(self, db: Session, **kwargs: Any) -> None:
+        """
+        Lanza HTTP 409 si alguno de los intervalos propuestos se solapa con
+        otra sesión del entrenador o de la sala. Acepta los mismos argumentos
+        que find_conflicts.
+        """
+        conflicts = self.find_conflicts(db, **kwargs)
+        if not conflicts:
+            return
+
+        reasons = {"trainer": "el entrenador ya tiene otra sesión", "room": "la sala está ocupada"}
+        details = [
+            f"{conflict['start_time']:%Y-%m-%d %H:%M} UTC: {reasons[conflict['reason']]}"
+            for conflict in conflicts[:MAX_REPORTED_CONFLICTS]
+        ]
+        if len(conflicts) > MAX_REPORTED_CONFLICTS:
+            details.append(f"... y {len(conflicts) - MAX_REPORTED_CONFLICTS} más")
+        logger.info(f"Rechazadas sesiones con {len(conflicts)} solapamientos en el gimnasio {kwargs.get('gym_id')}")
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Conflicto de horario: " + "; ".join(details)
+        )
+
+
+session_conflict_service = SessionConflictService()
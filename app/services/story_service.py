@@ -9,6 +9,7 @@ from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
 from sqlalchemy import select, and_, or_, func, update
 from fastapi import HTTPException, status
+from redis.asyncio import Redis
 
 from app.models.story import (
     Story, StoryView, StoryReaction, StoryReport,
@@ -23,6 +24,7 @@ from app.schemas.story import (
     StoryHighlightCreate, StoryHighlightUpdate
 )
 from app.repositories.story_feed_repository import StoryFeedRepository
+from app.services.story_view_ingestion import StoryViewIngestionService
 
 logger = logging.getLogger(__name__)
 
@@ -32,9 +34,11 @@ class StoryService:
     Servicio para gestionar historias del gimnasio.
     """
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, redis_client: Optional[Redis] = None):
         self.db = db
         self.feed_repo = StoryFeedRepository()
+        # Sin Redis las vistas se escriben de forma síncrona en BD
+        self.view_ingestion = StoryViewIngestionService(redis_client) if redis_client else None
 
     async def create_story(
         self,
@@ -165,7 +169,7 @@ class StoryService:
 
         # Registrar vista si no es el propio usuario
         if user_id != story.user_id:
-            await self.mark_story_as_viewed(story_id, gym_id, user_id)
+            await self._record_view(story, user_id)
 
         return story
 
@@ -365,10 +369,13 @@ class StoryService:
         gym_id: int,
         user_id: int,
         view_data: Optional[StoryViewCreate] = None
-    ) -> StoryView:
+    ) -> Optional[StoryView]:
         """
         Marca una historia como vista.
 
+        Con Redis disponible la vista se encola y se persiste en lote por
+        `flush_story_views_job`; sin Redis se escribe directamente en BD.
+
         Args:
             story_id: ID de la historia
             gym_id: ID del gimnasio
@@ -376,7 +383,7 @@ class StoryService:
             view_data: Datos adicionales de la vista
 
         Returns:
-            Registro de vista creado o existente
+            Registro de vista creado o existente, o None si la vista quedó encolada
         """
         # Verificar que la historia existe y pertenece al gimnasio (sin registrar vista)
         story = self.db.execute(
@@ -396,11 +403,35 @@ class StoryService:
                 detail="Historia no encontrada"
             )
 
+        return await self._record_view(story, user_id, view_data)
+
+    async def _record_view(
+        self,
+        story: Story,
+        user_id: int,
+        view_data: Optional[StoryViewCreate] = None
+    ) -> Optional[StoryView]:
+        """
+        Registra la vista de una historia ya cargada.
+        """
+        if self.view_ingestion:
+            try:
+                await self.view_ingestion.record_view(
+                    story_id=story.id,
+                    gym_id=story.gym_id,
+                    viewer_id=user_id,
+                    view_duration_seconds=view_data.view_duration_seconds if view_data else None,
+                    device_info=view_data.device_info if view_data else None
+                )
+                return None
+            except Exception as e:
+                logger.warning(f"Error encolando vista de historia {story.id}, escribiendo en BD: {e}")
+
         # Verificar si ya existe una vista
         existing_view = self.db.execute(
             select(StoryView).where(
                 and_(
-                    StoryView.story_id == story_id,
+                    StoryView.story_id == story.id,
                     StoryView.viewer_id == user_id
                 )
             )
@@ -412,7 +443,7 @@ class StoryService:
 
         # Crear nueva vista
         story_view = StoryView(
-            story_id=story_id,
+            story_id=story.id,
             viewer_id=user_id,
             view_duration_seconds=view_data.view_duration_seconds if view_data else None,
             device_info=view_data.device_info if view_data else None
@@ -427,10 +458,82 @@ class StoryService:
         self.db.refresh(story_view)
 
         # Limpiar cache
-        await self._invalidate_story_cache(gym_id, story.user_id)
+        await self._invalidate_story_cache(story.gym_id, story.user_id)
 
         return story_view
 
+    async def get_story_analytics(
+        self,
+        story_id: int,
+        gym_id: int,
+        user_id: int
+    ) -> Dict[str, Any]:
+        """
+        Obtiene las estadísticas de una historia (solo para su dueño).
+
+        El número de vistas se lee en vivo de Redis e incluye las vistas
+        pendientes de persistir; la duración media y las reacciones salen de BD.
+
+        Args:
+            story_id: ID de la historia
+            gym_id: ID del gimnasio
+            user_id: ID del usuario que solicita
+
+        Returns:
+            Estadísticas compatibles con el schema StoryStats
+        """
+        story = self.db.execute(
+            select(Story).where(
+                and_(
+                    Story.id == story_id,
+                    Story.gym_id == gym_id,
+                    Story.is_deleted == False
+                )
+            )
+        ).scalar_one_or_none()
+
+        if not story:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Historia no encontrada"
+            )
+
+        if story.user_id != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tienes permiso para ver esta información"
+            )
+
+        view_count = story.view_count or 0
+        if self.view_ingestion:
+            try:
+                # El set de Redis puede no contener vistas anteriores a su creación
+                view_count = max(view_count, await self.view_ingestion.get_live_view_count(story_id))
+            except Exception as e:
+                logger.warning(f"Error leyendo vistas en vivo de la historia {story_id}: {e}")
+
+        avg_view_duration = self.db.execute(
+            select(func.avg(StoryView.view_duration_seconds)).where(StoryView.story_id == story_id)
+        ).scalar()
+
+        top_reactions = self.db.execute(
+            select(StoryReaction.emoji, func.count(StoryReaction.id).label("count"))
+            .where(StoryReaction.story_id == story_id)
+            .group_by(StoryReaction.emoji)
+            .order_by(func.count(StoryReaction.id).desc())
+            .limit(5)
+        ).all()
+
+        return {
+            "story_id": story_id,
+            "view_count": view_count,
+            "unique_viewers": view_count,
+            "reaction_count": story.reaction_count or 0,
+            "avg_view_duration": float(avg_view_duration) if avg_view_duration is not None else None,
+            "top_reactions": [{"emoji": emoji, "count": count} for emoji, count in top_reactions],
+            "viewer_demographics": None
+        }
+
     async def add_reaction(
         self,
         story_id: int,
@@ -719,6 +822,13 @@ class StoryService:
         """
         Verifica si un usuario ya vio una historia.
         """
+        if self.view_ingestion:
+            try:
+                if await self.view_ingestion.has_viewed(story_id, user_id):
+                    return True
+            except Exception as e:
+                logger.warning(f"Error consultando vistas en Redis: {e}")
+
         result = self.db.execute(
             select(StoryView).where(
                 and_(
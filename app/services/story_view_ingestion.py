@@ -0,0 +1,279 @@
+"""
+Pipeline de ingesta de vistas de historias.
+
+Las vistas son la escritura más frecuente del módulo social: cada apertura de
+una historia de una cuenta popular generaba un INSERT + UPDATE de view_count
+síncrono. Este módulo desacopla la petición HTTP de la escritura en BD:
+
+1. `record_view` deduplica por viewer en un SET de Redis por historia y, solo
+   si la vista es nueva, la encola en un Redis Stream (un único EVAL atómico).
+2. `flush_pending_views` (job del scheduler) consume el stream mediante un
+   consumer group, inserta las filas de `story_views` en bloque con
+   ON CONFLICT DO NOTHING y actualiza `stories.view_count` por lotes.
+3. `get_live_view_count` devuelve el número de viewers únicos directamente de
+   Redis, incluyendo las vistas aún no persistidas.
+"""
+
+import logging
+import os
+import socket
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.story import Story, StoryView
+
+logger = logging.getLogger(__name__)
+
+
+# KEYS[1] = set de viewers de la historia, KEYS[2] = stream de ingesta
+# ARGV[1] = viewer_id, ARGV[2] = TTL del set, ARGV[3] = MAXLEN aproximado del stream
+# ARGV[4..] = pares campo/valor del evento
+_RECORD_VIEW_SCRIPT = """
+if redis.call('SADD', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], '*', unpack(ARGV, 4))
+return 1
+"""
+
+
+class StoryViewIngestionService:
+    """
+    Registro de vistas de historias en Redis con persistencia diferida por lotes.
+    """
+
+    STREAM_KEY = "stories:views:stream"
+    CONSUMER_GROUP = "story_view_writers"
+    VIEWERS_KEY = "story:{story_id}:viewers"
+
+    # El set de viewers vive lo mismo que la historia más un margen; las
+    # historias duran como máximo 48h (ver StoryCreate.duration_hours)
+    VIEWERS_TTL_SECONDS = 72 * 3600
+    # Tope de seguridad del stream si el consumidor está caído mucho tiempo
+    STREAM_MAXLEN = 200_000
+    # Entradas pendientes de otro consumidor que se reclaman tras este tiempo
+    CLAIM_MIN_IDLE_MS = 60_000
+
+    def __init__(self, redis: Redis):
+        """
+        Args:
+            redis: Cliente Redis asíncrono
+        """
+        self.redis = redis
+        self.consumer_name = f"{socket.gethostname()}-{os.getpid()}"
+
+    def _viewers_key(self, story_id: int) -> str:
+        return self.VIEWERS_KEY.format(story_id=story_id)
+
+    async def record_view(
+        self,
+        story_id: int,
+        gym_id: int,
+        viewer_id: int,
+        view_duration_seconds: Optional[int] = None,
+        device_info: Optional[str] = None
+    ) -> bool:
+        """
+        Registra una vista en Redis sin tocar la base de datos.
+
+        Args:
+            story_id: ID de la historia
+            gym_id: ID del gimnasio
+            viewer_id: ID del usuario que ve la historia
+            view_duration_seconds: Duración de la visualización
+            device_info: Dispositivo del viewer
+
+        Returns:
+            True si la vista es nueva y se encoló, False si el viewer ya la había visto
+        """
+        fields = [
+            "story_id", str(story_id),
+            "gym_id", str(gym_id),
+            "viewer_id", str(viewer_id),
+            "viewed_at", datetime.now(timezone.utc).isoformat(),
+            "view_duration_seconds", "" if view_duration_seconds is None else str(view_duration_seconds),
+            "device_info", device_info or "",
+        ]
+        result = await self.redis.eval(
+            _RECORD_VIEW_SCRIPT,
+            2,
+            self._viewers_key(story_id),
+            self.STREAM_KEY,
+            str(viewer_id),
+            self.VIEWERS_TTL_SECONDS,
+            self.STREAM_MAXLEN,
+            *fields
+        )
+        return bool(result)
+
+    async def has_viewed(self, story_id: int, viewer_id: int) -> bool:
+        """
+        Indica si el viewer tiene una vista registrada en Redis (persistida o pendiente).
+        """
+        return bool(await self.redis.sismember(self._viewers_key(story_id), str(viewer_id)))
+
+    async def get_live_view_count(self, story_id: int) -> int:
+        """
+        Número de viewers únicos registrados en Redis para una historia.
+        """
+        return int(await self.redis.scard(self._viewers_key(story_id)) or 0)
+
+    async def _ensure_consumer_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(self.STREAM_KEY, self.CONSUMER_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            # BUSYGROUP: el grupo ya existe
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _read_batch(self, batch_size: int) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        Lee un lote del stream: primero reclama entradas abandonadas por
+        consumidores caídos y después lee entradas nuevas.
+        """
+        entries: List[Tuple[str, Dict[str, str]]] = []
+
+        claimed = await self.redis.xautoclaim(
+            self.STREAM_KEY,
+            self.CONSUMER_GROUP,
+            self.consumer_name,
+            min_idle_time=self.CLAIM_MIN_IDLE_MS,
+            start_id="0-0",
+            count=batch_size
+        )
+        # xautoclaim devuelve [next_id, [(id, fields), ...], (deleted_ids)]
+        if claimed and len(claimed) > 1:
+            entries.extend(entry for entry in claimed[1] if entry and entry[1])
+
+        remaining = batch_size - len(entries)
+        if remaining > 0:
+            response = await self.redis.xreadgroup(
+                self.CONSUMER_GROUP,
+                self.consumer_name,
+                {self.STREAM_KEY: ">"},
+                count=remaining
+            )
+            for _stream, stream_entries in response or []:
+                entries.extend(stream_entries)
+
+        return entries
+
+    @staticmethod
+    def _parse_entry(fields: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        try:
+            duration = fields.get("view_duration_seconds")
+            viewed_at = fields.get("viewed_at")
+            return {
+                "story_id": int(fields["story_id"]),
+                "viewer_id": int(fields["viewer_id"]),
+                "viewed_at": datetime.fromisoformat(viewed_at) if viewed_at else datetime.now(timezone.utc),
+                "view_duration_seconds": int(duration) if duration else None,
+                "device_info": fields.get("device_info") or None,
+            }
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Entrada de vista de historia inválida descartada: {fields} ({e})")
+            return None
+
+    def _persist_views(self, db: Session, rows: List[Dict[str, Any]]) -> Counter:
+        """
+        Inserta las vistas en bloque y actualiza view_count con un único
+        executemany. Devuelve el número de vistas insertadas por historia.
+        """
+        # Descartar vistas de historias eliminadas físicamente (violarían la FK)
+        story_ids = {row["story_id"] for row in rows}
+        existing_ids = set(db.execute(select(Story.id).where(Story.id.in_(story_ids))).scalars().all())
+        rows = [row for row in rows if row["story_id"] in existing_ids]
+
+        # Una misma vista puede repetirse si el set de Redis expiró (historias fijadas)
+        unique_rows = list({(row["story_id"], row["viewer_id"]): row for row in rows}.values())
+        if not unique_rows:
+            return Counter()
+
+        insert_stmt = (
+            pg_insert(StoryView)
+            .values(unique_rows)
+            .on_conflict_do_nothing(constraint="unique_story_viewer")
+            .returning(StoryView.story_id)
+        )
+        inserted = Counter(db.execute(insert_stmt).scalars().all())
+
+        if inserted:
+            stories_table = Story.__table__
+            db.execute(
+                stories_table.update()
+                .where(stories_table.c.id == bindparam("b_story_id"))
+                .values(view_count=func.coalesce(stories_table.c.view_count, 0) + bindparam("b_increment")),
+                [{"b_story_id": story_id, "b_increment": count} for story_id, count in inserted.items()]
+            )
+
+        db.commit()
+        return inserted
+
+    async def flush_pending_views(self, db: Session, batch_size: int = 500, max_batches: int = 20) -> int:
+        """
+        Persiste en BD las vistas encoladas en el stream.
+
+        Args:
+            db: Sesión de base de datos
+            batch_size: Entradas leídas del stream por lote
+            max_batches: Máximo de lotes por ejecución para acotar la duración del job
+
+        Returns:
+            Número de vistas insertadas
+        """
+        await self._ensure_consumer_group()
+
+        total_inserted = 0
+        for _ in range(max_batches):
+            entries = await self._read_batch(batch_size)
+            if not entries:
+                break
+
+            entry_ids = [entry_id for entry_id, _fields in entries]
+            rows = [row for row in (self._parse_entry(fields) for _id, fields in entries) if row]
+
+            if rows:
+                try:
+                    inserted = self._persist_views(db, rows)
+                except Exception:
+                    db.rollback()
+                    # Sin XACK: las entradas quedan pendientes y se reintentan
+                    raise
+                total_inserted += sum(inserted.values())
+
+            await self.redis.xack(self.STREAM_KEY, self.CONSUMER_GROUP, *entry_ids)
+            await self.redis.xdel(self.STREAM_KEY, *entry_ids)
+
+            if len(entries) < batch_size:
+                break
+
+        if total_inserted:
+            logger.info(f"Persistidas {total_inserted} vistas de historias en lote")
+        return total_inserted
+
+
+async def flush_story_views_job():
+    """
+    Job del scheduler que vacía el stream de vistas de historias a la BD.
+    """
+    from app.db.redis_client import get_redis_client
+    from app.db.session import SessionLocal
+
+    db = None
+    try:
+        redis = await get_redis_client()
+        db = SessionLocal()
+        await StoryViewIngestionService(redis).flush_pending_views(db)
+    except Exception as e:
+        logger.error(f"Error persistiendo vistas de historias: {e}", exc_info=True)
+    finally:
+        if db:
+            db.close()
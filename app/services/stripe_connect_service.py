@@ -8,6 +8,8 @@ from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from app.core.config import get_settings
+from app.services.stripe_gateway import idempotency_key, stripe_gateway
+from app.services.stripe_resolution_cache import stripe_resolution_cache
 from app.models.stripe_profile import UserGymStripeProfile, GymStripeAccount
 from app.models.user import User
 from app.models.gym import Gym
@@ -75,7 +77,11 @@ class StripeConnectService:
                 raise ValueError(f"Gym {gym_id} no encontrado")
             
             # Crear cuenta en Stripe
-            account = stripe.Account.create(
+            account = await stripe_gateway.call(
+                stripe.Account.create,
+                idempotency_key=idempotency_key(
+                    "connect-account", gym_id, existing_account.stripe_account_id if existing_account else None
+                ),
                 type=account_type,
                 country=country,
                 email=gym.email or "user@example.com",  # Usar email del gym o placeholder
@@ -126,6 +132,7 @@ class StripeConnectService:
                 
                 logger.info(f"Nueva cuenta de Stripe creada para gym {gym_id}: {account.id}")
             
+            await stripe_resolution_cache.invalidate_gym_account(gym_id)
             return gym_stripe_account
             
         except stripe.error.StripeError as e:
@@ -179,7 +186,8 @@ class StripeConnectService:
             return_url = return_url or f"{base_url}/admin/stripe/return?gym_id={gym_id}&status=completed"
             
             # Crear link de onboarding
-            account_link = stripe.AccountLink.create(
+            account_link = await stripe_gateway.call(
+                stripe.AccountLink.create,
                 account=gym_account.stripe_account_id,
                 refresh_url=refresh_url,
                 return_url=return_url,
@@ -242,7 +250,7 @@ class StripeConnectService:
                 raise ValueError(f"Gym {gym_id} no tiene cuenta de Stripe")
             
             # Obtener información actualizada de Stripe
-            account = stripe.Account.retrieve(gym_account.stripe_account_id)
+            account = await stripe_gateway.call(stripe.Account.retrieve, gym_account.stripe_account_id)
             
             # Actualizar estado en BD
             gym_account.charges_enabled = account.charges_enabled
@@ -257,6 +265,7 @@ class StripeConnectService:
             
             db.commit()
             db.refresh(gym_account)
+            await stripe_resolution_cache.invalidate_gym_account(gym_id)
             
             logger.info(f"Estado de cuenta actualizado para gym {gym_id}: onboarding_completed={gym_account.onboarding_completed}")
             return gym_account
@@ -310,7 +319,8 @@ class StripeConnectService:
                 )
 
             # Crear login link al dashboard de Stripe
-            login_link = stripe.Account.create_login_link(
+            login_link = await stripe_gateway.call(
+                stripe.Account.create_login_link,
                 gym_account.stripe_account_id
             )
 
@@ -374,7 +384,9 @@ class StripeConnectService:
                 raise ValueError(f"Gym {gym_id} no tiene cuenta de Stripe configurada")
             
             # 3. Crear customer en la cuenta del gym
-            customer = stripe.Customer.create(
+            customer = await stripe_gateway.call(
+                stripe.Customer.create,
+                idempotency_key=idempotency_key("customer", gym_account.stripe_account_id, gym_id, user_id),
                 email=user.email,
                 name=f"{user.first_name} {user.last_name}".strip(),
                 metadata={
@@ -539,7 +551,8 @@ class StripeConnectService:
                 raise ValueError(f"No hay vinculación para user {user_id} en gym {gym_id}")
             
             # Obtener información de Stripe
-            customer = stripe.Customer.retrieve(
+            customer = await stripe_gateway.call(
+                stripe.Customer.retrieve,
                 stripe_profile.stripe_customer_id,
                 stripe_account=stripe_profile.stripe_account_id
             )
@@ -0,0 +1,132 @@
+"""
+Stripe Gateway - Punto único de salida hacia la API de Stripe.
+
+El SDK de Stripe es síncrono: llamarlo directamente desde un ``async def``
+bloquea el event loop durante todo el round-trip HTTPS. El gateway ejecuta
+cada llamada en un pool de hilos propio (no el executor por defecto, que
+comparten las consultas a base de datos) y mide su latencia por operación.
+
+El cliente HTTP del SDK (``RequestsClient``) guarda una sesión de requests
+por hilo, así que con un pool fijo cada hilo reutiliza su conexión keep-alive
+con api.stripe.com en lugar de repetir el handshake TLS en cada llamada.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import stripe
+
+from app.core.config import get_settings
+from app.core.metrics.base import track_stripe_request
+
+logger = logging.getLogger(__name__)
+
+
+def idempotency_key(operation: str, *parts: Any) -> str:
+    """
+    Clave de idempotencia estable para una operación de escritura.
+
+    Ejemplo: ``idempotency_key("event-payment-intent", participation.id)``
+    devuelve ``"event-payment-intent-42"``. Reintentar con la misma clave
+    devuelve el objeto ya creado en lugar de duplicarlo.
+    """
+    return "-".join([operation, *(str(part) for part in parts if part is not None)])[:255]
+
+
+def operation_name(func: Callable[..., Any]) -> str:
+    """Nombre de la operación para las métricas, p. ej. ``PaymentIntent.create``."""
+    func = getattr(func, "func", func)  # functools.partial
+    return getattr(func, "__qualname__", None) or getattr(func, "__name__", "unknown")
+
+
+class StripeGateway:
+
+    def __init__(self, max_workers: Optional[int] = None, timeout_seconds: Optional[int] = None):
+        settings = get_settings()
+        self.max_workers = max_workers or settings.STRIPE_GATEWAY_MAX_WORKERS
+        self.timeout_seconds = timeout_seconds or settings.STRIPE_TIMEOUT_SECONDS
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._http_client: Optional[stripe.HTTPClient] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._calls = 0
+        self._errors = 0
+
+    async def call(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        idempotency_key: Optional[str] = None,
+        **kwargs: Any
+    ) -> Any:
+        """
+        Ejecuta ``func(*args, **kwargs)`` del SDK de Stripe en el pool del gateway.
+
+        Los errores de Stripe se propagan tal cual, para que cada servicio
+        conserve su manejo actual.
+        """
+        if idempotency_key is not None:
+            kwargs["idempotency_key"] = idempotency_key
+        executor = self._ensure_started()
+        operation = operation_name(func)
+        loop = asyncio.get_running_loop()
+
+        start = time.perf_counter()
+        self._in_flight += 1
+        self._calls += 1
+        status = "success"
+        try:
+            return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+        except Exception as e:
+            status = type(e).__name__
+            self._errors += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            duration = time.perf_counter() - start
+            track_stripe_request(operation, status, duration)
+            if duration > self.timeout_seconds / 2:
+                logger.warning(f"Llamada lenta a Stripe {operation}: {duration:.2f}s ({status})")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "timeout_seconds": self.timeout_seconds,
+            "in_flight": self._in_flight,
+            "calls": self._calls,
+            "errors": self._errors,
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _ensure_started(self) -> ThreadPoolExecutor:
+        if self._executor is not None:
+            return self._executor
+        with self._lock:
+            if self._executor is None:
+                self._install_http_client()
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stripe")
+                logger.info(f"Gateway de Stripe iniciado: {self.max_workers} hilos, timeout {self.timeout_seconds}s")
+        return self._executor
+
+    def _install_http_client(self) -> None:
+        # El SDK usa stripe.default_http_client para todas las peticiones sin
+        # cliente explícito; el suyo por defecto espera hasta 80s por respuesta.
+        self._http_client = stripe.RequestsClient(
+            timeout=self.timeout_seconds,
+            verify_ssl_certs=stripe.verify_ssl_certs,
+            proxy=stripe.proxy,
+        )
+        stripe.default_http_client = self._http_client
+
+
+stripe_gateway = StripeGateway()
@@ -0,0 +1,307 @@
+"""
+Stripe Plan Sync - Sincronización masiva de planes con productos y precios.
+
+Sincronizar plan a plan (``StripeService.sync_plan_with_stripe``) hace varias
+llamadas secuenciales por plan aunque no haya nada que cambiar. Aquí se
+descargan de una vez, paginados, los productos y precios de la cuenta Connect
+del gym y se calcula localmente qué falta para que Stripe refleje cada plan:
+
+- Plan activo sin producto: crear producto y precio. Si ya existe un producto
+  con ``metadata.local_plan_id`` del plan (p. ej. de una sincronización
+  interrumpida) se reutiliza en lugar de duplicarlo.
+- Producto con nombre, descripción o estado distintos: actualizarlo.
+- Precio que no coincide con importe, moneda o intervalo: reutilizar uno
+  activo del producto que coincida o crear otro, y archivar el anterior.
+- Plan inactivo: archivar su producto y su precio si siguen activos.
+
+Las operaciones de cada plan se ejecutan en orden (el precio necesita el
+producto) y los planes en paralelo con concurrencia acotada, reintentos y
+pausa compartida ante los 429 de Stripe.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import stripe
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.membership import MembershipPlan
+from app.models.stripe_profile import GymStripeAccount
+from app.services.stripe_gateway import idempotency_key
+from app.services.stripe_retry import RateLimitGate, StripeRetryPolicy
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+RECURRING_INTERVALS = ('month', 'year')
+
+
+class PlanOperation(NamedTuple):
+    """Cambio pendiente en Stripe para un plan."""
+    action: str  # create_product, update_product, archive_product, create_price, activate_price, archive_price
+    target_id: Optional[str] = None
+    params: Optional[Dict[str, Any]] = None
+
+
+class PlanDiff(NamedTuple):
+    """Diferencia entre un plan local y su producto/precio en Stripe."""
+    plan_id: int
+    name: str
+    operations: List[PlanOperation]
+    product_id: Optional[str]  # Producto a enlazar (existente o a crear)
+    price_id: Optional[str]    # Precio a enlazar (existente o a crear)
+
+
+def _list_products(stripe_account: str) -> List[stripe.Product]:
+    return list(stripe.Product.list(limit=100, stripe_account=stripe_account).auto_paging_iter())
+
+
+def _list_prices(stripe_account: str) -> List[stripe.Price]:
+    return list(stripe.Price.list(limit=100, stripe_account=stripe_account).auto_paging_iter())
+
+
+def _product_fields(plan: MembershipPlan) -> Dict[str, Any]:
+    return {
+        'name': plan.name,
+        'description': plan.description or f"Plan de membresía {plan.name}",
+    }
+
+
+def _price_params(plan: MembershipPlan) -> Dict[str, Any]:
+    params = {
+        'unit_amount': plan.price_cents,
+        'currency': plan.currency.lower(),
+        'metadata': {
+            'gym_id': str(plan.gym_id),
+            'local_plan_id': str(plan.id),
+            'billing_interval': plan.billing_interval
+        }
+    }
+    if plan.billing_interval in RECURRING_INTERVALS:
+        params['recurring'] = {'interval': plan.billing_interval}
+    return params
+
+
+def _price_matches(price: Dict[str, Any], plan: MembershipPlan) -> bool:
+    recurring = price.get('recurring') or {}
+    expected_interval = plan.billing_interval if plan.billing_interval in RECURRING_INTERVALS else None
+    return (
+        price.get('unit_amount') == plan.price_cents
+        and (price.get('currency') or '').lower() == plan.currency.lower()
+        and recurring.get('interval') == expected_interval
+    )
+
+
+def diff_plan(
+    plan: MembershipPlan,
+    products: Dict[str, Any],
+    products_by_plan: Dict[str, Any],
+    prices: Dict[str, Any],
+    prices_by_product: Dict[str, List[Any]]
+) -> PlanDiff:
+    """Calcula las operaciones mínimas para que Stripe refleje el plan."""
+    product = products.get(plan.stripe_product_id) or products_by_plan.get(str(plan.id))
+    current_price = prices.get(plan.stripe_price_id)
+    if current_price is not None and product is not None and current_price.get('product') != product['id']:
+        current_price = None
+    operations: List[PlanOperation] = []
+
+    if not plan.is_active:
+        if product is not None and product.get('active'):
+            operations.append(PlanOperation('archive_product', product['id']))
+        if current_price is not None and current_price.get('active'):
+            operations.append(PlanOperation('archive_price', current_price['id']))
+        return PlanDiff(plan.id, plan.name, operations, plan.stripe_product_id, plan.stripe_price_id)
+
+    if product is None:
+        operations.append(PlanOperation('create_product', params=_product_fields(plan)))
+        operations.append(PlanOperation('create_price', params=_price_params(plan)))
+        return PlanDiff(plan.id, plan.name, operations, None, None)
+
+    changes = {
+        field: value for field, value in _product_fields(plan).items() if product.get(field) != value
+    }
+    if not product.get('active'):
+        changes['active'] = True
+    if (product.get('metadata') or {}).get('local_plan_id') != str(plan.id):
+        changes['metadata'] = {'gym_id': str(plan.gym_id), 'local_plan_id': str(plan.id)}
+    if changes:
+        operations.append(PlanOperation('update_product', product['id'], changes))
+
+    price_id = plan.stripe_price_id
+    if current_price is not None and _price_matches(current_price, plan):
+        if not current_price.get('active'):
+            operations.append(PlanOperation('activate_price', current_price['id']))
+    else:
+        reusable = next(
+            (price for price in prices_by_product.get(product['id'], [])
+             if price.get('active') and _price_matches(price, plan)),
+            None
+        )
+        if reusable is not None:
+            price_id = reusable['id']
+        else:
+            price_id = None
+            operations.append(PlanOperation(
+                'create_price', params=_price_params(plan),
+                target_id=current_price['id'] if current_price is not None else None
+            ))
+        if current_price is not None and current_price.get('active'):
+            operations.append(PlanOperation('archive_price', current_price['id']))
+
+    return PlanDiff(plan.id, plan.name, operations, product['id'], price_id)
+
+
+class StripePlanSyncService:
+
+    def __init__(self, concurrency: Optional[int] = None, retry_policy: Optional[StripeRetryPolicy] = None):
+        self.concurrency = max(1, concurrency or settings.STRIPE_PLAN_SYNC_CONCURRENCY)
+        self.retry_policy = retry_policy or StripeRetryPolicy()
+
+    async def sync_gym_plans(self, db: Session, gym_id: int, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Sincroniza todos los planes del gym con Stripe.
+
+        Returns:
+            dict con ``total``, ``synced``, ``failed``, ``details`` (diff por plan),
+            ``operations`` (recuento por tipo) y ``dry_run``
+
+        Raises:
+            ValueError: Si el gym no tiene cuenta de Stripe lista o falla la descarga
+        """
+        gym_account = db.query(GymStripeAccount).filter(
+            GymStripeAccount.gym_id == gym_id,
+            GymStripeAccount.is_active == True
+        ).first()
+        if not gym_account:
+            raise ValueError(f"Gimnasio {gym_id} no tiene cuenta de Stripe configurada")
+        if not gym_account.onboarding_completed:
+            raise ValueError(f"Gimnasio {gym_id} debe completar el onboarding de Stripe")
+        account_id = gym_account.stripe_account_id
+
+        plans = db.query(MembershipPlan).filter(
+            MembershipPlan.gym_id == gym_id
+        ).order_by(MembershipPlan.id).all()
+
+        # El límite de Stripe es por cuenta: un 429 frena a todas las llamadas
+        gate = RateLimitGate()
+        products_result, prices_result = await asyncio.gather(
+            self.retry_policy.call(_list_products, account_id, gate=gate),
+            self.retry_policy.call(_list_prices, account_id, gate=gate),
+        )
+        for listing in (products_result, prices_result):
+            if not listing.succeeded:
+                raise ValueError(f"Error descargando el catálogo de Stripe: {listing.error}")
+
+        products = {product['id']: product for product in products_result.value}
+        products_by_plan = {}
+        for product in products_result.value:
+            local_plan_id = (product.get('metadata') or {}).get('local_plan_id')
+            # Si hay varios, preferir el activo
+            if local_plan_id and (local_plan_id not in products_by_plan or product.get('active')):
+                products_by_plan[local_plan_id] = product
+        prices = {price['id']: price for price in prices_result.value}
+        prices_by_product: Dict[str, List[Any]] = {}
+        for price in prices_result.value:
+            prices_by_product.setdefault(price.get('product'), []).append(price)
+
+        diffs = [diff_plan(plan, products, products_by_plan, prices, prices_by_product) for plan in plans]
+        plans_by_id = {plan.id: plan for plan in plans}
+
+        details = []
+        if dry_run:
+            details = [self._detail(diff, 'pending' if diff.operations else 'unchanged') for diff in diffs]
+        else:
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def apply(diff: PlanDiff):
+                async with semaphore:
+                    return diff, await self._apply(plans_by_id[diff.plan_id], diff, account_id, gate)
+
+            for finished in asyncio.as_completed([asyncio.create_task(apply(diff)) for diff in diffs]):
+                diff, (product_id, price_id, error) = await finished
+                plan = plans_by_id[diff.plan_id]
+                # Guardar también el progreso parcial: el producto creado no se vuelve a crear
+                if product_id and plan.stripe_product_id != product_id:
+                    plan.stripe_product_id = product_id
+                if price_id and plan.stripe_price_id != price_id:
+                    plan.stripe_price_id = price_id
+                if error:
+                    details.append({**self._detail(diff, 'failed'), 'error': error})
+                else:
+                    details.append(self._detail(diff, 'synced' if diff.operations else 'unchanged'))
+            db.commit()
+            details.sort(key=lambda detail: detail['plan_id'])
+
+        failed = sum(1 for detail in details if detail['status'] == 'failed')
+        operations = Counter(op.action for diff in diffs for op in diff.operations)
+        logger.info(
+            f"Sincronización de planes gym {gym_id}{' (simulada)' if dry_run else ''}: "
+            f"{len(plans)} planes, operaciones {dict(operations)}, {failed} fallidos"
+        )
+        return {
+            'total': len(plans),
+            'synced': len(plans) - failed,
+            'failed': failed,
+            'details': details,
+            'operations': dict(operations),
+            'dry_run': dry_run,
+        }
+
+    async def _apply(self, plan: MembershipPlan, diff: PlanDiff, account_id: str, gate: RateLimitGate):
+        """
+        Ejecuta en orden las operaciones de un plan.
+
+        Returns:
+            (product_id, price_id, error) con los IDs a enlazar aunque falle a medias
+        """
+        product_id, price_id = diff.product_id, diff.price_id
+        for operation in diff.operations:
+            func, args, kwargs = self._operation_call(plan, operation, account_id, product_id)
+            outcome = await self.retry_policy.call(func, *args, gate=gate, **kwargs)
+            if not outcome.succeeded:
+                logger.error(f"Sincronización del plan {plan.id}: {operation.action} falló: {outcome.error}")
+                return product_id, price_id, f"{operation.action}: {outcome.error}"
+            if operation.action == 'create_product':
+                product_id = outcome.value['id']
+            elif operation.action == 'create_price':
+                price_id = outcome.value['id']
+        return product_id, price_id, None
+
+    @staticmethod
+    def _operation_call(plan: MembershipPlan, operation: PlanOperation, account_id: str, product_id: Optional[str]):
+        """Función del SDK, argumentos posicionales y kwargs de una operación."""
+        kwargs: Dict[str, Any] = {'stripe_account': account_id, **(operation.params or {})}
+        if operation.action == 'create_product':
+            # Mismos parámetros y clave que StripeService.create_stripe_product_for_plan
+            kwargs['metadata'] = {'gym_id': str(plan.gym_id), 'local_plan_id': str(plan.id), 'created_by': 'gym_api'}
+            kwargs['idempotency_key'] = idempotency_key("plan-product", account_id, plan.id)
+            return stripe.Product.create, (), kwargs
+        if operation.action == 'create_price':
+            kwargs['product'] = product_id
+            # Mismos componentes que StripeService: cambiar moneda o intervalo exige un precio nuevo
+            kwargs['idempotency_key'] = idempotency_key(
+                "plan-price", product_id, plan.price_cents, plan.currency.lower(), plan.billing_interval,
+                operation.target_id
+            )
+            return stripe.Price.create, (), kwargs
+        if operation.action == 'update_product':
+            return stripe.Product.modify, (operation.target_id,), kwargs
+        resource = stripe.Product if operation.action == 'archive_product' else stripe.Price
+        kwargs['active'] = operation.action == 'activate_price'
+        return resource.modify, (operation.target_id,), kwargs
+
+    @staticmethod
+    def _detail(diff: PlanDiff, status: str) -> Dict[str, Any]:
+        return {
+            'plan_id': diff.plan_id,
+            'name': diff.name,
+            'status': status,
+            'operations': [operation.action for operation in diff.operations],
+        }
+
+
+stripe_plan_sync_service = StripePlanSyncService()
@@ -0,0 +1,178 @@
+"""
+Caché de resolución de Stripe - Cuenta Connect del gym y customer del usuario.
+
+Crear un Payment Intent necesitaba, en cada checkout, comprobar el módulo
+billing, leer la ``GymStripeAccount`` (dos veces) y el perfil del usuario, y
+además recuperar el customer en Stripe para confirmar que seguía existiendo.
+Nada de eso cambia entre pagos, así que se guarda en Redis:
+
+- ``stripe:gym_account:{gym_id}``: cuenta Connect activa y sus capacidades
+  (cargos, pagos, onboarding) junto con el estado del módulo billing, bajo el
+  namespace versionado ``stripe_account:{gym_id}``.
+- ``stripe:customer:{account}:{gym_id}:{user_id}``: customer del usuario en
+  la cuenta del gym. La cuenta forma parte de la clave, así que al cambiar la
+  cuenta del gym las entradas antiguas dejan de leerse sin invalidarlas.
+
+La entrada del gym se invalida incrementando su namespace con los webhooks
+``account.updated`` y ``account.application.deauthorized`` y al modificar la
+cuenta o el módulo billing desde la API. La versión se lee antes de consultar
+la BD, así que una lectura que compite con un webhook guarda su resultado bajo
+la versión antigua y no sobrevive a la invalidación. Si Redis no está
+disponible se consulta la base de datos como antes.
+"""
+
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from app.db.redis_client import get_redis_client
+from app.models.stripe_profile import GymStripeAccount
+from app.services.cache_service import cache_service
+from app.services.module import module_service
+
+logger = logging.getLogger(__name__)
+
+# Con invalidación por webhook el TTL solo acota el daño de un webhook perdido
+ACCOUNT_TTL_SECONDS = 15 * 60
+CUSTOMER_TTL_SECONDS = 24 * 3600
+
+
+class GymStripeResolution(NamedTuple):
+    """Estado de cobro con Stripe de un gimnasio."""
+    gym_id: int
+    billing_enabled: bool
+    stripe_account_id: Optional[str] = None
+    charges_enabled: bool = False
+    payouts_enabled: bool = False
+    onboarding_completed: bool = False
+
+    @property
+    def can_charge(self) -> bool:
+        return self.billing_enabled and self.stripe_account_id is not None and self.charges_enabled
+
+
+class StripeResolutionCache:
+
+    def __init__(self, redis_factory: Callable[[], Awaitable[Any]] = get_redis_client):
+        self._redis_factory = redis_factory
+
+    # === Cuenta Connect del gym ===
+
+    async def get_gym_account(self, db: Session, gym_id: int) -> GymStripeResolution:
+        """Cuenta Connect activa y capacidades del gym, desde caché o base de datos."""
+        async def db_fetch():
+            return self._load_gym_account(db, gym_id)._asdict()
+
+        resolution = await cache_service.get_or_set_json(
+            await self._redis(),
+            self._account_key(gym_id),
+            db_fetch,
+            expiry_seconds=ACCOUNT_TTL_SECONDS,
+            namespaces=[self.namespace(gym_id)]
+        )
+        return GymStripeResolution(**resolution)
+
+    async def invalidate_gym_account(self, gym_id: int) -> None:
+        await cache_service.bump_namespaces(await self._redis(), self.namespace(gym_id))
+
+    async def invalidate_stripe_account(self, db: Session, stripe_account_id: str) -> None:
+        """Invalida el gym asociado a una cuenta Connect (webhooks de cuenta)."""
+        gym_ids = [
+            gym_id for (gym_id,) in db.query(GymStripeAccount.gym_id).filter(
+                GymStripeAccount.stripe_account_id == stripe_account_id
+            )
+        ]
+        if gym_ids:
+            await cache_service.bump_namespaces(
+                await self._redis(), *(self.namespace(gym_id) for gym_id in gym_ids)
+            )
+
+    # === Customer del usuario ===
+
+    async def get_customer_id(self, stripe_account_id: str, gym_id: int, user_id: int) -> Optional[str]:
+        cached = await self._get(self._customer_key(stripe_account_id, gym_id, user_id))
+        return cached.get("customer_id") if cached else None
+
+    async def set_customer_id(self, stripe_account_id: str, gym_id: int, user_id: int, customer_id: str) -> None:
+        await self._set(
+            self._customer_key(stripe_account_id, gym_id, user_id),
+            {"customer_id": customer_id},
+            CUSTOMER_TTL_SECONDS
+        )
+
+    async def invalidate_customer(self, stripe_account_id: str, gym_id: int, user_id: int) -> None:
+        await self._delete(self._customer_key(stripe_account_id, gym_id, user_id))
+
+    # === Auxiliares ===
+
+    def _load_gym_account(self, db: Session, gym_id: int) -> GymStripeResolution:
+        billing_enabled = bool(module_service.get_gym_module_status(db, gym_id, "billing"))
+        account = db.query(GymStripeAccount).filter(
+            GymStripeAccount.gym_id == gym_id,
+            GymStripeAccount.is_active == True
+        ).first()
+        if not account:
+            return GymStripeResolution(gym_id=gym_id, billing_enabled=billing_enabled)
+        return GymStripeResolution(
+            gym_id=gym_id,
+            billing_enabled=billing_enabled,
+            stripe_account_id=account.stripe_account_id,
+            charges_enabled=bool(account.charges_enabled),
+            payouts_enabled=bool(account.payouts_enabled),
+            onboarding_completed=bool(account.onboarding_completed),
+        )
+
+    @staticmethod
+    def namespace(gym_id: int) -> str:
+        return f"stripe_account:{gym_id}"
+
+    @staticmethod
+    def _account_key(gym_id: int) -> str:
+        return f"stripe:gym_account:{gym_id}"
+
+    @staticmethod
+    def _customer_key(stripe_account_id: str, gym_id: int, user_id: int) -> str:
+        return f"stripe:customer:{stripe_account_id}:{gym_id}:{user_id}"
+
+    async def _redis(self):
+        try:
+            return await self._redis_factory()
+        except Exception as e:
+            logger.warning(f"Redis no disponible para la caché de Stripe: {e}")
+            return None
+
+    async def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        redis_client = await self._redis()
+        if not redis_client:
+            return None
+        try:
+            cached = await redis_client.get(key)
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logger.warning(f"Error leyendo {key} de la caché de Stripe: {e}")
+            return None
+
+    async def _set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        redis_client = await self._redis()
+        if not redis_client:
+            return
+        try:
+            await redis_client.set(key, json.dumps(value), ex=ttl)
+        except Exception as e:
+            logger.warning(f"Error guardando {key} en la caché de Stripe: {e}")
+
+    async def _delete(self, *keys: str) -> None:
+        if not keys:
+            return
+        redis_client = await self._redis()
+        if not redis_client:
+            return
+        try:
+            await redis_client.delete(*keys)
+        except Exception as e:
+            logger.error(f"Error invalidando {list(keys)} en la caché de Stripe: {e}")
+
+
+stripe_resolution_cache = StripeResolutionCache()
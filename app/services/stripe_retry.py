@@ -0,0 +1,111 @@
+"""
+Stripe Retry - Llamadas síncronas al SDK de Stripe desde código asíncrono.
+
+Las llamadas se ejecutan en el pool del ``stripe_gateway`` para no bloquear el
+event loop y se reintentan ante errores transitorios (429 y fallos de conexión)
+con espera exponencial o la indicada por ``Retry-After``. Un ``RateLimitGate``
+compartido hace que un 429 frene a todas las llamadas concurrentes de un mismo
+lote, ya que el límite de Stripe es por cuenta y no por petición.
+
+Las operaciones que crean o modifican objetos deben llevar clave de
+idempotencia para que reintentarlas sea seguro.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Callable, NamedTuple, Optional
+
+import stripe
+
+from app.services.stripe_gateway import stripe_gateway
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+# Errores de Stripe que merece la pena reintentar
+RETRYABLE_ERRORS = (stripe.error.RateLimitError, stripe.error.APIConnectionError)
+
+
+class StripeCallResult(NamedTuple):
+    """Resultado de una llamada con reintentos."""
+    succeeded: bool
+    attempts: int
+    value: Any = None
+    error: Optional[str] = None
+
+
+class RateLimitGate:
+    """Pausa compartida por todas las llamadas de un lote tras un 429 de Stripe."""
+
+    def __init__(self):
+        self._resume_at = 0.0
+
+    def pause(self, seconds: float) -> None:
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def wait(self) -> None:
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class StripeRetryPolicy:
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        backoff_base_seconds: float = BACKOFF_BASE_SECONDS,
+        backoff_max_seconds: float = BACKOFF_MAX_SECONDS
+    ):
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+    def backoff_seconds(self, attempt: int, error: Exception) -> float:
+        """Retry-After si Stripe lo indica; si no, exponencial con jitter."""
+        headers = getattr(error, "headers", None) or {}
+        retry_after = headers.get("Retry-After") or headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max_seconds)
+            except ValueError:
+                pass
+        delay = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (attempt - 1))
+        return delay * (0.5 + random.random() / 2)
+
+    async def call(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        gate: Optional[RateLimitGate] = None,
+        **kwargs: Any
+    ) -> StripeCallResult:
+        """
+        Ejecuta ``func(*args, **kwargs)`` en el gateway de Stripe con reintentos.
+
+        Nunca lanza errores de Stripe: los no reintentables y los que agotan
+        los reintentos se devuelven en ``StripeCallResult.error``.
+        """
+        gate = gate or RateLimitGate()
+        attempt = 0
+        while True:
+            attempt += 1
+            await gate.wait()
+            try:
+                value = await stripe_gateway.call(func, *args, **kwargs)
+                return StripeCallResult(True, attempt, value=value)
+            except RETRYABLE_ERRORS as e:
+                if attempt > self.max_retries:
+                    return StripeCallResult(False, attempt, error=f"{type(e).__name__}: {e}")
+                delay = self.backoff_seconds(attempt, e)
+                logger.warning(f"Stripe {type(e).__name__} (intento {attempt}), reintentando en {delay:.2f}s")
+                if isinstance(e, stripe.error.RateLimitError):
+                    gate.pause(delay)
+                else:
+                    await asyncio.sleep(delay)
+            except stripe.error.StripeError as e:
+                return StripeCallResult(False, attempt, error=f"{type(e).__name__}: {e}")
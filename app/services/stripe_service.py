@@ -1,12 +1,13 @@
 import stripe
 from typing import Optional, Dict, Any, List
-from datetime import datetime
+from datetime import datetime, timezone
 from sqlalchemy.orm import Session
 from app.core.config import get_settings
 from app.models.membership import MembershipPlan
-from app.models.user_gym import UserGym
+from app.models.user_gym import UserGym, MembershipLifecycleStatus
 from app.schemas.membership import PurchaseMembershipResponse
 from app.services.membership import MembershipService
+from app.services.stripe_gateway import idempotency_key, stripe_gateway
 import logging
 
 logger = logging.getLogger(__name__)
@@ -148,7 +149,8 @@ class StripeService:
                 logger.info(f"Suscripción con ciclos limitados: {plan.max_billing_cycles} ciclos, cancelación automática: {cancel_date}")
 
             # 🆕 CREAR SESIÓN EN LA CUENTA DEL GYM
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = await stripe_gateway.call(
+                stripe.checkout.Session.create,
                 **checkout_data,
                 stripe_account=gym_account.stripe_account_id  # 🆕 Usar cuenta del gym
             )
@@ -323,7 +325,8 @@ class StripeService:
                 logger.info(f"Suscripción admin con ciclos limitados: {plan.max_billing_cycles} ciclos")
 
             # 🆕 CREAR SESIÓN EN LA CUENTA DEL GYM
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = await stripe_gateway.call(
+                stripe.checkout.Session.create,
                 **checkout_data,
                 stripe_account=gym_account.stripe_account_id  # 🆕 Usar cuenta del gym
             )
@@ -371,7 +374,7 @@ class StripeService:
         """Manejar un pago exitoso desde Stripe usando nueva arquitectura"""
         try:
             # Obtener la sesión de checkout
-            session = stripe.checkout.Session.retrieve(session_id)
+            session = await stripe_gateway.call(stripe.checkout.Session.retrieve, session_id)
             
             if session.payment_status != 'paid':
                 raise ValueError("El pago no fue completado")
@@ -438,7 +441,17 @@ class StripeService:
             raise
 
     async def handle_webhook(self, payload: bytes, signature: str) -> Dict[str, Any]:
-        """Manejar webhooks de Stripe"""
+        """Manejar webhooks de Stripe de forma síncrona (verificar y procesar)"""
+        event = self.construct_webhook_event(payload, signature)
+        return await self.process_webhook_event(event)
+
+    def construct_webhook_event(self, payload: bytes, signature: str) -> stripe.Event:
+        """
+        Verificar la firma de un webhook y construir el evento.
+
+        Raises:
+            ValueError: Si falta el secret, el payload no es válido o la firma no coincide
+        """
         if not settings.STRIPE_WEBHOOK_SECRET:
             logger.error("STRIPE_WEBHOOK_SECRET no configurado - webhook rechazado por seguridad")
             raise ValueError("Configuración de webhook secret faltante - contacte al administrador")
@@ -455,6 +468,10 @@ class StripeService:
             logger.error(f"Firma inválida en webhook: {str(e)}")
             raise ValueError("Firma inválida")
 
+        return event
+
+    async def process_webhook_event(self, event: stripe.Event) -> Dict[str, Any]:
+        """Ejecutar el handler de negocio de un evento de Stripe ya verificado"""
         # Manejar diferentes tipos de eventos
         event_type = event['type']
         logger.info(f"Procesando webhook de Stripe: {event_type}")
@@ -476,16 +493,16 @@ class StripeService:
             await self._handle_invoice_payment_succeeded(invoice)
             
         elif event_type == 'invoice.payment_failed':
-            # Pago de suscripción fallido
+            # Pago de suscripción fallido - PERIODO DE GRACIA mientras Stripe reintenta
             invoice = event['data']['object']
             logger.warning(f"Pago de suscripción fallido: {invoice['id']}")
-            # TODO: Notificar al usuario y suspender acceso
+            await self._apply_subscription_status(invoice.get('subscription'), 'past_due')
             
         elif event_type == 'customer.subscription.deleted':
-            # Suscripción cancelada
+            # Suscripción cancelada - EXPIRAR MEMBRESÍA
             subscription = event['data']['object']
             logger.info(f"Suscripción cancelada: {subscription['id']}")
-            # TODO: Desactivar membresía
+            await self._apply_subscription_status(subscription['id'], 'canceled')
             
         # 🆕 NUEVOS EVENTOS CRÍTICOS
         elif event_type == 'customer.subscription.updated':
@@ -552,8 +569,56 @@ class StripeService:
         else:
             logger.warning(f"Evento no manejado: {event_type}")
 
+        # Registrar el movimiento en el libro de ingresos
+        await self._record_revenue(event)
+
         return {"status": "success", "event_type": event_type}
 
+    async def _record_revenue(self, event: Dict[str, Any]) -> None:
+        """Registrar pagos y reembolsos del webhook en el libro de ingresos local."""
+        try:
+            from app.db.session import SessionLocal
+            from app.services.revenue_ledger import revenue_ledger_service
+
+            db = SessionLocal()
+            try:
+                revenue_ledger_service.record_webhook_event(
+                    db,
+                    event['type'],
+                    event['data']['object'],
+                    stripe_account=event.get('account'),
+                    occurred_at=datetime.fromtimestamp(event['created'], tz=timezone.utc)
+                    if event.get('created') else None
+                )
+            finally:
+                db.close()
+
+        except Exception as e:
+            # El libro se puede reconstruir con el backfill; nunca romper el webhook
+            logger.error(f"Error registrando {event.get('type')} en el libro de ingresos: {str(e)}")
+
+    async def _apply_subscription_status(self, subscription_id: Optional[str], status: str) -> None:
+        """Llevar la membresía de una suscripción al estado de Stripe y notificar el cambio."""
+        if not subscription_id:
+            logger.warning(f"Evento de suscripción ({status}) sin subscription_id - se ignora")
+            return
+
+        from app.db.session import SessionLocal
+        from app.services.membership_lifecycle import membership_lifecycle_service
+
+        db = SessionLocal()
+        try:
+            events = membership_lifecycle_service.apply_subscription_status(db, [subscription_id], status)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        logger.info(f"Suscripción {subscription_id} -> {status}: {sum(len(e.user_ids) for e in events)} membresías actualizadas")
+        await membership_lifecycle_service.publish(events)
+
     # 🆕 MÉTODOS PARA MANEJAR EVENTOS ESPECÍFICOS
     
     async def _handle_checkout_completed(self, session: Dict[str, Any]) -> None:
@@ -669,7 +734,8 @@ class StripeService:
                 
                 # Obtener información de la suscripción desde Stripe
                 import stripe
-                subscription = stripe.Subscription.retrieve(
+                subscription = await stripe_gateway.call(
+                    stripe.Subscription.retrieve,
                     subscription_id,
                     stripe_account=stripe_profile.stripe_account_id  # 🆕 Usar cuenta del gym
                 )
@@ -683,6 +749,7 @@ class StripeService:
                 user_gym.membership_expires_at = new_expiry_date
                 user_gym.last_payment_at = datetime.now()
                 user_gym.is_active = True  # Asegurar que esté activa
+                user_gym.membership_status = MembershipLifecycleStatus.ACTIVE.value
                 user_gym.notes = f"Renovación exitosa - Invoice {invoice_id} - {datetime.now().isoformat()}"
                 
                 # 🆕 ASEGURAR QUE EL SUBSCRIPTION_ID ESTÉ GUARDADO
@@ -759,48 +826,21 @@ class StripeService:
                         db, stripe_profile.user_id, stripe_profile.gym_id, subscription_id
                     )
                 
-                # Actualizar estado según el status de Stripe
-                status_mapping = {
-                    'active': True,
-                    'past_due': True,  # Mantener activo pero marcar como moroso
-                    'canceled': False,
-                    'unpaid': False,
-                    'incomplete': False,
-                    'incomplete_expired': False,
-                    'trialing': True,
-                    'paused': False
-                }
-                
-                old_status = user_gym.is_active
-                user_gym.is_active = status_mapping.get(status, user_gym.is_active)
-                
-                # Agregar nota con el cambio
-                status_note = f"Stripe status: {status}"
-                if status == 'past_due':
-                    status_note += " - Pago vencido"
-                elif status == 'canceled':
-                    status_note += " - Suscripción cancelada"
-                elif status == 'paused':
-                    status_note += " - Suscripción pausada"
-                
-                user_gym.notes = f"{status_note} - {datetime.now().isoformat()}"
+                # Estado local según el status de Stripe (UPDATE por suscripción)
+                from app.services.membership_lifecycle import membership_lifecycle_service
+                events = membership_lifecycle_service.apply_subscription_status(
+                    db, [subscription_id], status
+                )
                 
                 # Actualizar fecha de expiración si está en período de prueba
                 if status == 'trialing' and subscription.get('trial_end'):
-                    from datetime import datetime
                     trial_end_timestamp = subscription['trial_end']
                     user_gym.membership_expires_at = datetime.fromtimestamp(trial_end_timestamp)
                 
                 db.commit()
                 
-                # Enviar notificaciones según el cambio de estado
-                if old_status != user_gym.is_active:
-                    if status == 'past_due':
-                        await self._notify_payment_overdue(user_gym)
-                    elif status == 'canceled':
-                        await self._notify_subscription_canceled(user_gym)
-                    elif status == 'active' and not old_status:
-                        await self._notify_subscription_reactivated(user_gym)
+                # Notificar los cambios de estado e invalidar el resumen del gym
+                await membership_lifecycle_service.publish(events)
                 
                 logger.info(f"Membresía actualizada: user {user_gym.user_id}, gym {user_gym.gym_id}, status: {status}")
                 
@@ -936,7 +976,7 @@ class StripeService:
             if charge_id:
                 try:
                     import stripe
-                    charge = stripe.Charge.retrieve(charge_id)
+                    charge = await stripe_gateway.call(stripe.Charge.retrieve, charge_id)
                     gym_id = charge.metadata.get('gym_id')
                     customer_id = charge.customer
                 except Exception as charge_error:
@@ -1217,7 +1257,7 @@ class StripeService:
     async def cancel_subscription(self, subscription_id: str) -> bool:
         """Cancelar una suscripción en Stripe"""
         try:
-            stripe.Subscription.delete(subscription_id)
+            await stripe_gateway.call(stripe.Subscription.delete, subscription_id)
             logger.info(f"Suscripción cancelada: {subscription_id}")
             return True
         except stripe.error.StripeError as e:
@@ -1227,7 +1267,8 @@ class StripeService:
     async def get_customer_subscriptions(self, customer_id: str) -> List[Dict[str, Any]]:
         """Obtener las suscripciones activas de un cliente"""
         try:
-            subscriptions = stripe.Subscription.list(
+            subscriptions = await stripe_gateway.call(
+                stripe.Subscription.list,
                 customer=customer_id,
                 status='active'
             )
@@ -1267,7 +1308,7 @@ class StripeService:
             if amount:
                 refund_data['amount'] = amount
             
-            refund = stripe.Refund.create(**refund_data)
+            refund = await stripe_gateway.call(stripe.Refund.create, **refund_data)
             
             logger.info(f"Reembolso creado: {refund.id} para charge {charge_id}")
             
@@ -1285,7 +1326,7 @@ class StripeService:
     async def get_refunds_for_charge(self, charge_id: str) -> List[Dict[str, Any]]:
         """Obtener todos los reembolsos para un cargo específico"""
         try:
-            refunds = stripe.Refund.list(charge=charge_id)
+            refunds = await stripe_gateway.call(stripe.Refund.list, charge=charge_id)
             return [
                 {
                     'id': refund.id,
@@ -1339,18 +1380,19 @@ class StripeService:
             }
             
             # Buscar cliente existente por email
-            existing_customers = stripe.Customer.list(email=email, limit=1)
+            existing_customers = await stripe_gateway.call(stripe.Customer.list, email=email, limit=1)
             
             if existing_customers.data:
                 # Actualizar cliente existente
-                customer = stripe.Customer.modify(
+                customer = await stripe_gateway.call(
+                    stripe.Customer.modify,
                     existing_customers.data[0].id,
                     **customer_data
                 )
                 logger.info(f"Cliente actualizado (método obsoleto): {customer.id}")
             else:
                 # Crear nuevo cliente
-                customer = stripe.Customer.create(**customer_data)
+                customer = await stripe_gateway.call(stripe.Customer.create, **customer_data)
                 logger.info(f"Cliente creado (método obsoleto): {customer.id}")
             
             return customer.id
@@ -1362,7 +1404,8 @@ class StripeService:
     async def get_customer_payment_methods(self, customer_id: str) -> List[Dict[str, Any]]:
         """Obtener métodos de pago de un cliente"""
         try:
-            payment_methods = stripe.PaymentMethod.list(
+            payment_methods = await stripe_gateway.call(
+                stripe.PaymentMethod.list,
                 customer=customer_id,
                 type='card'
             )
@@ -1442,7 +1485,8 @@ class StripeService:
             cancel_url = cancel_url or settings.STRIPE_CANCEL_URL
 
             # 🆕 CREAR SESIÓN CON PERÍODO DE PRUEBA EN LA CUENTA DEL GYM
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = await stripe_gateway.call(
+                stripe.checkout.Session.create,
                 payment_method_types=['card'],
                 line_items=[{
                     'price': plan.stripe_price_id,
@@ -1522,7 +1566,9 @@ class StripeService:
                 raise ValueError(f"Gimnasio {plan.gym_id} debe completar el onboarding de Stripe")
             
             # 🆕 CREAR PRODUCTO EN LA CUENTA DEL GYM
-            product = stripe.Product.create(
+            product = await stripe_gateway.call(
+                stripe.Product.create,
+                idempotency_key=idempotency_key("plan-product", gym_account.stripe_account_id, plan.id),
                 name=plan.name,
                 description=plan.description or f"Plan de membresía {plan.name}",
                 metadata={
@@ -1551,7 +1597,11 @@ class StripeService:
             if plan.billing_interval in ['month', 'year']:
                 price_data['recurring'] = {'interval': plan.billing_interval}
             
-            price = stripe.Price.create(
+            price = await stripe_gateway.call(
+                stripe.Price.create,
+                idempotency_key=idempotency_key(
+                    "plan-price", product.id, plan.price_cents, plan.currency.lower(), plan.billing_interval
+                ),
                 **price_data,
                 stripe_account=gym_account.stripe_account_id  # 🆕 Crear en cuenta del gym
             )
@@ -1605,7 +1655,8 @@ class StripeService:
                 raise ValueError(f"Gimnasio {plan.gym_id} no tiene cuenta de Stripe configurada")
             
             # 🆕 ACTUALIZAR PRODUCTO EN LA CUENTA DEL GYM
-            stripe.Product.modify(
+            await stripe_gateway.call(
+                stripe.Product.modify,
                 plan.stripe_product_id,
                 name=plan.name,
                 description=plan.description or f"Plan de membresía {plan.name}",
@@ -1623,7 +1674,8 @@ class StripeService:
             # Si cambió el precio, crear nuevo Price (Stripe no permite modificar precios)
             if plan.stripe_price_id:
                 try:
-                    existing_price = stripe.Price.retrieve(
+                    existing_price = await stripe_gateway.call(
+                        stripe.Price.retrieve,
                         plan.stripe_price_id,
                         stripe_account=gym_account.stripe_account_id  # 🆕 Obtener desde cuenta del gym
                     )
@@ -1635,7 +1687,8 @@ class StripeService:
                         logger.info(f"Precio cambió para plan {plan.id}, creando nuevo precio en Stripe")
                         
                         # Desactivar precio anterior
-                        stripe.Price.modify(
+                        await stripe_gateway.call(
+                            stripe.Price.modify,
                             plan.stripe_price_id, 
                             active=False,
                             stripe_account=gym_account.stripe_account_id  # 🆕 Desactivar en cuenta del gym
@@ -1656,7 +1709,12 @@ class StripeService:
                         if plan.billing_interval in ['month', 'year']:
                             price_data['recurring'] = {'interval': plan.billing_interval}
                         
-                        new_price = stripe.Price.create(
+                        new_price = await stripe_gateway.call(
+                            stripe.Price.create,
+                            idempotency_key=idempotency_key(
+                                "plan-price", plan.stripe_product_id, plan.price_cents,
+                                plan.currency.lower(), plan.billing_interval, existing_price.id
+                            ),
                             **price_data,
                             stripe_account=gym_account.stripe_account_id  # 🆕 Crear en cuenta del gym
                         )
@@ -1709,7 +1767,8 @@ class StripeService:
                 return True
             
             # 🆕 DESACTIVAR PRODUCTO EN LA CUENTA DEL GYM
-            stripe.Product.modify(
+            await stripe_gateway.call(
+                stripe.Product.modify,
                 plan.stripe_product_id,
                 active=False,
                 metadata={
@@ -1721,7 +1780,8 @@ class StripeService:
             
             # 🆕 DESACTIVAR PRECIO SI EXISTE EN LA CUENTA DEL GYM
             if plan.stripe_price_id:
-                stripe.Price.modify(
+                await stripe_gateway.call(
+                    stripe.Price.modify,
                     plan.stripe_price_id, 
                     active=False,
                     stripe_account=gym_account.stripe_account_id  # 🆕 Desactivar en cuenta del gym
@@ -1776,85 +1836,6 @@ class StripeService:
 
 # 🆕 MÉTODOS DE NOTIFICACIÓN Y ALERTAS
 
-    async def _notify_payment_overdue(self, user_gym) -> None:
-        """Notificar al usuario sobre pago vencido"""
-        try:
-            from app.services.notification_service import notification_service
-            from app.models.user import User
-            from app.db.session import SessionLocal
-            
-            db = SessionLocal()
-            try:
-                user = db.query(User).filter(User.id == user_gym.user_id).first()
-                if user and user.onesignal_player_id:
-                    await notification_service.send_notification(
-                        player_id=user.onesignal_player_id,
-                        title="Pago Vencido",
-                        message="Tu pago de membresía está vencido. Por favor actualiza tu método de pago.",
-                        data={
-                            "type": "payment_overdue",
-                            "gym_id": str(user_gym.gym_id),
-                            "subscription_id": user_gym.stripe_subscription_id
-                        }
-                    )
-            finally:
-                db.close()
-                
-        except Exception as e:
-            logger.error(f"Error enviando notificación de pago vencido: {str(e)}")
-    
-    async def _notify_subscription_canceled(self, user_gym) -> None:
-        """Notificar al usuario sobre cancelación de suscripción"""
-        try:
-            from app.services.notification_service import notification_service
-            from app.models.user import User
-            from app.db.session import SessionLocal
-            
-            db = SessionLocal()
-            try:
-                user = db.query(User).filter(User.id == user_gym.user_id).first()
-                if user and user.onesignal_player_id:
-                    await notification_service.send_notification(
-                        player_id=user.onesignal_player_id,
-                        title="Suscripción Cancelada",
-                        message="Tu suscripción ha sido cancelada. Esperamos verte pronto de vuelta.",
-                        data={
-                            "type": "subscription_canceled",
-                            "gym_id": str(user_gym.gym_id)
-                        }
-                    )
-            finally:
-                db.close()
-                
-        except Exception as e:
-            logger.error(f"Error enviando notificación de cancelación: {str(e)}")
-    
-    async def _notify_subscription_reactivated(self, user_gym) -> None:
-        """Notificar al usuario sobre reactivación de suscripción"""
-        try:
-            from app.services.notification_service import notification_service
-            from app.models.user import User
-            from app.db.session import SessionLocal
-            
-            db = SessionLocal()
-            try:
-                user = db.query(User).filter(User.id == user_gym.user_id).first()
-                if user and user.onesignal_player_id:
-                    await notification_service.send_notification(
-                        player_id=user.onesignal_player_id,
-                        title="¡Bienvenido de Vuelta!",
-                        message="Tu suscripción ha sido reactivada. ¡Disfruta del gimnasio!",
-                        data={
-                            "type": "subscription_reactivated",
-                            "gym_id": str(user_gym.gym_id)
-                        }
-                    )
-            finally:
-                db.close()
-                
-        except Exception as e:
-            logger.error(f"Error enviando notificación de reactivación: {str(e)}")
-    
     async def _notify_membership_activated(self, user_gym) -> None:
         """Notificar al usuario sobre activación inicial de membresía"""
         try:
@@ -2074,7 +2055,8 @@ class StripeService:
             from datetime import datetime
             
             # Obtener métodos de pago del cliente
-            payment_methods = stripe.PaymentMethod.list(
+            payment_methods = await stripe_gateway.call(
+                stripe.PaymentMethod.list,
                 customer=customer_id,
                 type="card"
             )
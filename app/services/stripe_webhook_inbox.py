@@ -0,0 +1,297 @@
+"""
+Inbox de webhooks de Stripe - Recepción inmediata y procesamiento diferido.
+
+El endpoint solo verifica la firma, guarda el evento en bruto (deduplicado
+por su ID de Stripe) y responde; los handlers de negocio se ejecutan después
+en un worker. Así una activación de membresía lenta no provoca que Stripe
+reintente el webhook y lo procese dos veces.
+
+El worker reclama eventos respetando el orden por cliente (``ordering_key``):
+un evento no se procesa mientras haya otro anterior del mismo cliente
+pendiente o en curso. Los fallos se reintentan con espera exponencial y, al
+agotar los intentos, el evento queda en DEAD para revisarlo y reencolarlo.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import stripe
+from sqlalchemy import exists, func, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, aliased
+
+from app.core.config import get_settings
+from app.models.stripe_webhook import StripeWebhookEvent, StripeWebhookEventStatus
+
+logger = logging.getLogger(__name__)
+
+CLAIM_BATCH_SIZE = 50
+BACKOFF_BASE_SECONDS = 30.0
+BACKOFF_MAX_SECONDS = 3600.0
+# Un evento en PROCESSING más tiempo que esto se considera abandonado por un worker caído
+STALE_LOCK_SECONDS = 300
+
+OPEN_STATUSES = (StripeWebhookEventStatus.PENDING, StripeWebhookEventStatus.PROCESSING)
+
+
+def ordering_key(event: Dict[str, Any]) -> str:
+    """Clave de orden del evento: el cliente de Stripe o, si no hay, el propio objeto."""
+    obj = event['data']['object']
+    customer = obj.get('customer')
+    if isinstance(customer, dict):
+        customer = customer.get('id')
+    if not customer and obj.get('object') == 'customer':
+        customer = obj.get('id')
+    key = customer or obj.get('id') or event['id']
+    return f"{event.get('account') or 'platform'}:{key}"
+
+
+class StripeWebhookInbox:
+
+    def __init__(
+        self,
+        handler: Optional[Callable[[stripe.Event], Awaitable[Any]]] = None,
+        max_attempts: Optional[int] = None,
+        backoff_base_seconds: float = BACKOFF_BASE_SECONDS
+    ):
+        self._handler = handler
+        self.max_attempts = max_attempts or get_settings().STRIPE_WEBHOOK_MAX_ATTEMPTS
+        self.backoff_base_seconds = backoff_base_seconds
+
+    # === Recepción ===
+
+    def ingest(
+        self,
+        db: Session,
+        payload: bytes,
+        signature: str,
+        received_at: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Verifica el webhook y lo guarda en el inbox.
+
+        Args:
+            received_at: ``time.perf_counter()`` al recibir la petición, para medir el ack
+
+        Returns:
+            dict con ``status`` ("queued" o "duplicate"), ``event_id`` y ``event_type``
+
+        Raises:
+            ValueError: Si la firma o el payload no son válidos
+        """
+        received_at = received_at or time.perf_counter()
+        event = self._stripe_service().construct_webhook_event(payload, signature)
+        now = datetime.now(timezone.utc)
+
+        values = {
+            'stripe_event_id': event['id'],
+            'event_type': event['type'],
+            'stripe_account_id': event.get('account'),
+            'ordering_key': ordering_key(event),
+            'payload': payload.decode() if isinstance(payload, bytes) else payload,
+            'status': StripeWebhookEventStatus.PENDING,
+            'attempts': 0,
+            'stripe_created_at': datetime.fromtimestamp(event['created'], tz=timezone.utc),
+            'next_attempt_at': now,
+            'ack_ms': (time.perf_counter() - received_at) * 1000,
+        }
+        dialect_insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+        stmt = dialect_insert(StripeWebhookEvent).values(**values).on_conflict_do_nothing(
+            index_elements=[StripeWebhookEvent.stripe_event_id]
+        ).returning(StripeWebhookEvent.id)
+        inserted = db.execute(stmt).scalar_one_or_none()
+        db.commit()
+
+        if inserted is None:
+            logger.info(f"Webhook de Stripe duplicado ignorado: {event['id']} ({event['type']})")
+        return {
+            'status': 'queued' if inserted is not None else 'duplicate',
+            'event_id': event['id'],
+            'event_type': event['type'],
+        }
+
+    # === Worker ===
+
+    def claim_batch(self, db: Session, limit: int = CLAIM_BATCH_SIZE) -> List[int]:
+        """
+        Reclama eventos listos, como mucho uno por cliente: el más antiguo que
+        no tenga otro anterior del mismo cliente pendiente o en curso.
+        """
+        now = datetime.now(timezone.utc)
+
+        # Liberar eventos de workers caídos
+        db.execute(
+            update(StripeWebhookEvent)
+            .where(
+                StripeWebhookEvent.status == StripeWebhookEventStatus.PROCESSING,
+                StripeWebhookEvent.locked_at < now - timedelta(seconds=STALE_LOCK_SECONDS)
+            )
+            .values(status=StripeWebhookEventStatus.PENDING)
+        )
+
+        earlier = aliased(StripeWebhookEvent)
+        blocked = exists().where(
+            earlier.ordering_key == StripeWebhookEvent.ordering_key,
+            earlier.status.in_(OPEN_STATUSES),
+            tuple_(earlier.stripe_created_at, earlier.id)
+            < tuple_(StripeWebhookEvent.stripe_created_at, StripeWebhookEvent.id)
+        )
+        rows = db.query(StripeWebhookEvent).filter(
+            StripeWebhookEvent.status == StripeWebhookEventStatus.PENDING,
+            StripeWebhookEvent.next_attempt_at <= now,
+            ~blocked
+        ).order_by(
+            StripeWebhookEvent.stripe_created_at, StripeWebhookEvent.id
+        ).limit(limit).with_for_update(skip_locked=True).all()
+
+        for row in rows:
+            row.status = StripeWebhookEventStatus.PROCESSING
+            row.locked_at = now
+            row.attempts += 1
+        db.commit()
+        return [row.id for row in rows]
+
+    async def process_event(self, db: Session, inbox_id: int) -> StripeWebhookEventStatus:
+        """Ejecuta el handler de un evento reclamado y registra el resultado."""
+        row = db.get(StripeWebhookEvent, inbox_id)
+        event = stripe.Event.construct_from(json.loads(row.payload), stripe.api_key)
+        try:
+            await self._handle(event)
+            row.status = StripeWebhookEventStatus.PROCESSED
+            row.processed_at = datetime.now(timezone.utc)
+            row.last_error = None
+        except Exception as e:
+            row.last_error = f"{type(e).__name__}: {e}"
+            if row.attempts >= self.max_attempts:
+                row.status = StripeWebhookEventStatus.DEAD
+                logger.error(f"Webhook {row.stripe_event_id} ({row.event_type}) enviado a DEAD "
+                             f"tras {row.attempts} intentos: {row.last_error}")
+            else:
+                row.status = StripeWebhookEventStatus.PENDING
+                row.next_attempt_at = datetime.now(timezone.utc) + timedelta(
+                    seconds=self.backoff_seconds(row.attempts)
+                )
+                logger.warning(f"Webhook {row.stripe_event_id} falló (intento {row.attempts}), "
+                               f"reintento en {self.backoff_seconds(row.attempts):.0f}s: {row.last_error}")
+        db.commit()
+        return row.status
+
+    async def process_pending(self, session_factory=None, batch_size: int = CLAIM_BATCH_SIZE) -> int:
+        """
+        Procesa eventos hasta vaciar lo que esté listo. Los eventos de un lote
+        son de clientes distintos, así que se ejecutan en paralelo.
+
+        Returns:
+            Número de eventos procesados (con éxito o no)
+        """
+        if session_factory is None:
+            from app.db.session import SessionLocal
+            session_factory = SessionLocal
+
+        processed = 0
+        while True:
+            db = session_factory()
+            try:
+                inbox_ids = self.claim_batch(db, batch_size)
+            finally:
+                db.close()
+            if not inbox_ids:
+                return processed
+            await asyncio.gather(*(self._process_in_session(session_factory, inbox_id) for inbox_id in inbox_ids))
+            processed += len(inbox_ids)
+
+    def backoff_seconds(self, attempt: int) -> float:
+        return min(BACKOFF_MAX_SECONDS, self.backoff_base_seconds * 2 ** (attempt - 1))
+
+    # === Dead letters y métricas ===
+
+    def list_dead_letters(self, db: Session, limit: int = 50) -> List[StripeWebhookEvent]:
+        return db.query(StripeWebhookEvent).filter(
+            StripeWebhookEvent.status == StripeWebhookEventStatus.DEAD
+        ).order_by(StripeWebhookEvent.stripe_created_at.desc()).limit(limit).all()
+
+    def requeue(self, db: Session, stripe_event_id: str) -> bool:
+        """Devuelve un evento DEAD a la cola con los intentos a cero."""
+        result = db.execute(
+            update(StripeWebhookEvent)
+            .where(
+                StripeWebhookEvent.stripe_event_id == stripe_event_id,
+                StripeWebhookEvent.status == StripeWebhookEventStatus.DEAD
+            )
+            .values(status=StripeWebhookEventStatus.PENDING, attempts=0,
+                    next_attempt_at=datetime.now(timezone.utc))
+        )
+        db.commit()
+        return result.rowcount > 0
+
+    def stats(self, db: Session, since: Optional[datetime] = None) -> Dict[str, Any]:
+        """Eventos por estado y latencia del ack (p50/p99) desde ``since`` (24h por defecto)."""
+        since = since or datetime.now(timezone.utc) - timedelta(hours=24)
+        by_status = dict(
+            db.query(StripeWebhookEvent.status, func.count(StripeWebhookEvent.id))
+            .group_by(StripeWebhookEvent.status).all()
+        )
+
+        latencies = db.query(StripeWebhookEvent.ack_ms).filter(
+            StripeWebhookEvent.received_at >= since,
+            StripeWebhookEvent.ack_ms.isnot(None)
+        )
+        count = latencies.count()
+
+        def percentile(p: float) -> Optional[float]:
+            if not count:
+                return None
+            offset = max(0, math.ceil(p * count) - 1)
+            return latencies.order_by(StripeWebhookEvent.ack_ms).offset(offset).limit(1).scalar()
+
+        return {
+            'by_status': {status.value: by_status.get(status, 0) for status in StripeWebhookEventStatus},
+            'ack_latency_ms': {
+                'count': count,
+                'p50': percentile(0.50),
+                'p99': percentile(0.99),
+            },
+        }
+
+    # === Auxiliares ===
+
+    async def _process_in_session(self, session_factory, inbox_id: int) -> None:
+        db = session_factory()
+        try:
+            await self.process_event(db, inbox_id)
+        except Exception as e:
+            logger.error(f"Error procesando el webhook {inbox_id} del inbox: {e}", exc_info=True)
+        finally:
+            db.close()
+
+    async def _handle(self, event: stripe.Event) -> Any:
+        if self._handler is not None:
+            return await self._handler(event)
+        return await self._stripe_service().process_webhook_event(event)
+
+    def _stripe_service(self):
+        # Importación diferida: stripe_service depende de membership_service
+        from app.services.stripe_service import get_stripe_service
+        return get_stripe_service()
+
+
+stripe_webhook_inbox = StripeWebhookInbox()
+
+
+async def process_stripe_webhook_inbox():
+    """
+    Job del scheduler: procesa los webhooks pendientes o con reintento vencido
+    que no llegó a procesar la tarea en segundo plano del endpoint.
+    """
+    try:
+        processed = await stripe_webhook_inbox.process_pending()
+        if processed:
+            logger.info(f"Inbox de webhooks de Stripe: {processed} eventos procesados")
+    except Exception as e:
+        logger.error(f"Error procesando el inbox de webhooks de Stripe: {e}", exc_info=True)
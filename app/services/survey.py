@@ -99,6 +99,9 @@ class SurveyService:
         try:
             if redis_client:
                 # Try cache first
+                cache_key = await CacheService.versioned_key(
+                    redis_client, cache_key, self._gym_namespace(gym_id)
+                )
                 cached = await redis_client.get(cache_key)
                 if cached:
                     logger.debug(f"Cache hit for available surveys: {cache_key}")
@@ -150,7 +153,8 @@ class SurveyService:
                     db_fetch_func=db_fetch,
                     model_class=Survey,
                     expiry_seconds=300,
-                    is_list=True
+                    is_list=True,
+                    namespaces=[self._gym_namespace(gym_id)]
                 )
                 return result
             else:
@@ -617,6 +621,11 @@ class SurveyService:
     
     # ============= Cache Management =============
     
+    @staticmethod
+    def _gym_namespace(gym_id: int) -> str:
+        """Versioned namespace shared by the gym's survey lists"""
+        return f"surveys:gym:{gym_id}"
+
     async def _invalidate_survey_caches(
         self,
         redis_client: Redis,
@@ -624,24 +633,14 @@ class SurveyService:
         survey_id: Optional[int] = None
     ):
         """Invalidate survey-related caches"""
-        patterns = [
-            f"surveys:available:gym:{gym_id}*",
-            f"surveys:list:gym:{gym_id}*",
-            f"surveys:creator:*:gym:{gym_id}*"
-        ]
+        # Available/creator lists: a single INCR of the gym namespace
+        await CacheService.bump_namespaces(redis_client, self._gym_namespace(gym_id))
         
         if survey_id:
-            patterns.extend([
-                f"survey:detail:{survey_id}",
-                f"survey:stats:{survey_id}"
-            ])
-        
-        for pattern in patterns:
             try:
-                await CacheService.delete_pattern(redis_client, pattern)
-                logger.debug(f"Invalidated cache pattern: {pattern}")
+                await redis_client.delete(f"survey:detail:{survey_id}", f"survey:stats:{survey_id}")
             except Exception as e:
-                logger.error(f"Error invalidating cache pattern {pattern}: {e}")
+                logger.error(f"Error invalidating caches for survey {survey_id}: {e}")
     
     async def _invalidate_statistics_cache(
         self,
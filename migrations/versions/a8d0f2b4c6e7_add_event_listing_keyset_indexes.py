@@ -0,0 +1,37 @@
+"""add_event_listing_keyset_indexes
+
+Revision ID: a8d0f2b4c6e7
+Revises: f7c9e1a3b5d6
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d0f2b4c6e7'
+down_revision = 'f7c9e1a3b5d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Listado de eventos paginado por cursor: WHERE gym_id = ? AND
+    # (start_time, id) > (?, ?) ORDER BY start_time, id, y conteos por
+    # (event_id, status) resueltos solo con el índice.
+    # CONCURRENTLY para no bloquear escrituras
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_events_gym_start_id "
+            "ON events (gym_id, start_time, id)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_event_participation_event_status "
+            "ON event_participations (event_id, status)"
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_event_participation_event_status")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_events_gym_start_id")
@@ -0,0 +1,59 @@
+"""add_waitlisted_class_participation_status
+
+Revision ID: b3e5d7f9a1c2
+Revises: 7aac5b2b1032
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e5d7f9a1c2'
+down_revision = '7aac5b2b1032'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ALTER TYPE ADD VALUE no puede ejecutarse dentro de una transacción y el
+    # nuevo valor no puede usarse (índice parcial) hasta que se confirme
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE classparticipationstatus ADD VALUE IF NOT EXISTS 'WAITLISTED'")
+
+    # Índice parcial para promover desde la lista de espera por orden de llegada
+    op.create_index(
+        'ix_class_participation_session_waitlist',
+        'class_participation',
+        ['session_id', 'registration_time'],
+        unique=False,
+        postgresql_where=sa.text("status = 'WAITLISTED'::classparticipationstatus")
+    )
+
+    # Sincronizar el contador con las participaciones actuales: a partir de
+    # ahora se mantiene de forma incremental al reservar/liberar plazas
+    op.execute("""
+        UPDATE class_session cs
+        SET current_participants = COALESCE(counts.registered, 0)
+        FROM class_session s
+        LEFT JOIN (
+            SELECT session_id, COUNT(*) AS registered
+            FROM class_participation
+            WHERE status = 'REGISTERED'
+            GROUP BY session_id
+        ) counts ON counts.session_id = s.id
+        WHERE cs.id = s.id
+          AND cs.current_participants IS DISTINCT FROM COALESCE(counts.registered, 0)
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_class_participation_session_waitlist', table_name='class_participation')
+    # PostgreSQL no permite eliminar valores de un enum; las participaciones en
+    # lista de espera se marcan como canceladas
+    op.execute("""
+        UPDATE class_participation
+        SET status = 'CANCELLED', cancellation_time = now()
+        WHERE status = 'WAITLISTED'
+    """)
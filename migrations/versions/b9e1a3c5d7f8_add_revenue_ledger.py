@@ -0,0 +1,53 @@
+"""add_revenue_ledger
+
+Revision ID: b9e1a3c5d7f8
+Revises: a8d0f2b4c6e7
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e1a3c5d7f8'
+down_revision = 'a8d0f2b4c6e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    entry_type = sa.Enum('SUBSCRIPTION_INVOICE', 'ONE_TIME_PAYMENT', 'EVENT_PAYMENT', 'REFUND',
+                         name='revenueentrytype')
+
+    op.create_table(
+        'revenue_ledger_entries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('gym_id', sa.Integer(), sa.ForeignKey('gyms.id'), nullable=False),
+        sa.Column('entry_type', entry_type, nullable=False),
+        sa.Column('source_id', sa.String(length=255), nullable=False),
+        sa.Column('stripe_account_id', sa.String(length=255), nullable=True),
+        sa.Column('amount_cents', sa.Integer(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=True),
+        sa.Column('plan_id', sa.Integer(), sa.ForeignKey('membership_plans.id'), nullable=True),
+        sa.Column('plan_name', sa.String(length=255), nullable=True),
+        sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('occurred_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source_id')
+    )
+    op.create_index(op.f('ix_revenue_ledger_entries_id'), 'revenue_ledger_entries', ['id'], unique=False)
+    op.create_index('ix_revenue_ledger_gym_occurred', 'revenue_ledger_entries', ['gym_id', 'occurred_at'],
+                    unique=False)
+    op.create_index('ix_revenue_ledger_occurred', 'revenue_ledger_entries', ['occurred_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_revenue_ledger_occurred', table_name='revenue_ledger_entries')
+    op.drop_index('ix_revenue_ledger_gym_occurred', table_name='revenue_ledger_entries')
+    op.drop_index(op.f('ix_revenue_ledger_entries_id'), table_name='revenue_ledger_entries')
+    op.drop_table('revenue_ledger_entries')
+    sa.Enum(name='revenueentrytype').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,54 @@
+"""add_stripe_webhook_events
+
+Revision ID: c1f3b5d7e9a2
+Revises: b9e1a3c5d7f8
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1f3b5d7e9a2'
+down_revision = 'b9e1a3c5d7f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    event_status = sa.Enum('PENDING', 'PROCESSING', 'PROCESSED', 'DEAD', name='stripewebhookeventstatus')
+
+    op.create_table(
+        'stripe_webhook_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('stripe_event_id', sa.String(length=255), nullable=False),
+        sa.Column('event_type', sa.String(length=100), nullable=False),
+        sa.Column('stripe_account_id', sa.String(length=255), nullable=True),
+        sa.Column('ordering_key', sa.String(length=255), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', event_status, nullable=False, server_default='PENDING'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('stripe_created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('ack_ms', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('stripe_event_id')
+    )
+    op.create_index(op.f('ix_stripe_webhook_events_id'), 'stripe_webhook_events', ['id'], unique=False)
+    op.create_index('ix_stripe_webhook_events_status_next', 'stripe_webhook_events',
+                    ['status', 'next_attempt_at'], unique=False)
+    op.create_index('ix_stripe_webhook_events_ordering', 'stripe_webhook_events',
+                    ['ordering_key', 'stripe_created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_stripe_webhook_events_ordering', table_name='stripe_webhook_events')
+    op.drop_index('ix_stripe_webhook_events_status_next', table_name='stripe_webhook_events')
+    op.drop_index(op.f('ix_stripe_webhook_events_id'), table_name='stripe_webhook_events')
+    op.drop_table('stripe_webhook_events')
+    sa.Enum(name='stripewebhookeventstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,50 @@
+"""add_active_class_session_partial_indexes
+
+Revision ID: c4f6e8a0b2d3
+Revises: b3e5d7f9a1c2
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f6e8a0b2d3'
+down_revision = 'b3e5d7f9a1c2'
+branch_labels = None
+depends_on = None
+
+
+ACTIVE_STATUSES = sa.text("status IN ('SCHEDULED', 'IN_PROGRESS')")
+
+
+def upgrade():
+    # Índices parciales para las transiciones de estado de mark_completed_sessions:
+    # solo contienen sesiones activas, no el histórico de sesiones completadas.
+    # CONCURRENTLY para no bloquear escrituras en class_session
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_class_session_active_end_time',
+            'class_session',
+            ['end_time'],
+            unique=False,
+            postgresql_where=ACTIVE_STATUSES,
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        op.create_index(
+            'ix_class_session_active_start_time',
+            'class_session',
+            ['start_time'],
+            unique=False,
+            postgresql_where=ACTIVE_STATUSES,
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_class_session_active_start_time', table_name='class_session', postgresql_concurrently=True)
+        op.drop_index('ix_class_session_active_end_time', table_name='class_session', postgresql_concurrently=True)
@@ -0,0 +1,42 @@
+"""add_user_gym_membership_status
+
+Revision ID: d2a4c6e8f0b1
+Revises: c1f3b5d7e9a2
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a4c6e8f0b1'
+down_revision = 'c1f3b5d7e9a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'user_gyms',
+        sa.Column('membership_status', sa.String(length=20), nullable=False, server_default='active')
+    )
+    # Las membresías ya desactivadas parten como expiradas
+    op.execute("UPDATE user_gyms SET membership_status = 'expired' WHERE is_active = false")
+
+    # CONCURRENTLY para no bloquear escrituras en user_gyms
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_gyms_status_expires_at',
+            'user_gyms',
+            ['membership_status', 'membership_expires_at'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_gyms_status_expires_at', table_name='user_gyms', postgresql_concurrently=True)
+    op.drop_column('user_gyms', 'membership_status')
@@ -0,0 +1,43 @@
+"""add_class_session_period_gist_indexes
+
+Revision ID: d5a7c9e1f3b4
+Revises: c4f6e8a0b2d3
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a7c9e1f3b4'
+down_revision = 'c4f6e8a0b2d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # btree_gist permite combinar columnas escalares (trainer_id, gym_id, room)
+    # con el rango temporal en un mismo índice GiST
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    # Índices de solapamiento para la detección de conflictos de entrenador y sala
+    # (tstzrange && tstzrange). Se crean como índices y no como restricciones de
+    # exclusión para no fallar con solapamientos ya existentes en el histórico.
+    # CONCURRENTLY para no bloquear escrituras en class_session
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_class_session_trainer_period "
+            "ON class_session USING gist (trainer_id, tstzrange(start_time, end_time, '[)')) "
+            "WHERE status <> 'CANCELLED'"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_class_session_room_period "
+            "ON class_session USING gist (gym_id, room, tstzrange(start_time, end_time, '[)')) "
+            "WHERE status <> 'CANCELLED' AND room IS NOT NULL"
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_class_session_room_period")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_class_session_trainer_period")
@@ -0,0 +1,86 @@
+"""add_event_refund_jobs
+
+Revision ID: e6b8d0f2a4c5
+Revises: d5a7c9e1f3b4
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b8d0f2a4c5'
+down_revision = 'd5a7c9e1f3b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    job_status = sa.Enum('PENDING', 'RUNNING', 'COMPLETED', 'COMPLETED_WITH_ERRORS',
+                         name='eventrefundjobstatus')
+    action_type = sa.Enum('REFUND', 'CANCEL_PAYMENT', name='eventrefundactiontype')
+    item_status = sa.Enum('PENDING', 'SUCCEEDED', 'FAILED', name='eventrefunditemstatus')
+
+    op.create_table(
+        'event_refund_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id'), nullable=False),
+        sa.Column('gym_id', sa.Integer(), sa.ForeignKey('gyms.id'), nullable=False),
+        sa.Column('created_by_user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=True),
+        sa.Column('stripe_account_id', sa.String(length=255), nullable=True),
+        sa.Column('reason', sa.Text(), nullable=True),
+        sa.Column('status', job_status, nullable=False, server_default='PENDING'),
+        sa.Column('total_items', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('succeeded_items', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed_items', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('scheduled_refund_cents', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('refunded_cents', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_event_refund_jobs_id'), 'event_refund_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_event_refund_jobs_event_id'), 'event_refund_jobs', ['event_id'], unique=False)
+    op.create_index(op.f('ix_event_refund_jobs_gym_id'), 'event_refund_jobs', ['gym_id'], unique=False)
+    op.create_index(op.f('ix_event_refund_jobs_status'), 'event_refund_jobs', ['status'], unique=False)
+
+    op.create_table(
+        'event_refund_job_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.Integer(), sa.ForeignKey('event_refund_jobs.id', ondelete='CASCADE'),
+                  nullable=False),
+        sa.Column('participation_id', sa.Integer(), sa.ForeignKey('event_participations.id'), nullable=False),
+        sa.Column('member_id', sa.Integer(), nullable=False),
+        sa.Column('action', action_type, nullable=False),
+        sa.Column('payment_intent_id', sa.String(length=255), nullable=True),
+        sa.Column('amount_cents', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('status', item_status, nullable=False, server_default='PENDING'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('stripe_object_id', sa.String(length=255), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('job_id', 'participation_id', name='uq_event_refund_job_item_participation')
+    )
+    op.create_index(op.f('ix_event_refund_job_items_id'), 'event_refund_job_items', ['id'], unique=False)
+    op.create_index('ix_event_refund_job_items_job_status', 'event_refund_job_items',
+                    ['job_id', 'status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_event_refund_job_items_job_status', table_name='event_refund_job_items')
+    op.drop_index(op.f('ix_event_refund_job_items_id'), table_name='event_refund_job_items')
+    op.drop_table('event_refund_job_items')
+
+    op.drop_index(op.f('ix_event_refund_jobs_status'), table_name='event_refund_jobs')
+    op.drop_index(op.f('ix_event_refund_jobs_gym_id'), table_name='event_refund_jobs')
+    op.drop_index(op.f('ix_event_refund_jobs_event_id'), table_name='event_refund_jobs')
+    op.drop_index(op.f('ix_event_refund_jobs_id'), table_name='event_refund_jobs')
+    op.drop_table('event_refund_jobs')
+
+    sa.Enum(name='eventrefunditemstatus').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='eventrefundactiontype').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='eventrefundjobstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,31 @@
+"""add_event_participation_payment_expiry_index
+
+Revision ID: f7c9e1a3b5d6
+Revises: e6b8d0f2a4c5
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c9e1a3b5d6'
+down_revision = 'e6b8d0f2a4c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Índice para el job de expiración de pagos pendientes
+    # (payment_status = 'PENDING' AND payment_expiry < now ORDER BY payment_expiry).
+    # CONCURRENTLY para no bloquear escrituras en event_participations
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_event_participation_payment_expiry "
+            "ON event_participations (payment_status, payment_expiry)"
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_event_participation_payment_expiry")
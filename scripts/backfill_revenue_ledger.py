@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Carga el histórico de pagos y reembolsos de Stripe en el libro de ingresos.
+
+Recorre la cuenta de la plataforma y la cuenta de Stripe Connect de cada
+gimnasio activo (o solo la de --gym-id) con auto-paginación. Es idempotente:
+se puede repetir sobre el mismo periodo sin duplicar movimientos.
+
+Uso:
+    python scripts/backfill_revenue_ledger.py --since 2025-01-01
+    python scripts/backfill_revenue_ledger.py --since 2025-01-01 --until 2025-06-30 --gym-id 4
+"""
+
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stripe
+
+from app.core.config import get_settings
+from app.db.session import SessionLocal
+from app.models.stripe_profile import GymStripeAccount
+from app.services.revenue_ledger import revenue_ledger_service
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill del libro de ingresos desde Stripe")
+    parser.add_argument("--since", required=True, type=_parse_date, help="Fecha de inicio (YYYY-MM-DD)")
+    parser.add_argument("--until", type=_parse_date, help="Fecha de fin (YYYY-MM-DD)")
+    parser.add_argument("--gym-id", type=int, help="Solo la cuenta de este gimnasio")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if not settings.STRIPE_SECRET_KEY:
+        logger.error("STRIPE_SECRET_KEY no configurada")
+        sys.exit(1)
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+
+    db = SessionLocal()
+    try:
+        query = db.query(GymStripeAccount).filter(GymStripeAccount.is_active == True)
+        if args.gym_id:
+            query = query.filter(GymStripeAccount.gym_id == args.gym_id)
+        # None = cuenta de la plataforma (pagos antiguos con metadata gym_id)
+        accounts = ([] if args.gym_id else [None]) + [account.stripe_account_id for account in query]
+
+        for stripe_account in accounts:
+            try:
+                counts = revenue_ledger_service.backfill(
+                    db, since=args.since, until=args.until, stripe_account=stripe_account
+                )
+                logger.info(f"{stripe_account or 'plataforma'}: {counts}")
+            except stripe.error.StripeError as e:
+                logger.error(f"Error en el backfill de {stripe_account or 'plataforma'}: {str(e)}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
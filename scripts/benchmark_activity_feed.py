@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark de ingesta de eventos del Activity Feed contra un Redis real.
+
+Compara el procesamiento evento a evento (handlers `on_*`) con la ingesta
+por lotes (`process_batch_events`) y muestra eventos/segundo de cada modo.
+
+Uso:
+    REDIS_URL=redis://localhost:6379/0 python scripts/benchmark_activity_feed.py --events 5000 --gyms 5 --batch-size 200
+
+Usa gym_ids altos (a partir de --gym-offset) y borra sus claves al terminar.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from redis.asyncio import Redis
+
+from app.services.activity_feed_service import ActivityFeedService
+from app.services.activity_aggregator import ActivityAggregator
+
+
+EVENT_TEMPLATES = [
+    {"type": "class_checkin", "class_name": "CrossFit"},
+    {"type": "class_checkin", "class_name": "Spinning"},
+    {"type": "achievement_unlocked", "achievement_type": "consistency"},
+    {"type": "personal_record", "record_type": "weight"},
+    {"type": "goal_completed", "goal_type": "weekly"},
+    {"type": "streak_milestone", "streak_days": 30},
+    {"type": "class_completed", "total_participants": 18, "duration_minutes": 60},
+]
+
+HANDLERS = {
+    "class_checkin": "on_class_checkin",
+    "achievement_unlocked": "on_achievement_unlocked",
+    "streak_milestone": "on_streak_milestone",
+    "personal_record": "on_personal_record",
+    "goal_completed": "on_goal_completed",
+    "class_completed": "on_class_completed",
+}
+
+
+def generate_events(count: int, gyms: int, gym_offset: int):
+    rng = random.Random(42)
+    return [
+        {**rng.choice(EVENT_TEMPLATES), "gym_id": gym_offset + rng.randrange(gyms)}
+        for _ in range(count)
+    ]
+
+
+async def cleanup(redis: Redis, gyms: int, gym_offset: int):
+    for gym_id in range(gym_offset, gym_offset + gyms):
+        keys = [key async for key in redis.scan_iter(match=f"gym:{gym_id}:*")]
+        if keys:
+            await redis.delete(*keys)
+
+
+async def run_individual(aggregator: ActivityAggregator, events) -> float:
+    start = time.perf_counter()
+    for event in events:
+        await getattr(aggregator, HANDLERS[event["type"]])(event)
+    return time.perf_counter() - start
+
+
+async def run_batched(aggregator: ActivityAggregator, events, batch_size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(events), batch_size):
+        await aggregator.process_batch_events(events[i:i + batch_size])
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta del Activity Feed")
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--gyms", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--gym-offset", type=int, default=900000)
+    args = parser.parse_args()
+
+    redis = Redis.from_url(args.redis_url, decode_responses=True)
+    await redis.ping()
+
+    aggregator = ActivityAggregator(ActivityFeedService(redis))
+    events = generate_events(args.events, args.gyms, args.gym_offset)
+
+    print(f"📊 {args.events} eventos, {args.gyms} gimnasios, lotes de {args.batch_size}")
+    print("=" * 60)
+
+    try:
+        await cleanup(redis, args.gyms, args.gym_offset)
+        individual = await run_individual(aggregator, events)
+        print(f"Evento a evento: {individual:.2f}s -> {args.events / individual:,.0f} eventos/s")
+
+        await cleanup(redis, args.gyms, args.gym_offset)
+        batched = await run_batched(aggregator, events, args.batch_size)
+        print(f"Por lotes:       {batched:.2f}s -> {args.events / batched:,.0f} eventos/s")
+
+        print(f"🚀 Mejora: {individual / batched:.1f}x")
+    finally:
+        await cleanup(redis, args.gyms, args.gym_offset)
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark del listado de eventos: paginación por offset vs. por cursor.
+
+Crea N eventos en un gimnasio (con participaciones en uno de cada diez) en una
+base de datos desechable y mide el tiempo por página de
+`get_events_with_counts` (offset) y de `get_events_page` (keyset sobre
+(start_time, id), con conteos y estado del usuario) al principio, en medio y
+al final del listado.
+
+Uso:
+    python scripts/benchmark_event_listing.py --events 10000 --page-size 50
+    python scripts/benchmark_event_listing.py --database-url postgresql://localhost/bench_events
+
+La base de datos debe estar vacía: se crean las tablas necesarias y se borran al terminar.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models.event import Event, EventParticipation, EventParticipationStatus, EventStatus
+from app.models.user import User
+from app.repositories.event import event_repository
+
+GYM_ID = 1
+VIEWER_ID = 1
+TABLES = [User.__table__, Event.__table__, EventParticipation.__table__]
+
+
+def seed(db, events: int):
+    base = datetime(2026, 1, 1, 8, 0)
+    db.execute(insert(Event), [
+        dict(gym_id=GYM_ID, title=f"Evento {i}", start_time=base + timedelta(minutes=30 * i),
+             end_time=base + timedelta(minutes=30 * i + 60), max_participants=20,
+             status=EventStatus.SCHEDULED, creator_id=VIEWER_ID, is_paid=False)
+        for i in range(events)
+    ])
+    ids = [row.id for row in db.query(Event.id).order_by(Event.start_time, Event.id)]
+    db.execute(insert(EventParticipation), [
+        dict(event_id=event_id, gym_id=GYM_ID, member_id=member_id,
+             status=EventParticipationStatus.REGISTERED if member_id <= 3 else EventParticipationStatus.WAITING_LIST)
+        for event_id in ids[::10] for member_id in range(1, 6)
+    ])
+    db.commit()
+    return ids
+
+
+def timed(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del listado de eventos")
+    parser.add_argument("--database-url", default="sqlite://")
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    Base.metadata.create_all(engine, tables=TABLES)
+    db = sessionmaker(bind=engine)()
+    try:
+        ids = seed(db, args.events)
+        print(f"{args.events} eventos, páginas de {args.page_size}, media de {args.repeat} repeticiones\n")
+        print(f"{'posición':>10} {'offset (ms)':>12} {'cursor (ms)':>12}")
+        for position in (0, len(ids) // 2, len(ids) - args.page_size - 1):
+            anchor = db.get(Event, ids[position - 1]) if position else None
+            after = (anchor.start_time, anchor.id) if anchor else None
+            offset_ms = timed(lambda: event_repository.get_events_with_counts(
+                db, skip=position, limit=args.page_size, gym_id=GYM_ID), args.repeat)
+            keyset_ms = timed(lambda: event_repository.get_events_page(
+                db, gym_id=GYM_ID, viewer_id=VIEWER_ID, after=after, limit=args.page_size), args.repeat)
+            print(f"{position:>10} {offset_ms:>12.2f} {keyset_ms:>12.2f}")
+    finally:
+        db.close()
+        Base.metadata.drop_all(engine, tables=TABLES)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -27,7 +27,7 @@ from dotenv import load_dotenv
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.models.event import Event
-from app.services.event_payment_service import EventPaymentService
+from app.services.event_refund_jobs import event_refund_job_service
 from app.db.session import SessionLocal
 
 # Cargar variables de entorno
@@ -83,31 +83,32 @@ async def test_cancellation():
         print("🚀 Iniciando cancelación con reembolsos automáticos...")
         print()
 
-        # Ejecutar cancelación
-        payment_service = EventPaymentService()
-
-        result = await payment_service.cancel_event_with_full_refunds(
+        # Ejecutar cancelación: encolar el trabajo de reembolsos y ejecutarlo
+        job = event_refund_job_service.enqueue_cancellation(
             db=db,
             event=event,
             gym_id=event.gym_id,
             cancelled_by_user_id=1,  # User ID del admin
             reason="Prueba de sistema de reembolsos automáticos"
         )
+        result = await event_refund_job_service.run_job(job.id, SessionLocal)
+        db.expire_all()
+        result = result or event_refund_job_service.progress(db, job)
 
         print()
         print("=" * 100)
         print("✅ RESULTADO DE LA CANCELACIÓN:")
         print("=" * 100)
-        print(f"   Total participaciones: {result['total_participations']}")
-        print(f"   Reembolsos procesados: {result['refunds_processed']}")
-        print(f"   Reembolsos fallidos: {result['refunds_failed']}")
-        print(f"   Pagos cancelados: {result['payments_cancelled']}")
-        print(f"   Total reembolsado: ${result['total_refunded_cents']/100:.2f} {result['currency']}")
+        print(f"   Trabajo de reembolsos: {result['job_id']} ({result['status']})")
+        print(f"   Operaciones de Stripe: {result['total_items']}")
+        print(f"   Correctas: {result['succeeded_items']}")
+        print(f"   Fallidas: {result['failed_items']}")
+        print(f"   Total reembolsado: ${result['refunded_cents']/100:.2f} {event.currency}")
         print()
 
-        if result['failed_refunds']:
-            print("⚠️  REEMBOLSOS FALLIDOS:")
-            for failed in result['failed_refunds']:
+        if result['failures']:
+            print("⚠️  OPERACIONES FALLIDAS:")
+            for failed in result['failures']:
                 print(f"   • Participación {failed['participation_id']}: {failed['error']}")
             print()
 
@@ -150,21 +150,21 @@ async def test_session_cache():
             time_after = time.time() - start_time
             print(f"✅ Después de invalidación (BD): {len(sessions_after_invalidation)} sesiones en {time_after:.3f}s")
         
-        print("\n📊 PRUEBA 6: Verificar tracking sets")
+        print("\n📊 PRUEBA 6: Verificar namespaces versionados")
         print("-" * 40)
         
-        # Verificar que se crearon los tracking sets
-        gym_tracking_key = f"cache_keys:sessions:{GYM_ID}"
-        trainer_tracking_key = f"cache_keys:sessions:trainer:{TRAINER_ID}"
-        class_tracking_key = f"cache_keys:sessions:class:{CLASS_ID}"
-        
-        gym_keys = await redis_client.smembers(gym_tracking_key)
-        trainer_keys = await redis_client.smembers(trainer_tracking_key)
-        class_keys = await redis_client.smembers(class_tracking_key)
+        # Cada invalidación incrementa la generación de los namespaces
+        from app.services.cache_service import cache_service
+        gym_version, trainer_version, class_version = await cache_service.namespace_versions(
+            redis_client,
+            f"sessions:gym:{GYM_ID}",
+            f"sessions:trainer:{TRAINER_ID}",
+            f"sessions:class:{CLASS_ID}",
+        )
         
-        print(f"🔑 Tracking keys para gym {GYM_ID}: {len(gym_keys)} claves")
-        print(f"🔑 Tracking keys para trainer {TRAINER_ID}: {len(trainer_keys)} claves")
-        print(f"🔑 Tracking keys para class {CLASS_ID}: {len(class_keys)} claves")
+        print(f"🔑 Generación de sesiones para gym {GYM_ID}: {gym_version}")
+        print(f"🔑 Generación de sesiones para trainer {TRAINER_ID}: {trainer_version}")
+        print(f"🔑 Generación de sesiones para class {CLASS_ID}: {class_version}")
         
         print("\n✅ PRUEBAS COMPLETADAS EXITOSAMENTE")
         print("=" * 60)
@@ -172,7 +172,7 @@ async def test_session_cache():
         print("- ✅ Caché de sesiones funcionando correctamente")
         print("- ⚡ Mejoras significativas de rendimiento")
         print("- 🔄 Invalidación inteligente operativa")
-        print("- 📊 Tracking sets configurados correctamente")
+        print("- 📊 Namespaces versionados configurados correctamente")
         
     except Exception as e:
         print(f"❌ ERROR durante las pruebas: {e}")
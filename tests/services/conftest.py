@@ -0,0 +1,261 @@
+"""
+Fixtures compartidas de los tests de servicios.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+import stripe
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.base import Base
+
+
+class _FakePipeline:
+    """Pipeline que encola las operaciones y las aplica en ``execute``."""
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        method = getattr(self._redis, name)
+        return lambda *args, **kwargs: self._ops.append((method, args, kwargs))
+
+    async def execute(self):
+        return [await method(*args, **kwargs) for method, args, kwargs in self._ops]
+
+
+class FakeRedis:
+    """Redis en memoria con las operaciones que usan las cachés de los servicios."""
+
+    def __init__(self):
+        self.data = {}
+        self.hashes = {}
+        self.scans = 0
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        return True
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+    async def expire(self, key, seconds):
+        return key in self.data or key in self.hashes
+
+    async def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    async def hmget(self, key, fields):
+        stored = self.hashes.get(key, {})
+        return [stored.get(field) for field in fields]
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    def scan_iter(self, match=None):
+        self.scans += 1
+        raise AssertionError("SCAN no debe ejecutarse")
+
+    async def smembers(self, key):
+        raise AssertionError("Los tracking sets ya no se usan")
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def sqlite_sessionmaker():
+    """
+    Fábrica de sesiones sobre un SQLite en memoria con solo las tablas de los
+    modelos indicados: ``sqlite_sessionmaker(Gym, UserGym)``. La conexión es
+    única, así que las sesiones abiertas desde otros hilos ven los mismos datos.
+    """
+    engines = []
+
+    def factory(*models):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine, tables=[model.__table__ for model in models])
+        engines.append(engine)
+        return sessionmaker(bind=engine, autoflush=False)
+
+    yield factory
+    for engine in engines:
+        engine.dispose()
+
+
+class StripeStub:
+    """Estado compartido del servidor que imita la API de Stripe."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = []
+        self.responses = {}          # Idempotency-Key -> respuesta ya servida
+        self.rate_limited = 0        # Número de próximas peticiones que reciben 429
+        self.declined = set()        # Payment Intents cuyo reembolso o cancelación falla
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lists = {}              # Ruta de listado (p. ej. /v1/invoices) -> objetos
+        self.page_size = 100         # Tamaño máximo de página de los listados
+
+    def handle_list(self, path, headers, query):
+        with self.lock:
+            self.requests.append({
+                "path": path,
+                "idempotency_key": None,
+                "stripe_account": headers.get("Stripe-Account"),
+                "form": query,
+            })
+        items = self.lists.get(path, [])
+        start = 0
+        if query.get("starting_after"):
+            start = next(i for i, item in enumerate(items) if item["id"] == query["starting_after"]) + 1
+        size = min(int(query.get("limit", 10)), self.page_size)
+        page = items[start:start + size]
+        return 200, {"object": "list", "url": path, "has_more": start + size < len(items), "data": page}
+
+    def handle(self, path, headers, form):
+        key = headers.get("Idempotency-Key")
+        with self.lock:
+            self.requests.append({
+                "path": path,
+                "idempotency_key": key,
+                "stripe_account": headers.get("Stripe-Account"),
+                "form": form,
+            })
+            if self.rate_limited > 0:
+                self.rate_limited -= 1
+                return 429, {"error": {"type": "invalid_request_error", "code": "rate_limit",
+                                       "message": "Too many requests"}}
+            if key in self.responses:
+                return 200, self.responses[key]
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            time.sleep(self.delay)
+            if path.startswith(("/v1/products", "/v1/prices")):
+                body = self.upsert_catalog_object(path, form)
+            elif path == "/v1/refunds":
+                if form.get("payment_intent") in self.declined:
+                    return 402, {"error": {"type": "card_error", "code": "charge_disputed",
+                                           "message": "Charge is disputed"}}
+                body = {"id": f"re_{len(self.responses) + 1}", "object": "refund", "status": "succeeded",
+                        "amount": int(form["amount"])}
+            else:
+                intent_id = path.split("/")[3]
+                if intent_id in self.declined:
+                    return 400, {"error": {"type": "invalid_request_error",
+                                           "code": "payment_intent_unexpected_state",
+                                           "message": "PaymentIntent cannot be canceled"}}
+                body = {"id": intent_id, "object": "payment_intent", "status": "canceled"}
+            with self.lock:
+                self.responses[key] = body
+            return 200, body
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def upsert_catalog_object(self, path, form):
+        """Crea (POST /v1/products) o modifica (POST /v1/products/{id}) productos y precios."""
+        collection = "/" + "/".join(path.strip("/").split("/")[:2])
+        fields = {}
+        for key, value in form.items():
+            if "[" in key:
+                parent, child = key.rstrip("]").split("[", 1)
+                fields.setdefault(parent, {})[child] = value
+            elif key == "unit_amount":
+                fields[key] = int(value)
+            elif key == "active":
+                fields[key] = value == "true"
+            else:
+                fields[key] = value
+        with self.lock:
+            items = self.lists.setdefault(collection, [])
+            if path == collection:
+                kind, prefix = ("product", "prod") if collection == "/v1/products" else ("price", "price")
+                obj = {"id": f"{prefix}_new_{len(items) + 1}", "object": kind,
+                       "active": True, "metadata": {}, "recurring": None}
+                items.append(obj)
+            else:
+                obj = next(item for item in items if item["id"] == path.split("/")[3])
+            metadata = fields.pop("metadata", None)
+            obj.update(fields)
+            if metadata:
+                obj["metadata"] = {**obj["metadata"], **metadata}
+            return dict(obj)
+
+
+@pytest.fixture
+def stripe_stub():
+    """
+    Servidor HTTP local que imita la API de Stripe (/v1/refunds,
+    /v1/payment_intents/{id}/cancel, productos y precios, y listados
+    paginados con GET) y al que se redirige el SDK real.
+    """
+    stub = StripeStub()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length).decode()
+            form = {key: values[0] for key, values in parse_qs(raw).items()}
+            self._reply(*stub.handle(self.path, self.headers, form))
+
+        def do_GET(self):
+            path, _, raw = self.path.partition("?")
+            query = {key: values[0] for key, values in parse_qs(raw).items()}
+            self._reply(*stub.handle_list(path, self.headers, query))
+
+        def _reply(self, status_code, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    previous = (stripe.api_base, stripe.api_key, stripe.max_network_retries)
+    stripe.api_base = f"http://127.0.0.1:{server.server_address[1]}"
+    stripe.api_key = "sk_test_stub"
+    stripe.max_network_retries = 0
+    try:
+        yield stub
+    finally:
+        stripe.api_base, stripe.api_key, stripe.max_network_retries = previous
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,122 @@
+"""
+Tests para el broadcaster del Activity Feed en tiempo real.
+
+Verifica el reparto por gimnasio desde la suscripción compartida, el
+descarte de mensajes para clientes lentos y las métricas de conexiones.
+"""
+
+import asyncio
+import json
+
+import pytest
+from unittest.mock import Mock
+
+from app.services.activity_feed_broadcaster import ActivityFeedBroadcaster
+
+
+class FakePubSub:
+    """PubSub falso que entrega los mensajes encolados en `messages`."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.patterns = []
+
+    async def psubscribe(self, pattern):
+        self.patterns.append(pattern)
+
+    async def get_message(self, timeout=None):
+        if self.messages:
+            return self.messages.pop(0)
+        await asyncio.sleep(0.01)
+        return None
+
+    async def aclose(self):
+        pass
+
+
+def _pmessage(gym_id, activity):
+    return {
+        "type": "pmessage",
+        "pattern": "gym:*:feed:updates",
+        "channel": f"gym:{gym_id}:feed:updates",
+        "data": json.dumps(activity)
+    }
+
+
+@pytest.fixture
+def broadcaster():
+    broadcaster = ActivityFeedBroadcaster()
+    broadcaster._ensure_listener = Mock()
+    return broadcaster
+
+
+class TestActivityFeedBroadcaster:
+
+    @pytest.mark.asyncio
+    async def test_dispatch_fans_out_only_to_gym_subscribers(self, broadcaster):
+        gym_1_a = broadcaster.subscribe(Mock(), 1, transport="sse")
+        gym_1_b = broadcaster.subscribe(Mock(), 1, transport="websocket")
+        gym_2 = broadcaster.subscribe(Mock(), 2, transport="sse")
+
+        delivered = broadcaster._dispatch("gym:1:feed:updates", json.dumps({"id": "a1", "count": 5}))
+
+        assert delivered == 2
+        assert await gym_1_a.receive() == {"id": "a1", "count": 5}
+        assert await gym_1_b.receive() == {"id": "a1", "count": 5}
+        assert gym_2.queue.empty()
+
+    @pytest.mark.asyncio
+    async def test_slow_client_drops_oldest_and_is_disconnected(self, broadcaster):
+        broadcaster.CLIENT_QUEUE_SIZE = 2
+        broadcaster.MAX_CONSECUTIVE_DROPS = 3
+        slow = broadcaster.subscribe(Mock(), 1, transport="websocket")
+
+        for i in range(4):
+            broadcaster._dispatch("gym:1:feed:updates", json.dumps({"id": i}))
+
+        # Cola de 2: se descartaron los mensajes 0 y 1
+        assert slow.dropped == 2
+        assert [await slow.receive(), await slow.receive()] == [{"id": 2}, {"id": 3}]
+
+        for i in range(4, 10):
+            broadcaster._dispatch("gym:1:feed:updates", json.dumps({"id": i}))
+
+        assert slow.closed is True
+        assert slow.close_reason == "slow_consumer"
+        assert await slow.receive() is None
+        stats = broadcaster.get_stats()
+        assert stats["connections"] == 0
+        assert stats["slow_disconnects"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stats_track_connections(self, broadcaster):
+        sse = broadcaster.subscribe(Mock(), 1, transport="sse")
+        broadcaster.subscribe(Mock(), 3, transport="websocket")
+
+        stats = broadcaster.get_stats()
+        assert stats["connections"] == 2
+        assert stats["connections_by_transport"] == {"sse": 1, "websocket": 1}
+        assert stats["gyms_connected"] == 2
+
+        broadcaster.unsubscribe(sse)
+        broadcaster.unsubscribe(sse)  # idempotente
+        assert broadcaster.get_stats()["connections"] == 1
+
+    @pytest.mark.asyncio
+    async def test_shared_listener_uses_single_pattern_subscription(self):
+        pubsub = FakePubSub([_pmessage(1, {"id": "x"}), _pmessage(9, {"id": "y"})])
+        redis = Mock()
+        redis.pubsub = Mock(return_value=pubsub)
+        broadcaster = ActivityFeedBroadcaster()
+
+        first = broadcaster.subscribe(redis, 1, transport="sse")
+        second = broadcaster.subscribe(redis, 1, transport="sse")
+
+        assert await asyncio.wait_for(first.receive(), timeout=1) == {"id": "x"}
+        assert await asyncio.wait_for(second.receive(), timeout=1) == {"id": "x"}
+        assert redis.pubsub.call_count == 1
+        assert pubsub.patterns == ["gym:*:feed:updates"]
+
+        await broadcaster.stop()
+        assert await first.receive() is None
+        assert broadcaster.get_stats()["listener_running"] is False
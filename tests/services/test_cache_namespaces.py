@@ -0,0 +1,98 @@
+"""
+Tests de la invalidación por namespaces versionados de la caché.
+"""
+
+import asyncio
+
+from pydantic import BaseModel
+
+from app.services.cache_service import CacheService
+from app.services.event import EventService
+from app.services.schedule import ClassCategoryService, ClassSessionService, GymHoursService, GymSpecialHoursService
+
+
+class Item(BaseModel):
+    id: int
+
+
+def _cached_fetch(redis_client, calls, namespaces):
+    async def db_fetch():
+        calls.append(1)
+        return [Item(id=len(calls))]
+
+    return asyncio.run(CacheService.get_or_set(
+        redis_client, "items:list", db_fetch, Item, is_list=True, namespaces=namespaces
+    ))
+
+
+class TestVersionedNamespaces:
+
+    def test_bump_invalidates_only_its_namespace(self, fake_redis):
+        async def scenario():
+            before = await CacheService.versioned_key(fake_redis, "k", "a", "b")
+            await CacheService.bump_namespaces(fake_redis, "b")
+            after = await CacheService.versioned_key(fake_redis, "k", "a", "b")
+            other = await CacheService.versioned_key(fake_redis, "k", "a")
+            return before, after, other
+
+        before, after, other = asyncio.run(scenario())
+        assert before == "k:ns:0.0"
+        assert after == "k:ns:0.1"
+        assert other == "k:ns:0"
+
+    def test_get_or_set_refetches_after_bump(self, fake_redis):
+        calls = []
+
+        assert _cached_fetch(fake_redis, calls, ["items:gym:1"])[0].id == 1
+        assert _cached_fetch(fake_redis, calls, ["items:gym:1"])[0].id == 1
+        asyncio.run(CacheService.bump_namespaces(fake_redis, "items:gym:1"))
+        assert _cached_fetch(fake_redis, calls, ["items:gym:1"])[0].id == 2
+        assert len(calls) == 2
+
+
+class TestAdoptedNamespaces:
+
+    def test_session_invalidation_is_incr_without_scan(self, fake_redis):
+        fake_redis.data["schedule:session:detail:7"] = "{}"
+
+        asyncio.run(ClassSessionService()._invalidate_session_caches(
+            fake_redis, gym_id=1, session_id=7, trainer_id=2, class_id=3
+        ))
+
+        assert "schedule:session:detail:7" not in fake_redis.data
+        assert {k: v for k, v in fake_redis.data.items() if k.startswith("cache_ns:")} == {
+            "cache_ns:sessions:gym:1": "1",
+            "cache_ns:sessions:trainer:2": "1",
+            "cache_ns:sessions:class:3": "1",
+        }
+        assert fake_redis.scans == 0
+
+    def test_event_invalidation_without_gym_bumps_all_lists(self, fake_redis):
+        service = EventService()
+
+        asyncio.run(service.invalidate_event_caches(fake_redis, event_id=9))
+
+        assert fake_redis.data["cache_ns:events:all"] == "1"
+        assert fake_redis.data["cache_ns:event:9"] == "1"
+
+        asyncio.run(service.invalidate_event_caches(fake_redis, event_id=9, gym_id=4))
+        assert fake_redis.data["cache_ns:events:all"] == "1"
+        assert fake_redis.data["cache_ns:events:gym:4"] == "1"
+
+    def test_hours_special_days_and_categories_bump_their_namespaces(self, fake_redis):
+        fake_redis.data["special_day:detail:4"] = "{}"
+        fake_redis.data["category:custom:detail:5"] = "{}"
+
+        async def scenario():
+            await GymHoursService()._invalidate_gym_hours_cache(fake_redis, gym_id=1, day=2)
+            await GymSpecialHoursService()._invalidate_special_hours_cache(fake_redis, gym_id=1, special_day_id=4)
+            await ClassCategoryService()._invalidate_custom_category_caches(fake_redis, gym_id=1, category_id=5)
+
+        asyncio.run(scenario())
+
+        # Horarios semanales y días especiales comparten el namespace del calendario
+        assert fake_redis.data["cache_ns:gym_hours:1"] == "2"
+        assert fake_redis.data["cache_ns:special_days:1"] == "1"
+        assert fake_redis.data["cache_ns:categories:gym:1"] == "1"
+        assert "special_day:detail:4" not in fake_redis.data
+        assert "category:custom:detail:5" not in fake_redis.data
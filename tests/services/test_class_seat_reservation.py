@@ -0,0 +1,187 @@
+"""
+Tests del motor de reserva de plazas en clases.
+
+Usa una base de datos SQLite en fichero con varias conexiones reales para
+que las inscripciones concurrentes compitan por la misma sesión: el UPDATE
+condicional de `reserve_seat` debe impedir cualquier sobreventa.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models.schedule import (
+    Class,
+    ClassSession,
+    ClassParticipation,
+    ClassSessionStatus,
+    ClassParticipationStatus,
+    ClassDifficultyLevel,
+)
+from app.repositories.schedule import class_session_repository
+from app.services.schedule import ClassParticipationService
+
+GYM_ID = 1
+CAPACITY = 20
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'seats.db'}",
+        connect_args={"timeout": 30, "check_same_thread": False},
+    )
+    Base.metadata.create_all(
+        engine,
+        tables=[Class.__table__, ClassSession.__table__, ClassParticipation.__table__],
+    )
+    factory = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def class_session_id(session_factory):
+    db = session_factory()
+    class_obj = Class(
+        name="CrossFit", duration=60, max_capacity=CAPACITY,
+        difficulty_level=ClassDifficultyLevel.BEGINNER, gym_id=GYM_ID,
+    )
+    db.add(class_obj)
+    db.flush()
+    start = datetime.now(timezone.utc) + timedelta(days=1)
+    session = ClassSession(
+        class_id=class_obj.id, trainer_id=1, gym_id=GYM_ID,
+        start_time=start, end_time=start + timedelta(hours=1),
+        status=ClassSessionStatus.SCHEDULED, current_participants=0,
+    )
+    db.add(session)
+    db.commit()
+    session_id = session.id
+    db.close()
+    return session_id
+
+
+@pytest.fixture(autouse=True)
+def gym_in_utc():
+    gym = MagicMock(timezone="UTC")
+    with patch("app.repositories.gym.gym_repository.get", return_value=gym):
+        yield
+
+
+def _register(session_factory, session_id, member_id, join_waitlist=False):
+    db = session_factory()
+    try:
+        participation = asyncio.run(ClassParticipationService().register_for_class(
+            db, member_id=member_id, session_id=session_id, gym_id=GYM_ID,
+            join_waitlist=join_waitlist,
+        ))
+        return participation.status
+    except HTTPException as e:
+        return e.detail
+    finally:
+        db.close()
+
+
+def _statuses(session_factory, session_id):
+    db = session_factory()
+    try:
+        rows = db.query(ClassParticipation).filter(ClassParticipation.session_id == session_id).all()
+        counts = {}
+        for row in rows:
+            counts[row.status] = counts.get(row.status, 0) + 1
+        current = db.get(ClassSession, session_id).current_participants
+        return counts, current
+    finally:
+        db.close()
+
+
+class TestSeatReservation:
+
+    def test_reserve_seat_respects_override_capacity(self, session_factory, class_session_id):
+        db = session_factory()
+        db.query(ClassSession).filter(ClassSession.id == class_session_id).update({"override_capacity": 2})
+        db.commit()
+
+        assert class_session_repository.reserve_seat(db, session_id=class_session_id) == 1
+        assert class_session_repository.reserve_seat(db, session_id=class_session_id) == 2
+        assert class_session_repository.reserve_seat(db, session_id=class_session_id) is None
+        assert class_session_repository.release_seat(db, session_id=class_session_id) == 1
+        db.close()
+
+    def test_concurrent_registrations_never_overbook(self, session_factory, class_session_id):
+        members = range(1, 301)
+        with ThreadPoolExecutor(max_workers=40) as pool:
+            results = list(pool.map(
+                lambda member_id: _register(session_factory, class_session_id, member_id),
+                members,
+            ))
+
+        assert results.count(ClassParticipationStatus.REGISTERED) == CAPACITY
+        assert results.count("La sesión está llena") == len(members) - CAPACITY
+        counts, current = _statuses(session_factory, class_session_id)
+        assert counts == {ClassParticipationStatus.REGISTERED: CAPACITY}
+        assert current == CAPACITY
+
+    def test_concurrent_registrations_overflow_to_waitlist(self, session_factory, class_session_id):
+        with ThreadPoolExecutor(max_workers=40) as pool:
+            list(pool.map(
+                lambda member_id: _register(session_factory, class_session_id, member_id, join_waitlist=True),
+                range(1, 201),
+            ))
+
+        counts, current = _statuses(session_factory, class_session_id)
+        assert counts == {
+            ClassParticipationStatus.REGISTERED: CAPACITY,
+            ClassParticipationStatus.WAITLISTED: 200 - CAPACITY,
+        }
+        assert current == CAPACITY
+
+    def test_cancel_promotes_first_waitlisted_member(self, session_factory, class_session_id):
+        for member_id in range(1, CAPACITY + 3):
+            _register(session_factory, class_session_id, member_id, join_waitlist=True)
+
+        db = session_factory()
+        asyncio.run(ClassParticipationService().cancel_registration(
+            db, member_id=1, session_id=class_session_id, gym_id=GYM_ID
+        ))
+        db.close()
+
+        db = session_factory()
+        by_member = {
+            p.member_id: p.status
+            for p in db.query(ClassParticipation).filter(ClassParticipation.session_id == class_session_id)
+        }
+        db.close()
+        assert by_member[1] == ClassParticipationStatus.CANCELLED
+        assert by_member[CAPACITY + 1] == ClassParticipationStatus.REGISTERED
+        assert by_member[CAPACITY + 2] == ClassParticipationStatus.WAITLISTED
+        _counts, current = _statuses(session_factory, class_session_id)
+        assert current == CAPACITY
+
+    def test_cancelling_waitlisted_member_keeps_seat_count(self, session_factory, class_session_id):
+        for member_id in range(1, CAPACITY + 2):
+            _register(session_factory, class_session_id, member_id, join_waitlist=True)
+
+        db = session_factory()
+        cancelled = asyncio.run(ClassParticipationService().cancel_registration(
+            db, member_id=CAPACITY + 1, session_id=class_session_id, gym_id=GYM_ID
+        ))
+        assert cancelled.status == ClassParticipationStatus.CANCELLED
+        db.close()
+
+        _counts, current = _statuses(session_factory, class_session_id)
+        assert current == CAPACITY
+
+    def test_duplicate_registration_is_rejected(self, session_factory, class_session_id):
+        assert _register(session_factory, class_session_id, 7) == ClassParticipationStatus.REGISTERED
+        assert _register(session_factory, class_session_id, 7) == "Ya estás registrado en esta clase"
+        _counts, current = _statuses(session_factory, class_session_id)
+        assert current == 1
@@ -0,0 +1,127 @@
+"""
+Tests del listado de eventos paginado por cursor.
+
+Comprueban que cada página sale de una única consulta (eventos, conteos y
+estado del usuario), que el keyset ``(start_time, id)`` recorre todos los
+eventos sin duplicados aunque compartan hora de inicio, y el coste con 10k
+eventos en un gimnasio.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event as sa_event, insert
+
+from app.models.event import Event, EventParticipation, EventParticipationStatus, EventStatus, PaymentStatusType
+from app.models.user import User
+from app.services.event import EventService, decode_event_cursor, encode_event_cursor
+
+GYM_ID = 1
+VIEWER_ID = 7
+BASE = datetime(2026, 11, 1, 9, 0)
+
+
+@pytest.fixture
+def db(sqlite_sessionmaker):
+    session = sqlite_sessionmaker(Event, EventParticipation, User)()
+    yield session
+    session.close()
+
+
+def _seed_events(db, count, gym_id=GYM_ID, max_participants=10):
+    # Dos eventos por franja horaria para ejercitar el desempate por id
+    db.execute(insert(Event), [
+        dict(gym_id=gym_id, title=f"Evento {i}", start_time=BASE + timedelta(hours=i // 2),
+             end_time=BASE + timedelta(hours=i // 2, minutes=60), max_participants=max_participants,
+             status=EventStatus.SCHEDULED, creator_id=1, is_paid=False)
+        for i in range(count)
+    ])
+    db.commit()
+    return [row.id for row in db.query(Event.id).filter(Event.gym_id == gym_id).order_by(Event.start_time, Event.id)]
+
+
+def _participate(db, event_id, member_id, status=EventParticipationStatus.REGISTERED, **kwargs):
+    db.add(EventParticipation(event_id=event_id, gym_id=GYM_ID, member_id=member_id, status=status, **kwargs))
+
+
+def _count_queries(db):
+    statements = []
+    sa_event.listen(db.get_bind(), "before_cursor_execute",
+                    lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+class TestEventsPage:
+
+    def test_counts_and_viewer_status_in_one_query(self, db):
+        ids = _seed_events(db, 3, max_participants=2)
+        db.add(User(id=VIEWER_ID, auth0_id="auth0|viewer", email="viewer@example.com"))
+        _participate(db, ids[0], 1)
+        _participate(db, ids[0], 2)
+        _participate(db, ids[0], 3, status=EventParticipationStatus.WAITING_LIST)
+        _participate(db, ids[0], VIEWER_ID, status=EventParticipationStatus.WAITING_LIST)
+        _participate(db, ids[1], VIEWER_ID, status=EventParticipationStatus.PENDING_PAYMENT,
+                     payment_status=PaymentStatusType.PENDING)
+        _participate(db, ids[2], 4, status=EventParticipationStatus.CANCELLED)
+        db.commit()
+        statements = _count_queries(db)
+
+        page = EventService().get_events_page(db, gym_id=GYM_ID, viewer_id="auth0|viewer")
+
+        assert len(statements) == 1
+        assert [(e.id, e.participants_count, e.waiting_list_count) for e in page.items] == [
+            (ids[0], 2, 2), (ids[1], 0, 0), (ids[2], 0, 0)
+        ]
+        assert [(e.viewer_status, e.viewer_payment_status) for e in page.items] == [
+            (EventParticipationStatus.WAITING_LIST, PaymentStatusType.PENDING),
+            (EventParticipationStatus.PENDING_PAYMENT, PaymentStatusType.PENDING),
+            (None, None),
+        ]
+        assert page.next_cursor is None
+
+        available = EventService().get_events_page(db, gym_id=GYM_ID, viewer_id=VIEWER_ID, only_available=True)
+        assert [e.id for e in available.items] == ids[1:]
+
+    def test_keyset_pages_cover_all_events_once(self, db):
+        ids = _seed_events(db, 25)
+        _seed_events(db, 5, gym_id=2)
+        service = EventService()
+
+        seen, cursor = [], None
+        while True:
+            page = service.get_events_page(db, gym_id=GYM_ID, cursor=cursor, limit=4)
+            seen.extend(e.id for e in page.items)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        assert seen == ids
+
+    def test_cursor_round_trip_and_invalid_cursor(self, db):
+        assert decode_event_cursor(encode_event_cursor(BASE, 42)) == (BASE, 42)
+        with pytest.raises(ValueError):
+            EventService().get_events_page(db, gym_id=GYM_ID, cursor="no-es-un-cursor")
+
+    def test_benchmark_10k_events_per_gym(self, db):
+        ids = _seed_events(db, 10_000)
+        db.execute(insert(EventParticipation), [
+            dict(event_id=event_id, gym_id=GYM_ID, member_id=member_id,
+                 status=EventParticipationStatus.REGISTERED if member_id < 4 else EventParticipationStatus.WAITING_LIST)
+            for event_id in ids[::10] for member_id in range(1, 6)
+        ])
+        db.commit()
+        service = EventService()
+        deep_cursor = encode_event_cursor(BASE + timedelta(hours=4900), ids[9800])
+        statements = _count_queries(db)
+
+        start = time.perf_counter()
+        first = service.get_events_page(db, gym_id=GYM_ID, viewer_id=VIEWER_ID, limit=50)
+        deep = service.get_events_page(db, gym_id=GYM_ID, viewer_id=VIEWER_ID, cursor=deep_cursor, limit=50)
+        elapsed = time.perf_counter() - start
+
+        assert len(statements) == 2
+        assert (first.items[0].participants_count, first.items[0].waiting_list_count) == (3, 2)
+        assert [e.id for e in deep.items] == ids[9801:9851]
+        # Holgado para CI; en local ronda pocos milisegundos por página
+        assert elapsed < 2.0
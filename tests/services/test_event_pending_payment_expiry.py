@@ -0,0 +1,144 @@
+"""
+Tests del job de expiración de pagos pendientes de eventos.
+
+Las cancelaciones de Payment Intents van contra el servidor local ``stripe_stub``.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.event import (
+    Event,
+    EventParticipation,
+    EventParticipationStatus,
+    EventStatus,
+    PaymentStatusType,
+)
+from app.models.stripe_profile import GymStripeAccount
+from app.services.event_payment_service import EventPaymentService
+
+GYM_ID = 1
+STRIPE_ACCOUNT = "acct_gym_1"
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def notifications(monkeypatch):
+    sent = []
+    from app.services.notification_service import notification_service
+    monkeypatch.setattr(notification_service, "notify_waitlist_promotion",
+                        lambda db, **kwargs: sent.append(kwargs) or len(kwargs["promoted_user_ids"]))
+    return sent
+
+
+@pytest.fixture
+def db(sqlite_sessionmaker):
+    session = sqlite_sessionmaker(Event, EventParticipation, GymStripeAccount)()
+    session.add(GymStripeAccount(gym_id=GYM_ID, stripe_account_id=STRIPE_ACCOUNT, is_active=True))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _event(db, max_participants=2, status=EventStatus.SCHEDULED):
+    start = NOW + timedelta(days=7)
+    event = Event(gym_id=GYM_ID, title="Workshop", start_time=start, end_time=start + timedelta(hours=2),
+                  max_participants=max_participants, status=status, is_paid=True, price_cents=2500,
+                  currency="EUR", creator_id=1)
+    db.add(event)
+    db.flush()
+    return event
+
+
+def _participation(db, event, member_id, status=EventParticipationStatus.REGISTERED,
+                   payment_status=PaymentStatusType.PENDING, expiry=None, intent=None, minutes_ago=0):
+    participation = EventParticipation(
+        event_id=event.id, gym_id=GYM_ID, member_id=member_id, status=status,
+        payment_status=payment_status, payment_expiry=expiry, stripe_payment_intent_id=intent,
+        registered_at=NOW - timedelta(minutes=minutes_ago)
+    )
+    db.add(participation)
+    db.flush()
+    return participation
+
+
+def _expired(hours=1):
+    return NOW - timedelta(hours=hours)
+
+
+class TestExpirePendingPayments:
+
+    def test_expires_cancels_intents_and_promotes_waiting_list(self, db, stripe_stub, notifications):
+        event = _event(db)
+        expired = _participation(db, event, 1, expiry=_expired(), intent="pi_expired")
+        paid = _participation(db, event, 2, payment_status=PaymentStatusType.PAID)
+        first_waiting = _participation(db, event, 3, status=EventParticipationStatus.WAITING_LIST, minutes_ago=30)
+        second_waiting = _participation(db, event, 4, status=EventParticipationStatus.WAITING_LIST, minutes_ago=10)
+        still_valid = _participation(db, event, 5, status=EventParticipationStatus.PENDING_PAYMENT,
+                                     expiry=NOW + timedelta(hours=3), intent="pi_valid")
+        db.commit()
+
+        expired_ids = asyncio.run(EventPaymentService().expire_pending_payments(db, now=NOW))
+
+        assert expired_ids == [expired.id]
+        db.expire_all()
+        assert (expired.status, expired.payment_status) == (
+            EventParticipationStatus.CANCELLED, PaymentStatusType.EXPIRED
+        )
+        assert paid.status == EventParticipationStatus.REGISTERED
+        assert still_valid.payment_status == PaymentStatusType.PENDING
+
+        # La plaza liberada pasa al primero de la lista de espera, con plazo para pagar
+        assert first_waiting.status == EventParticipationStatus.REGISTERED
+        assert first_waiting.payment_status == PaymentStatusType.PENDING
+        assert first_waiting.payment_expiry is not None
+        assert second_waiting.status == EventParticipationStatus.WAITING_LIST
+        assert [n["promoted_user_ids"] for n in notifications] == [[3]]
+
+        assert [r["path"] for r in stripe_stub.requests] == ["/v1/payment_intents/pi_expired/cancel"]
+        assert stripe_stub.requests[0]["stripe_account"] == STRIPE_ACCOUNT
+        assert stripe_stub.requests[0]["idempotency_key"] == f"expire-participation-{expired.id}-pi_expired"
+
+    def test_processes_backlog_in_batches(self, db, stripe_stub):
+        event = _event(db, max_participants=10)
+        ids = [
+            _participation(db, event, member_id, expiry=_expired(hours=member_id),
+                           intent=f"pi_{member_id}" if member_id % 2 else None).id
+            for member_id in range(1, 6)
+        ]
+        db.commit()
+
+        expired_ids = asyncio.run(EventPaymentService().expire_pending_payments(db, batch_size=2, now=NOW))
+
+        # Lotes de 2, los más antiguos primero (RETURNING no garantiza orden dentro del lote)
+        assert [set(expired_ids[i:i + 2]) for i in range(0, 5, 2)] == [set(ids[4:2:-1]), set(ids[2:0:-1]), {ids[0]}]
+        assert db.query(EventParticipation).filter(
+            EventParticipation.payment_status == PaymentStatusType.EXPIRED
+        ).count() == 5
+        assert len(stripe_stub.requests) == 3
+
+    def test_stripe_failure_does_not_block_expiry(self, db, stripe_stub):
+        event = _event(db)
+        first = _participation(db, event, 1, expiry=_expired(), intent="pi_already_canceled")
+        second = _participation(db, event, 2, expiry=_expired(), intent="pi_ok")
+        db.commit()
+        stripe_stub.declined = {"pi_already_canceled"}
+
+        expired_ids = asyncio.run(EventPaymentService().expire_pending_payments(db, now=NOW))
+
+        assert sorted(expired_ids) == sorted([first.id, second.id])
+        assert len(stripe_stub.requests) == 2
+
+    def test_no_promotion_for_cancelled_event(self, db, stripe_stub):
+        event = _event(db, status=EventStatus.CANCELLED)
+        _participation(db, event, 1, expiry=_expired())
+        waiting = _participation(db, event, 2, status=EventParticipationStatus.WAITING_LIST)
+        db.commit()
+
+        asyncio.run(EventPaymentService().expire_pending_payments(db, now=NOW))
+
+        db.expire_all()
+        assert waiting.status == EventParticipationStatus.WAITING_LIST
+        assert stripe_stub.requests == []
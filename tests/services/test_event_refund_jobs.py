@@ -0,0 +1,284 @@
+"""
+Tests del trabajo de reembolsos masivos al cancelar eventos de pago.
+
+Stripe se sustituye por el servidor HTTP local de ``stripe_stub`` (conftest),
+de modo que se ejercita el SDK real: cabeceras Idempotency-Key y
+Stripe-Account, 429 y errores de tarjeta.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from app.models.event import (
+    Event,
+    EventParticipation,
+    EventParticipationStatus,
+    EventRefundItemStatus,
+    EventRefundJob,
+    EventRefundJobItem,
+    EventRefundJobStatus,
+    EventStatus,
+    PaymentStatusType,
+)
+from app.models.stripe_profile import GymStripeAccount
+from app.services.event_refund_jobs import EventRefundJobService
+
+GYM_ID = 1
+STRIPE_ACCOUNT = "acct_gym_1"
+
+
+@pytest.fixture
+def session_factory(sqlite_sessionmaker):
+    factory = sqlite_sessionmaker(Event, EventParticipation, GymStripeAccount, EventRefundJob, EventRefundJobItem)
+    session = factory()
+    session.add(GymStripeAccount(gym_id=GYM_ID, stripe_account_id=STRIPE_ACCOUNT, is_active=True))
+    session.commit()
+    session.close()
+    yield factory
+
+
+def _create_event(db, paid=3, pending=1, waiting=1, paid_without_intent=0):
+    start = datetime.now(timezone.utc) + timedelta(days=7)
+    event = Event(gym_id=GYM_ID, title="Workshop", start_time=start, end_time=start + timedelta(hours=2),
+                  max_participants=50, status=EventStatus.SCHEDULED, is_paid=True, price_cents=2500,
+                  currency="EUR", creator_id=1)
+    db.add(event)
+    db.flush()
+
+    member_id = 100
+    rows = (
+        [dict(payment_status=PaymentStatusType.PAID, stripe_payment_intent_id=f"pi_paid_{i}",
+              amount_paid_cents=2500) for i in range(paid)]
+        + [dict(payment_status=PaymentStatusType.PAID, amount_paid_cents=2500)
+           for _ in range(paid_without_intent)]
+        + [dict(status=EventParticipationStatus.PENDING_PAYMENT, payment_status=PaymentStatusType.PENDING,
+                stripe_payment_intent_id=f"pi_pending_{i}") for i in range(pending)]
+        + [dict(status=EventParticipationStatus.WAITING_LIST, payment_status=PaymentStatusType.PENDING)
+           for _ in range(waiting)]
+    )
+    for row in rows:
+        member_id += 1
+        row.setdefault("status", EventParticipationStatus.REGISTERED)
+        db.add(EventParticipation(event_id=event.id, gym_id=GYM_ID, member_id=member_id, **row))
+    db.commit()
+    return event
+
+
+def _service(**kwargs):
+    kwargs.setdefault("concurrency", 4)
+    kwargs.setdefault("max_retries", 3)
+    return EventRefundJobService(backoff_base_seconds=0.0, **kwargs)
+
+
+def _enqueue(session_factory, service, **event_kwargs):
+    db = session_factory()
+    event = _create_event(db, **event_kwargs)
+    job = service.enqueue_cancellation(db, event, GYM_ID, cancelled_by_user_id=7, reason="Lluvia")
+    job_id, event_id = job.id, event.id
+    db.close()
+    return job_id, event_id
+
+
+def _participations(session_factory, event_id):
+    db = session_factory()
+    rows = db.query(EventParticipation).filter(EventParticipation.event_id == event_id) \
+        .order_by(EventParticipation.id).all()
+    db.close()
+    return rows
+
+
+class TestEnqueueCancellation:
+
+    def test_cancels_event_and_queues_stripe_operations(self, session_factory, stripe_stub):
+        job_id, event_id = _enqueue(session_factory, _service(), paid_without_intent=1)
+
+        db = session_factory()
+        job = db.get(EventRefundJob, job_id)
+        event = db.get(Event, event_id)
+        actions = sorted((item.action.value, item.status.value) for item in job.items)
+
+        assert event.status == EventStatus.CANCELLED
+        assert event.cancellation_reason == "Lluvia"
+        assert job.status == EventRefundJobStatus.PENDING
+        assert job.total_items == 5 and job.failed_items == 1
+        assert job.scheduled_refund_cents == 3 * 2500
+        assert actions == [("CANCEL_PAYMENT", "PENDING")] + [("REFUND", "FAILED")] + [("REFUND", "PENDING")] * 3
+        db.close()
+
+        statuses = [(p.status, p.payment_status) for p in _participations(session_factory, event_id)]
+        # Los pagados siguen PAID hasta que Stripe confirme el reembolso
+        assert statuses[:3] == [(EventParticipationStatus.REGISTERED, PaymentStatusType.PAID)] * 3
+        assert statuses[4] == (EventParticipationStatus.CANCELLED, PaymentStatusType.EXPIRED)
+        assert statuses[5][0] == EventParticipationStatus.CANCELLED
+        assert stripe_stub.requests == []
+
+    def test_event_without_stripe_operations_completes_immediately(self, session_factory, stripe_stub):
+        job_id, _event_id = _enqueue(session_factory, _service(), paid=0, pending=0, waiting=2)
+
+        db = session_factory()
+        assert db.get(EventRefundJob, job_id).status == EventRefundJobStatus.COMPLETED
+        db.close()
+        assert asyncio.run(_service().run_job(job_id, session_factory)) is None
+
+    def test_paid_event_without_active_stripe_account_is_rejected(self, session_factory, stripe_stub):
+        db = session_factory()
+        db.query(GymStripeAccount).update({"is_active": False})
+        event = _create_event(db)
+
+        with pytest.raises(ValueError, match="No se encontró cuenta de Stripe"):
+            _service().enqueue_cancellation(db, event, GYM_ID, cancelled_by_user_id=7)
+        db.rollback()
+
+        assert db.get(Event, event.id).status == EventStatus.SCHEDULED
+        assert db.query(EventRefundJob).count() == 0
+        db.close()
+
+    def test_cancellation_is_audited_on_event_and_participations(self, session_factory, stripe_stub):
+        service = _service()
+        job_id, event_id = _enqueue(session_factory, service)
+        asyncio.run(service.run_job(job_id, session_factory))
+
+        db = session_factory()
+        event = db.get(Event, event_id)
+        assert event.cancelled_by_user_id == 7
+        assert event.cancellation_date is not None
+        assert db.get(EventRefundJob, job_id).created_by_user_id == 7
+        db.close()
+
+        participations = _participations(session_factory, event_id)
+        assert all(p.status == EventParticipationStatus.CANCELLED for p in participations)
+        assert all(p.refund_date is not None for p in participations[:3])
+
+
+class TestRunJob:
+
+    def test_executes_refunds_with_idempotency_keys(self, session_factory, stripe_stub):
+        service = _service()
+        job_id, event_id = _enqueue(session_factory, service)
+
+        progress = asyncio.run(service.run_job(job_id, session_factory))
+
+        assert progress["status"] == "COMPLETED"
+        assert progress["succeeded_items"] == 4 and progress["pending_items"] == 0
+        assert progress["refunded_cents"] == 3 * 2500
+
+        refunds = [r for r in stripe_stub.requests if r["path"] == "/v1/refunds"]
+        cancels = [r for r in stripe_stub.requests if r["path"].endswith("/cancel")]
+        assert len(refunds) == 3 and len(cancels) == 1
+        assert cancels[0]["path"] == "/v1/payment_intents/pi_pending_0/cancel"
+        assert {r["stripe_account"] for r in stripe_stub.requests} == {STRIPE_ACCOUNT}
+        keys = [r["idempotency_key"] for r in stripe_stub.requests]
+        assert len(set(keys)) == 4
+        assert all(key.startswith(f"event-refund-job-{job_id}-participation-") for key in keys)
+        assert {r["form"]["amount"] for r in refunds} == {"2500"}
+
+        participations = _participations(session_factory, event_id)
+        assert [(p.status, p.payment_status, p.refund_amount_cents) for p in participations[:3]] == [
+            (EventParticipationStatus.CANCELLED, PaymentStatusType.REFUNDED, 2500)
+        ] * 3
+        db = session_factory()
+        assert db.get(Event, event_id).total_refunded_cents == 3 * 2500
+        db.close()
+
+    def test_rate_limited_requests_are_retried(self, session_factory, stripe_stub):
+        service = _service(max_retries=5)
+        job_id, _event_id = _enqueue(session_factory, service, pending=0, waiting=0)
+        stripe_stub.rate_limited = 4
+
+        progress = asyncio.run(service.run_job(job_id, session_factory))
+
+        assert progress["status"] == "COMPLETED"
+        assert progress["succeeded_items"] == 3
+        assert len(stripe_stub.requests) == 3 + 4
+        db = session_factory()
+        attempts = [item.attempts for item in db.query(EventRefundJobItem).filter_by(job_id=job_id)]
+        assert sum(attempts) == 7
+        db.close()
+
+    def test_exhausted_retries_and_declines_are_recorded(self, session_factory, stripe_stub):
+        service = _service(max_retries=0, concurrency=1)
+        job_id, event_id = _enqueue(session_factory, service, pending=0, waiting=0)
+        stripe_stub.declined = {"pi_paid_1"}
+        stripe_stub.rate_limited = 1
+
+        progress = asyncio.run(service.run_job(job_id, session_factory))
+
+        assert progress["status"] == "COMPLETED_WITH_ERRORS"
+        assert progress["succeeded_items"] == 1 and progress["failed_items"] == 2
+        errors = sorted(failure["error"].split(":")[0] for failure in progress["failures"])
+        assert errors == ["CardError", "RateLimitError"]
+        # Sin reembolso confirmado la participación conserva el pago
+        paid = [p for p in _participations(session_factory, event_id)
+                if p.payment_status == PaymentStatusType.PAID]
+        assert len(paid) == 2
+
+    def test_concurrency_is_bounded(self, session_factory, stripe_stub):
+        service = _service(concurrency=2)
+        job_id, _event_id = _enqueue(session_factory, service, paid=6, pending=0, waiting=0)
+        stripe_stub.delay = 0.05
+
+        progress = asyncio.run(service.run_job(job_id, session_factory))
+
+        assert progress["succeeded_items"] == 6
+        assert stripe_stub.max_in_flight == 2
+
+
+class TestResume:
+
+    def test_stale_job_resumes_only_pending_items(self, session_factory, stripe_stub):
+        service = _service()
+        job_id, _event_id = _enqueue(session_factory, service, pending=0, waiting=0)
+
+        # Un worker anterior reembolsó el primer elemento y se cayó
+        db = session_factory()
+        job = db.get(EventRefundJob, job_id)
+        first = sorted(job.items, key=lambda item: item.id)[0]
+        first.status = EventRefundItemStatus.SUCCEEDED
+        job.succeeded_items = 1
+        job.refunded_cents = first.amount_cents
+        job.status = EventRefundJobStatus.RUNNING
+        job.heartbeat_at = datetime.now(timezone.utc) - timedelta(minutes=30)
+        db.commit()
+        assert service.get_resumable_job_ids(db) == [job_id]
+        db.close()
+
+        progress = asyncio.run(service.run_job(job_id, session_factory))
+
+        assert progress["status"] == "COMPLETED"
+        assert progress["succeeded_items"] == 3
+        assert progress["refunded_cents"] == 3 * 2500
+        assert len(stripe_stub.requests) == 2
+
+    def test_running_job_with_recent_heartbeat_is_not_claimed(self, session_factory, stripe_stub):
+        service = _service()
+        job_id, _event_id = _enqueue(session_factory, service, pending=0, waiting=0)
+        db = session_factory()
+        job = db.get(EventRefundJob, job_id)
+        job.status = EventRefundJobStatus.RUNNING
+        job.heartbeat_at = datetime.now(timezone.utc)
+        db.commit()
+        assert service.get_resumable_job_ids(db) == []
+        db.close()
+
+        assert asyncio.run(service.run_job(job_id, session_factory)) is None
+        assert stripe_stub.requests == []
+
+    def test_heartbeat_is_refreshed_while_items_are_in_flight(self, session_factory, stripe_stub):
+        service = _service(concurrency=1, heartbeat_interval_seconds=0.01)
+        job_id, _event_id = _enqueue(session_factory, service, paid=1, pending=0, waiting=0)
+        stripe_stub.delay = 0.2
+        heartbeats = []
+        event.listen(
+            session_factory.kw["bind"], "before_cursor_execute",
+            lambda conn, cursor, statement, params, *args: heartbeats.append(statement)
+            if statement.startswith("UPDATE event_refund_jobs SET heartbeat_at") else None
+        )
+
+        progress = asyncio.run(service.run_job(job_id, session_factory))
+
+        assert progress["succeeded_items"] == 1
+        # Varios latidos mientras la única operación seguía en Stripe
+        assert len(heartbeats) >= 3
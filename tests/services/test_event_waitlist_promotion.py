@@ -0,0 +1,193 @@
+"""
+Tests de la promoción desde la lista de espera de eventos.
+
+Los tests de concurrencia usan SQLite en fichero con transacciones
+``BEGIN IMMEDIATE`` (bloqueo de escritura al empezar), el equivalente más
+cercano al ``SELECT ... FOR UPDATE`` del evento en PostgreSQL: comprueban que
+la capacidad se calcula dentro de la transacción bloqueada y que ningún
+miembro se promueve dos veces.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, event as sa_event
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models.event import Event, EventParticipation, EventParticipationStatus, EventStatus, PaymentStatusType
+from app.repositories.event import EventParticipationRepository
+from app.services.event import EventService
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}",
+                           connect_args={"check_same_thread": False, "timeout": 30})
+
+    @sa_event.listens_for(engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, _record):
+        dbapi_connection.isolation_level = None
+
+    @sa_event.listens_for(engine, "begin")
+    def _begin_immediate(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    Base.metadata.create_all(engine, tables=[Event.__table__, EventParticipation.__table__])
+    yield sessionmaker(bind=engine, autoflush=False)
+    engine.dispose()
+
+
+def _seed(factory, capacity, registered, waiting, is_paid=False):
+    db = factory()
+    start = NOW + timedelta(days=3)
+    event = Event(gym_id=1, title="Trail", start_time=start, end_time=start + timedelta(hours=3),
+                  max_participants=capacity, status=EventStatus.SCHEDULED, is_paid=is_paid,
+                  price_cents=1500 if is_paid else None, creator_id=1)
+    db.add(event)
+    db.flush()
+    for member_id in range(1, registered + 1):
+        db.add(EventParticipation(event_id=event.id, gym_id=1, member_id=member_id,
+                                  status=EventParticipationStatus.REGISTERED,
+                                  registered_at=NOW - timedelta(hours=2)))
+    for position in range(waiting):
+        db.add(EventParticipation(event_id=event.id, gym_id=1, member_id=1000 + position,
+                                  status=EventParticipationStatus.WAITING_LIST,
+                                  registered_at=NOW - timedelta(minutes=60 - position)))
+    db.commit()
+    event_id = event.id
+    db.close()
+    return event_id
+
+
+def _statuses(factory, event_id):
+    db = factory()
+    rows = {
+        p.member_id: p.status
+        for p in db.query(EventParticipation).filter(EventParticipation.event_id == event_id)
+    }
+    db.close()
+    return rows
+
+
+def _in_parallel(workers, fn, args):
+    barrier = threading.Barrier(workers)
+
+    def run(arg):
+        barrier.wait()
+        return fn(arg)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, args))
+
+
+class TestWaitlistPromotion:
+
+    def test_fills_free_seats_in_order_in_one_transaction(self, session_factory):
+        event_id = _seed(session_factory, capacity=5, registered=2, waiting=6, is_paid=True)
+        db = session_factory()
+        commits = []
+        sa_event.listen(db, "after_commit", lambda session: commits.append(1))
+
+        promoted = EventParticipationRepository().fill_vacancies_from_waiting_list(db, event_id)
+
+        assert [p.member_id for p in promoted] == [1000, 1001, 1002]
+        assert all(p.payment_status == PaymentStatusType.PENDING and p.payment_expiry for p in promoted)
+        assert len(commits) == 1
+        db.close()
+
+    def test_limit_and_non_scheduled_events(self, session_factory):
+        event_id = _seed(session_factory, capacity=5, registered=0, waiting=4)
+        db = session_factory()
+        repo = EventParticipationRepository()
+
+        assert len(repo.fill_vacancies_from_waiting_list(db, event_id, limit=2)) == 2
+
+        db.get(Event, event_id).status = EventStatus.CANCELLED
+        db.commit()
+        assert repo.fill_vacancies_from_waiting_list(db, event_id) == []
+        db.close()
+
+
+class TestConcurrentPromotion:
+
+    def test_concurrent_cancellations_never_overfill(self, session_factory):
+        event_id = _seed(session_factory, capacity=5, registered=5, waiting=10)
+        repo = EventParticipationRepository()
+
+        def cancel(member_id):
+            db = session_factory()
+            try:
+                participation, promoted = repo.cancel_and_promote(db, member_id=member_id, event_id=event_id)
+                return participation is not None, [p.member_id for p in promoted]
+            finally:
+                db.close()
+
+        results = _in_parallel(5, cancel, range(1, 6))
+
+        promoted = [member for _ok, members in results for member in members]
+        assert all(ok for ok, _members in results)
+        assert sorted(promoted) == [1000, 1001, 1002, 1003, 1004]
+        statuses = _statuses(session_factory, event_id)
+        assert list(statuses.values()).count(EventParticipationStatus.REGISTERED) == 5
+
+    def test_concurrent_fills_promote_each_member_once(self, session_factory):
+        event_id = _seed(session_factory, capacity=8, registered=5, waiting=10)
+        repo = EventParticipationRepository()
+
+        def fill(_):
+            db = session_factory()
+            try:
+                return [p.member_id for p in repo.fill_vacancies_from_waiting_list(db, event_id)]
+            finally:
+                db.close()
+
+        results = _in_parallel(4, fill, range(4))
+
+        promoted = [member for members in results for member in members]
+        assert sorted(promoted) == [1000, 1001, 1002]
+        statuses = _statuses(session_factory, event_id)
+        assert list(statuses.values()).count(EventParticipationStatus.REGISTERED) == 8
+
+    def test_same_member_cancelling_twice_promotes_once(self, session_factory):
+        event_id = _seed(session_factory, capacity=2, registered=2, waiting=3)
+        repo = EventParticipationRepository()
+
+        def cancel(_):
+            db = session_factory()
+            try:
+                participation, promoted = repo.cancel_and_promote(db, member_id=1, event_id=event_id)
+                return participation is not None, len(promoted)
+            finally:
+                db.close()
+
+        results = _in_parallel(3, cancel, range(3))
+
+        assert sorted(results) == [(False, 0), (False, 0), (True, 1)]
+
+
+class TestPromotionNotifications:
+
+    def test_promoted_members_are_notified_in_one_batch(self, session_factory, monkeypatch):
+        from app.services.notification_service import notification_service
+        calls = []
+        monkeypatch.setattr(notification_service, "notify_waitlist_promotion",
+                            lambda db, **kwargs: calls.append((db, kwargs)) or 0)
+        event_id = _seed(session_factory, capacity=3, registered=0, waiting=3, is_paid=True)
+        db = session_factory()
+        promoted = EventParticipationRepository().fill_vacancies_from_waiting_list(db, event_id)
+
+        asyncio.run(EventService().notify_waitlist_promotions(db.get(Event, event_id), promoted))
+
+        assert len(calls) == 1
+        session, kwargs = calls[0]
+        # La sesión de la petición no se comparte con el hilo de envío
+        assert session is None
+        assert kwargs["promoted_user_ids"] == [1000, 1001, 1002]
+        assert kwargs["payment_deadline"] is not None
+        db.close()
@@ -0,0 +1,112 @@
+"""
+Tests del calendario precalculado de horarios efectivos del gimnasio.
+"""
+
+import asyncio
+from datetime import date, datetime, time, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from app.models.schedule import GymHours, GymSpecialHours
+from app.services.gym_hours_calendar import GymHoursCalendar, GymHoursCalendarService
+from app.services.schedule import GymHoursService
+
+GYM_ID = 1
+TODAY = datetime.now(timezone.utc).date()
+
+
+@pytest.fixture
+def db(sqlite_sessionmaker):
+    session = sqlite_sessionmaker(GymHours, GymSpecialHours)()
+    for day in range(6):
+        session.add(GymHours(gym_id=GYM_ID, day_of_week=day, open_time=time(7, 0),
+                             close_time=time(22, 0), is_closed=False))
+    session.add(GymSpecialHours(gym_id=GYM_ID, date=TODAY + timedelta(days=3), is_closed=True,
+                                description="Festivo"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _statements(db):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+class TestBuildCalendar:
+
+    def test_special_days_override_weekly_hours(self, db):
+        calendar = GymHoursCalendarService().build(db, GYM_ID, TODAY, TODAY + timedelta(days=13))
+
+        holiday = calendar.get(TODAY + timedelta(days=3))
+        assert holiday.is_special and holiday.is_closed and holiday.description == "Festivo"
+        regular = calendar.get(TODAY + timedelta(days=10))
+        assert not regular.is_special
+        assert regular == calendar.weekly[(TODAY + timedelta(days=10)).weekday()]
+        assert calendar.get(TODAY + timedelta(days=14)) is None
+
+    def test_missing_weekday_gets_default_hours(self, db):
+        calendar = GymHoursCalendarService().build(db, GYM_ID, TODAY, TODAY)
+
+        sunday = calendar.weekly[6]
+        assert sunday.is_closed is True
+        assert sunday.source_id is None
+        # El predeterminado se resuelve en memoria: una lectura no inserta filas
+        assert db.query(GymHours).count() == 6
+
+    def test_payload_round_trip(self, db):
+        calendar = GymHoursCalendarService().build(db, GYM_ID, TODAY, TODAY + timedelta(days=30))
+
+        restored = GymHoursCalendar.from_payload(GYM_ID, calendar.to_payload())
+
+        assert restored.start == calendar.start
+        assert restored.days == calendar.days
+        assert restored.weekly == calendar.weekly
+
+
+class TestCachedLookups:
+
+    def test_horizon_lookups_are_served_from_the_calendar(self, db, fake_redis):
+        service = GymHoursService()
+        statements = _statements(db)
+
+        first = asyncio.run(service.get_hours_for_date_cached(db, TODAY + timedelta(days=3), GYM_ID, fake_redis))
+        week = asyncio.run(service.get_schedule_for_date_range_cached(
+            db, TODAY, TODAY + timedelta(days=6), GYM_ID, fake_redis
+        ))
+
+        assert first["is_special"] is True
+        assert first["effective_hours"]["source"] == "special"
+        assert first["special_hours"]["description"] == "Festivo"
+        assert [entry["is_special"] for entry in week].count(True) == 1
+        # Horario semanal y días especiales del horizonte, una sola vez
+        assert len(statements) == 2
+
+    def test_special_day_change_rebuilds_calendar(self, db, fake_redis):
+        service = GymHoursService()
+        target = TODAY + timedelta(days=5)
+        asyncio.run(service.get_hours_for_date_cached(db, target, GYM_ID, fake_redis))
+
+        db.add(GymSpecialHours(gym_id=GYM_ID, date=target, open_time=time(10, 0),
+                               close_time=time(14, 0), is_closed=False, description="Horario reducido"))
+        db.commit()
+        # Equivalente a GymHoursCalendarService.invalidate (INCR del namespace)
+        fake_redis.data[f"cache_ns:gym_hours:{GYM_ID}"] = "1"
+
+        result = asyncio.run(service.get_hours_for_date_cached(db, target, GYM_ID, fake_redis))
+        assert result["effective_hours"]["open_time"] == time(10, 0)
+        assert result["effective_hours"]["source"] == "special"
+
+    def test_range_beyond_horizon_is_built_directly(self, db, fake_redis):
+        service = GymHoursService()
+        start = TODAY + timedelta(days=200)
+
+        schedule = asyncio.run(service.get_schedule_for_date_range_cached(
+            db, start, start + timedelta(days=6), GYM_ID, fake_redis
+        ))
+
+        assert [entry["date"] for entry in schedule] == [start + timedelta(days=i) for i in range(7)]
+        assert not any(entry["is_special"] for entry in schedule)
@@ -0,0 +1,87 @@
+"""
+Tests de la consulta en lote del estado de un miembro en varias sesiones.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import event
+
+from app.models.schedule import ClassParticipation, ClassParticipationStatus
+from app.services.schedule import ClassParticipationService
+
+GYM_ID = 1
+MEMBER_ID = 42
+
+
+@pytest.fixture
+def db(sqlite_sessionmaker):
+    session = sqlite_sessionmaker(ClassParticipation)()
+    now = datetime.now(timezone.utc)
+    session.add_all([
+        ClassParticipation(session_id=1, member_id=MEMBER_ID, gym_id=GYM_ID,
+                           status=ClassParticipationStatus.REGISTERED, registration_time=now),
+        ClassParticipation(session_id=2, member_id=MEMBER_ID, gym_id=GYM_ID,
+                           status=ClassParticipationStatus.WAITLISTED, registration_time=now),
+        ClassParticipation(session_id=1, member_id=7, gym_id=GYM_ID,
+                           status=ClassParticipationStatus.CANCELLED, registration_time=now),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def _count_selects(db):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+def _statuses(db, session_ids, redis_client=None):
+    return asyncio.run(ClassParticipationService().get_member_statuses(
+        db, member_id=MEMBER_ID, gym_id=GYM_ID, session_ids=session_ids, redis_client=redis_client
+    ))
+
+
+class TestMemberSessionStatuses:
+
+    def test_batch_resolved_with_one_query(self, db):
+        statements = _count_selects(db)
+
+        statuses = _statuses(db, list(range(1, 51)))
+
+        assert statuses[1] == ClassParticipationStatus.REGISTERED
+        assert statuses[2] == ClassParticipationStatus.WAITLISTED
+        assert statuses[3] is None
+        assert len(statuses) == 50
+        assert len(statements) == 1
+
+    def test_cached_hash_serves_batch_and_fills_only_missing(self, db, fake_redis):
+        statements = _count_selects(db)
+
+        _statuses(db, [1, 3], fake_redis)
+        statuses = _statuses(db, [1, 2, 3], fake_redis)
+
+        assert statuses == {
+            1: ClassParticipationStatus.REGISTERED,
+            2: ClassParticipationStatus.WAITLISTED,
+            3: None,
+        }
+        # Una consulta por llamada, la segunda solo para la sesión 2
+        assert len(statements) == 2
+
+    def test_invalidation_starts_a_new_hash(self, db, fake_redis):
+        service = ClassParticipationService()
+        _statuses(db, [1], fake_redis)
+
+        db.query(ClassParticipation).filter(
+            ClassParticipation.session_id == 1, ClassParticipation.member_id == MEMBER_ID
+        ).update({"status": ClassParticipationStatus.CANCELLED})
+        db.commit()
+        asyncio.run(service.invalidate_member_participation_cache(
+            member_id=MEMBER_ID, gym_id=GYM_ID, redis_client=fake_redis
+        ))
+
+        assert _statuses(db, [1], fake_redis) == {1: ClassParticipationStatus.CANCELLED}
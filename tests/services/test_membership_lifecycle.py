@@ -0,0 +1,195 @@
+"""
+Tests del ciclo de vida de membresías: transiciones por vencimiento con un
+UPDATE por estado, estado de suscripciones de Stripe en bloque, eventos
+agrupados por gimnasio y resumen cacheado por gimnasio.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import sessionmaker
+
+from app.models.gym import Gym
+from app.models.stripe_profile import UserGymStripeProfile
+from app.models.user_gym import UserGym
+from app.services import membership as membership_module
+from app.services import membership_lifecycle as lifecycle_module
+from app.services.membership import MembershipService
+from app.services.membership_lifecycle import MembershipLifecycleService, MembershipTransitionEvent
+from app.services.notification_service import notification_service
+from app.services.stripe_service import StripeService
+
+NOW = datetime.now().replace(microsecond=0)
+
+
+def _member(user_id, gym_id=1, membership_type="paid", expires_in_days=None, status="active", is_active=True):
+    return UserGym(
+        user_id=user_id, gym_id=gym_id, membership_type=membership_type, membership_status=status,
+        is_active=is_active, created_at=NOW - timedelta(days=60),
+        membership_expires_at=NOW + timedelta(days=expires_in_days) if expires_in_days is not None else None
+    )
+
+
+@pytest.fixture
+def db(sqlite_sessionmaker):
+    session = sqlite_sessionmaker(Gym, UserGym, UserGymStripeProfile)()
+    session.add_all([
+        Gym(id=1, name="Centro", subdomain="centro", is_active=True),
+        Gym(id=2, name="Norte", subdomain="norte", is_active=True),
+        _member(1, expires_in_days=10),                         # al día
+        _member(2, expires_in_days=3),                          # al día, vence pronto
+        _member(3, expires_in_days=-1),                         # -> grace
+        _member(4, expires_in_days=-5),                         # -> overdue
+        _member(5, expires_in_days=-5, status="grace"),         # -> overdue
+        _member(6, expires_in_days=-40),                        # -> expired directamente
+        _member(7, membership_type="trial", expires_in_days=-1),  # -> expired
+        _member(8, membership_type="free"),                     # sin vencimiento
+        _member(9, gym_id=2, expires_in_days=-1),               # -> grace en otro gym
+        UserGymStripeProfile(user_id=1, gym_id=1, stripe_customer_id="cus_1", stripe_account_id="acct_1",
+                             email="uno@example.com", stripe_subscription_id="sub_1"),
+    ])
+    session.commit()
+    session.queries = []
+    sa_event.listen(session.get_bind(), "before_cursor_execute",
+                    lambda conn, cursor, statement, *args: session.queries.append(statement))
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def lifecycle(monkeypatch, fake_redis):
+    async def factory():
+        return fake_redis
+
+    service = MembershipLifecycleService(redis_factory=factory)
+    service.redis = fake_redis
+    for module in (membership_module, lifecycle_module):
+        monkeypatch.setattr(module, "membership_lifecycle_service", service)
+    return service
+
+
+@pytest.fixture
+def pushes(monkeypatch):
+    sent = []
+
+    def notify(db, gym_id, transition, user_ids):
+        sent.append((transition, gym_id, sorted(user_ids)))
+        return len(user_ids)
+
+    monkeypatch.setattr(notification_service, "notify_membership_transition", notify)
+    return sent
+
+
+def _statuses(db):
+    db.expire_all()
+    return {m.user_id: (m.membership_status, m.is_active) for m in db.query(UserGym)}
+
+
+class TestSweep:
+
+    def test_each_transition_is_one_update_and_rows_jump_to_final_state(self, db, lifecycle):
+        db.queries.clear()
+        events = lifecycle.sweep(db, now=NOW)
+        db.commit()
+
+        assert len([q for q in db.queries if q.lstrip().upper().startswith("UPDATE")]) == 3
+        assert sorted((e.transition, e.gym_id, sorted(e.user_ids)) for e in events) == [
+            ("expired", 1, [6, 7]),
+            ("grace", 1, [3]),
+            ("grace", 2, [9]),
+            ("overdue", 1, [4, 5]),
+        ]
+        statuses = _statuses(db)
+        assert statuses[1] == statuses[2] == statuses[8] == ("active", True)
+        assert statuses[3] == ("grace", True)
+        assert statuses[4] == statuses[5] == ("overdue", False)
+        assert statuses[6] == statuses[7] == ("expired", False)
+
+        assert lifecycle.sweep(db, now=NOW) == []
+
+    def test_grace_keeps_access_until_the_window_ends(self, db, lifecycle):
+        lifecycle.sweep(db, now=NOW)
+        db.commit()
+        service = MembershipService()
+
+        assert service.get_membership_status(db, 3, 1).can_access is True
+        assert service.get_membership_status(db, 3, 1).membership_status == "grace"
+        assert service.get_membership_status(db, 4, 1).can_access is False
+        assert service.get_membership_status(db, 42, 1).can_access is False
+
+    def test_run_sweep_notifies_once_per_gym_and_transition(self, db, lifecycle, pushes, monkeypatch):
+        events = lifecycle.sweep(db, now=NOW)
+        monkeypatch.setattr(lifecycle, "_sweep_in_session", lambda: events)
+
+        counts = asyncio.run(lifecycle.run_sweep())
+
+        assert counts == {"expired": 2, "overdue": 2, "grace": 2}
+        assert sorted(pushes) == [("expired", 1, [6, 7]), ("grace", 1, [3]), ("grace", 2, [9]), ("overdue", 1, [4, 5])]
+        assert lifecycle.redis.data == {"cache_ns:membership_summary:1": "1", "cache_ns:membership_summary:2": "1"}
+
+
+class TestSubscriptionStatus:
+
+    def test_stripe_status_is_applied_by_subscription_without_duplicate_events(self, db, lifecycle):
+        past_due = lifecycle.apply_subscription_status(db, ["sub_1"], "past_due")
+        again = lifecycle.apply_subscription_status(db, ["sub_1"], "past_due")
+        canceled = lifecycle.apply_subscription_status(db, ["sub_1", None], "canceled")
+        db.commit()
+
+        assert past_due == [MembershipTransitionEvent("grace", 1, [1])]
+        assert again == []
+        assert canceled == [MembershipTransitionEvent("expired", 1, [1])]
+        assert lifecycle.apply_subscription_status(db, ["sub_1"], "desconocido") == []
+        assert _statuses(db)[1] == ("expired", False)
+        assert _statuses(db)[2] == ("active", True)
+
+    def test_subscription_webhooks_move_the_membership_and_notify(self, db, lifecycle, pushes, monkeypatch):
+        monkeypatch.setattr("app.db.session.SessionLocal", sessionmaker(bind=db.get_bind(), autoflush=False))
+        service = StripeService(MembershipService())
+        def webhook(event_type, obj):
+            return asyncio.run(service.process_webhook_event({"type": event_type, "data": {"object": obj}}))
+
+        webhook("invoice.payment_failed", {"id": "in_1", "object": "invoice", "subscription": "sub_1"})
+        assert _statuses(db)[1] == ("grace", True)
+        assert lifecycle.redis.data["cache_ns:membership_summary:1"] == "1"
+
+        webhook("invoice.payment_failed", {"id": "in_2", "object": "invoice", "subscription": None})
+        webhook("customer.subscription.deleted", {"id": "sub_1", "object": "subscription"})
+
+        assert _statuses(db)[1] == ("expired", False)
+        assert pushes == [("grace", 1, [1]), ("expired", 1, [1])]
+
+
+class TestSummary:
+
+    def test_summary_is_one_query_and_cached_per_gym(self, db, lifecycle):
+        lifecycle.sweep(db, now=NOW)
+        db.commit()
+        service = MembershipService()
+        db.queries.clear()
+
+        summary = asyncio.run(service.get_gym_membership_summary(db, 1))
+        cached = asyncio.run(service.get_gym_membership_summary(db, 1))
+
+        assert len(db.queries) == 1
+        assert cached == summary
+        assert (summary.total_members, summary.active_members, summary.expired_members) == (8, 4, 4)
+        assert (summary.grace_members, summary.overdue_members) == (1, 2)
+        assert (summary.paid_members, summary.expiring_members) == (3, 1)
+
+        asyncio.run(lifecycle.invalidate_summaries([1]))
+        asyncio.run(service.get_gym_membership_summary(db, 1))
+        assert len(db.queries) == 2
+
+    def test_deactivation_invalidates_the_summary(self, db, lifecycle):
+        service = MembershipService()
+        first = asyncio.run(service.get_gym_membership_summary(db, 1))
+
+        asyncio.run(service.deactivate_membership(db, 1, 1, reason="baja"))
+        after = asyncio.run(service.get_gym_membership_summary(db, 1))
+
+        assert (first.active_members, first.total_members) == (8, 8)
+        assert (after.active_members, after.total_members) == (7, 8)
+        assert lifecycle.redis.data["cache_ns:membership_summary:1"] == "1"
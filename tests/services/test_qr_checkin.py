@@ -0,0 +1,256 @@
+"""
+Tests del check-in por QR con tokens firmados y sesiones abiertas en caché.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import event
+
+from app.models.schedule import (
+    Class,
+    ClassSession,
+    ClassParticipation,
+    ClassParticipationStatus,
+    ClassSessionStatus,
+    ClassDifficultyLevel,
+)
+from app.models.user_gym import UserGym
+from app.schemas.attendance import BulkCheckInEvent
+from app.services.attendance import AttendanceService
+
+GYM_ID = 1
+MEMBER_ID = 42
+
+
+@pytest.fixture
+def db(sqlite_sessionmaker):
+    session = sqlite_sessionmaker(Class, ClassSession, ClassParticipation, UserGym)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def sessions(db):
+    now = datetime.now(timezone.utc)
+    class_obj = Class(name="Yoga", duration=60, max_capacity=20,
+                      difficulty_level=ClassDifficultyLevel.BEGINNER, gym_id=GYM_ID)
+    db.add(class_obj)
+    db.flush()
+    specs = {
+        "now": (10, ClassSessionStatus.SCHEDULED),
+        "later": (90, ClassSessionStatus.SCHEDULED),
+        "cancelled": (5, ClassSessionStatus.CANCELLED),
+    }
+    created = {}
+    for name, (offset, status) in specs.items():
+        session = ClassSession(class_id=class_obj.id, trainer_id=5, gym_id=GYM_ID, status=status,
+                               start_time=now + timedelta(minutes=offset),
+                               end_time=now + timedelta(minutes=offset + 60))
+        db.add(session)
+        db.flush()
+        created[name] = session.id
+    db.commit()
+    return created
+
+
+def _statements(db):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+class TestCheckinTokens:
+
+    def test_signed_token_round_trip(self):
+        service = AttendanceService()
+        token = service.issue_checkin_token(MEMBER_ID, GYM_ID)["token"]
+
+        assert service.verify_checkin_token(token, GYM_ID) == (MEMBER_ID, None)
+
+    def test_tampered_expired_and_foreign_tokens_are_rejected(self):
+        service = AttendanceService()
+        token = service.issue_checkin_token(MEMBER_ID, GYM_ID)["token"]
+        tampered = token.replace(f"CK1.{MEMBER_ID}.", "CK1.43.")
+        expired = service.issue_checkin_token(
+            MEMBER_ID, GYM_ID, now=datetime.now(timezone.utc) - timedelta(hours=1)
+        )["token"]
+
+        assert service.verify_checkin_token(tampered, GYM_ID) == (None, "Código QR inválido")
+        assert service.verify_checkin_token(expired, GYM_ID) == (None, "Código QR caducado")
+        assert service.verify_checkin_token(token, GYM_ID + 1)[0] is None
+
+
+class TestProcessCheckIn:
+
+    def test_signed_token_checks_in_without_membership_query(self, db, sessions):
+        service = AttendanceService()
+        token = service.issue_checkin_token(MEMBER_ID, GYM_ID)["token"]
+
+        with patch("app.services.attendance.gym_service.check_user_in_gym",
+                   side_effect=AssertionError("no debe consultar la pertenencia")):
+            result = asyncio.run(service.process_check_in(db, token, GYM_ID))
+            repeated = asyncio.run(service.process_check_in(db, token, GYM_ID))
+
+        assert result["success"] is True
+        assert result["session"]["id"] == sessions["now"]
+        assert repeated == {"success": False, "message": "Ya has hecho check-in en esta clase"}
+        participation = db.query(ClassParticipation).one()
+        assert participation.status == ClassParticipationStatus.ATTENDED
+
+    def test_registered_participation_is_upgraded_in_place(self, db, sessions):
+        db.add(ClassParticipation(session_id=sessions["now"], member_id=MEMBER_ID, gym_id=GYM_ID,
+                                  status=ClassParticipationStatus.REGISTERED))
+        db.commit()
+        service = AttendanceService()
+
+        with patch("app.services.attendance.gym_service.check_user_in_gym", return_value=True):
+            result = asyncio.run(service.process_check_in(db, f"U{MEMBER_ID}_abcd1234", GYM_ID))
+
+        assert result["success"] is True
+        rows = db.query(ClassParticipation).all()
+        assert len(rows) == 1
+        db.refresh(rows[0])
+        assert rows[0].status == ClassParticipationStatus.ATTENDED
+        assert rows[0].attendance_time is not None
+
+    def test_bulk_write_reports_only_new_attendances(self, db, sessions):
+        from app.repositories.schedule import class_participation_repository
+
+        now = datetime.now(timezone.utc)
+        entries = [
+            {"session_id": sessions["now"], "member_id": member_id, "attendance_time": now}
+            for member_id in (1, 2, 2, 3)
+        ]
+        statements = _statements(db)
+
+        first = class_participation_repository.mark_attended_bulk(db, gym_id=GYM_ID, entries=entries)
+        second = class_participation_repository.mark_attended_bulk(db, gym_id=GYM_ID, entries=entries[:1])
+
+        assert sorted(first) == [(sessions["now"], 1), (sessions["now"], 2), (sessions["now"], 3)]
+        assert second == []
+        assert len([s for s in statements if s.lstrip().upper().startswith("INSERT")]) == 2
+
+
+class TestOpenSessionsIndex:
+
+    def test_index_is_cached_until_schedule_namespace_changes(self, db, sessions, fake_redis):
+        service = AttendanceService()
+        statements = _statements(db)
+
+        first = asyncio.run(service.get_open_sessions(db, GYM_ID, fake_redis))
+        cached = asyncio.run(service.get_open_sessions(db, GYM_ID, fake_redis))
+
+        # La sesión de dentro de 90 minutos está indexada pero fuera de la ventana
+        assert [s["id"] for s in first] == [sessions["now"]]
+        assert cached == first
+        assert len(statements) == 1
+
+        db.query(ClassSession).filter(ClassSession.id == sessions["now"]).update(
+            {"status": ClassSessionStatus.CANCELLED}
+        )
+        db.commit()
+        # Equivalente a CacheService.bump_namespaces sobre el namespace del gimnasio
+        fake_redis.data[f"cache_ns:sessions:gym:{GYM_ID}"] = "1"
+
+        assert asyncio.run(service.get_open_sessions(db, GYM_ID, fake_redis)) == []
+
+
+class TestBulkCheckIn:
+
+    def _events(self, sessions):
+        service = AttendanceService()
+        now = datetime.now(timezone.utc)
+        token = service.issue_checkin_token(MEMBER_ID, GYM_ID)["token"]
+        expired = service.issue_checkin_token(7, GYM_ID, now=now - timedelta(hours=1))["token"]
+        return [
+            BulkCheckInEvent(event_id="a", qr_code=token, scanned_at=now),
+            BulkCheckInEvent(event_id="b", qr_code="U8_abcd1234", scanned_at=now - timedelta(minutes=5),
+                             session_id=sessions["now"]),
+            BulkCheckInEvent(event_id="c", qr_code="U9_abcd1234", scanned_at=now),
+            BulkCheckInEvent(event_id="d", qr_code=token, scanned_at=now + timedelta(minutes=1)),
+            BulkCheckInEvent(event_id="e", qr_code=expired, scanned_at=now),
+            BulkCheckInEvent(event_id="f", qr_code=token, scanned_at=now + timedelta(hours=1)),
+            BulkCheckInEvent(event_id="a", qr_code=token, scanned_at=now),
+        ]
+
+    def test_batch_is_resolved_with_one_query_per_step(self, db, sessions):
+        db.add(UserGym(user_id=8, gym_id=GYM_ID))
+        db.commit()
+        statements = _statements(db)
+
+        response = asyncio.run(AttendanceService().process_bulk_check_in(db, self._events(sessions), GYM_ID))
+
+        results = {r["event_id"]: r for r in response["results"]}
+        assert [r["event_id"] for r in response["results"]] == ["a", "b", "c", "d", "e", "f", "a"]
+        assert response["recorded"] == 2
+        assert results["a"]["success"] and results["a"]["session_id"] == sessions["now"]
+        assert results["b"]["success"] and results["b"]["session_id"] == sessions["now"]
+        assert results["c"]["message"] == "Usuario no pertenece a este gimnasio"
+        assert results["d"]["message"] == "Ya has hecho check-in en esta clase"
+        assert results["e"]["message"] == "Código QR caducado"
+        assert results["f"]["message"] == "La fecha del escaneo está en el futuro"
+        assert response["results"][-1]["duplicate"] is True
+        # Pertenencia, sesiones y upsert
+        assert len(statements) == 3
+        assert db.query(ClassParticipation).count() == 2
+
+    def test_resent_batch_returns_stored_results(self, db, sessions, fake_redis):
+        db.add(UserGym(user_id=8, gym_id=GYM_ID))
+        db.commit()
+        service = AttendanceService()
+        events = self._events(sessions)
+
+        first = asyncio.run(service.process_bulk_check_in(db, events, GYM_ID, fake_redis))
+        statements = _statements(db)
+        second = asyncio.run(service.process_bulk_check_in(db, events, GYM_ID, fake_redis))
+
+        assert second["recorded"] == 0
+        assert all(r["duplicate"] for r in second["results"])
+        assert [r["success"] for r in second["results"]] == [r["success"] for r in first["results"]]
+        assert statements == []
+
+    def test_offline_scan_from_an_hour_ago_is_accepted_and_replays_are_deduped(self, db, sessions):
+        service = AttendanceService()
+        scanned_at = datetime.now(timezone.utc) - timedelta(hours=1)
+        early = ClassSession(class_id=db.query(Class).first().id, trainer_id=5, gym_id=GYM_ID,
+                             status=ClassSessionStatus.SCHEDULED, start_time=scanned_at + timedelta(minutes=5),
+                             end_time=scanned_at + timedelta(minutes=65))
+        db.add(early)
+        db.commit()
+        token = service.issue_checkin_token(MEMBER_ID, GYM_ID, now=scanned_at)["token"]
+
+        offline = asyncio.run(service.process_bulk_check_in(
+            db, [BulkCheckInEvent(event_id="offline", qr_code=token, scanned_at=scanned_at)], GYM_ID
+        ))
+        replayed = asyncio.run(service.process_bulk_check_in(db, [
+            BulkCheckInEvent(event_id="replay", qr_code=token, scanned_at=scanned_at + timedelta(minutes=1)),
+            BulkCheckInEvent(event_id="moved", qr_code=token, scanned_at=datetime.now(timezone.utc)),
+        ], GYM_ID))
+
+        assert offline["recorded"] == 1
+        assert offline["results"][0]["session_id"] == early.id
+        results = {r["event_id"]: r for r in replayed["results"]}
+        assert replayed["recorded"] == 0
+        assert results["replay"]["message"] == "Ya has hecho check-in en esta clase"
+        # Llevar el token a la hora actual no lo reactiva para otra sesión
+        assert results["moved"]["message"] == "Código QR caducado"
+        assert db.query(ClassParticipation).count() == 1
+
+    def test_repeated_scans_keep_the_earliest_attendance_time(self, db, sessions):
+        db.add(UserGym(user_id=8, gym_id=GYM_ID))
+        db.commit()
+        now = datetime.now(timezone.utc)
+        first_scan = now - timedelta(minutes=10)
+
+        asyncio.run(AttendanceService().process_bulk_check_in(db, [
+            BulkCheckInEvent(event_id="early", qr_code="U8_abcd1234", scanned_at=first_scan,
+                             session_id=sessions["now"]),
+            BulkCheckInEvent(event_id="late", qr_code="U8_abcd1234", scanned_at=now, session_id=sessions["now"]),
+        ], GYM_ID))
+
+        participation = db.query(ClassParticipation).filter(ClassParticipation.member_id == 8).one()
+        assert participation.attendance_time.replace(tzinfo=None) == first_scan.replace(tzinfo=None)
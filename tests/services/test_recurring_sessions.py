@@ -0,0 +1,132 @@
+"""
+Tests de la generación masiva de sesiones recurrentes.
+
+Verifica la expansión del patrón semanal con excepciones y días especiales
+y que todas las sesiones se insertan en lote en una única transacción.
+"""
+
+import asyncio
+from datetime import date, datetime, time, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import event
+
+from app.models.schedule import Class, ClassSession, ClassDifficultyLevel, GymHours, GymSpecialHours
+from app.schemas.schedule import ClassSessionCreate
+from app.services.schedule import ClassSessionService
+
+GYM_ID = 1
+
+
+@pytest.fixture
+def db(sqlite_sessionmaker):
+    session = sqlite_sessionmaker(Class, ClassSession, GymHours, GymSpecialHours)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def class_id(db):
+    class_obj = Class(
+        name="Yoga", duration=60, max_capacity=15,
+        difficulty_level=ClassDifficultyLevel.BEGINNER, gym_id=GYM_ID,
+    )
+    db.add(class_obj)
+    db.commit()
+    return class_obj.id
+
+
+@pytest.fixture(autouse=True)
+def gym_in_utc():
+    with patch("app.repositories.gym.gym_repository.get", return_value=MagicMock(timezone="UTC")):
+        yield
+
+
+def _next_monday() -> date:
+    today = datetime.now(timezone.utc).date()
+    return today + timedelta(days=7 - today.weekday())
+
+
+def _create(db, class_id, start_date, end_date, trainer_id=1, **kwargs):
+    base = ClassSessionCreate(
+        class_id=class_id, trainer_id=trainer_id,
+        start_time=datetime.combine(start_date, time(18, 0)),
+        end_time=datetime.combine(start_date, time(19, 0)),
+    )
+    return asyncio.run(ClassSessionService().create_recurring_sessions(
+        db, base_session_data=base, start_date=start_date, end_date=end_date,
+        days_of_week=[0, 2, 4], gym_id=GYM_ID, **kwargs
+    ))
+
+
+class TestRecurrenceExpansion:
+
+    def test_expands_weekdays_in_order(self):
+        monday = date(2030, 1, 7)
+        dates = ClassSessionService._expand_weekly_recurrence(monday, monday + timedelta(days=13), [4, 0])
+        assert dates == [
+            date(2030, 1, 7), date(2030, 1, 11), date(2030, 1, 14), date(2030, 1, 18)
+        ]
+
+    def test_excludes_exception_dates(self):
+        monday = date(2030, 1, 7)
+        dates = ClassSessionService._expand_weekly_recurrence(
+            monday, monday + timedelta(days=13), [0], exclude_dates=[date(2030, 1, 14)]
+        )
+        assert dates == [date(2030, 1, 7)]
+
+
+class TestBulkRecurringSessions:
+
+    def test_year_of_sessions_inserted_in_one_transaction(self, db, class_id):
+        start = _next_monday()
+        statements = []
+        event.listen(db.get_bind(), "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        with patch.object(db, "commit", wraps=db.commit) as commit:
+            sessions = _create(db, class_id, start, start + timedelta(weeks=52) - timedelta(days=1))
+
+        assert len(sessions) == 156
+        assert commit.call_count == 1
+        inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT")]
+        assert 0 < len(inserts) < 10
+        assert all(s.is_recurring and s.recurrence_pattern == "WEEKLY:0,2,4" for s in sessions)
+        assert sessions[0].start_time.replace(tzinfo=None) == datetime.combine(start, time(18, 0))
+        assert [s.start_time for s in sessions] == sorted(s.start_time for s in sessions)
+
+    def test_skips_closed_and_out_of_hours_special_days(self, db, class_id):
+        start = _next_monday()
+        db.add_all([
+            GymSpecialHours(gym_id=GYM_ID, date=start, is_closed=True, description="Festivo"),
+            GymSpecialHours(gym_id=GYM_ID, date=start + timedelta(days=2), is_closed=False,
+                            open_time=time(8, 0), close_time=time(14, 0), description="Horario reducido"),
+            GymSpecialHours(gym_id=GYM_ID, date=start + timedelta(days=4), is_closed=False,
+                            open_time=time(8, 0), close_time=time(22, 0), description="Evento"),
+        ])
+        db.commit()
+
+        sessions = _create(db, class_id, start, start + timedelta(days=6))
+        assert [s.start_time.date() for s in sessions] == [start + timedelta(days=4)]
+
+        # Otro entrenador: el primero ya tiene la sesión del viernes
+        sessions = _create(db, class_id, start, start + timedelta(days=6), trainer_id=2, skip_special_days=False)
+        assert len(sessions) == 3
+
+    def test_exclude_dates_are_not_created(self, db, class_id):
+        start = _next_monday()
+        sessions = _create(db, class_id, start, start + timedelta(days=6), exclude_dates=[start + timedelta(days=2)])
+        assert [s.start_time.date() for s in sessions] == [start, start + timedelta(days=4)]
+
+    def test_trainer_double_booking_rejects_series(self, db, class_id):
+        from fastapi import HTTPException
+
+        start = _next_monday()
+        _create(db, class_id, start + timedelta(weeks=4), start + timedelta(weeks=4, days=6))
+
+        with pytest.raises(HTTPException) as exc_info:
+            _create(db, class_id, start, start + timedelta(weeks=8) - timedelta(days=1))
+
+        assert exc_info.value.status_code == 409
+        assert db.query(ClassSession).count() == 3
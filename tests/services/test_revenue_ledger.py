@@ -0,0 +1,199 @@
+"""
+Tests del libro de ingresos alimentado por webhooks de Stripe y de los
+resúmenes de ingresos calculados con SQL sobre él.
+
+El backfill usa el SDK real contra los listados paginados de ``stripe_stub``.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.gym import Gym
+from app.models.membership import MembershipPlan
+from app.models.revenue import RevenueEntryType, RevenueLedgerEntry
+from app.models.stripe_profile import GymStripeAccount, UserGymStripeProfile
+from app.models.user_gym_subscription import UserGymSubscription
+from app.services.gym_revenue import GymRevenueService
+from app.services.revenue_ledger import RevenueLedgerService
+
+ACCOUNT = "acct_gym_1"
+NOW = datetime.now(timezone.utc)
+CREATED = int((NOW - timedelta(days=2)).timestamp())
+
+
+@pytest.fixture
+def db(sqlite_sessionmaker):
+    session = sqlite_sessionmaker(Gym, MembershipPlan, GymStripeAccount, UserGymStripeProfile, UserGymSubscription, RevenueLedgerEntry)()
+    session.add_all([
+        Gym(id=1, name="Centro", subdomain="centro", is_active=True),
+        Gym(id=2, name="Norte", subdomain="norte", is_active=True),
+        Gym(id=3, name="Cerrado", subdomain="cerrado", is_active=False),
+        MembershipPlan(id=10, gym_id=1, name="Mensual", price_cents=3000, billing_interval="month",
+                       duration_days=30),
+        GymStripeAccount(gym_id=1, stripe_account_id=ACCOUNT, is_active=True),
+        UserGymStripeProfile(id=1, user_id=5, gym_id=1, stripe_customer_id="cus_5", stripe_account_id=ACCOUNT,
+                             email="socio@example.com", stripe_subscription_id="sub_5"),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def _invoice(invoice_id="in_1", amount=3000, subscription="sub_5", metadata=None):
+    return {"id": invoice_id, "object": "invoice", "amount_paid": amount, "currency": "eur",
+            "subscription": subscription, "customer": "cus_5", "metadata": metadata or {},
+            "created": CREATED, "status_transitions": {"paid_at": CREATED}}
+
+
+def _checkout(session_id="cs_1", mode="payment", gym_id="2"):
+    return {"id": session_id, "object": "checkout.session", "mode": mode, "payment_status": "paid",
+            "payment_intent": f"pi_{session_id}", "amount_total": 1500, "currency": "eur", "created": CREATED,
+            "metadata": {"gym_id": gym_id, "user_id": "6", "plan_id": "11", "plan_name": "Pase Día"}}
+
+
+def _event_payment(intent_id="pi_event_1", amount=2500):
+    return {"id": intent_id, "object": "payment_intent", "status": "succeeded", "amount": amount,
+            "amount_received": amount, "currency": "eur", "created": CREATED,
+            "metadata": {"event_id": "40", "gym_id": "1", "user_id": "7"}}
+
+
+def _refunded_charge(charge_id="ch_1", payment_intent="pi_event_1", amount_refunded=1000):
+    return {"id": charge_id, "object": "charge", "payment_intent": payment_intent, "invoice": None,
+            "amount_refunded": amount_refunded, "refunded": True, "currency": "eur", "created": CREATED,
+            "metadata": {}}
+
+
+def _entries(db):
+    return {entry.source_id: entry for entry in db.query(RevenueLedgerEntry)}
+
+
+class TestRecordWebhookEvents:
+
+    def test_records_each_revenue_event_once(self, db):
+        service = RevenueLedgerService()
+        for _ in range(2):  # Stripe puede reenviar el mismo webhook
+            service.record_webhook_event(db, "invoice.payment_succeeded", _invoice())
+            service.record_webhook_event(db, "checkout.session.completed", _checkout())
+            service.record_webhook_event(db, "checkout.session.completed", _checkout("cs_sub", mode="subscription"))
+            service.record_webhook_event(db, "payment_intent.succeeded", _event_payment())
+            service.record_webhook_event(db, "payment_intent.succeeded", {**_event_payment("pi_other"), "metadata": {}})
+
+        entries = _entries(db)
+        assert set(entries) == {"in_1", "pi_cs_1", "pi_event_1"}
+        invoice = entries["in_1"]
+        # Gimnasio y plan resueltos con el perfil local, sin pedir la suscripción a Stripe
+        assert (invoice.gym_id, invoice.user_id, invoice.plan_name, invoice.currency) == (1, 5, None, "EUR")
+        assert (entries["pi_cs_1"].entry_type, entries["pi_cs_1"].gym_id) == (RevenueEntryType.ONE_TIME_PAYMENT, 2)
+        assert (entries["pi_event_1"].event_id, entries["pi_event_1"].amount_cents) == (40, 2500)
+
+    def test_plan_is_resolved_from_local_subscription(self, db):
+        db.add(UserGymSubscription(user_gym_stripe_profile_id=1, stripe_subscription_id="sub_5", plan_id=10))
+        db.commit()
+
+        entry = RevenueLedgerService().record_invoice_paid(db, _invoice())
+
+        assert (entry.plan_id, entry.plan_name) == (10, "Mensual")
+
+    def test_partial_refunds_accumulate_on_original_gym(self, db):
+        service = RevenueLedgerService()
+        service.record_event_payment(db, _event_payment())
+        service.record_webhook_event(db, "charge.refunded", _refunded_charge(amount_refunded=1000),
+                                     occurred_at=NOW)
+        service.record_webhook_event(db, "charge.refunded", _refunded_charge(amount_refunded=2500),
+                                     occurred_at=NOW)
+
+        refund = _entries(db)["refund:ch_1"]
+        assert (refund.entry_type, refund.amount_cents, refund.gym_id, refund.event_id) == (
+            RevenueEntryType.REFUND, -2500, 1, 40
+        )
+
+    def test_late_refund_webhook_keeps_larger_total_and_first_date(self, db):
+        service = RevenueLedgerService()
+        service.record_event_payment(db, _event_payment())
+        service.record_webhook_event(db, "charge.refunded", _refunded_charge(amount_refunded=2500),
+                                     occurred_at=NOW)
+        service.record_webhook_event(db, "charge.refunded", _refunded_charge(amount_refunded=1000),
+                                     occurred_at=NOW + timedelta(hours=1))
+
+        refund = _entries(db)["refund:ch_1"]
+        assert refund.amount_cents == -2500
+        assert refund.occurred_at.replace(tzinfo=None) == NOW.replace(tzinfo=None)
+
+    def test_connected_account_resolves_gym_without_metadata(self, db):
+        checkout = _checkout(gym_id="")
+        entry = RevenueLedgerService().record_checkout_completed(db, checkout, stripe_account=ACCOUNT)
+        assert entry.gym_id == 1
+        assert RevenueLedgerService().record_checkout_completed(db, _checkout("cs_2", gym_id="")) is None
+
+
+class TestRevenueSummaries:
+
+    @pytest.fixture
+    def ledger(self, db):
+        service = RevenueLedgerService()
+        db.add(UserGymSubscription(user_gym_stripe_profile_id=1, stripe_subscription_id="sub_5", plan_id=10))
+        db.commit()
+        service.record_invoice_paid(db, _invoice("in_1"))
+        service.record_invoice_paid(db, _invoice("in_2"))
+        service.record_event_payment(db, _event_payment())
+        service.record_charge_refunded(db, _refunded_charge(amount_refunded=500))
+        service.record_checkout_completed(db, _checkout())
+        # Fuera del periodo
+        old = _invoice("in_old")
+        old["status_transitions"]["paid_at"] = int((NOW - timedelta(days=90)).timestamp())
+        service.record_invoice_paid(db, old)
+        return db
+
+    def test_gym_summary_and_payout(self, ledger):
+        service = GymRevenueService()
+        start, end = NOW - timedelta(days=30), NOW
+
+        summary = asyncio.run(service.get_gym_revenue_summary(ledger, 1, start, end))
+
+        assert summary["revenue"]["total_gross"] == 85.0
+        assert summary["revenue"]["refunds"] == 5.0
+        assert summary["revenue"]["platform_fee"] == pytest.approx(4.0)
+        assert summary["revenue"]["gym_net"] == pytest.approx(76.0)
+        assert summary["transactions"]["total_count"] == 3
+        assert summary["transactions"]["by_plan"] == {
+            "Mensual": {"count": 2, "revenue": 60.0}, "Unknown": {"count": 1, "revenue": 25.0}
+        }
+
+        payout = asyncio.run(service.calculate_gym_payout(ledger, 1, start, end))
+        assert payout["payout_amount"] == pytest.approx(76.0)
+        assert payout["gym_name"] == "Centro"
+
+    def test_platform_summary_aggregates_active_gyms(self, ledger):
+        summary = asyncio.run(GymRevenueService().get_platform_revenue_summary(
+            ledger, NOW - timedelta(days=30), NOW
+        ))
+
+        assert [(g["gym_id"], g["transaction_count"]) for g in summary["gyms"]] == [(1, 3), (2, 1)]
+        assert summary["totals"]["gross_revenue"] == 100.0
+        assert summary["totals"]["total_transactions"] == 4
+        assert summary["totals"]["gym_payouts"] == pytest.approx((100.0 - 5.0) * 0.95)
+
+
+class TestBackfill:
+
+    def test_walks_every_page_of_each_listing(self, db, stripe_stub):
+        stripe_stub.page_size = 2
+        stripe_stub.lists = {
+            "/v1/invoices": [_invoice(f"in_{i}") for i in range(5)],
+            "/v1/checkout/sessions": [_checkout("cs_1", gym_id=""), _checkout("cs_sub", mode="subscription")],
+            "/v1/payment_intents": [_event_payment(f"pi_event_{i}") for i in range(3)],
+            "/v1/charges": [_refunded_charge(), _refunded_charge("ch_2", amount_refunded=0)],
+        }
+
+        counts = RevenueLedgerService().backfill(db, since=NOW - timedelta(days=30), stripe_account=ACCOUNT)
+
+        assert counts == {"SUBSCRIPTION_INVOICE": 5, "ONE_TIME_PAYMENT": 1, "EVENT_PAYMENT": 3, "REFUND": 1}
+        invoice_pages = [r for r in stripe_stub.requests if r["path"] == "/v1/invoices"]
+        assert len(invoice_pages) == 3
+        assert {r["stripe_account"] for r in stripe_stub.requests} == {ACCOUNT}
+
+        # Repetir el backfill no duplica movimientos
+        RevenueLedgerService().backfill(db, since=NOW - timedelta(days=30), stripe_account=ACCOUNT)
+        assert db.query(RevenueLedgerEntry).count() == 10
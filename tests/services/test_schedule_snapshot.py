@@ -0,0 +1,144 @@
+"""
+Tests de la instantánea diaria del horario por gimnasio.
+"""
+
+import asyncio
+from datetime import date, datetime, time, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.models.schedule import (
+    Class,
+    ClassSession,
+    ClassSessionStatus,
+    ClassDifficultyLevel,
+    GymHours,
+    GymSpecialHours,
+    DayOfWeek,
+)
+from app.services.schedule_snapshot import ScheduleSnapshotService, _PATCH_SCRIPT
+
+GYM_ID = 1
+DAY = date(2030, 1, 7)  # Lunes
+
+
+@pytest.fixture
+def db(sqlite_sessionmaker):
+    session = sqlite_sessionmaker(Class, ClassSession, GymHours, GymSpecialHours)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def schedule(db):
+    class_obj = Class(
+        name="Spinning", duration=45, max_capacity=12,
+        difficulty_level=ClassDifficultyLevel.INTERMEDIATE, gym_id=GYM_ID,
+    )
+    db.add(class_obj)
+    db.add(GymHours(gym_id=GYM_ID, day_of_week=DayOfWeek.MONDAY,
+                    open_time=time(7, 0), close_time=time(22, 0), is_closed=False))
+    db.flush()
+    sessions = [
+        ClassSession(class_id=class_obj.id, trainer_id=5, gym_id=GYM_ID,
+                     start_time=datetime.combine(DAY, time(hour)),
+                     end_time=datetime.combine(DAY, time(hour, 45)),
+                     status=ClassSessionStatus.SCHEDULED, current_participants=participants)
+        for hour, participants in ((19, 3), (9, 12))
+    ]
+    # Sesión de otro día: no debe aparecer
+    sessions.append(ClassSession(class_id=class_obj.id, trainer_id=5, gym_id=GYM_ID,
+                                 start_time=datetime.combine(DAY + timedelta(days=1), time(9)),
+                                 end_time=datetime.combine(DAY + timedelta(days=1), time(9, 45))))
+    db.add_all(sessions)
+    db.commit()
+    return class_obj, sessions
+
+
+class TestBuildSnapshot:
+
+    def test_day_is_built_from_one_query_per_source(self, db, schedule):
+        _class_obj, sessions = schedule
+        service = ScheduleSnapshotService()
+
+        snapshot, etag = asyncio.run(service.get_day(db, None, GYM_ID, "UTC", DAY))
+
+        assert snapshot["hours"]["open"] == "07:00"
+        assert snapshot["hours"]["closed"] is False
+        assert [s["id"] for s in snapshot["sessions"]] == [sessions[1].id, sessions[0].id]
+        morning = snapshot["sessions"][0]
+        assert morning["name"] == "Spinning"
+        assert (morning["registered"], morning["available"]) == (12, 0)
+        assert snapshot["sessions"][1]["available"] == 9
+        assert etag.startswith(f'"{GYM_ID}-{DAY.isoformat()}-')
+
+    def test_special_hours_override_weekly_hours(self, db, schedule):
+        db.add(GymSpecialHours(gym_id=GYM_ID, date=DAY, is_closed=True, description="Festivo"))
+        db.commit()
+
+        snapshot, _etag = asyncio.run(ScheduleSnapshotService().get_day(db, None, GYM_ID, "UTC", DAY))
+
+        assert snapshot["hours"] == {
+            "open": None, "close": None, "closed": True, "special": True, "description": "Festivo"
+        }
+
+    def test_cached_snapshot_is_served_without_database(self, db, schedule):
+        service = ScheduleSnapshotService()
+        fields = service.build_fields(db, GYM_ID, "UTC", DAY)
+        redis_client = AsyncMock()
+        redis_client.hgetall.return_value = fields
+
+        snapshot, etag = asyncio.run(service.get_day(None, redis_client, GYM_ID, "UTC", DAY))
+
+        assert len(snapshot["sessions"]) == 2
+        assert etag == service.etag_for(GYM_ID, DAY, fields["v"])
+
+
+class TestSnapshotPatches:
+
+    def test_availability_patch_only_touches_counter(self, db, schedule):
+        _class_obj, sessions = schedule
+        service = ScheduleSnapshotService()
+        redis_client = AsyncMock()
+
+        asyncio.run(service.update_availability(redis_client, sessions[0], "UTC"))
+
+        redis_client.eval.assert_awaited_once_with(
+            _PATCH_SCRIPT, 1, service.key(GYM_ID, DAY), f"n:{sessions[0].id}", "3"
+        )
+
+    def test_moved_session_is_removed_from_previous_day(self, db, schedule):
+        class_obj, sessions = schedule
+        service = ScheduleSnapshotService()
+        redis_client = AsyncMock()
+        previous_start = sessions[0].start_time
+        sessions[0].start_time = previous_start + timedelta(days=2)
+
+        asyncio.run(service.upsert_session(
+            redis_client, sessions[0], class_obj, "UTC", previous_start_time=previous_start
+        ))
+
+        patched_keys = [call.args[2] for call in redis_client.eval.await_args_list]
+        assert patched_keys == [service.key(GYM_ID, DAY), service.key(GYM_ID, DAY + timedelta(days=2))]
+        removal = redis_client.eval.await_args_list[0].args
+        assert removal[3:] == (f"s:{sessions[0].id}", "", f"n:{sessions[0].id}", "")
+
+    def test_failed_patch_drops_snapshot(self, db, schedule):
+        _class_obj, sessions = schedule
+        service = ScheduleSnapshotService()
+        redis_client = AsyncMock()
+        redis_client.eval.side_effect = Exception("NOSCRIPT")
+
+        asyncio.run(service.update_availability(redis_client, sessions[0], "UTC"))
+
+        redis_client.delete.assert_awaited_once_with(service.key(GYM_ID, DAY))
+
+    def test_status_job_invalidates_adjacent_days(self):
+        service = ScheduleSnapshotService()
+        redis_client = AsyncMock()
+
+        asyncio.run(service.invalidate_sessions(redis_client, GYM_ID, [datetime.combine(DAY, time(9))]))
+
+        deleted = set(redis_client.delete.await_args.args)
+        assert deleted == {service.key(GYM_ID, DAY + timedelta(days=offset)) for offset in (-1, 0, 1)}
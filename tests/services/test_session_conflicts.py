@@ -0,0 +1,90 @@
+"""
+Tests de la detección de solapamientos de entrenador y sala.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from app.models.schedule import ClassSession, ClassSessionStatus
+from app.services.session_conflicts import IntervalIndex, SessionConflictService
+
+GYM_ID = 1
+TRAINER_ID = 5
+BASE = datetime(2030, 1, 7, 18, 0, tzinfo=timezone.utc)
+
+
+def _hours(start_offset, end_offset):
+    return BASE + timedelta(hours=start_offset), BASE + timedelta(hours=end_offset)
+
+
+@pytest.fixture
+def db(sqlite_sessionmaker):
+    session = sqlite_sessionmaker(ClassSession)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def existing(db):
+    specs = {
+        "trainer": (TRAINER_ID, None, 0, 1, ClassSessionStatus.SCHEDULED),
+        "room": (9, "Sala 1", 24, 25, ClassSessionStatus.SCHEDULED),
+        "cancelled": (TRAINER_ID, None, 48, 49, ClassSessionStatus.CANCELLED),
+        "other_gym_room": (9, "Sala 1", 72, 73, ClassSessionStatus.SCHEDULED),
+    }
+    ids = {}
+    for name, (trainer_id, room, start, end, status) in specs.items():
+        start_time, end_time = _hours(start, end)
+        session = ClassSession(class_id=1, trainer_id=trainer_id, room=room, status=status,
+                               gym_id=2 if name == "other_gym_room" else GYM_ID,
+                               start_time=start_time, end_time=end_time)
+        db.add(session)
+        db.flush()
+        ids[name] = session.id
+    db.commit()
+    return ids
+
+
+class TestIntervalIndex:
+
+    def test_touching_intervals_do_not_overlap(self):
+        index = IntervalIndex([(*_hours(0, 1), "a")])
+
+        assert index.overlapping(*_hours(1, 2)) == []
+        assert index.overlapping(*_hours(-1, 0)) == []
+        assert index.overlapping(*_hours(0.5, 2)) == ["a"]
+
+    def test_long_interval_is_found_past_shorter_ones(self):
+        index = IntervalIndex([(*_hours(0, 10), "long"), (*_hours(1, 2), "short"), (*_hours(3, 4), "later")])
+
+        assert sorted(index.overlapping(*_hours(5, 6))) == ["long"]
+        assert sorted(index.overlapping(*_hours(1.5, 3.5))) == ["later", "long", "short"]
+
+
+class TestFindConflicts:
+
+    def test_series_is_checked_with_one_query(self, db, existing):
+        statements = []
+        event.listen(db.get_bind(), "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        intervals = [_hours(day * 24 + 0.5, day * 24 + 1.5) for day in range(200)]
+
+        conflicts = SessionConflictService().find_conflicts(
+            db, gym_id=GYM_ID, intervals=intervals, trainer_id=TRAINER_ID, room="Sala 1"
+        )
+
+        assert len(statements) == 1
+        assert [(c["index"], c["reason"], c["session_id"]) for c in conflicts] == [
+            (0, "trainer", existing["trainer"]),
+            (1, "room", existing["room"]),
+        ]
+
+    def test_edited_session_is_excluded(self, db, existing):
+        conflicts = SessionConflictService().find_conflicts(
+            db, gym_id=GYM_ID, intervals=[_hours(0.5, 1.5)], trainer_id=TRAINER_ID,
+            exclude_session_ids=[existing["trainer"]]
+        )
+
+        assert conflicts == []
@@ -0,0 +1,148 @@
+"""
+Tests de las transiciones de estado programadas de las sesiones de clase.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core import scheduler
+from app.db.base import Base
+from app.models.schedule import (
+    Class, ClassDifficultyLevel, ClassParticipation, ClassParticipationStatus, ClassSession, ClassSessionStatus,
+)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sessions.db'}")
+    Base.metadata.create_all(engine, tables=[Class.__table__, ClassSession.__table__, ClassParticipation.__table__])
+    factory = sessionmaker(bind=engine, autoflush=False)
+    with patch.object(scheduler, "SessionLocal", factory):
+        yield factory
+    engine.dispose()
+
+
+def _add_sessions(factory, specs):
+    now = datetime.now(timezone.utc)
+    db = factory()
+    ids = {}
+    for name, (gym_id, status, start_offset, end_offset) in specs.items():
+        session = ClassSession(
+            class_id=1, trainer_id=gym_id * 10, gym_id=gym_id, status=status,
+            start_time=now + timedelta(minutes=start_offset),
+            end_time=now + timedelta(minutes=end_offset),
+        )
+        db.add(session)
+        db.flush()
+        ids[name] = session.id
+    db.commit()
+    db.close()
+    return ids
+
+
+def _status_by_id(factory):
+    db = factory()
+    try:
+        return {s.id: s.status for s in db.query(ClassSession)}
+    finally:
+        db.close()
+
+
+class TestMarkCompletedSessions:
+
+    def test_set_based_transitions(self, session_factory):
+        ids = _add_sessions(session_factory, {
+            "finished": (1, ClassSessionStatus.SCHEDULED, -120, -60),
+            "running_finished": (1, ClassSessionStatus.IN_PROGRESS, -90, -30),
+            "running": (2, ClassSessionStatus.SCHEDULED, -10, 50),
+            "future": (2, ClassSessionStatus.SCHEDULED, 60, 120),
+            "cancelled": (2, ClassSessionStatus.CANCELLED, -120, -60),
+        })
+
+        sessions_by_gym = scheduler.mark_completed_sessions()
+
+        statuses = _status_by_id(session_factory)
+        assert statuses[ids["finished"]] == ClassSessionStatus.COMPLETED
+        assert statuses[ids["running_finished"]] == ClassSessionStatus.COMPLETED
+        assert statuses[ids["running"]] == ClassSessionStatus.IN_PROGRESS
+        assert statuses[ids["future"]] == ClassSessionStatus.SCHEDULED
+        assert statuses[ids["cancelled"]] == ClassSessionStatus.CANCELLED
+        assert {gym: sorted(r.id for r in rows) for gym, rows in sessions_by_gym.items()} == {
+            1: sorted([ids["finished"], ids["running_finished"]]),
+            2: [ids["running"]],
+        }
+
+    def test_nothing_to_update_returns_empty(self, session_factory):
+        _add_sessions(session_factory, {"future": (1, ClassSessionStatus.SCHEDULED, 60, 120)})
+        assert scheduler.mark_completed_sessions() == {}
+
+    def test_job_invalidates_only_affected_gyms(self, session_factory):
+        _add_sessions(session_factory, {
+            "finished": (1, ClassSessionStatus.SCHEDULED, -120, -60),
+            "future": (2, ClassSessionStatus.SCHEDULED, 60, 120),
+        })
+        redis_client = object()
+
+        with patch.object(scheduler, "get_redis_client", AsyncMock(return_value=redis_client)), \
+             patch("app.services.schedule.class_session_service.invalidate_session_status_caches",
+                   new_callable=AsyncMock) as invalidate:
+            asyncio.run(scheduler.update_session_statuses())
+
+        invalidate.assert_awaited_once()
+        args = invalidate.await_args.args
+        assert args[0] is redis_client
+        assert args[1] == 1
+        assert len(args[2]) == 1
+
+    def test_failed_invalidation_still_publishes_completed_classes(self, session_factory):
+        ids = _add_sessions(session_factory, {"finished": (1, ClassSessionStatus.SCHEDULED, -120, -60)})
+        db = session_factory()
+        db.add(Class(id=1, name="Spinning", duration=60, max_capacity=20,
+                     difficulty_level=ClassDifficultyLevel.BEGINNER, gym_id=1))
+        db.add(ClassParticipation(session_id=ids["finished"], member_id=5, gym_id=1,
+                                  status=ClassParticipationStatus.ATTENDED))
+        db.commit()
+        db.close()
+
+        with patch.object(scheduler, "get_redis_client", AsyncMock(return_value=object())), \
+             patch("app.services.schedule.class_session_service.invalidate_session_status_caches",
+                   new_callable=AsyncMock, side_effect=ConnectionError("redis caído")), \
+             patch("app.services.activity_aggregator.ActivityAggregator.on_class_completed",
+                   new_callable=AsyncMock) as on_class_completed:
+            asyncio.run(scheduler.update_session_statuses())
+
+        on_class_completed.assert_awaited_once()
+        assert on_class_completed.await_args.args[0]["session_id"] == ids["finished"]
+
+    def test_job_publishes_completed_classes_with_attendees(self, session_factory):
+        ids = _add_sessions(session_factory, {
+            "finished": (1, ClassSessionStatus.SCHEDULED, -120, -60),
+            "running": (1, ClassSessionStatus.SCHEDULED, -10, 50),
+        })
+        db = session_factory()
+        db.add(Class(id=1, name="Spinning", duration=60, max_capacity=20,
+                     difficulty_level=ClassDifficultyLevel.BEGINNER, gym_id=1))
+        db.add_all([
+            ClassParticipation(session_id=ids["finished"], member_id=member_id, gym_id=1, status=status)
+            for member_id, status in [(5, ClassParticipationStatus.ATTENDED), (6, ClassParticipationStatus.ATTENDED),
+                                      (7, ClassParticipationStatus.REGISTERED)]
+        ])
+        db.commit()
+        db.close()
+
+        with patch.object(scheduler, "get_redis_client", AsyncMock(return_value=object())), \
+             patch("app.services.schedule.class_session_service.invalidate_session_status_caches",
+                   new_callable=AsyncMock), \
+             patch("app.services.activity_aggregator.ActivityAggregator.on_class_completed",
+                   new_callable=AsyncMock) as on_class_completed:
+            asyncio.run(scheduler.update_session_statuses())
+
+        on_class_completed.assert_awaited_once()
+        event = on_class_completed.await_args.args[0]
+        assert (event["session_id"], event["gym_id"], event["class_name"]) == (ids["finished"], 1, "Spinning")
+        assert (sorted(event["participant_ids"]), event["total_participants"], event["duration_minutes"]) == ([5, 6], 2, 60)
@@ -0,0 +1,155 @@
+"""
+Tests para el pipeline de ingesta de vistas de historias.
+
+Verifica que las vistas se encolan en Redis sin escribir en BD, que el
+consumidor persiste en lote y confirma (XACK) las entradas procesadas, y que
+StoryService vuelve a la escritura síncrona si Redis falla.
+"""
+
+import pytest
+from unittest.mock import Mock, AsyncMock, MagicMock
+from redis.asyncio import Redis
+from sqlalchemy.orm import Session
+
+from app.models.story import Story
+from app.services.story_service import StoryService
+from app.services.story_view_ingestion import StoryViewIngestionService
+
+
+def _result(values):
+    """Resultado de db.execute() con .scalars().all() configurado."""
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = values
+    return result
+
+
+class TestStoryViewIngestion:
+    """Tests del servicio de ingesta."""
+
+    @pytest.mark.asyncio
+    async def test_record_view_enqueues_with_dedup_keys(self):
+        redis_mock = AsyncMock(spec=Redis)
+        redis_mock.eval = AsyncMock(return_value=1)
+        service = StoryViewIngestionService(redis_mock)
+
+        queued = await service.record_view(story_id=10, gym_id=1, viewer_id=5, device_info="iOS")
+
+        assert queued is True
+        args = redis_mock.eval.call_args.args
+        assert args[1] == 2
+        assert args[2] == "story:10:viewers"
+        assert args[3] == StoryViewIngestionService.STREAM_KEY
+        assert args[4] == "5"
+        assert "device_info" in args and "iOS" in args
+
+    @pytest.mark.asyncio
+    async def test_record_view_duplicate_returns_false(self):
+        redis_mock = AsyncMock(spec=Redis)
+        redis_mock.eval = AsyncMock(return_value=0)
+        service = StoryViewIngestionService(redis_mock)
+
+        assert await service.record_view(story_id=10, gym_id=1, viewer_id=5) is False
+
+    @pytest.mark.asyncio
+    async def test_flush_persists_batch_and_acks(self):
+        redis_mock = AsyncMock(spec=Redis)
+        redis_mock.xgroup_create = AsyncMock(return_value=True)
+        redis_mock.xautoclaim = AsyncMock(return_value=["0-0", [], []])
+        redis_mock.xreadgroup = AsyncMock(return_value=[
+            ("stories:views:stream", [
+                ("1-0", {"story_id": "10", "gym_id": "1", "viewer_id": "5",
+                         "viewed_at": "2026-01-01T10:00:00+00:00",
+                         "view_duration_seconds": "4", "device_info": "iOS"}),
+                ("1-1", {"story_id": "10", "gym_id": "1", "viewer_id": "6",
+                         "viewed_at": "2026-01-01T10:00:01+00:00",
+                         "view_duration_seconds": "", "device_info": ""}),
+                ("1-2", {"story_id": "99", "gym_id": "1", "viewer_id": "6",
+                         "viewed_at": "2026-01-01T10:00:02+00:00"}),
+            ])
+        ])
+        redis_mock.xack = AsyncMock(return_value=3)
+        redis_mock.xdel = AsyncMock(return_value=3)
+
+        db = Mock(spec=Session)
+        db.execute.side_effect = [
+            _result([10]),      # historias existentes (99 fue eliminada)
+            _result([10, 10]),  # story_id de las filas insertadas
+            MagicMock(),        # UPDATE de view_count
+        ]
+
+        service = StoryViewIngestionService(redis_mock)
+        inserted = await service.flush_pending_views(db, batch_size=10)
+
+        assert inserted == 2
+        assert db.execute.call_count == 3
+        update_params = db.execute.call_args_list[2].args[1]
+        assert update_params == [{"b_story_id": 10, "b_increment": 2}]
+        db.commit.assert_called_once()
+        redis_mock.xack.assert_awaited_once_with(
+            StoryViewIngestionService.STREAM_KEY,
+            StoryViewIngestionService.CONSUMER_GROUP,
+            "1-0", "1-1", "1-2"
+        )
+
+    @pytest.mark.asyncio
+    async def test_flush_does_not_ack_on_db_error(self):
+        redis_mock = AsyncMock(spec=Redis)
+        redis_mock.xgroup_create = AsyncMock(return_value=True)
+        redis_mock.xautoclaim = AsyncMock(return_value=["0-0", [], []])
+        redis_mock.xreadgroup = AsyncMock(return_value=[
+            ("stories:views:stream", [
+                ("1-0", {"story_id": "10", "gym_id": "1", "viewer_id": "5"}),
+            ])
+        ])
+
+        db = Mock(spec=Session)
+        db.execute.side_effect = [_result([10]), Exception("db down")]
+
+        service = StoryViewIngestionService(redis_mock)
+        with pytest.raises(Exception):
+            await service.flush_pending_views(db)
+
+        db.rollback.assert_called_once()
+        redis_mock.xack.assert_not_called()
+
+
+class TestStoryServiceViews:
+    """Tests de integración de StoryService con la ingesta."""
+
+    @pytest.fixture
+    def story(self):
+        story = Mock(spec=Story)
+        story.id = 10
+        story.gym_id = 1
+        story.user_id = 2
+        story.view_count = 0
+        return story
+
+    @pytest.mark.asyncio
+    async def test_mark_viewed_with_redis_skips_db_write(self, story):
+        db = Mock(spec=Session)
+        db.execute.return_value.scalar_one_or_none.return_value = story
+        redis_mock = AsyncMock(spec=Redis)
+        redis_mock.eval = AsyncMock(return_value=1)
+
+        service = StoryService(db, redis_mock)
+        result = await service.mark_story_as_viewed(story_id=10, gym_id=1, user_id=5)
+
+        assert result is None
+        redis_mock.eval.assert_awaited_once()
+        db.add.assert_not_called()
+        db.commit.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_mark_viewed_falls_back_to_db_when_redis_fails(self, story):
+        db = Mock(spec=Session)
+        db.execute.return_value.scalar_one_or_none.side_effect = [story, None]
+        redis_mock = AsyncMock(spec=Redis)
+        redis_mock.eval = AsyncMock(side_effect=ConnectionError("redis down"))
+
+        service = StoryService(db, redis_mock)
+        await service.mark_story_as_viewed(story_id=10, gym_id=1, user_id=5)
+
+        db.add.assert_called_once()
+        db.commit.assert_called_once()
+        assert story.view_count == 1
@@ -0,0 +1,183 @@
+"""
+Tests para el cliente asíncrono de Stream Activity Feeds.
+
+Usa un servidor falso de Stream en memoria (httpx.MockTransport) que
+implementa los endpoints REST usados por los repositorios de posts e
+historias, de forma que no hay llamadas de red reales.
+"""
+
+import asyncio
+import json
+import re
+from collections import defaultdict
+
+import httpx
+import pytest
+
+from app.core.stream_feeds_async import AsyncStreamFeedsClient
+from app.repositories.post_feed_repository import PostFeedRepository
+
+
+class FakeStreamFeedsServer:
+    """Servidor falso de la API REST de Stream Feeds."""
+
+    FEED_RE = re.compile(r"^/api/v1\.0/feed/(?P<slug>\w+)/(?P<user>\w+)/(?P<rest>.*)$")
+
+    def __init__(self, delay: float = 0.0):
+        self.feeds = defaultdict(list)
+        self.follows = []
+        self.requests = []
+        self.delay = delay
+        self._next_id = 0
+
+    def _new_activity(self, feed_id, data):
+        self._next_id += 1
+        activity = {**data, "id": f"act-{self._next_id}"}
+        self.feeds[feed_id].insert(0, activity)
+        return activity
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append((request.method, request.url.path))
+        assert request.headers["stream-auth-type"] == "jwt"
+        assert request.url.params["api_key"] == "key"
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        path = request.url.path
+        body = json.loads(request.content) if request.content else None
+
+        if path == "/api/v1.0/follow_many/" and request.method == "POST":
+            self.follows.extend(body)
+            return httpx.Response(201, json={"duration": "1ms"})
+
+        match = self.FEED_RE.match(path)
+        if not match:
+            return httpx.Response(404, json={"detail": "not found", "code": 0, "exception": "NotFound"})
+
+        feed_id = f"{match['slug']}:{match['user']}"
+        rest = match["rest"]
+
+        if request.method == "POST" and rest == "":
+            if "activities" in body:
+                created = [self._new_activity(feed_id, a) for a in body["activities"]]
+                return httpx.Response(201, json={"activities": created, "duration": "1ms"})
+            return httpx.Response(201, json=self._new_activity(feed_id, body))
+
+        if request.method == "GET" and rest == "":
+            limit = int(request.url.params.get("limit", 25))
+            offset = int(request.url.params.get("offset", 0))
+            return httpx.Response(200, json={
+                "results": self.feeds[feed_id][offset:offset + limit],
+                "next": "",
+                "duration": "1ms"
+            })
+
+        if request.method == "DELETE" and rest.endswith("/") and "follows" not in rest:
+            foreign_id = rest.rstrip("/")
+            self.feeds[feed_id] = [a for a in self.feeds[feed_id] if a.get("foreign_id") != foreign_id]
+            return httpx.Response(200, json={"removed": foreign_id, "duration": "1ms"})
+
+        return httpx.Response(400, json={"detail": "unsupported", "code": 4, "exception": "InputException"})
+
+
+def _client(server: FakeStreamFeedsServer, **kwargs) -> AsyncStreamFeedsClient:
+    return AsyncStreamFeedsClient(
+        api_key="key",
+        api_secret="secret",
+        base_url="http://stream.local",
+        transport=httpx.MockTransport(server.handler),
+        **kwargs
+    )
+
+
+class TestAsyncStreamFeedsClient:
+
+    @pytest.mark.asyncio
+    async def test_add_get_and_remove_activity(self):
+        server = FakeStreamFeedsServer()
+        client = _client(server)
+
+        created = await client.add_activity("user", "gym_1_user_2", {"actor": "a", "verb": "post", "object": "post:1", "foreign_id": "post_1"})
+        assert created["id"] == "act-1"
+
+        feed = await client.get_feed("user", "gym_1_user_2", limit=10)
+        assert [a["foreign_id"] for a in feed["results"]] == ["post_1"]
+
+        await client.remove_activity("user", "gym_1_user_2", "post_1")
+        feed = await client.get_feed("user", "gym_1_user_2")
+        assert feed["results"] == []
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_adds_to_same_feed_are_batched(self):
+        server = FakeStreamFeedsServer()
+        client = _client(server, batch_window=0.01)
+
+        results = await asyncio.gather(*[
+            client.add_activity_batched("timeline", "gym_1", {"actor": "a", "verb": "post", "object": f"post:{i}"})
+            for i in range(5)
+        ])
+
+        assert [r["object"] for r in results] == [f"post:{i}" for i in range(5)]
+        post_requests = [r for r in server.requests if r[0] == "POST"]
+        assert len(post_requests) == 1
+        assert len(server.feeds["timeline:gym_1"]) == 5
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_follows_use_follow_many(self):
+        server = FakeStreamFeedsServer()
+        client = _client(server, batch_window=0.01)
+
+        await asyncio.gather(*[
+            client.follow_batched("timeline", "gym_1", "user", f"gym_1_user_{i}")
+            for i in range(3)
+        ])
+
+        assert server.requests.count(("POST", "/api/v1.0/follow_many/")) == 1
+        assert {f["target"] for f in server.follows} == {f"user:gym_1_user_{i}" for i in range(3)}
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_per_call_timeout_is_forwarded(self):
+        seen_timeouts = []
+
+        async def handler(request):
+            seen_timeouts.append(request.extensions["timeout"]["read"])
+            return httpx.Response(200, json={"results": [], "duration": "1ms"})
+
+        client = AsyncStreamFeedsClient(
+            api_key="key", api_secret="secret", base_url="http://stream.local",
+            timeout=3.0, transport=httpx.MockTransport(handler)
+        )
+        await client.get_feed("user", "gym_1_user_2")
+        await client.get_feed("user", "gym_1_user_2", timeout=0.5)
+
+        assert seen_timeouts == [3.0, 0.5]
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_api_errors_raise_stream_exceptions(self):
+        from stream.exceptions import StreamApiException
+
+        server = FakeStreamFeedsServer()
+        client = _client(server)
+        with pytest.raises(StreamApiException):
+            await client.unfollow("timeline", "gym_1", "user", "gym_1_user_2")
+        await client.aclose()
+
+
+class TestPostFeedRepositoryAsync:
+
+    @pytest.mark.asyncio
+    async def test_gym_feed_reads_through_async_client(self):
+        server = FakeStreamFeedsServer()
+        client = _client(server)
+        await client.add_activity("timeline", "gym_7", {"actor": "a", "verb": "post", "object": "post:9", "like_count": 1})
+
+        repo = PostFeedRepository()
+        repo.client = client
+        feed = await repo.get_gym_feed(gym_id=7, user_id=1)
+
+        assert [a["object"] for a in feed["results"]] == ["post:9"]
+        await client.aclose()
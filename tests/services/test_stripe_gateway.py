@@ -0,0 +1,92 @@
+"""
+Tests del gateway asíncrono de Stripe: las llamadas al SDK real (contra
+``stripe_stub``) no bloquean el event loop, se limitan al pool del gateway y
+quedan medidas por operación.
+"""
+
+import asyncio
+import time
+
+import pytest
+import stripe
+from prometheus_client import REGISTRY
+
+from app.services.stripe_gateway import StripeGateway, idempotency_key
+
+
+@pytest.fixture
+def gateway():
+    previous = stripe.default_http_client
+    gateway = StripeGateway(max_workers=2, timeout_seconds=5)
+    yield gateway
+    gateway.shutdown()
+    stripe.default_http_client = previous
+
+
+def _requests_total(operation, status):
+    return REGISTRY.get_sample_value(
+        "gymapi_stripe_requests_total", {"operation": operation, "status": status}
+    ) or 0.0
+
+
+def _refund(gateway, intent_id, **kwargs):
+    return gateway.call(stripe.Refund.create, payment_intent=intent_id, amount=1000, **kwargs)
+
+
+class TestStripeGateway:
+
+    def test_calls_do_not_block_the_event_loop_and_share_the_pool(self, gateway, stripe_stub):
+        stripe_stub.delay = 0.2
+
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticking = asyncio.create_task(ticker())
+            start = time.perf_counter()
+            refunds = await asyncio.gather(*(_refund(gateway, f"pi_{i}") for i in range(6)))
+            elapsed = time.perf_counter() - start
+            ticking.cancel()
+            return refunds, elapsed, ticks
+
+        refunds, elapsed, ticks = asyncio.run(scenario())
+
+        assert len({refund.id for refund in refunds}) == 6
+        assert stripe_stub.max_in_flight == 2
+        assert elapsed >= 0.6  # 6 llamadas de 0.2s con 2 hilos
+        assert ticks >= 30  # el loop siguió atendiendo otras tareas
+        assert gateway.stats()["calls"] == 6
+        assert gateway.stats()["in_flight"] == 0
+
+    def test_idempotency_key_and_timeout_are_applied(self, gateway, stripe_stub):
+        key = idempotency_key("event-refund-participation", 7, "pi_7")
+
+        first = asyncio.run(_refund(gateway, "pi_7", idempotency_key=key))
+        second = asyncio.run(_refund(gateway, "pi_7", idempotency_key=key))
+
+        assert key == "event-refund-participation-7-pi_7"
+        assert first.id == second.id
+        assert [r["idempotency_key"] for r in stripe_stub.requests] == [key, key]
+        assert isinstance(stripe.default_http_client, stripe.RequestsClient)
+        assert stripe.default_http_client._timeout == 5
+
+    def test_latency_and_errors_are_tracked_per_operation(self, gateway, stripe_stub):
+        stripe_stub.declined = {"pi_bad"}
+        succeeded = _requests_total("Refund.create", "success")
+        failed = _requests_total("Refund.create", "CardError")
+
+        asyncio.run(_refund(gateway, "pi_ok"))
+        with pytest.raises(stripe.error.CardError):
+            asyncio.run(_refund(gateway, "pi_bad"))
+
+        assert _requests_total("Refund.create", "success") == succeeded + 1
+        assert _requests_total("Refund.create", "CardError") == failed + 1
+        assert REGISTRY.get_sample_value(
+            "gymapi_stripe_request_duration_seconds_count", {"operation": "Refund.create"}
+        ) >= 2
+        assert gateway.stats()["errors"] == 1
@@ -0,0 +1,148 @@
+"""
+Tests de la sincronización masiva de planes con Stripe: diff local contra el
+catálogo descargado y aplicación de solo las operaciones necesarias, con el
+SDK real contra ``stripe_stub``.
+"""
+
+import asyncio
+
+import pytest
+
+from app.models.gym import Gym
+from app.models.membership import MembershipPlan
+from app.models.stripe_profile import GymStripeAccount
+from app.services.stripe_plan_sync import PlanOperation, StripePlanSyncService
+from app.services.stripe_retry import StripeRetryPolicy
+
+ACCOUNT = "acct_gym_1"
+
+
+@pytest.fixture
+def db(sqlite_sessionmaker):
+    session = sqlite_sessionmaker(Gym, MembershipPlan, GymStripeAccount)()
+    session.add_all([
+        Gym(id=1, name="Centro", subdomain="centro", is_active=True),
+        GymStripeAccount(gym_id=1, stripe_account_id=ACCOUNT, is_active=True, onboarding_completed=True),
+        _plan(1, "Mensual", 3000, "month", product="prod_1", price="price_1"),
+        _plan(2, "Anual renovado", 32000, "year", product="prod_2", price="price_2"),
+        _plan(3, "Pase Día", 1500, "one_time"),
+        _plan(4, "Antiguo", 2000, "month", product="prod_4", price="price_4", is_active=False),
+        _plan(5, "Recuperado", 4000, "month"),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def _plan(plan_id, name, price_cents, interval, product=None, price=None, is_active=True):
+    return MembershipPlan(id=plan_id, gym_id=1, name=name, description=f"Plan {name}", price_cents=price_cents,
+                          currency="EUR", billing_interval=interval, duration_days=30, is_active=is_active,
+                          stripe_product_id=product, stripe_price_id=price)
+
+
+def _product(product_id, name, plan_id, active=True):
+    return {"id": product_id, "object": "product", "name": name, "description": f"Plan {name}",
+            "active": active, "metadata": {"gym_id": "1", "local_plan_id": str(plan_id)}}
+
+
+def _price(price_id, product_id, amount, interval="month", active=True):
+    return {"id": price_id, "object": "price", "product": product_id, "unit_amount": amount, "currency": "eur",
+            "active": active, "recurring": {"interval": interval} if interval else None}
+
+
+@pytest.fixture
+def catalog(stripe_stub):
+    stripe_stub.page_size = 2
+    stripe_stub.lists = {
+        "/v1/products": [
+            _product("prod_1", "Mensual", 1),
+            _product("prod_2", "Anual", 2),
+            _product("prod_4", "Antiguo", 4),
+            # Creado por una sincronización interrumpida antes de guardar el ID en el plan
+            _product("prod_5", "Recuperado", 5),
+        ],
+        "/v1/prices": [
+            _price("price_1", "prod_1", 3000),
+            _price("price_2", "prod_2", 30000, "year"),
+            _price("price_4", "prod_4", 2000),
+            _price("price_5", "prod_5", 4000),
+        ],
+    }
+    return stripe_stub
+
+
+def _service():
+    return StripePlanSyncService(concurrency=3, retry_policy=StripeRetryPolicy(backoff_base_seconds=0.01))
+
+
+def _writes(stub):
+    return [(r["path"], r["form"].get("active")) for r in stub.requests if r["idempotency_key"]]
+
+
+class TestPlanSync:
+
+    def test_applies_only_the_minimal_operations(self, db, catalog):
+        result = asyncio.run(_service().sync_gym_plans(db, 1))
+
+        operations = {detail["plan_id"]: detail["operations"] for detail in result["details"]}
+        assert operations == {
+            1: [],
+            2: ["update_product", "create_price", "archive_price"],
+            3: ["create_product", "create_price"],
+            4: ["archive_product", "archive_price"],
+            5: [],
+        }
+        assert (result["total"], result["synced"], result["failed"]) == (5, 5, 0)
+        assert [d["status"] for d in result["details"]] == ["unchanged", "synced", "synced", "synced", "unchanged"]
+
+        # Dos listados paginados (2 páginas cada uno) y 7 escrituras
+        assert len([r for r in catalog.requests if r["idempotency_key"] is None]) == 4
+        assert sorted(_writes(catalog)) == sorted([
+            ("/v1/products/prod_2", None), ("/v1/prices", None), ("/v1/prices/price_2", "False"),
+            ("/v1/products", None), ("/v1/prices", None),
+            ("/v1/products/prod_4", "False"), ("/v1/prices/price_4", "False"),
+        ])
+
+        plans = {plan.id: plan for plan in db.query(MembershipPlan)}
+        assert plans[2].stripe_price_id.startswith("price_new_")
+        assert plans[3].stripe_product_id.startswith("prod_new_")
+        assert (plans[5].stripe_product_id, plans[5].stripe_price_id) == ("prod_5", "price_5")
+        new_price = next(p for p in catalog.lists["/v1/prices"] if p["id"] == plans[2].stripe_price_id)
+        assert (new_price["unit_amount"], new_price["recurring"]) == (32000, {"interval": "year"})
+
+        # Una segunda pasada no encuentra diferencias
+        catalog.requests.clear()
+        again = asyncio.run(_service().sync_gym_plans(db, 1))
+        assert again["operations"] == {}
+        assert _writes(catalog) == []
+
+    def test_dry_run_reports_diff_without_writing(self, db, catalog):
+        result = asyncio.run(_service().sync_gym_plans(db, 1, dry_run=True))
+
+        assert result["dry_run"] is True
+        assert result["operations"] == {"update_product": 1, "create_price": 2, "archive_price": 2,
+                                        "create_product": 1, "archive_product": 1}
+        assert [d["status"] for d in result["details"]] == ["unchanged", "pending", "pending", "pending", "unchanged"]
+        assert _writes(catalog) == []
+        assert db.get(MembershipPlan, 3).stripe_product_id is None
+
+    def test_rate_limits_are_retried(self, db, catalog):
+        catalog.rate_limited = 3
+
+        result = asyncio.run(_service().sync_gym_plans(db, 1))
+
+        assert result["failed"] == 0
+        assert db.get(MembershipPlan, 3).stripe_price_id is not None
+
+    def test_price_key_changes_with_currency_and_interval(self):
+        def key(plan):
+            _, _, kwargs = StripePlanSyncService._operation_call(plan, PlanOperation("create_price"), ACCOUNT, "prod_x")
+            return kwargs["idempotency_key"]
+
+        monthly = _plan(9, "Mensual", 3000, "month")
+        yearly = _plan(9, "Mensual", 3000, "year")
+        in_usd = _plan(9, "Mensual", 3000, "month")
+        in_usd.currency = "USD"
+
+        assert len({key(monthly), key(yearly), key(in_usd)}) == 3
+        assert key(monthly) == key(_plan(9, "Mensual", 3000, "month"))
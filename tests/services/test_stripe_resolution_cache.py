@@ -0,0 +1,139 @@
+"""
+Tests de la caché de resolución de Stripe: cuenta Connect del gym y customer
+del usuario fuera del camino caliente del checkout de eventos, con
+invalidación por el webhook ``account.updated``.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event as sa_event
+
+from app.api.v1.endpoints import modules as modules_endpoint
+from app.api.v1.endpoints.webhooks import stripe_connect_webhooks
+from app.models.gym import Gym
+from app.models.gym_module import GymModule
+from app.models.module import Module
+from app.models.stripe_profile import GymStripeAccount
+from app.services import event_payment_service as event_payment_module
+from app.services.event_payment_service import EventPaymentService
+from app.services.stripe_resolution_cache import StripeResolutionCache
+
+ACCOUNT = "acct_gym_1"
+
+
+@pytest.fixture
+def db(sqlite_sessionmaker):
+    session = sqlite_sessionmaker(Gym, Module, GymModule, GymStripeAccount)()
+    session.add_all([
+        Gym(id=1, name="Centro", subdomain="centro", is_active=True),
+        Module(id=1, code="billing", name="Billing"),
+        GymModule(gym_id=1, module_id=1, active=True),
+        GymStripeAccount(gym_id=1, stripe_account_id=ACCOUNT, is_active=True, charges_enabled=True,
+                         payouts_enabled=True, onboarding_completed=True),
+    ])
+    session.commit()
+    session.queries = []
+    sa_event.listen(session.get_bind(), "before_cursor_execute",
+                    lambda conn, cursor, statement, *args: session.queries.append(statement))
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def cache(monkeypatch, fake_redis):
+    async def factory():
+        return fake_redis
+
+    cache = StripeResolutionCache(redis_factory=factory)
+    for module in (event_payment_module, stripe_connect_webhooks):
+        monkeypatch.setattr(module, "stripe_resolution_cache", cache)
+    return cache
+
+
+class TestGymAccountResolution:
+
+    def test_checkout_checks_hit_the_database_once(self, db, cache):
+        service = EventPaymentService()
+
+        assert asyncio.run(service.verify_stripe_enabled(db, 1)) is True
+        first_queries = len(db.queries)
+        for _ in range(3):
+            account = asyncio.run(service._resolve_chargeable_account(db, 1))
+
+        assert first_queries > 0
+        assert len(db.queries) == first_queries
+        assert (account.stripe_account_id, account.can_charge) == (ACCOUNT, True)
+
+    def test_account_updated_webhook_invalidates_the_gym(self, db, cache):
+        service = EventPaymentService()
+        assert asyncio.run(service.verify_stripe_enabled(db, 1)) is True
+
+        event = {"type": "account.updated", "account": ACCOUNT,
+                 "data": {"object": {"id": ACCOUNT, "charges_enabled": False, "payouts_enabled": True,
+                                     "details_submitted": True}}}
+        asyncio.run(stripe_connect_webhooks._handle_account_updated(db, event))
+
+        assert asyncio.run(service.verify_stripe_enabled(db, 1)) is False
+        assert asyncio.run(cache.get_gym_account(db, 1)).charges_enabled is False
+
+    def test_invalidation_during_a_load_is_not_overwritten(self, db, cache, monkeypatch):
+        redis = asyncio.run(cache._redis())
+        load = cache._load_gym_account
+
+        def load_racing_a_webhook(db, gym_id):
+            resolution = load(db, gym_id)
+            # account.updated llega mientras la lectura está en la BD (INCR del namespace)
+            db.query(GymStripeAccount).update({"charges_enabled": False})
+            db.commit()
+            redis.data[f"cache_ns:{cache.namespace(gym_id)}"] = "1"
+            return resolution
+
+        monkeypatch.setattr(cache, "_load_gym_account", load_racing_a_webhook)
+        assert asyncio.run(cache.get_gym_account(db, 1)).charges_enabled is True
+
+        monkeypatch.setattr(cache, "_load_gym_account", load)
+        assert asyncio.run(cache.get_gym_account(db, 1)).charges_enabled is False
+
+    def test_billing_module_toggle_invalidates_the_gym(self, db, cache, monkeypatch):
+        monkeypatch.setattr(modules_endpoint, "stripe_resolution_cache", cache)
+        assert asyncio.run(cache.get_gym_account(db, 1)).billing_enabled is True
+
+        asyncio.run(modules_endpoint.deactivate_module(db=db, gym_id=1, module_code="billing", super_admin=None))
+
+        assert asyncio.run(cache.get_gym_account(db, 1)).billing_enabled is False
+
+    def test_falls_back_to_database_without_redis(self, db):
+        async def unavailable():
+            raise ConnectionError("redis caído")
+
+        cache = StripeResolutionCache(redis_factory=unavailable)
+
+        assert asyncio.run(cache.get_gym_account(db, 1)).stripe_account_id == ACCOUNT
+        assert asyncio.run(cache.get_gym_account(db, 2)).stripe_account_id is None
+
+
+class TestCustomerResolution:
+
+    def test_customer_is_verified_once_then_cached_per_account(self, db, cache, monkeypatch):
+        service = EventPaymentService()
+        calls = []
+
+        async def get_or_create(db, user, gym_id, stripe_account_id):
+            calls.append(stripe_account_id)
+            return SimpleNamespace(stripe_customer_id=f"cus_{stripe_account_id}")
+
+        monkeypatch.setattr(service, "_get_or_create_stripe_customer", get_or_create)
+        user = SimpleNamespace(id=5)
+
+        ids = [asyncio.run(service._resolve_stripe_customer_id(db, user, 1, ACCOUNT)) for _ in range(3)]
+        other = asyncio.run(service._resolve_stripe_customer_id(db, user, 1, "acct_new"))
+
+        assert ids == [f"cus_{ACCOUNT}"] * 3
+        assert other == "cus_acct_new"
+        assert calls == [ACCOUNT, "acct_new"]
+
+        asyncio.run(cache.invalidate_customer(ACCOUNT, 1, 5))
+        asyncio.run(service._resolve_stripe_customer_id(db, user, 1, ACCOUNT))
+        assert calls == [ACCOUNT, "acct_new", ACCOUNT]
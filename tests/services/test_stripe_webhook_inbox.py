@@ -0,0 +1,169 @@
+"""
+Tests del inbox de webhooks de Stripe: recepción deduplicada, orden por
+cliente, reintentos con espera y cola de eventos muertos.
+
+Los payloads se firman como lo hace Stripe (cabecera ``Stripe-Signature``)
+y se verifican con el SDK real.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from app.models.stripe_webhook import StripeWebhookEvent, StripeWebhookEventStatus
+from app.services import stripe_service as stripe_service_module
+from app.services.stripe_webhook_inbox import StripeWebhookInbox
+
+SECRET = "whsec_test_inbox"
+
+
+@pytest.fixture(autouse=True)
+def webhook_secret(monkeypatch):
+    monkeypatch.setattr(stripe_service_module.settings, "STRIPE_WEBHOOK_SECRET", SECRET)
+
+
+@pytest.fixture
+def session_factory(sqlite_sessionmaker):
+    return sqlite_sessionmaker(StripeWebhookEvent)
+
+
+def _signed(event_id, event_type="invoice.payment_succeeded", customer="cus_1", created=1_700_000_000):
+    payload = json.dumps({
+        "id": event_id, "object": "event", "type": event_type, "created": created,
+        "data": {"object": {"id": f"in_{event_id}", "object": "invoice", "customer": customer}},
+    })
+    timestamp = int(time.time())
+    digest = hmac.new(SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return payload.encode(), f"t={timestamp},v1={digest}"
+
+
+class RecordingHandler:
+
+    def __init__(self, failures=None):
+        self.calls = []
+        self.failures = dict(failures or {})  # evento -> fallos antes de funcionar
+
+    async def __call__(self, event):
+        self.calls.append(event["id"])
+        if self.failures.get(event["id"], 0) > 0:
+            self.failures[event["id"]] -= 1
+            raise RuntimeError("handler caído")
+
+
+def _inbox(handler, **kwargs):
+    kwargs.setdefault("max_attempts", 3)
+    return StripeWebhookInbox(handler=handler, backoff_base_seconds=0.0, **kwargs)
+
+
+def _ingest(session_factory, inbox, *events):
+    db = session_factory()
+    results = [inbox.ingest(db, *_signed(*event)) for event in events]
+    db.close()
+    return results
+
+
+def _row(session_factory, event_id):
+    db = session_factory()
+    row = db.query(StripeWebhookEvent).filter_by(stripe_event_id=event_id).one()
+    db.close()
+    return row
+
+
+class TestIngest:
+
+    def test_acks_without_running_handlers_and_dedupes(self, session_factory):
+        handler = RecordingHandler()
+        inbox = _inbox(handler)
+
+        results = _ingest(session_factory, inbox, ("evt_1",), ("evt_1",))
+
+        assert [r["status"] for r in results] == ["queued", "duplicate"]
+        assert handler.calls == []
+        row = _row(session_factory, "evt_1")
+        assert (row.status, row.ordering_key, row.event_type) == (
+            StripeWebhookEventStatus.PENDING, "platform:cus_1", "invoice.payment_succeeded"
+        )
+        assert row.ack_ms is not None
+
+    def test_invalid_signature_is_rejected(self, session_factory):
+        db = session_factory()
+        payload, _signature = _signed("evt_1")
+        with pytest.raises(ValueError):
+            _inbox(RecordingHandler()).ingest(db, payload, "t=1,v1=firma-falsa")
+        assert db.query(StripeWebhookEvent).count() == 0
+        db.close()
+
+
+class TestWorker:
+
+    def test_events_of_a_customer_are_processed_in_order(self, session_factory):
+        handler = RecordingHandler()
+        inbox = _inbox(handler)
+        _ingest(session_factory, inbox,
+                ("evt_b2", "invoice.paid", "cus_b", 20), ("evt_a1", "invoice.paid", "cus_a", 10),
+                ("evt_b1", "invoice.paid", "cus_b", 10), ("evt_a2", "invoice.paid", "cus_a", 30))
+
+        db = session_factory()
+        first_batch = inbox.claim_batch(db)
+        # Un evento por cliente: el más antiguo de cada uno
+        assert sorted(db.get(StripeWebhookEvent, i).stripe_event_id for i in first_batch) == ["evt_a1", "evt_b1"]
+        assert inbox.claim_batch(db) == []
+        db.close()
+
+        for inbox_id in first_batch:
+            db = session_factory()
+            asyncio.run(inbox.process_event(db, inbox_id))
+            db.close()
+        assert asyncio.run(inbox.process_pending(session_factory)) == 2
+
+        assert handler.calls.index("evt_b1") < handler.calls.index("evt_b2")
+        assert handler.calls.index("evt_a1") < handler.calls.index("evt_a2")
+
+    def test_failed_event_blocks_later_events_of_same_customer(self, session_factory):
+        handler = RecordingHandler(failures={"evt_1": 1})
+        inbox = StripeWebhookInbox(handler=handler, max_attempts=3, backoff_base_seconds=3600)
+        _ingest(session_factory, inbox, ("evt_1", "invoice.paid", "cus_1", 10),
+                ("evt_2", "invoice.paid", "cus_1", 20), ("evt_3", "invoice.paid", "cus_2", 15))
+
+        asyncio.run(inbox.process_pending(session_factory))
+
+        assert sorted(handler.calls) == ["evt_1", "evt_3"]
+        retry = _row(session_factory, "evt_1")
+        assert (retry.status, retry.attempts, retry.last_error) == (
+            StripeWebhookEventStatus.PENDING, 1, "RuntimeError: handler caído"
+        )
+        assert _row(session_factory, "evt_2").status == StripeWebhookEventStatus.PENDING
+
+    def test_retries_then_dead_letter_and_requeue(self, session_factory):
+        handler = RecordingHandler(failures={"evt_1": 3})
+        inbox = _inbox(handler)
+        _ingest(session_factory, inbox, ("evt_1",), ("evt_2", "invoice.paid", "cus_1", 1_700_000_100))
+
+        asyncio.run(inbox.process_pending(session_factory))
+
+        # Tras agotar los intentos el evento deja de bloquear al siguiente del cliente
+        assert handler.calls == ["evt_1"] * 3 + ["evt_2"]
+        db = session_factory()
+        assert [e.stripe_event_id for e in inbox.list_dead_letters(db)] == ["evt_1"]
+        assert inbox.requeue(db, "evt_1") is True
+        assert inbox.requeue(db, "evt_2") is False
+        db.close()
+
+        asyncio.run(inbox.process_pending(session_factory))
+        assert _row(session_factory, "evt_1").status == StripeWebhookEventStatus.PROCESSED
+
+    def test_stats_report_ack_latency_percentiles(self, session_factory):
+        inbox = _inbox(RecordingHandler())
+        _ingest(session_factory, inbox, *[(f"evt_{i}",) for i in range(20)])
+
+        db = session_factory()
+        stats = inbox.stats(db)
+        db.close()
+
+        assert stats["by_status"]["PENDING"] == 20
+        assert stats["ack_latency_ms"]["count"] == 20
+        assert 0 < stats["ack_latency_ms"]["p50"] <= stats["ack_latency_ms"]["p99"]
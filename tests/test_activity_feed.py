@@ -15,12 +15,29 @@ import time
 from typing import Dict, List
 from datetime import datetime
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
 from unittest.mock import Mock, AsyncMock, patch
 
 from app.services.activity_feed_service import ActivityFeedService
 from app.services.activity_aggregator import ActivityAggregator
 
 
+def _mock_pipeline(redis_mock, *results):
+    """
+    Configura redis_mock.pipeline() para devolver un pipeline mock.
+
+    Cada elemento de `results` es el resultado de una llamada a execute().
+    """
+    pipe = AsyncMock(spec=Pipeline)
+    pipe.__aenter__.return_value = pipe
+    if results:
+        pipe.execute = AsyncMock(side_effect=list(results))
+    else:
+        pipe.execute = AsyncMock(return_value=[])
+    redis_mock.pipeline = Mock(return_value=pipe)
+    return pipe
+
+
 class TestActivityFeedPrivacy:
     """Tests de privacidad del Activity Feed."""
 
@@ -29,11 +46,7 @@ class TestActivityFeedPrivacy:
         """Verifica que las actividades nunca contengan nombres de usuarios."""
         # Crear mock de Redis
         redis_mock = AsyncMock(spec=Redis)
-        redis_mock.setex = AsyncMock(return_value=True)
-        redis_mock.lpush = AsyncMock(return_value=1)
-        redis_mock.ltrim = AsyncMock(return_value=True)
-        redis_mock.expire = AsyncMock(return_value=True)
-        redis_mock.publish = AsyncMock(return_value=1)
+        pipe = _mock_pipeline(redis_mock)
 
         # Crear servicio
         feed_service = ActivityFeedService(redis_mock)
@@ -58,10 +71,15 @@ class TestActivityFeedPrivacy:
         assert activity["type"] == "realtime"
         assert activity["message"] == "15 personas entrenando ahora"
 
+        # Todas las escrituras van en una sola transacción
+        redis_mock.pipeline.assert_called_once_with(transaction=True)
+        pipe.execute.assert_awaited_once()
+
     @pytest.mark.asyncio
     async def test_minimum_aggregation_threshold(self):
         """Verifica que no se publiquen actividades con menos del umbral mínimo."""
         redis_mock = AsyncMock(spec=Redis)
+        pipe = _mock_pipeline(redis_mock)
         feed_service = ActivityFeedService(redis_mock)
 
         # Intentar publicar con count < 3
@@ -76,7 +94,8 @@ class TestActivityFeedPrivacy:
         assert activity is None
 
         # Verificar que no se llamó a Redis
-        redis_mock.lpush.assert_not_called()
+        pipe.lpush.assert_not_called()
+        pipe.execute.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_anonymous_rankings(self):
@@ -210,11 +229,7 @@ class TestActivityFeedPerformance:
     async def test_memory_efficient_storage(self):
         """Verifica que el almacenamiento sea eficiente en memoria."""
         redis_mock = AsyncMock(spec=Redis)
-        redis_mock.setex = AsyncMock(return_value=True)
-        redis_mock.lpush = AsyncMock(return_value=1)
-        redis_mock.ltrim = AsyncMock(return_value=True)
-        redis_mock.expire = AsyncMock(return_value=True)
-        redis_mock.publish = AsyncMock(return_value=1)
+        pipe = _mock_pipeline(redis_mock)
 
         feed_service = ActivityFeedService(redis_mock)
 
@@ -228,8 +243,8 @@ class TestActivityFeedPerformance:
             )
 
         # Verificar que se limita el tamaño del feed (ltrim a 100 items)
-        assert redis_mock.ltrim.call_count == 100
-        ltrim_calls = redis_mock.ltrim.call_args_list
+        assert pipe.ltrim.call_count == 100
+        ltrim_calls = pipe.ltrim.call_args_list
         # Verificar que siempre se limita a 100 items
         for call in ltrim_calls:
             assert call[0][1] == 0
@@ -243,12 +258,8 @@ class TestActivityAggregator:
     async def test_check_in_aggregation(self):
         """Verifica la agregación de check-ins."""
         redis_mock = AsyncMock(spec=Redis)
-        redis_mock.incr = AsyncMock(side_effect=[5, 20, 1])  # Clase, total, diario
-        redis_mock.expire = AsyncMock(return_value=True)
-        redis_mock.setex = AsyncMock(return_value=True)
-        redis_mock.lpush = AsyncMock(return_value=1)
-        redis_mock.ltrim = AsyncMock(return_value=True)
-        redis_mock.publish = AsyncMock(return_value=1)
+        # Clase, total, diario (cada INCRBY seguido de su EXPIRE) y después la publicación
+        pipe = _mock_pipeline(redis_mock, [5, True, 20, True, 1, True], [])
 
         feed_service = ActivityFeedService(redis_mock)
         aggregator = ActivityAggregator(feed_service)
@@ -262,22 +273,19 @@ class TestActivityAggregator:
         })
 
         # Verificar que se incrementaron contadores
-        assert redis_mock.incr.call_count == 3  # Clase, total, diario
+        assert pipe.incrby.call_count == 3  # Clase, total, diario
+        # total=20 es múltiplo del umbral: se publica en un segundo round-trip
+        assert pipe.execute.await_count == 2
+        pipe.setex.assert_called_once_with("gym:1:realtime:training_count", 300, 20)
 
     @pytest.mark.asyncio
     async def test_achievement_aggregation(self):
         """Verifica la agregación de logros sin exponer usuarios."""
         redis_mock = AsyncMock(spec=Redis)
-        redis_mock.incr = AsyncMock(return_value=3)  # Múltiplo del umbral
-        redis_mock.get = AsyncMock(return_value=b"3")
-        redis_mock.expire = AsyncMock(return_value=True)
-        redis_mock.setex = AsyncMock(return_value=True)
-        redis_mock.lpush = AsyncMock(return_value=1)
-        redis_mock.ltrim = AsyncMock(return_value=True)
-        redis_mock.publish = AsyncMock(return_value=1)
 
         feed_service = ActivityFeedService(redis_mock)
-        feed_service.update_aggregate_stats = AsyncMock(return_value=3)
+        feed_service.increment_counters = AsyncMock(return_value=[3, 1])  # Múltiplo del umbral
+        feed_service.publish_realtime_activities = AsyncMock(return_value=[])
         aggregator = ActivityAggregator(feed_service)
 
         # Procesar logro
@@ -288,18 +296,16 @@ class TestActivityAggregator:
         })
 
         # Verificar que se actualizaron estadísticas
-        feed_service.update_aggregate_stats.assert_called_once()
+        feed_service.increment_counters.assert_called_once()
+        published = feed_service.publish_realtime_activities.call_args.args[1]
+        assert published[0]["activity_type"] == "achievement_unlocked"
+        assert "user_id" not in published[0]["metadata"]
 
     @pytest.mark.asyncio
     async def test_streak_milestone_handling(self):
         """Verifica el manejo de hitos de racha."""
         redis_mock = AsyncMock(spec=Redis)
-        redis_mock.incr = AsyncMock(return_value=5)
-        redis_mock.expire = AsyncMock(return_value=True)
-        redis_mock.setex = AsyncMock(return_value=True)
-        redis_mock.lpush = AsyncMock(return_value=1)
-        redis_mock.ltrim = AsyncMock(return_value=True)
-        redis_mock.publish = AsyncMock(return_value=1)
+        pipe = _mock_pipeline(redis_mock, [5, True, 5, True], [])
 
         feed_service = ActivityFeedService(redis_mock)
         aggregator = ActivityAggregator(feed_service)
@@ -311,10 +317,10 @@ class TestActivityAggregator:
         })
 
         # Verificar que se procesó
-        assert redis_mock.incr.call_count >= 1
+        assert pipe.incrby.call_count >= 1
 
         # Resetear mocks
-        redis_mock.reset_mock()
+        pipe.reset_mock()
 
         # Procesar día no milestone (15 días)
         await aggregator.on_streak_milestone({
@@ -323,7 +329,200 @@ class TestActivityAggregator:
         })
 
         # No debe procesarse (no es milestone)
-        redis_mock.incr.assert_not_called()
+        pipe.incrby.assert_not_called()
+
+
+class FakeRedis:
+    """Redis en memoria con el subconjunto de comandos usado por el feed."""
+
+    def __init__(self):
+        self.data = {}
+        self.published = []
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def zrange(self, key, start, end, withscores=False):
+        return sorted(self.data.get(key, {}).items(), key=lambda item: item[1])
+
+    async def zrevrange(self, key, start, end, withscores=False):
+        items = sorted(self.data.get(key, {}).items(), key=lambda item: -item[1])
+        return items[start:end + 1]
+
+
+class FakePipeline:
+
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args + tuple(kwargs.values())))
+            return self
+        return queue
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        data = self.redis.data
+        results = []
+        for name, args in self.commands:
+            if name in ("incrby", "incrbyfloat"):
+                data[args[0]] = data.get(args[0], 0) + args[1]
+                results.append(data[args[0]])
+            elif name == "setex":
+                data[args[0]] = args[2]
+                results.append(True)
+            elif name == "lpush":
+                data[args[0]] = list(reversed(args[1:])) + data.get(args[0], [])
+                results.append(len(data[args[0]]))
+            elif name == "ltrim":
+                data[args[0]] = data[args[0]][args[1]:args[2] + 1]
+                results.append(True)
+            elif name == "publish":
+                self.redis.published.append(args)
+                results.append(1)
+            elif name == "zincrby":
+                zset = data.setdefault(args[0], {})
+                zset[args[2]] = zset.get(args[2], 0) + args[1]
+                results.append(zset[args[2]])
+            elif name == "zadd":
+                data.setdefault(args[0], {}).update(args[1])
+                results.append(len(args[1]))
+            elif name == "zrem":
+                for member in args[1:]:
+                    data.get(args[0], {}).pop(member, None)
+                results.append(len(args) - 1)
+            elif name == "hsetnx":
+                results.append(data.setdefault(args[0], {}).setdefault(args[1], args[2]) == args[2])
+            elif name == "hset":
+                data.setdefault(args[0], {}).update(args[-1])
+                results.append(len(args[-1]))
+            elif name == "hmget":
+                results.append([data.get(args[0], {}).get(field) for field in args[1]])
+            else:
+                results.append(True)
+        self.commands = []
+        return results
+
+
+class TestActivityFeedBatching:
+    """Tests de la ingesta por lotes con pipelines."""
+
+    @pytest.mark.asyncio
+    async def test_batch_ingest_groups_round_trips_per_gym(self):
+        """Un lote de eventos usa dos round-trips por gimnasio."""
+        redis = FakeRedis()
+        aggregator = ActivityAggregator(ActivityFeedService(redis))
+
+        events = [{"type": "class_checkin", "gym_id": 1, "class_name": "CrossFit"} for _ in range(10)]
+        events += [{"type": "personal_record", "gym_id": 2} for _ in range(3)]
+        events += [{"type": "unknown", "gym_id": 1}]
+
+        await aggregator.process_batch_events(events)
+
+        assert redis.round_trips == 4  # contadores + publicaciones, por gym
+        assert redis.data["gym:1:realtime:by_class:CrossFit"] == 10
+        assert redis.data["gym:1:daily:attendance"] == 10
+        assert redis.data["gym:2:daily:personal_records"] == 3
+
+        # Se publica en los mismos umbrales que procesando evento a evento
+        feed = [json.loads(item) for item in redis.data["gym:1:feed:activities"]]
+        assert [(a["subtype"], a["count"]) for a in feed] == [
+            ("class_checkin", 10), ("training_count", 10), ("training_count", 5)
+        ]
+        assert [json.loads(item)["subtype"] for item in redis.data["gym:2:feed:activities"]] == ["pr_broken"]
+        assert len(redis.published) == 4
+
+    @pytest.mark.asyncio
+    async def test_batch_matches_individual_processing(self):
+        """El lote deja los mismos contadores que los handlers individuales."""
+        events = [
+            {"type": "achievement_unlocked", "gym_id": 1, "achievement_type": "consistency"},
+            {"type": "goal_completed", "gym_id": 1},
+            {"type": "streak_milestone", "gym_id": 1, "streak_days": 30},
+            {"type": "class_completed", "gym_id": 1, "total_participants": 20, "duration_minutes": 45},
+        ]
+
+        batch_redis = FakeRedis()
+        await ActivityAggregator(ActivityFeedService(batch_redis)).process_batch_events(events)
+
+        single_redis = FakeRedis()
+        aggregator = ActivityAggregator(ActivityFeedService(single_redis))
+        await aggregator.on_achievement_unlocked(events[0])
+        await aggregator.on_goal_completed(events[1])
+        await aggregator.on_streak_milestone(events[2])
+        await aggregator.on_class_completed(events[3])
+
+        counters = {k: v for k, v in batch_redis.data.items() if ":feed:" not in k}
+        assert counters == {k: v for k, v in single_redis.data.items() if ":feed:" not in k}
+        assert batch_redis.data["gym:1:daily:total_hours"] == 15.0
+        assert batch_redis.round_trips < single_redis.round_trips
+
+
+class TestIncrementalRankings:
+    """Tests de los rankings diarios mantenidos con ZINCRBY."""
+
+    @pytest.mark.asyncio
+    async def test_checkins_update_ranking_in_same_transaction(self):
+        redis = FakeRedis()
+        feed_service = ActivityFeedService(redis)
+        aggregator = ActivityAggregator(feed_service)
+
+        events = [
+            {"type": "class_checkin", "gym_id": 1, "user_id": 7, "user_name": "Ana G."},
+            {"type": "class_checkin", "gym_id": 1, "user_id": 8, "user_name": "Luis P."},
+            {"type": "class_checkin", "gym_id": 1, "user_id": 7, "user_name": "Ana G."},
+        ]
+        await aggregator.process_batch_events(events)
+
+        assert redis.round_trips == 1  # sin umbrales alcanzados no hay publicación
+        rankings = await feed_service.get_anonymous_rankings(1, "attendance", period="daily")
+        assert [(r["user_id"], r["value"], r["label"]) for r in rankings] == [
+            (7, 2, "Ana G."), (8, 1, "Luis P.")
+        ]
+
+    @pytest.mark.asyncio
+    async def test_class_completed_scores_activity_hours(self):
+        redis = FakeRedis()
+        aggregator = ActivityAggregator(ActivityFeedService(redis))
+
+        await aggregator.on_class_completed({
+            "gym_id": 1, "total_participants": 2, "duration_minutes": 90, "participant_ids": [3, 4]
+        })
+
+        assert redis.data["gym:1:rankings:daily:activity"] == {"3": 1.5, "4": 1.5}
+
+    @pytest.mark.asyncio
+    async def test_reconcile_writes_only_differences(self):
+        redis = FakeRedis()
+        redis.data["gym:1:rankings:daily:attendance"] = {"7": 2.0, "8": 1.0, "9": 1.0}
+        feed_service = ActivityFeedService(redis)
+
+        result = await feed_service.reconcile_ranking(1, "attendance", [
+            {"user_id": 7, "name": "Ana G.", "value": 2},
+            {"user_id": 8, "name": "Luis P.", "value": 3},
+            {"user_id": 10, "name": "Eva R.", "value": 1},
+        ])
+
+        assert result == {"updated": 2, "removed": 1}
+        assert redis.data["gym:1:rankings:daily:attendance"] == {"7": 2.0, "8": 3.0, "10": 1.0}
+
+        redis.round_trips = 0
+        unchanged = await feed_service.reconcile_ranking(1, "attendance", [
+            {"user_id": 7, "name": "Ana G.", "value": 2},
+            {"user_id": 8, "name": "Luis P.", "value": 3},
+            {"user_id": 10, "name": "Eva R.", "value": 1},
+        ])
+        assert unchanged == {"updated": 0, "removed": 0}
+        assert redis.round_trips == 0
 
 
 class TestActivityFeedFunctionality:
@@ -363,9 +562,7 @@ class TestActivityFeedFunctionality:
     async def test_class_occupancy_updates(self):
         """Verifica las actualizaciones de ocupación de clases."""
         redis_mock = AsyncMock(spec=Redis)
-        redis_mock.lpush = AsyncMock(return_value=1)
-        redis_mock.ltrim = AsyncMock(return_value=True)
-        redis_mock.expire = AsyncMock(return_value=True)
+        pipe = _mock_pipeline(redis_mock)
 
         feed_service = ActivityFeedService(redis_mock)
 
@@ -383,7 +580,7 @@ class TestActivityFeedFunctionality:
         assert "Spinning casi lleno (18/20)" in activity["message"]
 
         # Resetear mock
-        redis_mock.reset_mock()
+        pipe.reset_mock()
 
         # Actualizar ocupación baja (<80%)
         activity = await feed_service.update_class_occupancy(
@@ -396,17 +593,13 @@ class TestActivityFeedFunctionality:
 
         # No debe publicarse
         assert activity is None
-        redis_mock.lpush.assert_not_called()
+        pipe.lpush.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_ttl_configuration(self):
         """Verifica que los TTLs se configuren correctamente."""
         redis_mock = AsyncMock(spec=Redis)
-        redis_mock.setex = AsyncMock(return_value=True)
-        redis_mock.expire = AsyncMock(return_value=True)
-        redis_mock.lpush = AsyncMock(return_value=1)
-        redis_mock.ltrim = AsyncMock(return_value=True)
-        redis_mock.publish = AsyncMock(return_value=1)
+        pipe = _mock_pipeline(redis_mock)
 
         feed_service = ActivityFeedService(redis_mock)
 
@@ -418,12 +611,12 @@ class TestActivityFeedFunctionality:
         )
 
         # Verificar que se estableció TTL correcto para tiempo real (5 minutos)
-        setex_call = redis_mock.setex.call_args
+        setex_call = pipe.setex.call_args
         assert setex_call[0][1] == 300  # 5 minutos
 
-        # Verificar expire del feed (1 hora)
-        expire_calls = [call[0] for call in redis_mock.expire.call_args_list]
-        assert any(call[1] == 3600 for call in expire_calls)  # 1 hora para feed
+        # Verificar expire del feed (24 horas)
+        expire_calls = [call[0] for call in pipe.expire.call_args_list]
+        assert any(call[1] == 86400 for call in expire_calls)  # 24 horas para feed
 
 
 # Fixtures para tests